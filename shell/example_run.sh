@@ -33,8 +33,7 @@ done
 "$scriptpath/run_lzrr.sh" "$scriptpath/example_run/splitted" "$scriptpath/example_run/log"
 
 
-"$scriptpath/generate_slurmscripts.sh" "$scriptpath/example_run/splitted" "$scriptpath/example_run/log" "$scriptpath/example_run/scripts"
-for script in "$scriptpath/example_run/scripts/"*.sh; do
-	timeout 1h $script > "$scriptpath/example_run/log/"$(basename $script .sh).log 2> "$scriptpath/example_run/log/"$(basename $script .sh).err
-done
-"$scriptpath/concat_json.sh" "$scriptpath/example_run/log" > "$scriptpath/example_run/benchmark.json"
+# the jobs of generate_slurmscripts.sh run in parallel on all cores, longest first (see src/scheduler.py)
+cd "$scriptpath/.."
+pipenv run python src/scheduler.py --timeout 3600 --memory_cap 16000 --files "$scriptpath"/example_run/splitted/* \
+	--log_dir "$scriptpath/example_run/log" --output "$scriptpath/example_run/benchmark.json"
@@ -75,9 +75,11 @@ Pipenv="pipenv run python"
 for filename in $datasetFolder/*; do
 	basefilename="$(basename $filename)"
 	memory=$kMaxMemory
-	putScriptRedir "$Pipenv src/bidirectional_solver.py" "bidir_$basefilename" "$filename" "$memory"
-	putScriptRedir "$Pipenv src/attractor_solver.py --algo min" "attr_$basefilename" "$filename" "$memory"
+	# the solvers check their estimated memory against the memory of the job before building the formula,
+	# and report the status "memory-cap" instead of being killed by the out-of-memory killer
+	putScriptRedir "$Pipenv src/bidirectional_solver.py --memory_cap $memory --on_memory_cap downgrade" "bidir_$basefilename" "$filename" "$memory"
+	putScriptRedir "$Pipenv src/attractor_solver.py --algo min --memory_cap $memory" "attr_$basefilename" "$filename" "$memory"
 	# putScriptRedir "$Pipenv src/grammar_solver.py" "grammar_$basefilename" "$filename"
-	putScriptRedir "$Pipenv src/slp_solver.py" "slp_$basefilename" "$filename" "$memory"
+	putScriptRedir "$Pipenv src/slp_solver.py --memory_cap $memory" "slp_$basefilename" "$filename" "$memory"
 	# putScriptRedir "$Pipenv src/slp_naive.py" "slpnaive_$basefilename" "$filename" "100"
 done 
@@ -0,0 +1,176 @@
+# Accounting of the resources used by the jobs of the benchmarks: CPU time in user and system mode and peak resident
+# set size, of a program (by wait4, see `run`) or of a job in a worker of worker_pool.py (by getrusage in the worker,
+# see `Meter`, or by /proc if the worker is killed), and the status of a failed job by how it ended:
+#   "timeout": killed after the timeout
+#   "oom":     ran out of memory: MemoryError under the memory limit, killed by SIGKILL that was not sent on the timeout
+#              (by the OOM killer of Linux), or its peak memory reached the memory limit
+#   "crash":   any other exception, signal or exit code
+# Results that do not pass the verification of the benchmarks are "wrong".
+
+import os
+import resource
+import signal
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+
+@dataclass
+class Usage:
+    # seconds of CPU in user and system mode
+    cpu_user: float = 0.0
+    cpu_sys: float = 0.0
+    # peak resident set size (MB)
+    max_rss: float = 0.0
+    # exit code of the program, or minus the signal that killed it
+    exit_code: int = 0
+
+
+def from_rusage(ru) -> Usage:
+    # ru_maxrss is in KB on Linux
+    return Usage(ru.ru_utime, ru.ru_stime, ru.ru_maxrss / 1024)
+
+
+def exit_code(status: int) -> int:
+    """
+    The exit code of a status given by wait, or minus the signal that killed the process.
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def classify(usage: Usage, timed_out: bool, memory_limit: float = 0) -> str:
+    """
+    Status of a job that did not exit normally, with `usage` and the memory limit (MB) it ran under.
+    """
+    if timed_out:
+        return "timeout"
+    if usage.exit_code == -signal.SIGKILL or (
+        memory_limit > 0 and usage.max_rss >= memory_limit
+    ):
+        return "oom"
+    return "crash"
+
+
+def run(
+    cmd: List[str], timeout: Optional[float] = None, **kwargs
+) -> Tuple[bytes, Usage, bool]:
+    """
+    Run the program `cmd`, killed after `timeout` seconds (no limit if None), and return its stdout, its resource
+    usage, and whether it timed out. `kwargs` are given to subprocess.Popen.
+    A program that cannot be run exits with 127 as in the shell.
+    """
+    with tempfile.TemporaryFile() as out:
+        try:
+            proc = subprocess.Popen(cmd, stdout=out, **kwargs)
+        except OSError:
+            return (b"", Usage(exit_code=127), False)
+        deadline = None if timeout is None else time.time() + timeout
+        timed_out = False
+        # the resource usage of this child only is given by wait4
+        while True:
+            (pid, status, ru) = os.wait4(
+                proc.pid, 0 if deadline is None else os.WNOHANG
+            )
+            if pid != 0:
+                break
+            if deadline is not None and time.time() > deadline:
+                proc.kill()
+                (_, status, ru) = os.wait4(proc.pid, 0)
+                timed_out = True
+                break
+            time.sleep(0.01)
+        # already waited, Popen must not wait again
+        proc.returncode = exit_code(status)
+        usage = from_rusage(ru)
+        usage.exit_code = proc.returncode
+        out.seek(0)
+        return (out.read(), usage, timed_out)
+
+
+def peak_rss(pid: Union[int, str] = "self") -> Optional[float]:
+    """
+    Peak resident set size (MB) of a process since it started or `reset_peak`, None if not available (not on Linux).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak():
+    """
+    Reset the peak resident set size of this process given by `peak_rss` (on Linux).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def process_cpu(pid: int) -> Tuple[float, float]:
+    """
+    Seconds of CPU of a process (which may be a zombie) in user and system mode, (0, 0) if not available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return (0.0, 0.0)
+    # fields after the name of the command, which may have spaces
+    fields = stat[stat.rindex(")") + 2 :].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) / ticks, int(fields[12]) / ticks)
+
+
+def process_usage(pid: int, since: Tuple[float, float]) -> Usage:
+    """
+    Usage of a process that is still running or a zombie, since its CPU time was `since` (see `process_cpu`).
+    """
+    (user, system) = process_cpu(pid)
+    return Usage(
+        max(0.0, user - since[0]), max(0.0, system - since[1]), peak_rss(pid) or 0.0
+    )
+
+
+class Meter:
+    """
+    Usage of a job run in this process, including the programs it ran, from creation to `stop`.
+    """
+
+    def __init__(self):
+        reset_peak()
+        self.self_begin = resource.getrusage(resource.RUSAGE_SELF)
+        self.children_begin = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def stop(self) -> Usage:
+        (s, c) = (
+            resource.getrusage(resource.RUSAGE_SELF),
+            resource.getrusage(resource.RUSAGE_CHILDREN),
+        )
+        (s0, c0) = (self.self_begin, self.children_begin)
+        peak = peak_rss()
+        max_rss = peak if peak is not None else s.ru_maxrss / 1024
+        # the peak of a program run by the job, if larger than those run before
+        if c.ru_maxrss > c0.ru_maxrss:
+            max_rss = max(max_rss, c.ru_maxrss / 1024)
+        return Usage(
+            s.ru_utime - s0.ru_utime + c.ru_utime - c0.ru_utime,
+            s.ru_stime - s0.ru_stime + c.ru_stime - c0.ru_stime,
+            max_rss,
+        )
+
+
+def fill_usage(exp, usage: Usage):
+    exp.cpu_user = usage.cpu_user
+    exp.cpu_sys = usage.cpu_sys
+    exp.max_rss = usage.max_rss
+    exp.exit_code = usage.exit_code
@@ -0,0 +1,102 @@
+# Compare the encodings of at-most-one constraints (mysat.amo_encodings) over the solvers.
+# For each solver, file and encoding, report the size of the WCNF and the time to build and solve it.
+# python src/amo_bench.py --files data/misc/fib08.txt data/misc/pds05.txt
+
+import argparse
+import importlib
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from typing import List
+
+from pysat.examples.rc2 import RC2
+
+import mysat
+
+# solver module -> function building (lm, wcnf, ...) from the text
+builders = {
+    "slp_solver": "smallest_SLP_WCNF",
+    "rlslp_solver": "smallest_RLSLP_WCNF",
+    "cs_solver": "smallest_CollageSystem_WCNF",
+    "bidirectional_solver_var0": "bidirectional_WCNF",
+    "bidirectional_solver_var1": "bidirectional_WCNF",
+    "bidirectional_solver_var2": "bidirectional_WCNF",
+}
+
+
+def run(solver: str, file: str, encoding: str) -> List[str]:
+    text = open(file, "rb").read()
+    build = getattr(importlib.import_module(solver), builders[solver])
+    mysat.amo_encoding = encoding
+    start = time.time()
+    with redirect_stdout(io.StringIO()):
+        wcnf = build(text)[1]
+    time_build = time.time() - start
+    start = time.time()
+    rc2 = RC2(wcnf)
+    rc2.compute()
+    time_solve = time.time() - start
+    return [
+        solver,
+        os.path.basename(file),
+        encoding,
+        str(wcnf.nv),
+        str(len(wcnf.hard)),
+        str(sum(len(clause) for clause in wcnf.hard)),
+        f"{time_build:.2f}",
+        f"{time_solve:.2f}",
+        str(rc2.cost),
+    ]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare encodings of at-most-one constraints."
+    )
+    parser.add_argument("--files", nargs="+", help="input files", required=True)
+    parser.add_argument(
+        "--solvers",
+        nargs="+",
+        choices=list(builders.keys()),
+        default=list(builders.keys()),
+    )
+    parser.add_argument(
+        "--encodings",
+        nargs="+",
+        choices=mysat.amo_encodings,
+        default=mysat.amo_encodings,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(
+        "\t".join(
+            [
+                "solver",
+                "file",
+                "encoding",
+                "nvars",
+                "nhard",
+                "nlits",
+                "time_build",
+                "time_solve",
+                "cost",
+            ]
+        )
+    )
+    for solver in args.solvers:
+        for file in args.files:
+            costs = set()
+            for encoding in args.encodings:
+                row = run(solver, file, encoding)
+                costs.add(row[-1])
+                print("\t".join(row), flush=True)
+            if len(costs) != 1:
+                print(
+                    f"costs differ between encodings: {solver} {file}", file=sys.stderr
+                )
+                sys.exit(1)
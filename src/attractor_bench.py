@@ -1,15 +1,25 @@
 import argparse
 import datetime
 import os
+import shutil
 import sqlite3
-import subprocess
 import sys
+import tempfile
+import time
 from typing import Optional
 
-from joblib import Parallel, delayed
-
+import accounting
+import instance_cache
+import result_cache
+import results_db
+import tracing
 from attractor import AttractorType, verify_attractor
 from attractor_bench_format import AttractorExp
+from attractor_solver import min_attractor
+from maxsat_engine import EngineOptions
+from resource_estimate import check_memory_cap, reported_status
+from results_db import Job, Progress, ResultsWriter
+from worker_pool import JobResult, WorkerPool
 
 dbname = "out/satcomp.db"
 dbtable = "attractor_bench"
@@ -19,7 +29,11 @@ algos = ["solver"]
 
 
 def run_solver(
-    input_file: str, timeout: Optional[float] = None
+    input_file: str,
+    timeout: Optional[float] = None,
+    time_budget: float = 0,
+    memory_cap: float = 0,
+    cache_dir: str = "",
 ) -> Optional[AttractorExp]:
     cmd = [
         "pipenv",
@@ -31,97 +45,223 @@ def run_solver(
         "--file",
         input_file,
     ]
+    if time_budget > 0:
+        cmd += ["--time_budget", str(time_budget)]
+    if memory_cap > 0:
+        cmd += ["--memory_cap", str(memory_cap), "--on_memory_cap", "refuse"]
+    if cache_dir != "":
+        cmd += ["--instance_cache", cache_dir]
     print(" ".join(cmd))
     exp = None
-    try:
-        out = subprocess.check_output(cmd, shell=False, timeout=timeout)
-        last1 = out.rfind(b"\n")
-        last2 = out.rfind(b"\n", 0, last1)
-        print(out[last2 + 1 : last1])
-        exp = AttractorExp.from_json(out[last2 + 1 : last1])  # type: ignore
-        status = "complete"
-        exp.status = status
-    except subprocess.TimeoutExpired:
+    (out, usage, timed_out) = accounting.run(cmd, timeout)
+    if timed_out:
         status = f"timeout-{timeout}"
-    except Exception:
-        print("Unexpected error:", sys.exc_info()[0])
-        status = "error"
+    elif usage.exit_code != 0:
+        # "memory-cap" or "oom" if the solver refused to run or ran out of memory
+        status = reported_status(out, accounting.classify(usage, False, memory_cap))
+    else:
+        try:
+            last1 = out.rfind(b"\n")
+            last2 = out.rfind(b"\n", 0, last1)
+            print(out[last2 + 1 : last1])
+            exp = AttractorExp.from_json(out[last2 + 1 : last1])  # type: ignore
+            status = "complete"
+            # "anytime" if the time budget ran out
+            if exp.status != "anytime":
+                exp.status = status
+        except Exception:
+            print("Unexpected error:", sys.exc_info()[0])
+            status = "crash"
 
     print(f"status: {status}")
     if status != "complete":
-        exp = AttractorExp(
-            date=str(datetime.datetime.now()),
-            status=status,
-            algo="solver",
-            file_name=os.path.basename(input_file),
-            file_len=len(open(input_file, "rb").read()),
-            time_prep=0,
-            time_total=0,
-            sol_nvars=0,
-            sol_nhard=0,
-            sol_nsoft=0,
-            factor_size=0,
-            sol_navgclause=0,
-            sol_ntotalvars=0,
-            sol_nmaxclause=0,
-            factors=AttractorType([]),
-        )
-        assert isinstance(exp, AttractorExp)
+        exp = failed(input_file, status)
+    assert isinstance(exp, AttractorExp)
+    accounting.fill_usage(exp, usage)
+    return exp
+
+
+def solve(
+    input_file: str, time_budget: float = 0, memory_cap: float = 0, cache_dir: str = ""
+) -> AttractorExp:
+    """
+    Run the solver in this process (a worker of worker_pool, which limits the memory) as `run_solver` runs it as a program.
+    """
+    text = open(input_file, "rb").read()
+    exp = AttractorExp.create()
+    exp.algo = "attractor-sat"
+    exp.file_name = os.path.basename(input_file)
+    exp.file_len = len(text)
+    instance_cache.cache_dir = cache_dir
+    if check_memory_cap(exp, "attractor_solver", text, memory_cap, False) is None:
+        exp.status = "memory-cap"
+        return exp
+    attractor = min_attractor(
+        text, exp, engine_options=EngineOptions(time_budget=time_budget)
+    )
+    exp.factors = attractor
+    exp.factor_size = len(attractor)
+    # "anytime" if the time budget ran out
+    if exp.status != "anytime":
+        exp.status = "complete"
     return exp
 
 
-def benchmark_program(timeout, algo, file):
+def failed(input_file: str, status: str) -> AttractorExp:
+    return AttractorExp(
+        date=str(datetime.datetime.now()),
+        status=status,
+        algo="solver",
+        file_name=os.path.basename(input_file),
+        file_len=len(open(input_file, "rb").read()),
+        time_prep=0,
+        time_total=0,
+        sol_nvars=0,
+        sol_nhard=0,
+        sol_nsoft=0,
+        factor_size=0,
+        sol_navgclause=0,
+        sol_ntotalvars=0,
+        sol_nmaxclause=0,
+        factors=AttractorType([]),
+    )
+
+
+def benchmark_program(
+    algo,
+    file,
+    time_budget=0,
+    memory_cap=0,
+    cache_dir="",
+    use_result_cache=True,
+    trace_dir="",
+) -> AttractorExp:
     """
-    Runs program with given setting (timeout, algo, file).
+    Runs program with given setting (algo, file) in a worker of `benchmark_mul`, which enforces the timeout.
     """
+    begin = time.time()
+    if trace_dir != "":
+        tracing.start()
+    cached = None
     if algo == "solver":
-        exp = run_solver(file, timeout)
+        # verified results of the same input and options are not recomputed
+        options = {"time_budget": time_budget, "memory_cap": memory_cap}
+        version = result_cache.encoding_version("attractor_solver")
+        if use_result_cache:
+            cached = result_cache.lookup("attractor", version, options, file)
+        if cached is not None:
+            exp = AttractorExp.from_json(cached)  # type: ignore
+            # verified again below, as the cache is shared with tests/size_check.py
+            exp.status = "complete"
+            print("status: cached")
+        else:
+            exp = solve(file, time_budget, memory_cap, cache_dir)
     else:
         assert False
 
-    # verify the result
-    if exp.status == "complete":
+    # verify the result, the solution of an anytime run is not minimum but must be valid
+    if exp.status in ["complete", "anytime"]:
         valid = verify_attractor(open(file, "rb").read(), exp.factors)
-        exp.status = "correct" if valid else "wrong"
-
-    con = sqlite3.connect(dbname)
-    cur = con.cursor()
-    json = exp.to_dict()  # type: ignore
-    n = len(json.values())
-    cur.execute(
-        f"INSERT INTO {dbtable} VALUES ({', '.join('?' for _ in range(n))})",
-        tuple(map(str, json.values())),
+        if not valid:
+            exp.status = "wrong"
+        elif exp.status == "complete":
+            exp.status = "correct"
+    if algo == "solver" and cached is None and exp.status == "correct":
+        result_cache.store("attractor", version, options, file, exp.to_json(ensure_ascii=False), exp.factor_size)  # type: ignore
+    tracing.save_job(
+        trace_dir,
+        begin,
+        file=os.path.basename(file),
+        algo=algo,
+        status=exp.status,
+        cached=cached is not None,
     )
-    con.commit()
+    return exp
 
 
-def benchmark_mul(timeout, algos, files, n_jobs):
+def benchmark_mul(
+    timeout,
+    algos,
+    files,
+    n_jobs,
+    time_budget=0,
+    memory_cap=0,
+    cache_dir="",
+    use_result_cache=True,
+    trace="",
+    retry_failed=False,
+):
     """
-    Run benchmark program with multiple processes
+    Run benchmark program with `n_jobs` workers, and write the timeline of the jobs to `trace` if not empty.
+    A job over the timeout or the memory cap is killed with its worker, which is respawned.
+    Jobs run before with the same encoding version and timeout are skipped, unless they failed and `retry_failed`.
     """
-    Parallel(n_jobs=n_jobs)(
-        [
-            delayed(benchmark_program)(timeout, algo, file)
-            for file in files
-            for algo in algos
-        ]
+    # events of the jobs written by the workers
+    trace_dir = tempfile.mkdtemp() if trace != "" else ""
+    if trace != "":
+        tracing.start()
+    version = result_cache.encoding_version("attractor_solver")
+    writer = ResultsWriter(dbtable, AttractorExp, dbname)
+    todo = [
+        (Job(algo, os.path.basename(file), version, timeout or 0), file)
+        for file in files
+        for algo in algos
+    ]
+    todo = [(job, file) for (job, file) in todo if not writer.done(job, retry_failed)]
+    print(
+        f"{len(files) * len(algos) - len(todo)} jobs are done in previous runs, {len(todo)} jobs to run"
     )
+    progress = Progress([job for (job, _) in todo], writer.past, n_jobs)
+    jobs = [
+        (
+            job.algo,
+            file,
+            time_budget,
+            memory_cap,
+            cache_dir,
+            use_result_cache,
+            trace_dir,
+        )
+        for (job, file) in todo
+    ]
+
+    def finish(i: int, res: JobResult):
+        (algo, file, *_) = jobs[i]
+        if res.status == "ok":
+            exp = res.value
+        else:
+            status = f"timeout-{timeout}" if res.status == "timeout" else res.status
+            if res.status == "crash":
+                print(res.value)
+            print(f"status: {status}")
+            exp = failed(file, status)
+            if trace != "":
+                tracing.record(
+                    "job",
+                    "benchmark",
+                    res.begin,
+                    res.end,
+                    file=os.path.basename(file),
+                    algo=algo,
+                    status=status,
+                    worker=res.pid,
+                )
+        accounting.fill_usage(exp, res.usage)
+        writer.put(exp, todo[i][0], res.end - res.begin)
+        progress.finish(todo[i][0], exp.status, res.end - res.begin)
+
+    with writer, WorkerPool(n_jobs, memory_cap) as pool:
+        pool.map(benchmark_program, jobs, timeout, finish)
+    if trace != "":
+        tracing.merge(trace, trace_dir, "attractor_bench", n_jobs=n_jobs)
+        shutil.rmtree(trace_dir)
 
 
 def clear_table():
     """
     Delete table if exists, and create new table.
     """
-    con = sqlite3.connect(dbname)
-    cur = con.cursor()
-    exp = AttractorExp.create()
-    d = exp.to_dict()  # type: ignore
-
-    try:
-        cur.execute(f"DROP TABLE {dbtable}")
-    except sqlite3.OperationalError:
-        pass
-    cur.execute(f"CREATE TABLE {dbtable} ({', '.join(key for key in d.keys())})")
+    results_db.clear_table(dbtable, AttractorExp, dbname)
 
 
 def export_csv(out_file):
@@ -146,6 +286,45 @@ def parse_args():
         default=60,
     )
     parser.add_argument("--output", type=str, help="output file", default="")
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        help="time budget (sec) of the solver, after which it reports the best solution and lower bound. It should be less than the timeout.",
+        default=0,
+    )
+    parser.add_argument(
+        "--memory_cap",
+        type=float,
+        help="memory cap (MB) of the solver, which refuses to run if its estimated memory exceeds it (0 for no cap)",
+        default=0,
+    )
+    parser.add_argument(
+        "--instance_cache",
+        type=str,
+        help="directory of the instance cache of the solver, which reuses formulas built for the same files (none if empty)",
+        default="",
+    )
+    parser.add_argument(
+        "--bypass_result_cache",
+        action="store_true",
+        help="run the solver even if the result is in the result cache (see result_cache.py), which is updated by the new results",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        help="file to write the timeline of the jobs and the phases of the solver to, in the Chrome trace event format (none if empty)",
+        default="",
+    )
+    parser.add_argument(
+        "--retry_failed",
+        action="store_true",
+        help="run again the jobs that failed or timed out in previous runs, which are skipped otherwise",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="delete the results of previous runs and run all jobs",
+    )
     parser.add_argument("--n_jobs", type=int, help="number of jobs", default=2)
     parser.add_argument("--files", nargs="*", help="files", default=[])
 
@@ -159,9 +338,21 @@ def parse_args():
 
 
 def main():
-    clear_table()
     args = parse_args()
-    benchmark_mul(args.timeout, algos, args.files, args.n_jobs)
+    if args.restart:
+        clear_table()
+    benchmark_mul(
+        args.timeout,
+        algos,
+        args.files,
+        args.n_jobs,
+        args.time_budget,
+        args.memory_cap,
+        args.instance_cache,
+        not args.bypass_result_cache,
+        args.trace,
+        args.retry_failed,
+    )
     export_csv(args.output)
 
 
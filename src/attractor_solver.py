@@ -11,13 +11,24 @@ from typing import List, Optional
 import matplotlib
 import matplotlib.pyplot as plt
 from pysat.card import CardEnc, EncType
-from pysat.examples.rc2 import RC2
-from pysat.formula import CNF, WCNF
+from pysat.formula import CNF
 from pysat.solvers import Solver
 
+import instance_cache
+import profiling
 import stralgo
+import tracing
 from attractor import AttractorType
 from attractor_bench_format import AttractorExp
+from clause_store import ClauseStore
+from maxsat_engine import (
+    EngineOptions,
+    add_engine_args,
+    create_engine,
+    engine_options_from_args,
+)
+from preprocess import WCNFPreprocessor
+from resource_estimate import add_resource_args, apply_memory_cap, exit_with_status
 
 # prevend appearing gui window
 matplotlib.use("Agg")
@@ -30,6 +41,9 @@ formatter = Formatter(FORMAT)
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# version of the encoding, increased when the formula changes so that cached instances are not reused
+encoding_version = 1
+
 
 def min_substr_hist(min_substrs, th):
     """
@@ -129,11 +143,13 @@ def attractor_of_size(
     return attractor
 
 
-def min_attractor_WCNF(text: bytes) -> WCNF:
+def min_attractor_WCNF(text: bytes) -> ClauseStore:
     """
     Compute the max sat formula for computing the minimum string attractor.
     """
     n = len(text)
+    wcnf = ClauseStore()
+    rec = profiling.BuildRecorder(wcnf)
 
     sa = stralgo.make_sa_MM(text)
     isa = stralgo.make_isa(sa)
@@ -141,35 +157,50 @@ def min_attractor_WCNF(text: bytes) -> WCNF:
     min_substrs = stralgo.minimum_substr_sa(text, sa, isa, lcp)
     logger.info(f"text length = {len(text)}")
     logger.info(f"# of min substrs = {len(min_substrs)}")
+    rec.phase("index build")
 
-    wcnf = WCNF()
     for b, l in min_substrs:
         lcp_range = stralgo.get_lcprange(lcp, isa[b], l)
         occs = [sa[i] for i in range(lcp_range[0], lcp_range[1] + 1)]
         # hard clauses
         wcnf.append(list(set(occ + i + 1 for occ in occs for i in range(l))))
+    rec.block("cover")
     for i in range(n):
         # soft clauses
         wcnf.append([-(i + 1)], weight=1)
+    rec.block("soft")
     return wcnf
 
 
 def min_attractor(
-    text: bytes, exp: Optional[AttractorExp] = None, contain_list: List[int] = []
+    text: bytes,
+    exp: Optional[AttractorExp] = None,
+    contain_list: List[int] = [],
+    preprocess: bool = False,
+    engine_options: Optional[EngineOptions] = None,
 ) -> AttractorType:
     """
     Compute the minimum string attractor.
     """
     total_start = time.time()
-    wcnf = min_attractor_WCNF(text)
+    profiling.start()
+    engine = create_engine(engine_options)
+    wcnf, cache_status = instance_cache.build(
+        "attractor", encoding_version, min_attractor_WCNF, text
+    )
     for i in contain_list:
         wcnf.append([i])
-    rc2 = RC2(wcnf)
+    pre = WCNFPreprocessor(wcnf) if preprocess else None
+    engine.load(pre.run() if pre else wcnf)
     time_prep = time.time() - total_start
-    sol = rc2.compute()
+    with profiling.phase("solve"):
+        sol = engine.compute()
+        if pre:
+            sol = pre.restore(sol)
     assert sol is not None
 
-    attractor = AttractorType(list(x - 1 for x in filter(lambda x: x > 0, sol)))
+    with profiling.phase("decode"):
+        attractor = AttractorType(list(x - 1 for x in filter(lambda x: x > 0, sol)))
     logger.info(f"the size of minimum attractor = {len(attractor)}")
     logger.info(f"minimum attractor is {attractor}")
     if exp:
@@ -178,6 +209,16 @@ def min_attractor(
         exp.factors = attractor
         exp.factor_size = len(attractor)
         exp.fill(wcnf)
+        if pre is not None:
+            assert pre.reduced is not None
+            exp.fill_pre(pre.reduced, pre.time)
+        exp.instance_cache = cache_status
+        exp.engine = engine.options.name
+        exp.engine_options = engine.options.to_json()  # type: ignore
+        exp.lower_bound = engine.lower_bound
+        if not engine.optimal:
+            exp.status = "anytime"
+        exp.profile = profiling.finish(engine.stats)
     return attractor
 
 
@@ -204,6 +245,15 @@ def parse_args():
         type=str,
         help="[min: find a minimum string attractor, exact/atmost: find a string attractor whose size is exact/atmost SIZE]",
     )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="simplify the hard clauses before solving (see preprocess.py)",
+    )
+    add_engine_args(parser)
+    add_resource_args(parser)
+    instance_cache.add_cache_args(parser)
+    tracing.add_trace_args(parser)
     parser.add_argument(
         "--log_level",
         type=str,
@@ -240,15 +290,29 @@ if __name__ == "__main__":
 
     exp = AttractorExp.create()
     exp.algo = "attractor-sat"
+    instance_cache.configure(args)
+    tracing.configure(args)
+    if args.engine != "rc2":
+        exp.algo += f"-{args.engine}"
     exp.file_name = os.path.basename(args.file)
     exp.file_len = len(text)
-
-    if args.algo in ["exact", "atmost"]:
-        attractor = attractor_of_size(text, args.size, args.algo, exp)
-    elif args.algo == "min":
-        attractor = min_attractor(text, exp, args.contains)
-    else:
-        assert False
+    apply_memory_cap(args, exp, "attractor_solver", text)
+
+    try:
+        if args.algo in ["exact", "atmost"]:
+            attractor = attractor_of_size(text, args.size, args.algo, exp)
+        elif args.algo == "min":
+            attractor = min_attractor(
+                text,
+                exp,
+                args.contains,
+                args.preprocess,
+                engine_options_from_args(args),
+            )
+        else:
+            assert False
+    except MemoryError:
+        exit_with_status(exp, "oom", args.output)
 
     exp.factors = attractor
     exp.factor_size = len(attractor)
@@ -258,3 +322,4 @@ if __name__ == "__main__":
     else:
         with open(args.output, "w") as f:
             json.dump(exp, f, ensure_ascii=False)
+    tracing.save(args.trace, exp.algo, file=exp.file_name, status=exp.status)
@@ -1,6 +1,7 @@
 # compute the smallest bidirectional macro scheme by using SAT solver
 # Original version described in the ESA paper
 import argparse
+import importlib
 import json
 import os
 import sys
@@ -12,19 +13,33 @@ from typing import Dict, Iterator, List, Optional, Tuple
 
 from pysat.card import CardEnc
 from pysat.examples.rc2 import RC2
-from pysat.formula import WCNF
 
+import instance_cache
 import lz77
+import mysat
+import profiling
+import tracing
 from bidirectional import BiDirExp, BiDirType, decode
+from clause_store import ClauseStore
+from maxsat_engine import (
+    EngineOptions,
+    add_engine_args,
+    create_engine,
+    engine_options_from_args,
+)
 from mysat import (
     Enum,
     Literal,
     LiteralManager,
     pysat_and,
+    pysat_atmost_one,
+    pysat_exactly_one,
     pysat_if,
     pysat_if_and_then_or,
 )
 from mytimer import Timer
+from preprocess import WCNFPreprocessor
+from resource_estimate import add_resource_args, apply_memory_cap, exit_with_status
 
 logger = getLogger(__name__)
 handler = StreamHandler()
@@ -34,6 +49,9 @@ formatter = Formatter(FORMAT)
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# version of the encoding, increased when the formula changes so that cached instances are not reused
+encoding_version = 1
+
 
 class BiDirLiteral(Enum):
     true = Literal.true
@@ -66,7 +84,7 @@ class BiDirLiteralManager(LiteralManager):
 
     def newid(self, *obj) -> int:
         res = super().newid(*obj)
-        if len(obj) > 0 and obj[0] in self.verifyf:
+        if self.debug and len(obj) > 0 and obj[0] in self.verifyf:
             self.verifyf[obj[0]](obj)
         return res
 
@@ -99,6 +117,8 @@ class BiDirLiteralManager(LiteralManager):
 
 
 def pysat_equal(lm: BiDirLiteralManager, bound: int, lits: List[int]):
+    if bound == 1:
+        return pysat_exactly_one(lm, lits)
     return CardEnc.equals(lits, bound=bound, vpool=lm.vpool)
 
 
@@ -108,7 +128,7 @@ def sol2lits(lm: BiDirLiteralManager, sol: Dict[int, bool], lit_name: str) -> li
     Returns the list whose element is formed of (literal, True or False)
     """
     res = []
-    for id, obj in lm.vpool.id2obj.items():
+    for id, obj in lm.items():
         assert isinstance(id, int)
         if obj[0] == lit_name:
             res.append((obj, sol[id]))
@@ -225,21 +245,26 @@ def occ_others(occ1: Dict[int, List[int]], text: bytes, i: int):
             yield j
 
 
-def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
+def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, ClauseStore]:
     """
     Compute the max sat formula for computing the smallest bidirectional macro schemes.
     """
     n = len(text)
-    lz77fs = lz77.encode(text)
+    with profiling.phase("index build"):
+        lz77fs = lz77.encode(text)
+        occ1 = make_occa1(text)
+        occ2 = make_occa2(text)
     logger.info("bidirectional_solver start")
     logger.info(f"# of text = {n}, # of lz77 = {len(lz77fs)}")
 
-    occ1 = make_occa1(text)
-    occ2 = make_occa2(text)
-
     max_depth = max(len(v) for v in occ1.values())
     lm = BiDirLiteralManager(text, max_depth)
-    wcnf = WCNF()
+    lm.declare(lm.lits.fbeg, n)
+    lm.declare(lm.lits.root, n)
+    lm.declare(lm.lits.ref, n, n)
+    lm.declare(lm.lits.any_ref, max_depth, n)
+    wcnf = ClauseStore()
+    rec = profiling.BuildRecorder(wcnf, lm)
     # wcnf.append([lm.getid(lm.lits.true)])
     # wcnf.append([lm.getid(lm.lits.false)])
 
@@ -264,11 +289,13 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
             # any_ref(depth, i) is true iff i refers to any position at depth
             lits.append(lm.newid(lm.lits.any_ref, depth, i))
     # wcnf.append(lits)
+    rec.phase("literal definition")
 
     # objective: minimizes the number of factors
     for i in range(n):
         fbeg0 = lm.getid(lm.lits.fbeg, i)
         wcnf.append([-fbeg0], weight=1)
+    rec.block("soft")
 
     # objective to run fast: if text[i:i+2] occurs only once, i+1 is the beginning of a factor
     count = 0
@@ -278,6 +305,7 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
             wcnf.append([fbeg])
             count += 1
     logger.info(f"{count}/{n} occurs only once")
+    rec.block("unique-pair")
 
     # objective: valid references
 
@@ -293,6 +321,7 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
                 # tree-1: if j refers to i at depth, j refers to any position at depth
                 # this is the definition of any_ref(depth, j)
                 wcnf.append(pysat_if(dref_ji, dref_j))
+            rec.count("tree-1")
             refi = [
                 lm.getid(lm.lits.depth_ref, depth, i, j)
                 for j in occ1[text[i]]
@@ -302,26 +331,31 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
                 dref_i = lm.getid(lm.lits.any_ref, depth, i)
                 # tree-2: if i refers to any position at depth, there is a reference from i to j
                 wcnf.append(pysat_if_and_then_or([dref_i], refi))
+                rec.count("tree-2")
 
                 # tree-3: the number of references from i is at most one
-                wcnf.extend(CardEnc.atmost(refi, bound=1, vpool=lm.vpool))
+                wcnf.extend(pysat_atmost_one(lm, refi))
+                rec.count("tree-3")
 
                 no_refi, clauses = pysat_and(lm.newid, [-x for x in refi])
                 wcnf.extend(clauses)
                 # tree-4: if i does not refer to any position at depth, there is no references from i
                 wcnf.append(pysat_if(-dref_i, no_refi))
+                rec.count("tree-4")
     for i in range(n):
         dref_i = [lm.getid(lm.lits.any_ref, depth, i) for depth in range(max_depth - 1)]
         root_i = lm.getid(lm.lits.root, i)
         # tree-5: each position is a root or has a reference to any position
         # (use all positions)
         wcnf.extend(pysat_equal(lm, 1, dref_i + [root_i]))
+    rec.count("tree-5")
     for c in occ1.keys():
         roots = [lm.getid(lm.lits.root, i) for i in occ1[c]]
         # a root for each character exists only one.
         # this is not necessity, it may cause bad effect.
         wcnf.extend(pysat_equal(lm, 1, roots))
         # wcnf.append(pysat_atleast_one(roots))
+    rec.count("root-unique")
 
     for depth in range(1, max_depth - 1):
         if depth % 30 == 0:
@@ -330,8 +364,10 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
             for j in occ_others(occ1, text, i):
                 dref_ji = lm.getid(lm.lits.depth_ref, depth, j, i)
                 dref_i = lm.getid(lm.lits.any_ref, depth - 1, i)
-                # tree-5: if j refers to j at depth, i refers to any position at dpeth-1
+                # tree-6: if j refers to j at depth, i refers to any position at dpeth-1
                 wcnf.append(pysat_if(dref_ji, dref_i))
+    rec.count("tree-6")
+    rec.phase("valid reference")
     # ----------- end of valid reference ----
     # bridge
     for i in range(n):
@@ -343,26 +379,31 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
                 dref_ji = lm.getid(lm.lits.depth_ref, depth, j, i)
                 # bridge-1: if j refers to i at depth, j refers to i
                 wcnf.append(pysat_if(dref_ji, ref_ji0))
+            rec.count("bridge-1")
             if i == 0 or j == 0 or text[i - 1] != text[j - 1]:
                 # bridge-2: since it is impossible refer to i-1 or j-1, factor begins at j.
                 wcnf.append(pysat_if(ref_ji0, fbeg_j))
+                rec.count("bridge-2")
             if i > 0 and j > 0 and text[i - 1] == text[j - 1]:
                 ref_ji1 = lm.getid(lm.lits.ref, j - 1, i - 1)
                 fbeg0 = lm.getid(lm.lits.fbeg, j)
                 # here, text[i-1:i+1] == text[j-1:j+1]
                 # bridge-3: if j-1 does not refer to i-1 and j refers to i, factor begins at j
                 wcnf.append(pysat_if_and_then_or([-ref_ji1, ref_ji0], [fbeg0]))
+                rec.count("bridge-3")
                 # bridge-4: if j-1 and j refer to i-1 and i, respectively, factor does not begin at j
                 # because if not, the result size is not the minimum.
                 # wcnf.append(pysat_if_and_then_or([ref_ji1, ref_ji0], [-fbeg0]))
+    rec.phase("bridge")
 
     logger.debug("# of referrences is only one")
     for i in range(n):
         refs = [lm.getid(lm.lits.ref, i, j) for j in occ1[text[i]] if i != j]
         root_i = lm.getid(lm.lits.root, i)
         # the number of rerferences from a position is at most one.
-        wcnf.extend(CardEnc.atmost(refs, bound=1, vpool=lm.vpool))
+        wcnf.extend(pysat_atmost_one(lm, refs))
         # wcnf.extend(pysat_equal(lm, 1, refs + [root_i]))
+        rec.count("ref-amo")
         for j in occ_others(occ1, text, i):
             ref_ij = lm.getid(lm.lits.ref, i, j)
             dref_ji = lm.getid(lm.lits.depth_ref, 0, j, i)
@@ -370,6 +411,8 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
             wcnf.append(pysat_if(root_i, -ref_ij))
             # any non root position is not refered from any positions
             wcnf.append(pysat_if(-root_i, -dref_ji))
+        rec.count("root-ref")
+    rec.phase("single reference")
 
     logger.info(
         f"#literals = {lm.top()}, # hard clauses={len(wcnf.hard)}, # of soft clauses={len(wcnf.soft)}"
@@ -384,18 +427,27 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
             fbeg1 = lm.getid(lm.lits.fbeg, i + 1)
             # if i is root, a factor begins at i
             wcnf.append(pysat_if(root0, fbeg1))
+    rec.block("root-fbeg")
 
     return lm, wcnf
 
 
 def min_bidirectional(
-    text: bytes, exp: Optional[BiDirExp] = None, contain_list: List[int] = []
+    text: bytes,
+    exp: Optional[BiDirExp] = None,
+    contain_list: List[int] = [],
+    preprocess: bool = False,
+    engine_options: Optional[EngineOptions] = None,
 ) -> BiDirType:
     """
     Compute the smallest bidirectional macro schemes.
     """
     total_start = time.time()
-    lm, wcnf = bidirectional_WCNF(text)
+    profiling.start()
+    engine = create_engine(engine_options)
+    (lm, wcnf), cache_status = instance_cache.build(
+        "bidirectional-var0", encoding_version, bidirectional_WCNF, text
+    )
     for lname in lm.nvar.keys():
         logger.info(f"# of [{lname}] literals  = {lm.nvar[lname]}")
 
@@ -403,36 +455,53 @@ def min_bidirectional(
         fbeg0 = lm.getid(lm.lits.fbeg, i)
         wcnf.append([fbeg0])
 
+    pre = WCNFPreprocessor(wcnf) if preprocess else None
+    wcnf_solve = pre.run() if pre else wcnf
+
     if exp:
         exp.time_prep = time.time() - total_start
 
     # solver = RC2(wcnf, verbose=3)
-    solver = RC2(wcnf)
-    sol = solver.compute()
+    with profiling.phase("solve"):
+        sol = engine.compute(wcnf_solve)
+        if pre:
+            sol = pre.restore(sol)
 
     assert sol is not None
-    sold = dict()
-    for x in sol:
-        sold[abs(x)] = x > 0
+    with profiling.phase("decode"):
+        sold = dict()
+        for x in sol:
+            sold[abs(x)] = x > 0
 
-    def show_lits(lits):
-        for lit in sorted(lits):
-            if lit[1]:
-                logger.debug(lit[0])
+        def show_lits(lits):
+            for lit in sorted(lits):
+                if lit[1]:
+                    logger.debug(lit[0])
 
-    # show_lits(sol2lits2(lm, sold, lm.lit.ref))
-    show_sol(lm, sold, text)
-    factors = sol2bidirectional(lm, sold, text)
+        # show_lits(sol2lits2(lm, sold, lm.lit.ref))
+        show_sol(lm, sold, text)
+        factors = sol2bidirectional(lm, sold, text)
 
     logger.debug(factors)
     logger.debug(f"original={text}")
     logger.debug(f"decode={decode(factors)}")
-    assert decode(factors) == text
+    with profiling.phase("verify"):
+        assert decode(factors) == text
     if exp:
         exp.time_total = time.time() - total_start
         exp.factors = factors
         exp.factor_size = len(factors)
         exp.fill(wcnf)
+        if pre is not None:
+            assert pre.reduced is not None
+            exp.fill_pre(pre.reduced, pre.time)
+        exp.instance_cache = cache_status
+        exp.engine = engine.options.name
+        exp.engine_options = engine.options.to_json()  # type: ignore
+        exp.lower_bound = engine.lower_bound
+        if not engine.optimal:
+            exp.status = "anytime"
+        exp.profile = profiling.finish(engine.stats)
     return factors
 
 
@@ -474,6 +543,22 @@ def parse_args():
         help="list of text positions that must be included in the string attractor, starting with index 1",
         default=[],
     )
+    parser.add_argument(
+        "--amo_encoding",
+        type=str,
+        help="encoding of at-most-one constraints, " + "/".join(mysat.amo_encodings),
+        choices=mysat.amo_encodings,
+        default="auto",
+    )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="simplify the hard clauses before solving (see preprocess.py)",
+    )
+    add_engine_args(parser)
+    add_resource_args(parser)
+    instance_cache.add_cache_args(parser)
+    tracing.add_trace_args(parser)
     parser.add_argument(
         "--log_level",
         type=str,
@@ -510,9 +595,30 @@ if __name__ == "__main__":
 
     exp = BiDirExp.create()
     exp.algo = "bidirectional-sat"
+    mysat.amo_encoding = args.amo_encoding
+    instance_cache.configure(args)
+    tracing.configure(args)
+    if args.amo_encoding != "auto":
+        exp.algo += f"-amo-{args.amo_encoding}"
+    if args.engine != "rc2":
+        exp.algo += f"-{args.engine}"
     exp.file_name = os.path.basename(args.file)
     exp.file_len = len(text)
-    factors_sol = min_bidirectional(text, exp, args.contains)
+    # the encodings of bidirectional_solver_var1 and var2 are smaller
+    model = apply_memory_cap(args, exp, "bidirectional_solver_var0", text)
+    solver = min_bidirectional
+    if model != "bidirectional-var0":
+        variant = model[len("bidirectional-") :]
+        exp.algo += f"-{variant}"
+        solver = importlib.import_module(
+            f"bidirectional_solver_{variant}"
+        ).min_bidirectional
+    try:
+        factors_sol = solver(
+            text, exp, args.contains, args.preprocess, engine_options_from_args(args)
+        )
+    except MemoryError:
+        exit_with_status(exp, "oom", args.output)
     exp.factors = factors_sol
     exp.factor_size = len(factors_sol)
 
@@ -521,3 +627,4 @@ if __name__ == "__main__":
     else:
         with open(args.output, "w") as f:
             json.dump(exp, f, ensure_ascii=False)
+    tracing.save(args.trace, exp.algo, file=exp.file_name, status=exp.status)
@@ -13,12 +13,24 @@ from typing import Dict, Iterator, List, Optional, Tuple
 
 from pysat.card import CardEnc
 from pysat.examples.rc2 import RC2
-from pysat.formula import WCNF
 
+import instance_cache
 import lz77
+import mysat
+import profiling
+import tracing
 from bidirectional import BiDirExp, BiDirType, decode
-from mysat import Enum, Literal, LiteralManager
+from clause_store import ClauseStore
+from maxsat_engine import (
+    EngineOptions,
+    add_engine_args,
+    create_engine,
+    engine_options_from_args,
+)
+from mysat import Enum, Literal, LiteralManager, pysat_atmost_one, pysat_exactly_one
 from mytimer import Timer
+from preprocess import WCNFPreprocessor
+from resource_estimate import add_resource_args, apply_memory_cap, exit_with_status
 
 logger = getLogger(__name__)
 handler = StreamHandler()
@@ -28,6 +40,9 @@ formatter = Formatter(FORMAT)
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# version of the encoding, increased when the formula changes so that cached instances are not reused
+encoding_version = 1
+
 
 class BiDirLiteral(Enum):
     true = Literal.true
@@ -58,7 +73,7 @@ class BiDirLiteralManager(LiteralManager):
 
     def newid(self, *obj) -> int:
         res = super().newid(*obj)
-        if len(obj) > 0 and obj[0] in self.verifyf:
+        if self.debug and len(obj) > 0 and obj[0] in self.verifyf:
             self.verifyf[obj[0]](obj)
         return res
 
@@ -84,6 +99,8 @@ class BiDirLiteralManager(LiteralManager):
 
 
 def pysat_equal(lm: BiDirLiteralManager, bound: int, lits: List[int]):
+    if bound == 1:
+        return pysat_exactly_one(lm, lits)
     return CardEnc.equals(lits, bound=bound, vpool=lm.vpool)
 
 
@@ -185,19 +202,23 @@ def occ_others(occ1: Dict[int, List[int]], text: bytes, i: int):
             yield j
 
 
-def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
+def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, ClauseStore]:
     """
     Compute the max sat formula for computing the smallest bidirectional macro schemes.
     """
     n = len(text)
-    lz77fs = lz77.encode(text)
+    with profiling.phase("index build"):
+        lz77fs = lz77.encode(text)
+        occ1 = make_occa1(text)
     logger.info("bidirectional_solver start")
     logger.info(f"# of text = {n}, # of lz77 = {len(lz77fs)}")
 
-    occ1 = make_occa1(text)
-
     lm = BiDirLiteralManager(text)
-    wcnf = WCNF()
+    lm.declare(lm.lits.pstart, n)
+    lm.declare(lm.lits.ref, n, n)
+    lm.declare(lm.lits.tref, n, n)
+    wcnf = ClauseStore()
+    rec = profiling.BuildRecorder(wcnf, lm)
 
     # register all literals (except auxiliary literals) to literal manager
     # lits = [lm.sym2id(lm.true)]
@@ -212,12 +233,14 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
             lits.append(lm.newid(lm.lits.ref, i, j))
             # tref(i, j) is true iff i eventualy refers to j
             lits.append(lm.newid(lm.lits.tref, i, j))
+    rec.phase("literal definition")
     ############################################################################
 
     logger.debug("each position has atmost one reference")
     for i in range(n):
         refi = [lm.getid(lm.lits.ref, i, j) for j in occ_others(occ1, text, i)]
-        wcnf.extend(CardEnc.atmost(refi, bound=1, vpool=lm.vpool))
+        wcnf.extend(pysat_atmost_one(lm, refi))
+    rec.block("ref-amo")
 
     for c in occ1.keys():
         for i in occ1[c]:
@@ -226,6 +249,7 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
                 wcnf.append(
                     [-lm.getid(lm.lits.ref, i, j), lm.getid(lm.lits.tref, i, j)]
                 )
+                rec.count("tref-ref")
                 for k in occ1[c]:
                     if i != k and j != k:
                         wcnf.append(  # if tref(i,k) and ref(k,j) -> tref(i,j)
@@ -235,11 +259,14 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
                                 lm.getid(lm.lits.tref, i, j),
                             ]
                         )
+                rec.count("tref-transitive")
+    rec.phase("tref closure")
 
     # acyclicity of tref: If tref(i,j) -> not tref(j,i)
     for i in range(n):
         for j in occ_others(occ1, text, i):
             wcnf.append([-lm.getid(lm.lits.tref, i, j), -lm.getid(lm.lits.tref, j, i)])
+    rec.block("tref-acyclic")
 
     # a root must be a beginning of a phrase: root(i) -> pstart(i)
     # sum_j ref(i,j) = 0 => pstart(i)
@@ -249,6 +276,7 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
             [lm.getid(lm.lits.ref, i, j) for j in occ_others(occ1, text, i)]
             + [lm.getid(lm.lits.pstart, i)]
         )
+    rec.block("root-pstart")
 
     # if i = 0 or j = 0 or T[i-1] \neq T[j-1]: not (ref(i,j)) or pstart(i)
     for c in occ1.keys():
@@ -258,6 +286,7 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
                     wcnf.append(
                         [-lm.getid(lm.lits.ref, i, j), lm.getid(lm.lits.pstart, i)]
                     )
+    rec.block("ref-pstart")
     # for i,j > 0, and T[i] = T[j], T[i-1] = T[j-1]
     # if (not ref(i-1,j-1)) and ref(i,j) => pstart(i)
     # <=> ref(i-1,j-1) or not ref(i,j) or pstart(i)
@@ -272,25 +301,36 @@ def bidirectional_WCNF(text: bytes) -> Tuple[BiDirLiteralManager, WCNF]:
                             lm.getid(lm.lits.pstart, i),
                         ]
                     )
+    rec.block("ref-extend")
 
     # the first position is always a beginning of a phrase
     wcnf.append([lm.getid(lm.lits.pstart, 0)])
+    rec.block("first-pstart")
 
     # objective: minimizes the number of factors
     for i in range(n):
         wcnf.append([-lm.getid(lm.lits.pstart, i)], weight=1)
+    rec.block("soft")
 
     return lm, wcnf
 
 
 def min_bidirectional(
-    text: bytes, exp: Optional[BiDirExp] = None, contain_list: List[int] = []
+    text: bytes,
+    exp: Optional[BiDirExp] = None,
+    contain_list: List[int] = [],
+    preprocess: bool = False,
+    engine_options: Optional[EngineOptions] = None,
 ) -> BiDirType:
     """
     Compute the smallest bidirectional macro schemes.
     """
     total_start = time.time()
-    lm, wcnf = bidirectional_WCNF(text)
+    profiling.start()
+    engine = create_engine(engine_options)
+    (lm, wcnf), cache_status = instance_cache.build(
+        "bidirectional-var2", encoding_version, bidirectional_WCNF, text
+    )
     for lname in lm.nvar.keys():
         logger.info(f"# of [{lname}] literals  = {lm.nvar[lname]}")
 
@@ -298,28 +338,45 @@ def min_bidirectional(
         fbeg0 = lm.getid(lm.lits.pstart, i)
         wcnf.append([fbeg0])
 
+    pre = WCNFPreprocessor(wcnf) if preprocess else None
+    wcnf_solve = pre.run() if pre else wcnf
+
     if exp:
         exp.time_prep = time.time() - total_start
 
     # solver = RC2(wcnf, verbose=3)
-    solver = RC2(wcnf)
-    sol = solver.compute()
+    with profiling.phase("solve"):
+        sol = engine.compute(wcnf_solve)
+        if pre:
+            sol = pre.restore(sol)
 
     assert sol is not None
-    sold = get_sold(sol)
+    with profiling.phase("decode"):
+        sold = get_sold(sol)
 
-    show_sol(lm, sold, text)
-    factors = sol2bidirectional(lm, sold, text)
+        show_sol(lm, sold, text)
+        factors = sol2bidirectional(lm, sold, text)
 
     logger.debug(factors)
     logger.debug(f"original={text}")
     logger.debug(f"decode={decode(factors)}")
-    assert decode(factors) == text
+    with profiling.phase("verify"):
+        assert decode(factors) == text
     if exp:
         exp.time_total = time.time() - total_start
         exp.factors = factors
         exp.factor_size = len(factors)
         exp.fill(wcnf)
+        if pre is not None:
+            assert pre.reduced is not None
+            exp.fill_pre(pre.reduced, pre.time)
+        exp.instance_cache = cache_status
+        exp.engine = engine.options.name
+        exp.engine_options = engine.options.to_json()  # type: ignore
+        exp.lower_bound = engine.lower_bound
+        if not engine.optimal:
+            exp.status = "anytime"
+        exp.profile = profiling.finish(engine.stats)
     return factors
 
 
@@ -361,6 +418,22 @@ def parse_args():
         help="list of text positions that must be a beginning of a phrase, starting with index 0",
         default=[],
     )
+    parser.add_argument(
+        "--amo_encoding",
+        type=str,
+        help="encoding of at-most-one constraints, " + "/".join(mysat.amo_encodings),
+        choices=mysat.amo_encodings,
+        default="auto",
+    )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="simplify the hard clauses before solving (see preprocess.py)",
+    )
+    add_engine_args(parser)
+    add_resource_args(parser)
+    instance_cache.add_cache_args(parser)
+    tracing.add_trace_args(parser)
     parser.add_argument(
         "--log_level",
         type=str,
@@ -397,9 +470,22 @@ if __name__ == "__main__":
 
     exp = BiDirExp.create()
     exp.algo = "bidirectional-sat"
+    mysat.amo_encoding = args.amo_encoding
+    instance_cache.configure(args)
+    tracing.configure(args)
+    if args.amo_encoding != "auto":
+        exp.algo += f"-amo-{args.amo_encoding}"
+    if args.engine != "rc2":
+        exp.algo += f"-{args.engine}"
     exp.file_name = os.path.basename(args.file)
     exp.file_len = len(text)
-    factors_sol = min_bidirectional(text, exp, args.contains)
+    apply_memory_cap(args, exp, "bidirectional_solver_var2", text)
+    try:
+        factors_sol = min_bidirectional(
+            text, exp, args.contains, args.preprocess, engine_options_from_args(args)
+        )
+    except MemoryError:
+        exit_with_status(exp, "oom", args.output)
     exp.factors = factors_sol
     exp.factor_size = len(factors_sol)
 
@@ -408,3 +494,4 @@ if __name__ == "__main__":
     else:
         with open(args.output, "w") as f:
             json.dump(exp, f, ensure_ascii=False)
+    tracing.save(args.trace, exp.algo, file=exp.file_name, status=exp.status)
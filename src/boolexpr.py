@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Tuple, Union
+
+
+class Expr:
+    """
+    Boolean expression over pysat variables (positive integers).
+
+    Expressions are built with `&`, `|`, `~` and `>>` (implication) and are
+    converted to clauses by `expr_cnf_pysat` without going through sympy.
+    """
+
+    __slots__ = ()
+
+    def __and__(self, other: Expr) -> Expr:
+        return And(self, other)
+
+    def __or__(self, other: Expr) -> Expr:
+        return Or(self, other)
+
+    def __invert__(self) -> Expr:
+        return Not(self)
+
+    def __rshift__(self, other: Expr) -> Expr:
+        return Implies(self, other)
+
+
+class Const(Expr):
+    __slots__ = ("value",)
+
+    def __init__(self, value: bool):
+        self.value = value
+
+    def __repr__(self) -> str:
+        return "true" if self.value else "false"
+
+
+true = Const(True)
+false = Const(False)
+
+
+class Var(Expr):
+    __slots__ = ("id",)
+
+    def __init__(self, id: int):
+        assert id > 0
+        self.id = id
+
+    def __str__(self) -> str:
+        return str(self.id)
+
+    def __repr__(self) -> str:
+        return str(self.id)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Var) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return self.id
+
+
+class Not(Expr):
+    __slots__ = ("arg",)
+
+    def __init__(self, arg: Expr):
+        self.arg = arg
+
+    def __repr__(self) -> str:
+        return f"~{self.arg!r}"
+
+
+class And(Expr):
+    __slots__ = ("args",)
+
+    def __init__(self, *args: Expr):
+        self.args = args
+
+    def __repr__(self) -> str:
+        return "(" + " & ".join(map(repr, self.args)) + ")"
+
+
+class Or(Expr):
+    __slots__ = ("args",)
+
+    def __init__(self, *args: Expr):
+        self.args = args
+
+    def __repr__(self) -> str:
+        return "(" + " | ".join(map(repr, self.args)) + ")"
+
+
+class Implies(Expr):
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: Expr, y: Expr):
+        self.x = x
+        self.y = y
+
+    def __repr__(self) -> str:
+        return f"({self.x!r} >> {self.y!r})"
+
+
+class Equivalent(Expr):
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: Expr, y: Expr):
+        self.x = x
+        self.y = y
+
+    def __repr__(self) -> str:
+        return f"({self.x!r} <-> {self.y!r})"
+
+
+def lit(x: int) -> Expr:
+    """
+    Expression of the pysat literal `x`.
+    """
+    return Var(x) if x > 0 else Not(Var(-x))
+
+
+def evaluate(x: Expr, assignment: Dict[int, bool]) -> bool:
+    """
+    Truth value of `x` under the assignment of its variables.
+    """
+    if isinstance(x, Var):
+        return assignment[x.id]
+    if isinstance(x, Const):
+        return x.value
+    if isinstance(x, Not):
+        return not evaluate(x.arg, assignment)
+    if isinstance(x, And):
+        return all(evaluate(y, assignment) for y in x.args)
+    if isinstance(x, Or):
+        return any(evaluate(y, assignment) for y in x.args)
+    if isinstance(x, Implies):
+        return not evaluate(x.x, assignment) or evaluate(x.y, assignment)
+    assert isinstance(x, Equivalent)
+    return evaluate(x.x, assignment) == evaluate(x.y, assignment)
+
+
+# negation normal form: a literal (int), a constant (bool), or ("and" | "or", children)
+NNF = Union[int, bool, Tuple[str, list]]
+
+
+def to_nnf(x: Expr, positive: bool = True) -> NNF:
+    """
+    Push negations to the variables, flattening nested And/Or and folding constants.
+    """
+    if isinstance(x, Var):
+        return x.id if positive else -x.id
+    if isinstance(x, Const):
+        return x.value == positive
+    if isinstance(x, Not):
+        return to_nnf(x.arg, not positive)
+    if isinstance(x, And) or isinstance(x, Or):
+        op = "and" if isinstance(x, And) == positive else "or"
+        return _join(op, [to_nnf(y, positive) for y in x.args])
+    if isinstance(x, Implies):
+        # x -> y = ~x | y, ~(x -> y) = x & ~y
+        return _join(
+            "or" if positive else "and",
+            [to_nnf(x.x, not positive), to_nnf(x.y, positive)],
+        )
+    assert isinstance(x, Equivalent)
+    # x <-> y = (x & y) | (~x & ~y), ~(x <-> y) = (x & ~y) | (~x & y)
+    return _join(
+        "or",
+        [
+            _join("and", [to_nnf(x.x, True), to_nnf(x.y, positive)]),
+            _join("and", [to_nnf(x.x, False), to_nnf(x.y, not positive)]),
+        ],
+    )
+
+
+def _join(op: str, children: List[NNF]) -> NNF:
+    # the absorbing constant of `op` is False for "and" and True for "or"
+    absorbing = op == "or"
+    args = []
+    for child in children:
+        if isinstance(child, bool):
+            if child == absorbing:
+                return absorbing
+            continue
+        if isinstance(child, tuple) and child[0] == op:
+            args.extend(child[1])
+        else:
+            args.append(child)
+    if len(args) == 0:
+        return not absorbing
+    if len(args) == 1:
+        return args[0]
+    return (op, args)
+
+
+def _nnf_clause(x: NNF) -> Union[List[int], None]:
+    if isinstance(x, int) and not isinstance(x, bool):
+        return [x]
+    if isinstance(x, tuple) and x[0] == "or" and all(isinstance(y, int) for y in x[1]):
+        return list(x[1])
+    return None
+
+
+def nnf_to_clauses(x: NNF) -> Union[List[List[int]], None]:
+    """
+    Clauses of `x` if it is already in CNF, otherwise None.
+    """
+    if isinstance(x, bool):
+        return [] if x else [[]]
+    clause = _nnf_clause(x)
+    if clause is not None:
+        return [clause]
+    assert isinstance(x, tuple)
+    if x[0] != "and":
+        return None
+    res = []
+    for y in x[1]:
+        clause = _nnf_clause(y)
+        if clause is None:
+            return None
+        res.append(clause)
+    return res
+
+
+def expr_cnf_pysat(new_var: Callable[[], int], x: Expr) -> List[List[int]]:
+    """
+    Convert `x` to equisatisfiable clauses of pysat.
+
+    Formulas already in CNF are returned as they are. Otherwise every And/Or node
+    of the negation normal form is named by a new variable (Tseitin). Since all nodes
+    occur positively in NNF, only the implications from the names to the nodes are
+    needed (Plaisted-Greenbaum), and any model of `x` extends to the clauses.
+
+    new_var: get a new variable.
+    """
+    nnf = to_nnf(x)
+    clauses = nnf_to_clauses(nnf)
+    if clauses is not None:
+        return clauses
+
+    new_formula = []
+
+    def rec(y: NNF) -> int:
+        if not isinstance(y, tuple):
+            assert not isinstance(y, bool)
+            return y
+        (op, children) = y
+        nvar = new_var()
+        literals = [rec(child) for child in children]
+        if op == "and":
+            for literal in literals:
+                new_formula.append([-nvar, literal])
+        else:
+            new_formula.append([-nvar] + literals)
+        return nvar
+
+    new_formula.append([rec(nnf)])
+    return new_formula
@@ -0,0 +1,111 @@
+from array import array
+from typing import IO, Iterable, Iterator, List, Optional
+
+
+class HardClauses:
+    """
+    Read-only sequence view of the hard clauses of a ClauseStore.
+
+    Clauses are materialized as lists only when they are accessed. Iteration converts
+    the flat buffer in batches of `batch` clauses, so that solvers can be
+    bootstrapped without building the whole list of lists.
+    """
+
+    def __init__(self, store: "ClauseStore", batch: int = 1 << 12):
+        self.store = store
+        self.batch = batch
+
+    def __len__(self) -> int:
+        return len(self.store.ends)
+
+    def __getitem__(self, i: int) -> List[int]:
+        ends = self.store.ends
+        if i < 0:
+            i += len(ends)
+        begin = ends[i - 1] if i > 0 else 0
+        return self.store.lits[begin : ends[i]].tolist()
+
+    def __iter__(self) -> Iterator[List[int]]:
+        lits = self.store.lits
+        ends = self.store.ends
+        n = len(ends)
+        for i in range(0, n, self.batch):
+            # clauses [i, j) are converted at once
+            j = min(n, i + self.batch)
+            begin = ends[i - 1] if i > 0 else 0
+            chunk = lits[begin : ends[j - 1]].tolist()
+            pos = 0
+            for end in ends[i:j]:
+                end -= begin
+                yield chunk[pos:end]
+                pos = end
+
+
+class ClauseStore:
+    """
+    WCNF whose hard clauses are kept in a flat literal buffer of `array('i')` with end offsets.
+
+    It provides the part of the interface of pysat.formula.WCNF used by the builders,
+    the Exp records and RC2 (append, extend, hard, soft, wght, nv), so it can be given to
+    RC2 in place of a WCNF. Soft clauses are few and kept as lists.
+    """
+
+    def __init__(self):
+        self.lits = array("i")
+        self.ends = array("q")
+        self.soft: List[List[int]] = []
+        self.wght: List[int] = []
+        self.nv = 0
+        self.hard = HardClauses(self)
+
+    def append(self, clause: Iterable[int], weight: Optional[int] = None):
+        if not isinstance(clause, list):
+            clause = list(clause)
+        if clause:
+            nv = max(max(clause), -min(clause))
+            if nv > self.nv:
+                self.nv = nv
+        if weight is None:
+            lits = self.lits
+            lits.extend(clause)
+            self.ends.append(len(lits))
+        else:
+            self.soft.append(clause)
+            self.wght.append(weight)
+
+    def extend(
+        self, clauses: Iterable[Iterable[int]], weights: Optional[List[int]] = None
+    ):
+        if weights is None:
+            for clause in clauses:
+                self.append(clause)
+        else:
+            for (clause, weight) in zip(clauses, weights):
+                self.append(clause, weight=weight)
+
+    def topw(self) -> int:
+        return sum(self.wght) + 1
+
+    def write_dimacs(self, fp: IO[str]):
+        """
+        Write the formula in the DIMACS WCNF format ("p wcnf nvars nclauses top").
+
+        Hard clauses are written from the flat buffer in batches without building lists of clauses.
+        """
+        top = self.topw()
+        fp.write(f"p wcnf {self.nv} {len(self.ends) + len(self.soft)} {top}\n")
+        lines = []
+        begin = 0
+        for end in self.ends:
+            lines.append(f"{top} {' '.join(map(str, self.lits[begin:end]))} 0\n")
+            begin = end
+            if len(lines) >= 1 << 12:
+                fp.writelines(lines)
+                lines = []
+        fp.writelines(lines)
+        for (clause, weight) in zip(self.soft, self.wght):
+            fp.write(f"{weight} {' '.join(map(str, clause))} 0\n")
+
+    def to_file(self, path: str):
+        with open(path, "w") as fp:
+            self.write_dimacs(fp)
@@ -0,0 +1,391 @@
+# Empirical complexity of the solvers from the results of the scaling benchmark (see scaling_bench.py), and detection
+# of performance regressions between runs.
+#
+# For each solver and corpus, a metric y of the prefixes is fitted to y = coef * n^slope by least squares in log-log
+# scale, where n is the length of the prefix and the metrics are
+#   prep:    time of building the formula (time_prep)
+#   solve:   time of solving it (time_total - time_prep)
+#   clauses: number of hard clauses (sol_nhard)
+#   memory:  peak memory of the job (max_rss)
+# over the correct results (not anytime ones, whose times are cut by the time budget).
+# The fits are saved with the values of the prefixes as a baseline (JSON), and a run is compared to it: a metric of a
+# solver and corpus regressed if its slope is larger by a one-sided Welch t-test of the slopes, or its values on the
+# prefixes of both runs are larger by a one-sided paired t-test of their log ratios, at the significance level `alpha`
+# divided by the number of tests (Bonferroni), and by more than `min_slope` or the ratio `min_ratio`, so that the noise
+# of short times is not flagged.
+# The verdict is written as JSON for CI, and the exit status is 1 if a metric regressed.
+# python src/complexity.py [--db out/satcomp.db] [--suite nightly] [--save_baseline base.json | --baseline base.json --verdict verdict.json]
+
+import argparse
+import datetime
+import json
+import math
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from dataclasses_json import dataclass_json
+
+import scaling_bench
+
+dbname = "out/satcomp.db"
+metrics = ["prep", "solve", "clauses", "memory"]
+
+
+@dataclass_json
+@dataclass
+class Fit:
+    algo: str
+    corpus: str
+    metric: str
+    # y = coef * n^slope
+    slope: float
+    coef: float
+    # standard error of the slope and coefficient of determination in log-log scale
+    stderr: float
+    r2: float
+    min_len: int
+    max_len: int
+    # file name of the prefix -> value
+    values: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass_json
+@dataclass
+class Check:
+    algo: str
+    corpus: str
+    metric: str
+    slope_baseline: float
+    slope: float
+    # one-sided p-value of a larger slope
+    p_slope: float
+    # geometric mean of the ratios of the values on the prefixes of both runs, 0 if none
+    ratio: float
+    # one-sided p-value of larger values, 1 if less than 2 prefixes are shared
+    p_ratio: float
+    regressed: bool
+
+
+def load(path: str = dbname, suite: str = "") -> pd.DataFrame:
+    """
+    The correct results of the scaling benchmark in the database at `path` (of `suite` if not empty).
+    """
+    con = sqlite3.connect(path)
+    try:
+        df = pd.read_sql_query(
+            f"SELECT algo, corpus, suite, file_name, file_len, time_prep, time_total, sol_nhard, max_rss FROM {scaling_bench.dbtable} WHERE status = 'correct'",
+            con,
+        )
+    finally:
+        con.close()
+    if suite != "":
+        df = df[df.suite == suite]
+    return df
+
+
+def metric_values(df: pd.DataFrame, metric: str) -> pd.Series:
+    if metric == "prep":
+        return df.time_prep
+    if metric == "solve":
+        return df.time_total - df.time_prep
+    if metric == "clauses":
+        return df.sol_nhard.astype(float)
+    if metric == "memory":
+        return df.max_rss
+    assert False
+
+
+def linear_fit(
+    points: List[Tuple[float, float]]
+) -> Optional[Tuple[float, float, float, float]]:
+    """
+    (slope, intercept, standard error of the slope, r2) of y = intercept + slope * x by least squares,
+    or None without 3 points and 2 distinct x.
+    """
+    k = len(points)
+    if k < 3 or len(set(x for (x, _) in points)) < 2:
+        return None
+    mx = sum(x for (x, _) in points) / k
+    my = sum(y for (_, y) in points) / k
+    sxx = sum((x - mx) ** 2 for (x, _) in points)
+    syy = sum((y - my) ** 2 for (_, y) in points)
+    slope = sum((x - mx) * (y - my) for (x, y) in points) / sxx
+    intercept = my - slope * mx
+    sse = sum((y - intercept - slope * x) ** 2 for (x, y) in points)
+    r2 = 1 - sse / syy if syy > 0 else 1.0
+    return (slope, intercept, math.sqrt(sse / (k - 2) / sxx), r2)
+
+
+def fit_all(df: pd.DataFrame, min_len: int = 0) -> List[Fit]:
+    """
+    Fits of each metric of each solver and corpus, over the prefixes of at least `min_len` with positive values.
+    """
+    df = df[df.file_len >= min_len]
+    res = []
+    for ((algo, corpus), group) in df.groupby(["algo", "corpus"], sort=True):
+        for metric in metrics:
+            values = metric_values(group, metric)
+            ok = values > 0
+            (names, lens, ys) = (group.file_name[ok], group.file_len[ok], values[ok])
+            fit = linear_fit([(math.log(n), math.log(y)) for (n, y) in zip(lens, ys)])
+            if fit is None:
+                continue
+            (slope, intercept, stderr, r2) = fit
+            res.append(
+                Fit(
+                    algo,
+                    corpus,
+                    metric,
+                    slope,
+                    math.exp(intercept),
+                    stderr,
+                    r2,
+                    int(lens.min()),
+                    int(lens.max()),
+                    dict(zip(names, map(float, ys))),
+                )
+            )
+    return res
+
+
+def betacf(a: float, b: float, x: float) -> float:
+    """
+    Continued fraction of the incomplete beta function by the modified Lentz's method.
+    """
+    tiny = 1e-300
+    (c, d) = (1.0, 1 - (a + b) * x / (a + 1))
+    d = 1 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        for aa in [
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ]:
+            d = 1 + aa * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + aa / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1) < 1e-14:
+            break
+    return h
+
+
+def betainc(a: float, b: float, x: float) -> float:
+    """
+    Regularized incomplete beta function I_x(a, b).
+    """
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(
+        math.lgamma(a + b)
+        - math.lgamma(a)
+        - math.lgamma(b)
+        + a * math.log(x)
+        + b * math.log(1 - x)
+    )
+    if x < (a + 1) / (a + b + 2):
+        return front * betacf(a, b, x) / a
+    return 1 - front * betacf(b, a, 1 - x) / b
+
+
+def t_sf(t: float, df: float) -> float:
+    """
+    P(T > t) of Student's t-distribution with `df` degrees of freedom.
+    """
+    if math.isinf(t):
+        return 0.0 if t > 0 else 1.0
+    p = 0.5 * betainc(df / 2, 0.5, df / (df + t * t))
+    return p if t > 0 else 1 - p
+
+
+def slope_test(base: Fit, cur: Fit) -> float:
+    """
+    One-sided p-value of the slope of `cur` larger than that of `base` by Welch's t-test.
+    """
+    (df_base, df_cur) = (len(base.values) - 2, len(cur.values) - 2)
+    var = base.stderr**2 + cur.stderr**2
+    diff = cur.slope - base.slope
+    if var == 0:
+        return 0.0 if diff > 0 else 1.0
+    df = (
+        var**2 / (base.stderr**4 / df_base + cur.stderr**4 / df_cur)
+        if base.stderr > 0 and cur.stderr > 0
+        else max(df_base, df_cur)
+    )
+    return t_sf(diff / math.sqrt(var), df)
+
+
+def ratio_test(base: Fit, cur: Fit) -> Tuple[float, float]:
+    """
+    Geometric mean of the ratios of the values of `cur` to those of `base` on the same prefixes, and the one-sided
+    p-value of larger values by a paired t-test of the log ratios.
+    """
+    logs = [
+        math.log(cur.values[name] / base.values[name])
+        for name in cur.values
+        if name in base.values
+    ]
+    if len(logs) == 0:
+        return (0.0, 1.0)
+    mean = sum(logs) / len(logs)
+    if len(logs) < 2:
+        return (math.exp(mean), 1.0)
+    sd = math.sqrt(sum((d - mean) ** 2 for d in logs) / (len(logs) - 1))
+    if sd == 0:
+        return (math.exp(mean), 0.0 if mean > 0 else 1.0)
+    return (math.exp(mean), t_sf(mean / (sd / math.sqrt(len(logs))), len(logs) - 1))
+
+
+def compare(
+    baseline: List[Fit],
+    fits: List[Fit],
+    alpha: float = 0.01,
+    min_slope: float = 0.1,
+    min_ratio: float = 1.2,
+) -> dict:
+    """
+    The verdict of `fits` against `baseline`: the checks of the fits of both, the keys (algo, corpus, metric) of the
+    baseline without a fit now, and whether any regressed (see the top of this file).
+    """
+    current = {(f.algo, f.corpus, f.metric): f for f in fits}
+    pairs = [
+        (base, current[base.algo, base.corpus, base.metric])
+        for base in baseline
+        if (base.algo, base.corpus, base.metric) in current
+    ]
+    missing = [
+        [base.algo, base.corpus, base.metric]
+        for base in baseline
+        if (base.algo, base.corpus, base.metric) not in current
+    ]
+    # two tests per fit
+    level = alpha / max(1, 2 * len(pairs))
+    checks = []
+    for (base, cur) in pairs:
+        p_slope = slope_test(base, cur)
+        (ratio, p_ratio) = ratio_test(base, cur)
+        regressed = (p_slope < level and cur.slope - base.slope > min_slope) or (
+            p_ratio < level and ratio > min_ratio
+        )
+        checks.append(
+            Check(
+                cur.algo,
+                cur.corpus,
+                cur.metric,
+                base.slope,
+                cur.slope,
+                p_slope,
+                ratio,
+                p_ratio,
+                regressed,
+            )
+        )
+    regressions = [c for c in checks if c.regressed]
+    return {
+        "status": "fail" if regressions else "pass",
+        "date": str(datetime.datetime.now()),
+        "alpha": alpha,
+        "min_slope": min_slope,
+        "min_ratio": min_ratio,
+        "regressions": [c.to_dict() for c in regressions],  # type: ignore
+        "missing": missing,
+        "checks": [c.to_dict() for c in checks],  # type: ignore
+    }
+
+
+def save_baseline(fits: List[Fit], path: str):
+    with open(path, "w") as f:
+        json.dump({"date": str(datetime.datetime.now()), "fits": [fit.to_dict() for fit in fits]}, f, indent=1)  # type: ignore
+
+
+def load_baseline(path: str) -> List[Fit]:
+    with open(path) as f:
+        return [Fit.from_dict(fit) for fit in json.load(f)["fits"]]  # type: ignore
+
+
+def print_fits(fits: List[Fit]):
+    for fit in fits:
+        print(
+            f"{fit.algo:20} {fit.corpus:12} {fit.metric:8} {fit.coef:.3g} * n^{fit.slope:.2f} (±{fit.stderr:.2f}, r2 {fit.r2:.2f}, "
+            f"{len(fit.values)} prefixes of {fit.min_len}-{fit.max_len})"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Fit the times, clauses and memory of the solvers to the lengths, and detect regressions."
+    )
+    parser.add_argument("--db", type=str, help="results database", default=dbname)
+    parser.add_argument(
+        "--suite", type=str, help="suite of the results (all if empty)", default=""
+    )
+    parser.add_argument(
+        "--min_len", type=int, help="minimum length of the prefixes fitted", default=0
+    )
+    parser.add_argument(
+        "--save_baseline",
+        type=str,
+        help="JSON file to save the fits to as a baseline",
+        default="",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        help="JSON file of the baseline to compare the fits with",
+        default="",
+    )
+    parser.add_argument(
+        "--verdict",
+        type=str,
+        help="JSON file to write the verdict of the comparison to (stdout if empty)",
+        default="",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        help="significance level of the tests of regressions",
+        default=0.01,
+    )
+    parser.add_argument(
+        "--min_slope", type=float, help="increase of the slope tolerated", default=0.1
+    )
+    parser.add_argument(
+        "--min_ratio",
+        type=float,
+        help="ratio of the values to those of the baseline tolerated",
+        default=1.2,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    fits = fit_all(load(args.db, args.suite), args.min_len)
+    if args.save_baseline != "":
+        save_baseline(fits, args.save_baseline)
+    if args.baseline == "":
+        print_fits(fits)
+        sys.exit()
+    verdict = compare(
+        load_baseline(args.baseline), fits, args.alpha, args.min_slope, args.min_ratio
+    )
+    if args.verdict != "":
+        with open(args.verdict, "w") as f:
+            json.dump(verdict, f, indent=1)
+        for c in verdict["regressions"]:
+            print(
+                f"regression of {c['metric']} of {c['algo']} on {c['corpus']}: n^{c['slope_baseline']:.2f} -> n^{c['slope']:.2f}, x{c['ratio']:.2f}"
+            )
+        print(
+            f"{verdict['status']}: {len(verdict['regressions'])} of {len(verdict['checks'])} fits regressed"
+        )
+    else:
+        json.dump(verdict, sys.stdout, indent=1)
+        print()
+    sys.exit(1 if verdict["status"] == "fail" else 0)
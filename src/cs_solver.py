@@ -6,22 +6,36 @@ import sys
 import time
 from enum import auto
 from logging import CRITICAL, DEBUG, INFO, Formatter, StreamHandler, getLogger
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from pysat.card import CardEnc
-from pysat.examples.rc2 import RC2
-from pysat.formula import WCNF
 
+import instance_cache
+import mysat
+import profiling
+import stralgo
+import tracing
+from clause_store import ClauseStore
+from interval_index import IntervalIndex
+from maxsat_engine import (
+    EngineOptions,
+    add_engine_args,
+    create_engine,
+    engine_options_from_args,
+)
 from mysat import (
     Enum,
     Literal,
     LiteralManager,
-    pysat_and,
+    pysat_atmost,
     pysat_if,
     pysat_iff,
+    pysat_less,
     pysat_or,
-    pysat_atmost,
 )
+from preprocess import WCNFPreprocessor
+from resource_estimate import add_resource_args, apply_memory_cap, exit_with_status
+from rlslp_solver import compute_rlrefs, phrase_clauses
 from slp import SLPExp, SLPType
 
 logger = getLogger(__name__)
@@ -32,23 +46,41 @@ formatter = Formatter(FORMAT)
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-#CollageSystemLiteralという列挙型のクラスの定義
+# 符号化のバージョン (式を変えたら上げる. 古いバージョンのキャッシュされたインスタンスは使われない)
+encoding_version = 1
+
+# CollageSystemLiteralという列挙型のクラスの定義
 class CollageSystemLiteral(Enum):
-    true = Literal.true             #true = 1
-    false = Literal.false           #false = 2
-    auxlit = Literal.auxlit         #auxlit = 3
+    true = Literal.true  # true = 1
+    false = Literal.false  # false = 2
+    auxlit = Literal.auxlit  # auxlit = 3
     phrase = auto()  # (i,l) (representing T[i:i+l)) is phrase of grammar parsing
     pstart = auto()  # i is a starting position of a phrase of grammar parsing
-    slpref = auto()  # (j,i,l): phrase (j,j+l) references T[i,i+l)  (T[i,i+l] <- T[j,j+l])
-    rlref = auto() # (j,i,l): phrase (j,j+l) references (T[i,i+l))*(t-1)  ((T[i,i+l])*(t-1) <- T[j,j+l])
-    csref = auto() # (j,i,l): phrase (j,j+l) references (T[i,i+l))  ((T[i,i+l]) <- T[j,j+l])
+    slpref = (
+        auto()
+    )  # (j,i,l): phrase (j,j+l) references T[i,i+l)  (T[i,i+l] <- T[j,j+l])
+    rlref = (
+        auto()
+    )  # (j,i,l): phrase (j,j+l) references (T[i,i+l))*(t-1)  ((T[i,i+l])*(t-1) <- T[j,j+l])
+    csref = (
+        auto()
+    )  # (j,i,l): phrase (j,j+l) references (T[i,i+l))  ((T[i,i+l]) <- T[j,j+l])
     dref = auto()
     referred = auto()  # (i,l): T[i,i+l) is referenced by some phrase
     depth = auto()
-                         # "T[i,i+l) is referenced by some phrase" or
-                         # "T[i,i+l) is labeled by a run-length non-terminal" or
-                         # "[i,i+l) is the left child of a run-length rule" or
-                         # "T[i,i+l) is labeled by a truncation non-terminal"
+    # "T[i,i+l) is referenced by some phrase" or
+    # "T[i,i+l) is labeled by a run-length non-terminal" or
+    # "[i,i+l) is the left child of a run-length rule" or
+    # "T[i,i+l) is labeled by a truncation non-terminal"
+    depthbit = (
+        auto()
+    )  # (i,l,b): b-th bit (from the most significant) of the depth of T[i,i+l)
+    dep = (
+        auto()
+    )  # (i,k): phrase beginning at i refers to an interval containing phrase beginning at k
+    tdep = (
+        auto()
+    )  # (i,k): phrase beginning at i eventually refers to phrase beginning at k
 
 
 class CollageSystemLiteralManager(LiteralManager):
@@ -69,13 +101,16 @@ class CollageSystemLiteralManager(LiteralManager):
             CollageSystemLiteral.dref: self.verify_dref,
             CollageSystemLiteral.depth: self.verify_depth,
             CollageSystemLiteral.referred: self.verify_referred,
+            CollageSystemLiteral.depthbit: self.verify_depthbit,
+            CollageSystemLiteral.dep: self.verify_dep,
+            CollageSystemLiteral.tdep: self.verify_dep,
         }
-        super().__init__(self.lits) # type: ignore
+        super().__init__(self.lits)  # type: ignore
 
     # 新しくIDを割り当てるメソッド
     def newid(self, *obj) -> int:
         res = super().newid(*obj)
-        if len(obj) > 0 and obj[0] in self.verifyf:
+        if self.debug and len(obj) > 0 and obj[0] in self.verifyf:
             self.verifyf[obj[0]](*obj)
         return res
 
@@ -96,7 +131,7 @@ class CollageSystemLiteralManager(LiteralManager):
         assert len(obj) == 2
         name, i = obj
         assert name == self.lits.pstart
-        assert 0 <= i <= self.n #i \in [1,n+1]
+        assert 0 <= i <= self.n  # i \in [1,n+1]
 
     # 変数がref_{i<-j,l}の型であるか確認するメソッド
     def verify_slpref(self, *obj):
@@ -105,7 +140,7 @@ class CollageSystemLiteralManager(LiteralManager):
         assert len(obj) == 4
         name, j, i, l = obj
         assert name == self.lits.slpref
-        assert 0 <= i < self.n-1 #i \in [1,n-1]
+        assert 0 <= i < self.n - 1  # i \in [1,n-1]
         assert j < j + l <= i < i + l <= self.n
         assert 1 < l <= self.n
 
@@ -144,7 +179,6 @@ class CollageSystemLiteralManager(LiteralManager):
         assert 0 < l <= self.n
         assert j + l <= self.n
 
-    
     # 変数がdepth_{i,l,d}の型であるか確認するメソッド
     def verify_depth(self, *obj):
         assert len(obj) == 4
@@ -154,6 +188,24 @@ class CollageSystemLiteralManager(LiteralManager):
         assert 0 < l <= self.n
         assert d >= 0
 
+    # 変数がdepthbit_{i,l,b}の型であるか確認するメソッド
+    def verify_depthbit(self, *obj):
+        assert len(obj) == 4
+        name, i, l, b = obj
+        assert name == self.lits.depthbit
+        assert 0 <= i < self.n
+        assert 0 < l <= self.n
+        assert i + l <= self.n
+        assert b >= 0
+
+    # 変数がdep_{i,k}, tdep_{i,k}の型であるか確認するメソッド
+    def verify_dep(self, *obj):
+        assert len(obj) == 3
+        name, i, k = obj
+        assert name in [self.lits.dep, self.lits.tdep]
+        assert 0 <= i < self.n
+        assert 0 <= k < self.n
+
     # 変数がq_{j,l}の型であるか確認するメソッド
     def verify_referred(self, *obj):
         # print(f"verify_referred, {obj}")
@@ -165,6 +217,7 @@ class CollageSystemLiteralManager(LiteralManager):
         assert 0 < l <= self.n
         assert j + l <= self.n
 
+
 # # SLPルールにおける参照先の候補を格納する関数
 # def compute_lpf(text: bytes):  # non-self-referencing lpf
 #     """
@@ -220,16 +273,285 @@ class CollageSystemLiteralManager(LiteralManager):
 #                 cslpf[i] = l
 #     return cslpf
 
+
+# 切り取り規則の参照の候補を全探索で列挙する関数
+def compute_csrefs_naive(text: bytes):
+    """
+    Enumerate (j2, l2, i, l1) s.t. phrase T[i:i+l1) can be a truncation reference to T[j2:j2+l2),
+    i.e., T[j2:j2+l2) encloses an occurrence of T[i:i+l1) that does not overlap it.
+    A tuple is listed once for every enclosed occurrence.
+    """
+    n = len(text)
+    res = []
+    for j in range(0, n):
+        for i in range(j + 1, n):
+            for l1 in range(2, n - i + 1):
+                if j + l1 <= i and text[j : j + l1] == text[i : i + l1]:
+                    # 右側が左側を参照するとき
+                    for substr_left in range(0, j + 1):
+                        for substr_length in range(l1, i - substr_left + 1):
+                            if j + l1 <= substr_left + substr_length <= i:
+                                res.append((substr_left, substr_length, i, l1))
+                    # 左側が右側を参照するとき
+                    for substr_left in range(j + l1, i + 1):
+                        for substr_length in range(l1, n - substr_left + 1):
+                            if i + l1 <= substr_left + substr_length <= n:
+                                res.append((substr_left, substr_length, j, l1))
+    return res
+
+
+# 切り取り規則の参照の候補を出現位置の組から列挙する関数
+def compute_csrefs(text: bytes):
+    """
+    Enumerate the same tuples as `compute_csrefs_naive` in the same order.
+    The pairs of non-overlapping occurrences are taken from the suffix array,
+    and the intervals enclosing each occurrence are listed directly.
+    """
+    n = len(text)
+    res = []
+    for (j, i, l1) in stralgo.nonoverlapping_occ_pairs(text, 2):
+        # 右側が左側を参照するとき: [j, j+l1) を含み，i 以前で終わる区間
+        for substr_left in range(0, j + 1):
+            for substr_length in range(j + l1 - substr_left, i - substr_left + 1):
+                res.append((substr_left, substr_length, i, l1))
+        # 左側が右側を参照するとき: [i, i+l1) を含み，j+l1 以降で始まる区間
+        for substr_left in range(j + l1, i + 1):
+            for substr_length in range(
+                max(l1, i + l1 - substr_left), n - substr_left + 1
+            ):
+                res.append((substr_left, substr_length, j, l1))
+    return res
+
+
+# 非巡回性の符号化
+depth_encodings = ["unary", "bounded", "binary", "transitive"]
+
+
+# 貪欲法による解析（深さの上界の計算に用いる）
+def greedy_parse(text: bytes) -> List[Tuple[int, int, Optional[int]]]:
+    """
+    Parse text from left to right into phrases (i, l, j), where a phrase of length l >= 2
+    refers to the longest earlier interval T[j:j+l) that begins and ends at phrase boundaries
+    and does not cross the intervals referred so far (j is None for a phrase of length 1).
+    The parse is a feasible solution of the formula.
+    """
+    n = len(text)
+    bounds = [0]
+    referred = []
+    res = []
+    i = 0
+    while i < n:
+        best = None
+        for x, j in enumerate(bounds):
+            for e in bounds[x + 1 :]:
+                l = e - j
+                if l < 2 or i + l > n or (best is not None and l <= best[1]):
+                    continue
+                if text[j:e] != text[i : i + l]:
+                    continue
+                if any(a < j < a + b < e or j < a < e < a + b for (a, b) in referred):
+                    continue
+                best = (j, l)
+        if best is None:
+            res.append((i, 1, None))
+            i += 1
+        else:
+            referred.append(best)
+            res.append((i, best[1], best[0]))
+            i += best[1]
+        bounds.append(i)
+    return res
+
+
+def compute_depth_bound(text: bytes) -> int:
+    """
+    Upper bound of the depth of a phrase in an optimal solution.
+
+    A chain of references visits distinct phrases of length >= 2 and ends at a phrase of length 1,
+    and every character needs a phrase of length 1, so the depth is at most
+    (# of phrases of an optimal solution) - sigma <= (size of the greedy parse) - sigma.
+    """
+    return max(1, len(greedy_parse(text)) - len(set(text)))
+
+
+def bounded_depth_clauses(
+    lm: CollageSystemLiteralManager,
+    n: int,
+    refs_by_allreferred: Dict[Tuple[int, int], set],
+    bound: int,
+) -> List[List[int]]:
+    """
+    Unary depth encoding with d in [0, bound], where depth(i,l,d) for l > 1 is defined only for referred intervals.
+    """
+    clauses = []
+    for i in range(n):
+        for d in range(0, bound + 2):
+            lm.newid(lm.lits.depth, i, 1, d)
+    for (j, l) in refs_by_allreferred.keys():
+        if l > 1:
+            for d in range(0, bound + 1):
+                lm.newid(lm.lits.depth, j, l, d)
+
+    # すべての文字の深さは0以上であり，bound以下である
+    for i in range(n):
+        clauses.append([lm.getid(lm.lits.depth, i, 1, 0)])
+        clauses.append([-lm.getid(lm.lits.depth, i, 1, bound + 1)])
+        for d in range(1, bound + 2):
+            clauses.append(
+                pysat_if(
+                    lm.getid(lm.lits.depth, i, 1, d),
+                    lm.getid(lm.lits.depth, i, 1, d - 1),
+                )
+            )
+
+    # 同一のファクタ内に含まれるi-1, i番目の文字の深さは等しい
+    for i in range(1, n):
+        pos = lm.getid(lm.lits.pstart, i)
+        for d in range(1, bound + 1):
+            bwd_dpth = lm.getid(lm.lits.depth, i - 1, 1, d)
+            fwd_dpth = lm.getid(lm.lits.depth, i, 1, d)
+            clauses.append([pos, -bwd_dpth, fwd_dpth])
+            clauses.append([pos, bwd_dpth, -fwd_dpth])
+
+    # 参照先の深さは，その区間に含まれる文字の深さの最大値以上
+    for (j, l) in refs_by_allreferred.keys():
+        if l > 1:
+            clauses.append([lm.getid(lm.lits.depth, j, l, 0)])
+            for d in range(1, bound + 1):
+                str_dpth = lm.getid(lm.lits.depth, j, l, d)
+                for k in range(j, j + l):
+                    clauses.append(pysat_if(lm.getid(lm.lits.depth, k, 1, d), str_dpth))
+
+    # 参照元の深さは参照先の深さより大きい
+    for (j, l) in refs_by_allreferred.keys():
+        for i in refs_by_allreferred[j, l]:
+            dref_id = lm.getid(lm.lits.dref, j, l, i)
+            for d in range(0, bound + 1):
+                referred_dpth = lm.getid(lm.lits.depth, j, l, d)
+                referrer_dpth = lm.getid(lm.lits.depth, i, 1, d + 1)
+                clauses.append([-dref_id, -referred_dpth, referrer_dpth])
+    return clauses
+
+
+def binary_depth_clauses(
+    lm: CollageSystemLiteralManager,
+    n: int,
+    refs_by_allreferred: Dict[Tuple[int, int], set],
+    bound: int,
+) -> List[List[int]]:
+    """
+    Binary depth encoding: the depth of each character and of each referred interval is a bound.bit_length() bit integer,
+    and a reference is compared with its referred interval by a lexicographic comparator.
+    """
+    nbits = bound.bit_length()
+    clauses = []
+
+    def bits(i: int, l: int) -> List[int]:
+        return [lm.getid(lm.lits.depthbit, i, l, b) for b in range(nbits)]
+
+    for i in range(n):
+        for b in range(nbits):
+            lm.newid(lm.lits.depthbit, i, 1, b)
+    for (j, l) in refs_by_allreferred.keys():
+        if l > 1:
+            for b in range(nbits):
+                lm.newid(lm.lits.depthbit, j, l, b)
+
+    # 同一のファクタ内に含まれるi-1, i番目の文字の深さは等しい
+    for i in range(1, n):
+        pos = lm.getid(lm.lits.pstart, i)
+        for (bwd_bit, fwd_bit) in zip(bits(i - 1, 1), bits(i, 1)):
+            clauses.append([pos, -bwd_bit, fwd_bit])
+            clauses.append([pos, bwd_bit, -fwd_bit])
+
+    # 参照先の深さは，その区間に含まれる文字の深さの最大値以上
+    for (j, l) in refs_by_allreferred.keys():
+        if l > 1:
+            for k in range(j, j + l):
+                clauses.extend(pysat_less(lm, bits(k, 1), bits(j, l), strict=False))
+
+    # 参照元の深さは参照先の深さより大きい
+    for (j, l) in refs_by_allreferred.keys():
+        for i in refs_by_allreferred[j, l]:
+            dref_id = lm.getid(lm.lits.dref, j, l, i)
+            clauses.extend(
+                pysat_less(lm, bits(j, l), bits(i, 1), strict=True, cond=[dref_id])
+            )
+    return clauses
+
+
+def transitive_clauses(
+    lm: CollageSystemLiteralManager, refs_by_allreferred: Dict[Tuple[int, int], set]
+) -> List[List[int]]:
+    """
+    Acyclicity by the transitive closure tdep of the references between phrases, as in bidirectional_solver_var2:
+    dep(i,k) -> tdep(i,k), tdep(i,k) and dep(k,m) -> tdep(i,m), and not tdep(i,i).
+    """
+    clauses = []
+    # 参照元の開始位置iから，参照先の区間に含まれるファクタの開始位置kへの辺
+    deps: Dict[int, List[int]] = {}
+    for (j, l) in refs_by_allreferred.keys():
+        for i in refs_by_allreferred[j, l]:
+            dref_id = lm.getid(lm.lits.dref, j, l, i)
+            for k in range(j, j + l):
+                if not lm.contains(lm.lits.dep, i, k):
+                    lm.newid(lm.lits.dep, i, k)
+                    deps.setdefault(i, []).append(k)
+                clauses.append(
+                    [
+                        -dref_id,
+                        -lm.getid(lm.lits.pstart, k),
+                        lm.getid(lm.lits.dep, i, k),
+                    ]
+                )
+
+    for i in sorted(deps.keys()):
+        # iから到達しうる位置に対してのみtdepを定義する
+        reach = set(deps[i])
+        stack = list(deps[i])
+        while stack:
+            k = stack.pop()
+            for m in deps.get(k, []):
+                if m not in reach:
+                    reach.add(m)
+                    stack.append(m)
+        for k in sorted(reach):
+            lm.newid(lm.lits.tdep, i, k)
+        for k in deps[i]:
+            clauses.append(
+                pysat_if(lm.getid(lm.lits.dep, i, k), lm.getid(lm.lits.tdep, i, k))
+            )
+    for i in sorted(deps.keys()):
+        for k in deps.keys():
+            if lm.contains(lm.lits.tdep, i, k):
+                for m in deps[k]:
+                    clauses.append(
+                        [
+                            -lm.getid(lm.lits.tdep, i, k),
+                            -lm.getid(lm.lits.dep, k, m),
+                            lm.getid(lm.lits.tdep, i, m),
+                        ]
+                    )
+        if lm.contains(lm.lits.tdep, i, i):
+            clauses.append([-lm.getid(lm.lits.tdep, i, i)])
+    return clauses
+
+
 # 条件式を基に重み付きCNFの作成
-def smallest_CollageSystem_WCNF(text: bytes):
+def smallest_CollageSystem_WCNF(text: bytes, depth_encoding: str = "unary"):
     """
     Compute the max sat formula for computing the smallest SLP
     """
     n = len(text)
-    logger.info(f"text length = {len(text)}") # テキストの長さをログ出力
-    wcnf = WCNF() #空の重み付きCNFを生成
-
-    lm = CollageSystemLiteralManager(text) # textに対して生成されるすべての変数からなる集合を表す.
+    logger.info(f"text length = {len(text)}")  # テキストの長さをログ出力
+    wcnf = ClauseStore()  # 空の重み付きCNFを生成
+
+    lm = CollageSystemLiteralManager(text)  # textに対して生成されるすべての変数からなる集合を表す.
+    rec = profiling.BuildRecorder(wcnf, lm)
+    # 密な族だけ配列で管理し, slpref などの疎な族は辞書で管理する
+    lm.declare(lm.lits.pstart, n + 1)
+    lm.declare(lm.lits.dep, n, n)
+    lm.declare(lm.lits.tdep, n, n)
     # print("sloooow algorithm for lpf... (should use linear time algorithm)")
 
     # lpf = compute_lpf(text)
@@ -240,14 +562,14 @@ def smallest_CollageSystem_WCNF(text: bytes):
     # ref(i,j,l): defined for all i,j,l>1 s.t. T[i:i+l) = T[j:j+l)
     # pstart(i)
     # phrase(i,l) defined for all i, l > 1 with l <= lpf[i]
-    phrases = []
+    phrases = IntervalIndex(n)
     for i in range(0, n + 1):
         lm.newid(lm.lits.pstart, i)  # definition of p_i
 
-    #ファクタになり得る変数の作成
+    # ファクタになり得る変数の作成
     for i in range(0, n):
-        #一文字のファクタ
-        phrases.append((i, 1))
+        # 一文字のファクタ
+        phrases.add(i, 1)
         # lm.newid(lm.lits.phrase, i, l)  # definition of f_{i,l}(type-A)
 
         """"
@@ -256,107 +578,95 @@ def smallest_CollageSystem_WCNF(text: bytes):
             lm.newid(lm.lits.phrase, i, rll)  # definition of f_{i,l}(type-b)
         """
 
-    #refの定義
-    refs_by_slpreferred = {} #(j,l)(参照先の開始位置と区間長)がキー，i(参照元の開始位置)が値
-    refs_by_slpreferrer = {} #(i,l)(参照元の開始位置と区間長)がキー，j(参照先の開始位置)が値
+    # refの定義
+    refs_by_slpreferred = {}  # (j,l)(参照先の開始位置と区間長)がキー，i(参照元の開始位置)が値
+    refs_by_slpreferrer = {}  # (i,l)(参照元の開始位置と区間長)がキー，j(参照先の開始位置)が値
 
     for j in range(0, n):
         for i in range(j + 1, n):
-            #print(lpf[j])
+            # print(lpf[j])
             for l in range(2, n - i + 1):
                 if j + l <= i and text[j : j + l] == text[i : i + l]:
-                    #print(f"{text[j:j+l]}, {text[i:i+l]}")
+                    # print(f"{text[j:j+l]}, {text[i:i+l]}")
                     lm.newid(lm.lits.slpref, j, i, l)  # definition of ref_{j<-i,l}
                     if not (j, l) in refs_by_slpreferred:
                         refs_by_slpreferred[j, l] = []
-                    refs_by_slpreferred[j, l].append(i) #キー[j,l]にiを格納する
+                    refs_by_slpreferred[j, l].append(i)  # キー[j,l]にiを格納する
                     if not (i, l) in refs_by_slpreferrer:
                         refs_by_slpreferrer[i, l] = []
-                    refs_by_slpreferrer[i, l].append(j) #キー[i,l]にjを格納する
-
-    #print(f"SLPの参照先 = {refs_by_slpreferred}")
-    #print(f"SLPの参照元 = {refs_by_slpreferrer}")
-
-
-    refs_by_allrule = {} # 連長圧縮ルール全体が表す区間の開始位置と区間長（キー），右のノードの開始位置（値）
-    refs_by_rliterated = {} # 連長圧縮ルールの左のノードの開始位置と区間長（キー），右のノードが表す区間長（値）
-    refs_by_rlreferrer = {} # 連長圧縮ルールの右のノードの開始位置と区間長（キー），左のノードの開始位置（値）
-    
-    #ref^rの定義
-    for j in range(0, n):
-        for i in range(j + 1, n):
-            for l in range(2, n - i + 1):
-                # 二つの文字列は，一部のみ重複かつ一致していて，重複していない部分の長さは文字列の長さを余り無しで割り切れる
-                if i < j + l  and text[j : j + l] == text[i : i + l] and (l % (i - j)) == 0:
-                    lm.newid(lm.lits.rlref, j, i, l)  # definition of {ref^r}_{j<-i,l}
-                    #print(f"{text[j:i+l]},{text[j:i]},{text[i:i+l]}")
-                    #print(f"全体{j, l+i-j}, 左の子{j, i-j}, 右の子{i, l}")
-                    if not (j, l + i - j) in refs_by_allrule:
-                        refs_by_allrule[j, l + i - j] = []
-                    refs_by_allrule[j, l + i - j].append(i)
-                    if not (j, i - j) in refs_by_rliterated:
-                        refs_by_rliterated[j, i - j] = []
-                    refs_by_rliterated[j, i - j].append(l)
-                    if not (i, l) in refs_by_rlreferrer:
-                        refs_by_rlreferrer[i, l] = []
-                    refs_by_rlreferrer[i, l].append(j) # 参照先の位置を格納
-
-    #print(f"連長圧縮ルール全体 = {refs_by_allrule}")
-    #print("連長圧縮左のノード", refs_by_rliterated)
-    #print("連帳圧縮右のノード", refs_by_rlreferrer)
-
-    refs_by_csreferred = {} #(j,l2)(参照先)がキー，(i,l1)(参照元)が値
-    refs_by_csreferrer = {} #(i,l1)(参照元)がキー，(j,l2)(参照先)が値
-
-    #ref^cの定義
-    for j in range(0, n):
-        for i in range(j + 1, n):
-            for l1 in range(2, n - i + 1):
-                if j + l1 <= i and text[j : j + l1] == text[i : i + l1]:
-                    # 右側が左側を参照するとき
-                    #print(f"左参照　左側の文字列:{text[j:j+l1]} = 右側の文字列:{text[i:i+l1]}")
-                    for substr_left in range(0, j + 1):
-                        for substr_length in range(l1, i - substr_left + 1):
-                            if j + l1 <= substr_left + substr_length <= i:
-                                # print(text[j:j+l1], "<-", text[substr_left:substr_left+substr_length])
-                                # print(j, j+l1, "<-", substr_left, substr_left+substr_length)
-                                if not (substr_left, substr_length) in refs_by_csreferred:
-                                    refs_by_csreferred[substr_left, substr_length] = []
-                                refs_by_csreferred[substr_left, substr_length].append([i, l1]) #キー[j(substr_left), l2(substr_length)]にiを格納する
-                                if not (i, l1) in refs_by_csreferrer:
-                                    refs_by_csreferrer[i, l1] = []
-                                refs_by_csreferrer[i, l1].append([substr_left, substr_length]) #キー[i,l1]にj(substr_left)を格納する
-                                if not lm.contains(lm.lits.csref, substr_left, substr_length, i, l1):
-                                    lm.newid(lm.lits.csref, substr_left, substr_length, i, l1) #definition of {ref^c}_{j,l2<-i,l1}
-                    # 左側が右側を参照するとき
-                    # print(f"右参照　左側の文字列:{text[j:j+l1]} = 右側の文字列:{text[i:i+l1]}")
-                    for substr_left in range(j + l1, i + 1):
-                        for substr_length in range(l1, n - substr_left + 1):
-                            if i + l1 <= substr_left + substr_length <= n:
-                                # print(text[substr_left:substr_left+substr_length], "->",text[j:j+l1])
-                                # print(substr_left, substr_left+substr_length, "->", j, j+l1)
-                                if not (substr_left, substr_length) in refs_by_csreferred:
-                                    refs_by_csreferred[substr_left, substr_length] = []
-                                refs_by_csreferred[substr_left, substr_length].append([j, l1]) #キー[j(substr_left), l2(substr_length)]にiを格納する
-                                if not (j, l1) in refs_by_csreferrer:
-                                    refs_by_csreferrer[j, l1] = []
-                                refs_by_csreferrer[j, l1].append([substr_left, substr_length]) #キー[i,l1]にj(substr_left)を格納する                                    
-                                if not lm.contains(lm.lits.csref, substr_left, substr_length, j, l1):
-                                    lm.newid(lm.lits.csref, substr_left, substr_length, j, l1) #definition of {ref^c}_{j,l2<-i,l1}
-                        #print("reset")
+                    refs_by_slpreferrer[i, l].append(j)  # キー[i,l]にjを格納する
+
+    # print(f"SLPの参照先 = {refs_by_slpreferred}")
+    # print(f"SLPの参照元 = {refs_by_slpreferrer}")
+
+    refs_by_allrule = {}  # 連長圧縮ルール全体が表す区間の開始位置と区間長（キー），右のノードの開始位置（値）
+    refs_by_rliterated = {}  # 連長圧縮ルールの左のノードの開始位置と区間長（キー），右のノードが表す区間長（値）
+    refs_by_rlreferrer = {}  # 連長圧縮ルールの右のノードの開始位置と区間長（キー），左のノードの開始位置（値）
+
+    # ref^rの定義
+    # 二つの文字列は，一部のみ重複かつ一致していて，重複していない部分の長さは文字列の長さを余り無しで割り切れる
+    # そのような組は連から列挙する
+    for (j, i, l) in compute_rlrefs(text):
+        lm.newid(lm.lits.rlref, j, i, l)  # definition of {ref^r}_{j<-i,l}
+        # print(f"{text[j:i+l]},{text[j:i]},{text[i:i+l]}")
+        # print(f"全体{j, l+i-j}, 左の子{j, i-j}, 右の子{i, l}")
+        if not (j, l + i - j) in refs_by_allrule:
+            refs_by_allrule[j, l + i - j] = []
+        refs_by_allrule[j, l + i - j].append(i)
+        if not (j, i - j) in refs_by_rliterated:
+            refs_by_rliterated[j, i - j] = []
+        refs_by_rliterated[j, i - j].append(l)
+        if not (i, l) in refs_by_rlreferrer:
+            refs_by_rlreferrer[i, l] = []
+        refs_by_rlreferrer[i, l].append(j)  # 参照先の位置を格納
+
+    # print(f"連長圧縮ルール全体 = {refs_by_allrule}")
+    # print("連長圧縮左のノード", refs_by_rliterated)
+    # print("連帳圧縮右のノード", refs_by_rlreferrer)
+
+    refs_by_csreferred = {}  # (j,l2)(参照先)がキー，(i,l1)(参照元)が値
+    refs_by_csreferrer = {}  # (i,l1)(参照元)がキー，(j,l2)(参照先)が値
+
+    # ref^cの定義: 重複しない出現位置の組から参照の候補を列挙する
+    for (substr_left, substr_length, i, l1) in compute_csrefs(text):
+        # print(i, i+l1, "<-", substr_left, substr_left+substr_length)
+        if not (substr_left, substr_length) in refs_by_csreferred:
+            refs_by_csreferred[substr_left, substr_length] = []
+        refs_by_csreferred[substr_left, substr_length].append(
+            [i, l1]
+        )  # キー[j(substr_left), l2(substr_length)]にiを格納する
+        if not (i, l1) in refs_by_csreferrer:
+            refs_by_csreferrer[i, l1] = []
+        refs_by_csreferrer[i, l1].append(
+            [substr_left, substr_length]
+        )  # キー[i,l1]にj(substr_left)を格納する
+        if not lm.contains(lm.lits.csref, substr_left, substr_length, i, l1):
+            lm.newid(
+                lm.lits.csref, substr_left, substr_length, i, l1
+            )  # definition of {ref^c}_{j,l2<-i,l1}
     # print(f"切り取り規則の参照先={refs_by_csreferred}")
     # print(f"切り取り規則を用いて導出される文字列={refs_by_csreferrer}")
 
-    #qの定義
-    nt_intervals = list(set(refs_by_slpreferred.keys())|set(refs_by_rliterated.keys())|set(refs_by_csreferred.keys())|set(refs_by_allrule.keys())) # intervals implying nonterminal
+    # qの定義
+    nt_intervals = IntervalIndex(n)  # intervals implying nonterminal
+    nt_intervals.update(
+        set(refs_by_slpreferred.keys())
+        | set(refs_by_rliterated.keys())
+        | set(refs_by_csreferred.keys())
+        | set(refs_by_allrule.keys())
+    )
     for (j, l) in nt_intervals:
         lm.newid(lm.lits.referred, j, l)
     # drefの定義
-    refs_by_allreferred = {} #参照先の開始位置j,参照先の長さlの組(j, l)がキー，参照元の開始位置iが値
-    referred_keys = list(set(refs_by_slpreferred.keys())|set(refs_by_rliterated.keys())|set(refs_by_csreferred.keys()))
+    refs_by_allreferred = {}  # 参照先の開始位置j,参照先の長さlの組(j, l)がキー，参照元の開始位置iが値
+    referred_keys = list(
+        set(refs_by_slpreferred.keys())
+        | set(refs_by_rliterated.keys())
+        | set(refs_by_csreferred.keys())
+    )
     for (j, l) in referred_keys:
-        #print(f"[j, l] = {[j, l]}")
-        #print(set([refs_by_csreferrer[i, l][x][0] for x in range(len(refs_by_csreferrer))]))
+        # print(f"[j, l] = {[j, l]}")
+        # print(set([refs_by_csreferrer[i, l][x][0] for x in range(len(refs_by_csreferrer))]))
         if refs_by_slpreferred.get((j, l)):
             for i in refs_by_slpreferred[j, l]:
                 if not (j, l) in refs_by_allreferred:
@@ -365,7 +675,7 @@ def smallest_CollageSystem_WCNF(text: bytes):
         if refs_by_rliterated.get((j, l)):
             if not (j, l) in refs_by_allreferred:
                 refs_by_allreferred[j, l] = []
-            refs_by_allreferred[j, l].append(j+l)
+            refs_by_allreferred[j, l].append(j + l)
         if refs_by_csreferred.get((j, l)):
             for (i, l2) in refs_by_csreferred[j, l]:
                 if not (j, l) in refs_by_allreferred:
@@ -374,17 +684,22 @@ def smallest_CollageSystem_WCNF(text: bytes):
         refs_by_allreferred[j, l] = set(refs_by_allreferred[j, l])
         for i in refs_by_allreferred[j, l]:
             lm.newid(lm.lits.dref, j, l, i)
-            #print([j, l], "←",i)
-    #print(refs_by_allreferred.keys())
+            # print([j, l], "←",i)
+    # print(refs_by_allreferred.keys())
 
     # (参照元の開始位置，参照元の長さ)
-    refs_by_allreferrers = list(set(refs_by_slpreferrer.keys())|set(refs_by_rlreferrer.keys())|set(refs_by_csreferrer.keys()))
+    refs_by_allreferrers = list(
+        set(refs_by_slpreferrer.keys())
+        | set(refs_by_rlreferrer.keys())
+        | set(refs_by_csreferrer.keys())
+    )
 
     # 二文字以上のファクタになりうる変数の組をphrasesに追加
-    phrases.extend(refs_by_allreferrers)
+    phrases.update(refs_by_allreferrers)
 
     # print(f"refs_by_allreferrers = {refs_by_allreferrers}")
-    
+    rec.phase("literal definition")
+
     # // start constraint (1)(2) ###############################
     # (1):phrase(i,l) <=> pstart[i] and pstart[i+l] and \neg{pstart[i+1]} and .. and \neg{pstart[i+l-1]}
 
@@ -392,28 +707,9 @@ def smallest_CollageSystem_WCNF(text: bytes):
     wcnf.append([lm.getid(lm.lits.pstart, 0)])
     wcnf.append([lm.getid(lm.lits.pstart, n)])
 
-    for i in range(n):
-        for l in range(1, n - i + 1):
-            plst = [-lm.getid(lm.lits.pstart, (i + j)) for j in range(1, l)] + [
-                lm.getid(lm.lits.pstart, i), #p_iの取得
-                lm.getid(lm.lits.pstart, (i + l)), #p_(i+l)の取得
-            ]
-            lm.newid(lm.lits.phrase, i, l)
-            #print(lm.getid(lm.lits.phrase, i, l), i, l)
-
-        # range_iff_startp:plst全体を表すliteral
-        # clauses:条件式(1)の右辺を表す
-            range_iff_startp, clauses = pysat_and(lm.newid, plst)
-            wcnf.extend(clauses)
-            wcnf.extend(pysat_iff(lm.getid(lm.lits.phrase, i, l), range_iff_startp))
-        # pysat_iff(x,y)->リスト[[-x,y], [x, -y]]を返す．(x<=>yを表現する関数)
-
-     # (2): 二文字以上で，かつ参照先が存在しない区間はファクタにならない
-    for i in range(n):
-        for l in range(2, n - i + 1):
-            if not (i,l) in phrases:
-                #print(f"phrasesにないペア={i,l}")
-                wcnf.append([-lm.getid(lm.lits.phrase, i, l)])
+    # (2): 二文字以上で，かつ参照先が存在しない区間はファクタにならない
+    # phrase(i,l)は候補(i,l) in phrasesに対してのみ定義する
+    wcnf.extend(phrase_clauses(lm, lm.lits.pstart, lm.lits.phrase, n, phrases))
     """
     print(f"phrase = {phrases}")
     for (j,l) in phrases:
@@ -458,6 +754,7 @@ def smallest_CollageSystem_WCNF(text: bytes):
             print(f"rllst = {rllst}")
             wcnf.append([lm.getid(lm.lits.pstart, i) for i in rllst])
     """
+    rec.block("constraint (1)(2)")
     # // end constraint (1)(2) ###############################
 
     # // start constraint (3),(4)###############################
@@ -465,17 +762,24 @@ def smallest_CollageSystem_WCNF(text: bytes):
         reflst1 = []
         reflst2 = []
         reflst3 = []
-        #print(i,l)
-        if (i,l) in refs_by_slpreferrer.keys():
-            #print(f"nm(i, l) = {refs_by_slpreferrer[i, l], i, l}")
-            reflst1 = [lm.getid(lm.lits.slpref, j, i, l) for j in refs_by_slpreferrer[i, l]]
-        if (i,l) in refs_by_rlreferrer.keys():
-            #print(f"rl(i, l) = {refs_by_rlreferrer[i, l], i, l}")
-            reflst2 = [lm.getid(lm.lits.rlref, j, i, l) for j in refs_by_rlreferrer[i, l]]
-        if (i,l) in refs_by_csreferrer.keys():
+        # print(i,l)
+        if (i, l) in refs_by_slpreferrer.keys():
+            # print(f"nm(i, l) = {refs_by_slpreferrer[i, l], i, l}")
+            reflst1 = [
+                lm.getid(lm.lits.slpref, j, i, l) for j in refs_by_slpreferrer[i, l]
+            ]
+        if (i, l) in refs_by_rlreferrer.keys():
+            # print(f"rl(i, l) = {refs_by_rlreferrer[i, l], i, l}")
+            reflst2 = [
+                lm.getid(lm.lits.rlref, j, i, l) for j in refs_by_rlreferrer[i, l]
+            ]
+        if (i, l) in refs_by_csreferrer.keys():
             # print(f"cs(i, l) = {i, l}")
             # print(refs_by_csreferrer[i, l])
-            reflst3 = [lm.getid(lm.lits.csref, j, l2, i, l) for (j,l2) in refs_by_csreferrer[i, l]]
+            reflst3 = [
+                lm.getid(lm.lits.csref, j, l2, i, l)
+                for (j, l2) in refs_by_csreferrer[i, l]
+            ]
             # reflst3 = []
             # for (j, l2) in refs_by_csreferrer[i, l]:
             #     print(i, l, "->", j, l2)
@@ -493,6 +797,7 @@ def smallest_CollageSystem_WCNF(text: bytes):
         wcnf.extend(nclauses)
         wcnf.append([nvar])
 
+    rec.block("constraint (3),(4)")
     # // end constraint (3),(4)###############################
 
     # // start constraint (5) ###############################
@@ -501,58 +806,56 @@ def smallest_CollageSystem_WCNF(text: bytes):
         for i in refs_by_allreferred[j, l]:
             # 参照先の区間と参照元の開始位置が確定している
 
-            slpreferred_lst=[] # 連結規則の参照先のノードのidリスト
-            rliterated_lst=[] # 連長圧縮規則の左の子ノード
-            csreferred_lst=[] # 切断規則の参照先のノード
+            slpreferred_lst = []  # 連結規則の参照先のノードのidリスト
+            rliterated_lst = []  # 連長圧縮規則の左の子ノード
+            csreferred_lst = []  # 切断規則の参照先のノード
 
             # slprefはひとつだけ
-            if (j,l) in refs_by_slpreferred.keys():
+            if (j, l) in refs_by_slpreferred.keys():
                 if i in refs_by_slpreferred[j, l]:
-                    #print(f"slpref: ({j},{l},{i})")
+                    # print(f"slpref: ({j},{l},{i})")
                     slpreferred_lst.append(lm.getid(lm.lits.slpref, j, i, l))
 
             # rlrefは参照元の長さの倍数分だけ存在しうる(rliteratedに格納済み)
-            if (j,l) in refs_by_rliterated.keys():
+            if (j, l) in refs_by_rliterated.keys():
                 for l2 in refs_by_rliterated[j, l]:
                     if i == j + l:
-                        #print(f"rlref: ({j},{j+l},{j+l+l2})")
-                        assert  l2 % l == 0
+                        # print(f"rlref: ({j},{j+l},{j+l+l2})")
+                        assert l2 % l == 0
                         rliterated_lst.append(lm.getid(lm.lits.rlref, j, i, l2))
 
             # csrefは参照元の長さ分だけ存在しうる
             if (j, l) in refs_by_csreferred.keys():
                 for ref in refs_by_csreferred[j, l]:
                     if i == ref[0]:
-                        #print(f"csref: ({j},{l},{i},{l2})")
-                        csreferred_lst.append(lm.getid(lm.lits.csref, j, l, ref[0], ref[1]))
+                        # print(f"csref: ({j},{l},{i},{l2})")
+                        csreferred_lst.append(
+                            lm.getid(lm.lits.csref, j, l, ref[0], ref[1])
+                        )
 
             referred_lst = []
             referred_lst.extend(slpreferred_lst + rliterated_lst + csreferred_lst)
             referred_lst = list(set(referred_lst))
-            # referred_lst = list(set(referred_lst))          
+            # referred_lst = list(set(referred_lst))
             # print(referred_lst)
             nvar, nclauses = pysat_or(lm.newid, referred_lst)
             wcnf.extend(nclauses)
             wcnf.extend(pysat_iff(lm.getid(lm.lits.dref, j, l, i), nvar))
 
+    rec.block("constraint (5)")
     # // end constraint (5) ###############################
 
     # // start constraint (6) ###############################
     # (6):qが真なら，qが表す区間を参照先に持つようなdref，またはその区間内に参照元と参照先の両方を含むrlrefが存在する
     for (j, l) in nt_intervals:
-        allreferred_lst = [] # drefのidリスト
-        allrule_lst=[] # 連長圧縮規則全体のノード
+        allreferred_lst = []  # drefのidリスト
+        allrule_lst = []  # 連長圧縮規則全体のノード
 
         if (j, l) in refs_by_allreferred.keys():
             for i in refs_by_allreferred[j, l]:
                 allreferred_lst.append(lm.getid(lm.lits.dref, j, l, i))
-        # if (j, l) in refs_by_allrule.keys():
-        #     for i in refs_by_allrule[j, l]:
-        #         allrule_lst.append(lm.getid(lm.lits.rlref, j, i, l + j - i))
-        for (i, l2) in refs_by_rlreferrer.keys():
-            if j in refs_by_rlreferrer[i, l2] and j + l == i + l2:
-                allrule_lst.append(lm.getid(lm.lits.rlref, j, i, l2))
-                
+        for i in refs_by_allrule.get((j, l), []):
+            allrule_lst.append(lm.getid(lm.lits.rlref, j, i, l + j - i))
 
         referred_lst = []
         referred_lst.extend(allreferred_lst + allrule_lst)
@@ -561,6 +864,7 @@ def smallest_CollageSystem_WCNF(text: bytes):
         nvar, nclauses = pysat_or(lm.newid, referred_lst)
         wcnf.extend(nclauses)
         wcnf.extend(pysat_iff(lm.getid(lm.lits.referred, j, l), nvar))
+    rec.block("constraint (6)")
     # // end constraint (6) #################################
 
     # // start constraint (7) ###############################
@@ -574,8 +878,12 @@ def smallest_CollageSystem_WCNF(text: bytes):
     for (i, l) in refs_by_rlreferrer.keys():
         for j in refs_by_rlreferrer[i, l]:
             if (i, l) in nt_intervals:
-                wcnf.append(pysat_if(lm.getid(lm.lits.rlref, j, i, l), -lm.getid(lm.lits.referred, i, l)))
-
+                wcnf.append(
+                    pysat_if(
+                        lm.getid(lm.lits.rlref, j, i, l),
+                        -lm.getid(lm.lits.referred, i, l),
+                    )
+                )
 
     # # SLPの参照先の条件
     # for (j, l) in refs_by_slpreferred.keys():
@@ -584,131 +892,152 @@ def smallest_CollageSystem_WCNF(text: bytes):
     #         if (j, l) in refs_by_rlreferrer.keys():
     #             for k in refs_by_rlreferrer[j, l]:
     #                 id_list.append(-lm.getid(lm.lits.rlref, k, j, l))
-            
+
     #         nvar, nclauses = pysat_and(lm.newid, id_list)
     #         wcnf.extend(nclauses)
     #         wcnf.append(pysat_if(lm.getid(lm.lits.slpref, j, i, l), nvar))
 
-                    
+    rec.block("constraint (7)")
     # // end constraint (7) ###############################
 
     # // start constraint (8) ###############################
     # (9):crossing intervals cannot be referred to at the same time.
-    #rliterated = list(refs_by_rliterated)
-    sorted_ntIntervals = [[] for _ in range(n)] # occ * n サイズのリストを作成
-    for (occ, l) in nt_intervals:
-        sorted_ntIntervals[occ].append(l)
-    for lst in sorted_ntIntervals:
-        lst.sort(reverse=True)
-    # print(nt_intervals)
-    # print(sorted_ntIntervals)
-
     for (occ1, l1) in nt_intervals:
         for occ2 in range(occ1 + 1, occ1 + l1):
-            for l2 in sorted_ntIntervals[occ2]:
+            for l2 in reversed(nt_intervals.starting_at(occ2)):
                 if l2 == 1:
                     pass
                 else:
-                    #print(f"l1,l2,occ1,occ2 = {l1,l2,occ1,occ2}")
-                    #print(occ1, occ2, occ1+l1, occ2+l2)
+                    # print(f"l1,l2,occ1,occ2 = {l1,l2,occ1,occ2}")
+                    # print(occ1, occ2, occ1+l1, occ2+l2)
                     assert l1 > 1 and l2 > 1
                     assert occ1 < occ2 and occ2 < occ1 + l1
                     if occ1 + l1 >= occ2 + l2:
-                        #print("ok")
+                        # print("ok")
                         break
-                    #print("not ok")
+                    # print("not ok")
                     id1 = lm.getid(lm.lits.referred, occ1, l1)
                     id2 = lm.getid(lm.lits.referred, occ2, l2)
                     wcnf.append([-id1, -id2])
 
+    rec.block("constraint (8)")
     # // end constraint (8) ###############################
 
-    for i in range(0, n):
-        for l in range(1, n - i + 1):
-            for d in range(0, n + 1):
-                lm.newid(lm.lits.depth, i, l, d)  # definition of depth_{i,l,d}
-
-    # // start constraint (9) ##############################
-    # すべての文字の深さ，および文字列の深さは0以上であり，nより小さい
-    for i in range(0,n):
-        wcnf.append([lm.getid(lm.lits.depth, i, 1, 0)])
-        wcnf.append([-lm.getid(lm.lits.depth, i, 1, n)])
-        # for l in range(1, n - i + 1):
-        #     wcnf.append([lm.getid(lm.lits.depth, i, l, 0)])
-        #     wcnf.append([-lm.getid(lm.lits.depth, i, l, n)])
-    # // end constraint (9) ###############################
-
-    # // start constraint (10) ##############################
-    # depth_{i,l,d}=1ならば，depth_{i,l,d-1}である
-    for i in range(0,n):
-        for d in range(1,n):
-            wcnf.append(pysat_if(lm.getid(lm.lits.depth, i, 1, d), lm.getid(lm.lits.depth, i, 1, d-1)))
-    
-    # # depth_{i,l,d}=1ならば，depth_{i,l,d-1}である
-    # for i in range(0,n):
-    #    for l in range(1, n - i + 1):
-    #        for d in range(1,n):
-    #            wcnf.append(pysat_if(lm.getid(lm.lits.depth, i, l, d), lm.getid(lm.lits.depth, i, l, d-1)))
-    # // end constraint (10) ###############################
-
-    # // start constraint (11) ##############################
-    #ともに同一のファクタ内に含まれるi-1, i番目の文字の深さは等しい
-    for i in range(1,n):
-        pos = lm.getid(lm.lits.pstart, i)
-        for d in range(0,n):
-            bwd_dpth = lm.getid(lm.lits.depth, i-1, 1, d)
-            fwd_dpth = lm.getid(lm.lits.depth, i, 1, d)
-            wcnf.append([pos, -bwd_dpth, fwd_dpth])
-            wcnf.append([pos, bwd_dpth, -fwd_dpth])
-
-            # memo
-            # -1->23+(-2)(-3)
-            # =1+23+(-2)(-3)
-            # =1+(23+(-2))(23+(-3))
-            # =1+((2+(-2))(3+(-2)))((2+(-3))(3+(-3)))
-            # =1+(3+(-2))(2+(-3))
-            # =(1+3+(-2))(1+2+(-3))
-
-    # // end constraint (11) ###############################
-
-    # // start constraint (12) ##############################
-    #文字列の深さは，その文字列に含まれる文字の深さの最大値に等しい
-    for i in range(0,n):
-        for l in range(1, n - i + 1):
-            for d in range(0,n):
-                str_dpth = lm.getid(lm.lits.depth, i, l, d)
-                chr_dpth = [lm.getid(lm.lits.depth, k, 1, d) for k in range(i, i + l)]
-                # (1->(2+3))((2+3)->1)
-                # =(-1+(2+3))((-2)(-3)+1)
-                # =(-1+2+3)(-2+1)(-3+1)
-                # wcnf.append([-id1] + [id for id in list1])
-                # for id in list1:
-                #     wcnf.append([id1, -id])
-                nvar, nclauses = pysat_or(lm.newid, chr_dpth)
-                # nvar:条件式の左辺を表すliteral
-                # nclauses:条件式の左辺の節を表す
-                wcnf.extend(nclauses)
-                wcnf.extend(pysat_iff(str_dpth, nvar))
-
-    # // end constraint (12) ###############################
-
-    # // start constraint (13) ##############################
-    #参照元の深さは参照先の深さより大きい
-    for (j, l) in refs_by_allreferred.keys():
-        for i in refs_by_allreferred[j, l]:
-            dref_id = lm.getid(lm.lits.dref, j, l, i)
+    # 非巡回性: 参照元の深さは参照先の深さより大きい
+    if depth_encoding == "bounded":
+        wcnf.extend(
+            bounded_depth_clauses(lm, n, refs_by_allreferred, compute_depth_bound(text))
+        )
+        rec.block("depth (bounded)")
+    elif depth_encoding == "binary":
+        wcnf.extend(
+            binary_depth_clauses(lm, n, refs_by_allreferred, compute_depth_bound(text))
+        )
+        rec.block("depth (binary)")
+    elif depth_encoding == "transitive":
+        wcnf.extend(transitive_clauses(lm, refs_by_allreferred))
+        rec.block("depth (transitive)")
+    else:
+        assert depth_encoding == "unary"
+        for i in range(0, n):
+            for l in range(1, n - i + 1):
+                for d in range(0, n + 1):
+                    lm.newid(lm.lits.depth, i, l, d)  # definition of depth_{i,l,d}
+        rec.phase("depth literal definition")
+
+        # // start constraint (9) ##############################
+        # すべての文字の深さ，および文字列の深さは0以上であり，nより小さい
+        for i in range(0, n):
+            wcnf.append([lm.getid(lm.lits.depth, i, 1, 0)])
+            wcnf.append([-lm.getid(lm.lits.depth, i, 1, n)])
+            # for l in range(1, n - i + 1):
+            #     wcnf.append([lm.getid(lm.lits.depth, i, l, 0)])
+            #     wcnf.append([-lm.getid(lm.lits.depth, i, l, n)])
+        rec.block("constraint (9)")
+        # // end constraint (9) ###############################
+
+        # // start constraint (10) ##############################
+        # depth_{i,l,d}=1ならば，depth_{i,l,d-1}である
+        for i in range(0, n):
+            for d in range(1, n):
+                wcnf.append(
+                    pysat_if(
+                        lm.getid(lm.lits.depth, i, 1, d),
+                        lm.getid(lm.lits.depth, i, 1, d - 1),
+                    )
+                )
+
+        # # depth_{i,l,d}=1ならば，depth_{i,l,d-1}である
+        # for i in range(0,n):
+        #    for l in range(1, n - i + 1):
+        #        for d in range(1,n):
+        #            wcnf.append(pysat_if(lm.getid(lm.lits.depth, i, l, d), lm.getid(lm.lits.depth, i, l, d-1)))
+        rec.block("constraint (10)")
+        # // end constraint (10) ###############################
+
+        # // start constraint (11) ##############################
+        # ともに同一のファクタ内に含まれるi-1, i番目の文字の深さは等しい
+        for i in range(1, n):
+            pos = lm.getid(lm.lits.pstart, i)
             for d in range(0, n):
-                referred_dpth = lm.getid(lm.lits.depth, j, l, d)
-                referrer_dpth = lm.getid(lm.lits.depth, i, 1, d + 1)
-                wcnf.append([-dref_id, -referred_dpth, referrer_dpth])
+                bwd_dpth = lm.getid(lm.lits.depth, i - 1, 1, d)
+                fwd_dpth = lm.getid(lm.lits.depth, i, 1, d)
+                wcnf.append([pos, -bwd_dpth, fwd_dpth])
+                wcnf.append([pos, bwd_dpth, -fwd_dpth])
 
                 # memo
-                # 1->(2->3)
-                # =1->(-2+3)
-                # =(-1)+((-2)+3)
-                # =(-1)+(-2)+3
+                # -1->23+(-2)(-3)
+                # =1+23+(-2)(-3)
+                # =1+(23+(-2))(23+(-3))
+                # =1+((2+(-2))(3+(-2)))((2+(-3))(3+(-3)))
+                # =1+(3+(-2))(2+(-3))
+                # =(1+3+(-2))(1+2+(-3))
+
+        rec.block("constraint (11)")
+        # // end constraint (11) ###############################
+
+        # // start constraint (12) ##############################
+        # 文字列の深さは，その文字列に含まれる文字の深さの最大値に等しい
+        for i in range(0, n):
+            for l in range(1, n - i + 1):
+                for d in range(0, n):
+                    str_dpth = lm.getid(lm.lits.depth, i, l, d)
+                    chr_dpth = [
+                        lm.getid(lm.lits.depth, k, 1, d) for k in range(i, i + l)
+                    ]
+                    # (1->(2+3))((2+3)->1)
+                    # =(-1+(2+3))((-2)(-3)+1)
+                    # =(-1+2+3)(-2+1)(-3+1)
+                    # wcnf.append([-id1] + [id for id in list1])
+                    # for id in list1:
+                    #     wcnf.append([id1, -id])
+                    nvar, nclauses = pysat_or(lm.newid, chr_dpth)
+                    # nvar:条件式の左辺を表すliteral
+                    # nclauses:条件式の左辺の節を表す
+                    wcnf.extend(nclauses)
+                    wcnf.extend(pysat_iff(str_dpth, nvar))
+
+        rec.block("constraint (12)")
+        # // end constraint (12) ###############################
+
+        # // start constraint (13) ##############################
+        # 参照元の深さは参照先の深さより大きい
+        for (j, l) in refs_by_allreferred.keys():
+            for i in refs_by_allreferred[j, l]:
+                dref_id = lm.getid(lm.lits.dref, j, l, i)
+                for d in range(0, n):
+                    referred_dpth = lm.getid(lm.lits.depth, j, l, d)
+                    referrer_dpth = lm.getid(lm.lits.depth, i, 1, d + 1)
+                    wcnf.append([-dref_id, -referred_dpth, referrer_dpth])
+
+                    # memo
+                    # 1->(2->3)
+                    # =1->(-2+3)
+                    # =(-1)+((-2)+3)
+                    # =(-1)+(-2)+3
 
-    # // end constraint (13) ############################### 
+        rec.block("constraint (13)")
+        # // end constraint (13) ###############################
 
     # lll = []
     # for i in range(len(wcnf.hard)):
@@ -716,9 +1045,8 @@ def smallest_CollageSystem_WCNF(text: bytes):
     #     for id in id_list:
     #         if id == wcnf.hard[i][0]:
     #             lll.append(wcnf.hard[i])
-                
 
-    '''
+    """
     # // start constraint (11) ##############################
     # 最初に出現した文字をファクタの開始位置とする
     for i in range(0, n):
@@ -730,7 +1058,7 @@ def smallest_CollageSystem_WCNF(text: bytes):
     wcnf.append([lm.getid(lm.lits.pstart, 0)])
     wcnf.append([lm.getid(lm.lits.pstart, n)])
     # // end constraint (11) ###############################
-    '''
+    """
 
     # soft clauses: minimize # of phrases
     # soft clauseの作成
@@ -739,7 +1067,16 @@ def smallest_CollageSystem_WCNF(text: bytes):
     for (j, l2) in refs_by_csreferred:
         for (i, l1) in refs_by_csreferred[j, l2]:
             wcnf.append([-lm.getid(lm.lits.csref, j, l2, i, l1)], weight=1)
-    return lm, wcnf, phrases, refs_by_slpreferrer, refs_by_rlreferrer, refs_by_csreferrer
+    rec.block("soft")
+    return (
+        lm,
+        wcnf,
+        phrases,
+        refs_by_slpreferrer,
+        refs_by_rlreferrer,
+        refs_by_csreferrer,
+    )
+
 
 # リストxとリストyの比較関数
 # 1を返す → そのまま，0を返す → 順番を変える
@@ -752,17 +1089,18 @@ def postorder_cmp(x, y):
     if i1 == i2 and i2 == j2:
         assert False
         # return 0
-    if j1 <= i2: # x < y
+    if j1 <= i2:  # x < y
         return -1
-    elif j2 <= i1: # y < x
+    elif j2 <= i1:  # y < x
         return 1
-    elif i1 <= i2 and j2 <= j1: # y \subset x(yはbの部分区間)
+    elif i1 <= i2 and j2 <= j1:  # y \subset x(yはbの部分区間)
         return 1
-    elif i2 <= i1 and j1 <= j2: # x \subset y
+    elif i2 <= i1 and j1 <= j2:  # x \subset y
         return -1
     else:
         assert False
 
+
 # given a list of nodes that in postorder of subtree rooted at root,
 # find the direct children of [root_i,root_j) and add it to slp
 # slp[j,l,i] is a list of nodes that are direct children of [i,j)
@@ -778,13 +1116,14 @@ def build_cs_aux(nodes, cs):
         # print(f"nodes[-1] = {nodes[-1]}")
         c = build_cs_aux(nodes, cs)
         children.append(c)
-    children.reverse() # 逆順に並び替える
+    children.reverse()  # 逆順に並び替える
     # assert len(children) <= 2
     cs[root] = children
     # print(f"cs[root] = {cs[root]}")
     ##########################################################
     return root
 
+
 # turn multi-ary tree into binary tree
 # 与えられた生成規則を基に復元する順番を決定する関数
 def binarize_cs(root, cs):
@@ -802,7 +1141,7 @@ def binarize_cs(root, cs):
         # children[1][2] = "RLrule" + str((children[1][1] - children[1][0]) / (children[0][1] - children[0][0])) + "times"
         # print(f"children_2 = {children[0][2]}")
         cs[root] = (binarize_cs(children[0], cs), binarize_cs(children[1], cs))
-    
+
     elif numc == 1:
         binarize_cs(children[0], cs)
 
@@ -819,6 +1158,7 @@ def binarize_cs(root, cs):
         cs[root] = None
     return root
 
+
 # csの生成規則から文字列を復元する関数
 def cs2str(root, cs):
     # print(f"root={root}")
@@ -831,14 +1171,16 @@ def cs2str(root, cs):
         children = cs[root]
         # print(f"root = {root}")
         # print(f"children = {children}")
-        if ref == None: # SLPの生成規則を表す内部ノードの場合
-            assert len(children) == 2 or (len(children) == 1 and children[0][2] == "RLrule")
-            if children[0][2]  == "RLrule" and len(children) == 1:
+        if ref == None:  # SLPの生成規則を表す内部ノードの場合
+            assert len(children) == 2 or (
+                len(children) == 1 and children[0][2] == "RLrule"
+            )
+            if children[0][2] == "RLrule" and len(children) == 1:
                 res += cs2str(children[0], cs)
             else:
                 res += cs2str(children[0], cs)
                 res += cs2str(children[1], cs)
-        elif ref == "RLrule": # 連帳圧縮ルール全体を表す内部ノードである場合
+        elif ref == "RLrule":  # 連帳圧縮ルール全体を表す内部ノードである場合
             assert len(children) == 2
             # print(f"children_RLrule = {children}")
             len_unit = children[0][1] - children[0][0]
@@ -846,7 +1188,7 @@ def cs2str(root, cs):
             for j in range(num_repeats):
                 res += cs2str(children[0], cs)
 
-        else: # 葉ノードの場合
+        else:  # 葉ノードの場合
             # print(f"root = {root}")
             # print(f"children_leaves = {children}")
             assert children == None
@@ -855,7 +1197,7 @@ def cs2str(root, cs):
                 for (refi, refj, refref) in cs.keys():
                     if ref[0] == refi and ref[1] == refj:
                         n = (refi, refj, refref)
-                        res += cs2str(n, cs)[ref[2]:ref[2]+(j-i)]
+                        res += cs2str(n, cs)[ref[2] : ref[2] + (j - i)]
                         break
             elif isinstance(ref, int):
                 for node in cs.keys():
@@ -866,37 +1208,66 @@ def cs2str(root, cs):
                 assert ref == "RestRL"
     return res
 
+
 # SLPの解析木の情報を保存
-def recover_cs(text: bytes, pstartl, refs_by_slpreferrer, refs_by_rlreferrer, refs_by_csreferrer):
+def recover_cs(
+    text: bytes, pstartl, refs_by_slpreferrer, refs_by_rlreferrer, refs_by_csreferrer
+):
     n = len(text)
     # 各区間に対応するノードの種類を分類
     # slpreferred = (参照先の開始位置，参照先の長さ)
-    slpreferred = set((refs_by_slpreferrer[i, l], l) for (i, l) in refs_by_slpreferrer.keys()) # 参照元の位置と長さを保持するタプルを生成
-    
+    slpreferred = set(
+        (refs_by_slpreferrer[i, l], l) for (i, l) in refs_by_slpreferrer.keys()
+    )  # 参照元の位置と長さを保持するタプルを生成
+
     # rliterated = (参照先の開始位置，参照元の位置，参照元の長さ)
-    rliterated = set((refs_by_rlreferrer[i, l], i, l) for (i, l) in refs_by_rlreferrer.keys())
+    rliterated = set(
+        (refs_by_rlreferrer[i, l], i, l) for (i, l) in refs_by_rlreferrer.keys()
+    )
 
     # csreferred = (参照先の開始位置，参照先の長さ)
-    csreferred = set((refs_by_csreferrer[i, l][0], refs_by_csreferrer[i, l][1]) for (i, l) in refs_by_csreferrer.keys()) # 参照元の位置と長さ
+    csreferred = set(
+        (refs_by_csreferrer[i, l][0], refs_by_csreferrer[i, l][1])
+        for (i, l) in refs_by_csreferrer.keys()
+    )  # 参照元の位置と長さ
 
     # ノードが内部ノードかつ蓮長圧縮ルール全体のノードとみなされていた場合，連長圧縮ルール全体のノードとして扱う
     # 繰り返しを表す区間が左に出現していた時発生する
 
     # （葉ノードが表す区間，参照先のノードの開始位置）
-    leaves = [(i, i + l, refs_by_slpreferrer[i, l]) for (i, l) in refs_by_slpreferrer.keys()]
+    leaves = [
+        (i, i + l, refs_by_slpreferrer[i, l]) for (i, l) in refs_by_slpreferrer.keys()
+    ]
     leaves.extend([(i, i + l, "RestRL") for (i, l) in refs_by_rlreferrer.keys()])
-    #切断規則は，（葉ノードが表す区間，（参照先の区間，参照する文字列の開始位置））
-    leaves.extend([(i, i + l, (refs_by_csreferrer[i, l][0], refs_by_csreferrer[i, l][0] + refs_by_csreferrer[i, l][1], refs_by_csreferrer[i, l][2])) for (i, l) in refs_by_csreferrer.keys()])
+    # 切断規則は，（葉ノードが表す区間，（参照先の区間，参照する文字列の開始位置））
+    leaves.extend(
+        [
+            (
+                i,
+                i + l,
+                (
+                    refs_by_csreferrer[i, l][0],
+                    refs_by_csreferrer[i, l][0] + refs_by_csreferrer[i, l][1],
+                    refs_by_csreferrer[i, l][2],
+                ),
+            )
+            for (i, l) in refs_by_csreferrer.keys()
+        ]
+    )
     for i in range(len(pstartl) - 1):
-        if pstartl[i + 1] - pstartl[i] == 1: # pstartl[i]が長さ1のファクタの開始位置の場合
+        if pstartl[i + 1] - pstartl[i] == 1:  # pstartl[i]が長さ1のファクタの開始位置の場合
             leaves.append((pstartl[i], pstartl[i + 1], text[pstartl[i]]))
 
-    internal = [(occ, occ + l, None) for (occ, l) in slpreferred] # 内部ノードが表す区間(SLP)
-    rlinternal = [(occ, i + l , "RLrule") for (occ, i, l) in rliterated] # 連長圧縮全体を表す内部ノードの区間(RLSLP)
-    csinternal = [(occ, occ + l2, None) for (occ, l2) in csreferred] # 切り取り規則を表す内部ノードの区間(CS)
-            # leaves = [(occ, j + l - i, None)]
-            # print(f"occ, j, l = {occ, j, l}")
-    
+    internal = [(occ, occ + l, None) for (occ, l) in slpreferred]  # 内部ノードが表す区間(SLP)
+    rlinternal = [
+        (occ, i + l, "RLrule") for (occ, i, l) in rliterated
+    ]  # 連長圧縮全体を表す内部ノードの区間(RLSLP)
+    csinternal = [
+        (occ, occ + l2, None) for (occ, l2) in csreferred
+    ]  # 切り取り規則を表す内部ノードの区間(CS)
+    # leaves = [(occ, j + l - i, None)]
+    # print(f"occ, j, l = {occ, j, l}")
+
     nodes = []
     # 葉ノードを追加
     for node in leaves:
@@ -912,8 +1283,6 @@ def recover_cs(text: bytes, pstartl, refs_by_slpreferrer, refs_by_rlreferrer, re
         else:
             nodes.append(node)
 
-    
-        
     # # 連長圧縮規則の右側の子ノードが切断規則によって参照されている場合，それを内部ノードとして扱う必要はない，なぜならファクタであることが確定しているから
     # for (ri, rl) in refs_by_rlreferrer.keys():
     #     for (csi, csl) in csreferred:
@@ -928,25 +1297,51 @@ def recover_cs(text: bytes, pstartl, refs_by_slpreferrer, refs_by_rlreferrer, re
     # print(f"csinternal = {csinternal}")
     # print(f"leaves = {leaves}")
     if len(nodes) > 1:
-        nodes.append((0, n, None)) # 根ノードを表す区間を追加
+        nodes.append((0, n, None))  # 根ノードを表す区間を追加
     # print(f"nodes={nodes}")
-    nodes.sort(key=functools.cmp_to_key(postorder_cmp)) # postorder_cmpの規則に従い，ソートする
+    nodes.sort(key=functools.cmp_to_key(postorder_cmp))  # postorder_cmpの規則に従い，ソートする
     cs = {}
     root = build_cs_aux(nodes, cs)
     binarize_cs(root, cs)
     return (root, cs)
 
+
 # 最小のSLPを計算,SLP分解したときの解析木を返す関数
-def smallest_CollageSystem(text: bytes, exp: Optional[SLPExp] = None) -> SLPType:
+def smallest_CollageSystem(
+    text: bytes,
+    exp: Optional[SLPExp] = None,
+    depth_encoding: str = "unary",
+    preprocess: bool = False,
+    engine_options: Optional[EngineOptions] = None,
+) -> SLPType:
     """
     Compute the smallest SLP.
     """
     total_start = time.time()
-    lm, wcnf, phrases, refs_by_slpreferrer, refs_by_rlreferrer, refs_by_csreferrer = smallest_CollageSystem_WCNF(text) # 条件式を生成
-    rc2 = RC2(wcnf) # MAX-SATを計算
+    profiling.start()
+    engine = create_engine(engine_options)  # MAX-SATのソルバ
+    (
+        lm,
+        wcnf,
+        phrases,
+        refs_by_slpreferrer,
+        refs_by_rlreferrer,
+        refs_by_csreferrer,
+    ), cache_status = instance_cache.build(
+        f"cs-{depth_encoding}",
+        encoding_version,
+        smallest_CollageSystem_WCNF,
+        text,
+        depth_encoding=depth_encoding,
+    )  # 条件式を生成 (キャッシュにあれば読み込む)
+    pre = WCNFPreprocessor(wcnf) if preprocess else None  # 条件式の簡約
+    engine.load(pre.run() if pre else wcnf)  # MAX-SATを計算
     time_prep = time.time() - total_start  # 前処理時間
-    #print("preparation complete\n")
-    sol_ = rc2.compute()    # MAX-SATの解を保持したint型のリストを返す．
+    # print("preparation complete\n")
+    with profiling.phase("solve"):
+        sol_ = engine.compute()  # MAX-SATの解を保持したint型のリストを返す．
+        if pre:
+            sol_ = pre.restore(sol_)  # 簡約前の変数の値に戻す
     assert sol_ is not None
     sol = set(sol_)
 
@@ -957,81 +1352,102 @@ def smallest_CollageSystem(text: bytes, exp: Optional[SLPExp] = None) -> SLPType
 
     n = len(text)
 
-    posl = []
-    for i in range(0, n + 1):
-        x = lm.getid(lm.lits.pstart, i)
-        if x in sol:
-            posl.append(i)
-    # print(f"posl={posl}")
-    phrasel = []
-    for (occ, l) in phrases:
-        x = lm.getid(lm.lits.phrase, occ, l)
-        if x in sol:
-            phrasel.append((occ, occ + l))
-    # print(f"phrasel={phrasel}")
-
-    # dref = {}
-
-    slprefs = {}
-    for (i, l) in refs_by_slpreferrer.keys():
-        for j in refs_by_slpreferrer[i, l]:
-            if lm.getid(lm.lits.slpref, j, i, l) in sol:
-                slprefs[i, l] = j
-                assert lm.getid(lm.lits.dref, j, l, i) in sol
-                # dref[j, l] = i
-    # print(f"slprefs={slprefs}")
-    # 連長圧縮ルールの参照先と参照元のデータを保存
-    rlrefs = {}
-    for (i, l) in refs_by_rlreferrer.keys():
-        for j in refs_by_rlreferrer[i, l]:
-            if lm.getid(lm.lits.rlref, j, i, l) in sol:
-                rlrefs[i, l] = j
-                assert lm.getid(lm.lits.dref, j, i - j, i) in sol
-                # dref[j, i - j] = i
-    # print(f"rlrefs={rlrefs}")
-    csrefs = {}
-    for (i, l1) in refs_by_csreferrer.keys():
-        for (j, l2) in refs_by_csreferrer[i, l1]:
-            if lm.getid(lm.lits.csref, j, l2, i, l1) in sol:
-                for k in range(j, j + l2 - l1 + 1):
-                    if text[i:i+l1] == text[k:k+l1]:
-                        csrefs[i, l1] = (j, l2, k-j)
-                assert lm.getid(lm.lits.dref, j, l2, i) in sol
-                # dref[j, l2] = i
-
-    # depth = {}
-    # for i in range(0, n):
-    #     for l in range(1, n - i + 1):
-    #         assert lm.getid(lm.lits.depth, i, l, 0) in sol
-    #         depth[i, l] = 0
-    #         for d in range(1, n):
-    #             if lm.getid(lm.lits.depth, i, l, d) in sol and d > depth[i, l]:
-    #                 depth[i, l] = d
-
-    # print(f"csrefs = {csrefs}")
-    # MAX-SATの解からcsを生成
-    root, cs = recover_cs(text, posl, slprefs, rlrefs, csrefs)
-    # print(f"root={root}, cs = {cs}, cskeys={cs.keys()}") 
-
-    cssize = len(posl) - 2 + len(set(text)) + len(csrefs) #分解数+文字の種類数+切断規則の数
+    with profiling.phase("decode"):
+        posl = []
+        for i in range(0, n + 1):
+            x = lm.getid(lm.lits.pstart, i)
+            if x in sol:
+                posl.append(i)
+        # print(f"posl={posl}")
+        phrasel = []
+        for (occ, l) in phrases:
+            x = lm.getid(lm.lits.phrase, occ, l)
+            if x in sol:
+                phrasel.append((occ, occ + l))
+        # print(f"phrasel={phrasel}")
+
+        # dref = {}
+
+        slprefs = {}
+        for (i, l) in refs_by_slpreferrer.keys():
+            for j in refs_by_slpreferrer[i, l]:
+                if lm.getid(lm.lits.slpref, j, i, l) in sol:
+                    slprefs[i, l] = j
+                    assert lm.getid(lm.lits.dref, j, l, i) in sol
+                    # dref[j, l] = i
+        # print(f"slprefs={slprefs}")
+        # 連長圧縮ルールの参照先と参照元のデータを保存
+        rlrefs = {}
+        for (i, l) in refs_by_rlreferrer.keys():
+            for j in refs_by_rlreferrer[i, l]:
+                if lm.getid(lm.lits.rlref, j, i, l) in sol:
+                    rlrefs[i, l] = j
+                    assert lm.getid(lm.lits.dref, j, i - j, i) in sol
+                    # dref[j, i - j] = i
+        # print(f"rlrefs={rlrefs}")
+        csrefs = {}
+        for (i, l1) in refs_by_csreferrer.keys():
+            for (j, l2) in refs_by_csreferrer[i, l1]:
+                if lm.getid(lm.lits.csref, j, l2, i, l1) in sol:
+                    for k in range(j, j + l2 - l1 + 1):
+                        if text[i : i + l1] == text[k : k + l1]:
+                            csrefs[i, l1] = (j, l2, k - j)
+                    assert lm.getid(lm.lits.dref, j, l2, i) in sol
+                    # dref[j, l2] = i
+
+        # depth = {}
+        # for i in range(0, n):
+        #     for l in range(1, n - i + 1):
+        #         assert lm.getid(lm.lits.depth, i, l, 0) in sol
+        #         depth[i, l] = 0
+        #         for d in range(1, n):
+        #             if lm.getid(lm.lits.depth, i, l, d) in sol and d > depth[i, l]:
+        #                 depth[i, l] = d
+
+        # print(f"csrefs = {csrefs}")
+        # MAX-SATの解からcsを生成
+        root, cs = recover_cs(text, posl, slprefs, rlrefs, csrefs)
+    # print(f"root={root}, cs = {cs}, cskeys={cs.keys()}")
+
+    cssize = len(posl) - 2 + len(set(text)) + len(csrefs)  # 分解数+文字の種類数+切断規則の数
     # print(cssize)
 
+    with profiling.phase("verify"):
+        check = bytes(cs2str(root, cs))
+
+        assert check == text
+
     if exp:
         exp.time_total = time.time() - total_start
         exp.time_prep = time_prep
         exp.factors = f"{(root, cs)}"
         exp.factor_size = cssize  # len(internal_nodes) + len(set(text))
         exp.fill(wcnf)
-        
-    check = bytes(cs2str(root, cs))
-
-    assert check == text
+        if pre is not None:
+            assert pre.reduced is not None
+            exp.fill_pre(pre.reduced, pre.time)
+        exp.instance_cache = cache_status
+        exp.engine = engine.options.name
+        exp.engine_options = engine.options.to_json()  # type: ignore
+        exp.lower_bound = engine.lower_bound + len(set(text)) - 1
+        if not engine.optimal:
+            exp.status = "anytime"
+        exp.profile = profiling.finish(engine.stats)
 
     return SLPType((root, cs))
 
 
+def algo_name(depth_encoding: str) -> str:
+    """
+    Name of the algorithm in the Exp record with the depth encoding.
+    """
+    return "cs-sat" if depth_encoding == "unary" else f"cs-sat-{depth_encoding}"
+
+
 def parse_args():
-    parser = argparse.ArgumentParser(description="Compute Minimum Internal Collage System.")
+    parser = argparse.ArgumentParser(
+        description="Compute Minimum Internal Collage System."
+    )
     parser.add_argument("--file", type=str, help="input file", default="")
     parser.add_argument("--str", type=str, help="input string", default="")
     parser.add_argument("--output", type=str, help="output file", default="")
@@ -1041,6 +1457,29 @@ def parse_args():
         help="exact size or upper bound of attractor size to search",
         default=0,
     )
+    parser.add_argument(
+        "--depth_encoding",
+        type=str,
+        help="encoding of the acyclicity of references, unary/bounded/binary/transitive",
+        choices=depth_encodings,
+        default="unary",
+    )
+    parser.add_argument(
+        "--amo_encoding",
+        type=str,
+        help="encoding of at-most-one constraints, " + "/".join(mysat.amo_encodings),
+        choices=mysat.amo_encodings,
+        default="auto",
+    )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="simplify the hard clauses before solving (see preprocess.py)",
+    )
+    add_engine_args(parser)
+    add_resource_args(parser)
+    instance_cache.add_cache_args(parser)
+    tracing.add_trace_args(parser)
     parser.add_argument(
         "--log_level",
         type=str,
@@ -1057,7 +1496,7 @@ def parse_args():
 
 if __name__ == "__main__":
     # print("start!")
-    args = parse_args() # 解析するデータの指定
+    args = parse_args()  # 解析するデータの指定
 
     if args.str != "":
         text = bytes(args.str, "utf-8")
@@ -1070,18 +1509,38 @@ if __name__ == "__main__":
     elif args.log_level == "CRITICAL":
         logger.setLevel(CRITICAL)
 
-    exp = SLPExp.create() # 出力したいフォーマットの作成
-    exp.algo = "cs-sat"
+    exp = SLPExp.create()  # 出力したいフォーマットの作成
+    exp.algo = algo_name(args.depth_encoding)
+    mysat.amo_encoding = args.amo_encoding
+    instance_cache.configure(args)
+    tracing.configure(args)
+    if args.amo_encoding != "auto":
+        exp.algo += f"-amo-{args.amo_encoding}"
+    if args.engine != "rc2":
+        exp.algo += f"-{args.engine}"
     exp.file_name = os.path.basename(args.file)
     exp.file_len = len(text)
+    # 推定メモリが上限を超えるなら終了するか, より小さいdepthの符号化に切り替える
+    depth_encoding = apply_memory_cap(
+        args, exp, "cs_solver", text, f"cs-{args.depth_encoding}"
+    )[len("cs-") :]
+    exp.algo = (
+        algo_name(depth_encoding) + exp.algo[len(algo_name(args.depth_encoding)) :]
+    )
+
+    try:
+        collageSystem = smallest_CollageSystem(
+            text, exp, depth_encoding, args.preprocess, engine_options_from_args(args)
+        )  # SLPの最小サイズを計算
+    except MemoryError:
+        exit_with_status(exp, "oom", args.output)
 
-    collageSystem = smallest_CollageSystem(text, exp) # SLPの最小サイズを計算
-    
     if args.output == "":
         print(exp.to_json(ensure_ascii=False))  # type: ignore
     else:
         with open(args.output, "w") as f:
             json.dump(exp, f, ensure_ascii=False)
+    tracing.save(args.trace, exp.algo, file=exp.file_name, status=exp.status)
 
     # if args.output == "":
     #     with open("csdot", "w") as f:
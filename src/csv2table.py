@@ -1,5 +1,6 @@
 import csv
 import sys
+from typing import List
 
 table_template = """
 \\begin{{tabular}}{{{}}}
@@ -10,42 +11,50 @@ table_template = """
 """
 
 
-def main(fname: str, vtype: str):
+def latex_table(header: List[str], rows: List[List[str]], vtype: str) -> str:
+    """
+    LaTeX table of the rows of a benchmark CSV (see report.py), with the times formatted if `vtype` is "float".
+    """
     assert vtype == "str" or vtype == "float"
+    header = list(header)
     res = []
-    # header = ''
-    with open(fname) as csvfile:
-        reader = csv.reader(csvfile)
-        header = next(reader)
-        # header.pop(1)
-        header[1] = "len"
-        header[2] = "lz77"
-        header[-2] = "SA"
-        header[-1] = "BMS"
-        res.append(" & ".join(header))
-        for row in reader:
-            row[0] = row[0].split("-")[0]
-            row[0] = row[0].split(".txt")[0]
-            # row.pop(1)
-            line = [row[0], row[1]]
-            for elm in row[2:]:
-                if elm.startswith("timeout"):
-                    line.append("T")
-                elif elm.startswith("error"):
-                    line.append("M")
-                else:
-                    try:
-                        if vtype == "float":
-                            line.append("{:.4f}".format(float(elm)))
-                        else:
-                            line.append(elm)
-                    except Exception:
+    # header.pop(1)
+    header[1] = "len"
+    header[2] = "lz77"
+    header[-2] = "SA"
+    header[-1] = "BMS"
+    res.append(" & ".join(header))
+    for row in rows:
+        row = list(row)
+        row[0] = row[0].split("-")[0]
+        row[0] = row[0].split(".txt")[0]
+        # row.pop(1)
+        line = [row[0], row[1]]
+        for elm in row[2:]:
+            if elm.startswith("timeout"):
+                line.append("T")
+            elif elm.startswith("error") or elm in ["oom", "memory-cap"]:
+                line.append("M")
+            else:
+                try:
+                    if vtype == "float":
+                        line.append("{:.4f}".format(float(elm)))
+                    else:
                         line.append(elm)
+                except Exception:
+                    line.append(elm)
 
-            res.append(" & ".join(line))
+        res.append(" & ".join(line))
     table_format = "|{}|".format("|".join(["c" for _ in header]))
     table_body = " \\\\ \\hline\n".join(res)
-    print(table_template.format(table_format, table_body))
+    return table_template.format(table_format, table_body)
+
+
+def main(fname: str, vtype: str):
+    with open(fname) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        print(latex_table(header, list(reader), vtype))
 
 
 def size_table(fname):
@@ -0,0 +1,225 @@
+# Cache of built formulas on disk, so that runs on the same text with other engines, options or
+# --contains lists skip building the WCNF.
+#
+# An instance is the result of a builder (e.g. smallest_SLP_WCNF: the literal manager, the ClauseStore
+# and the lists needed to decode a model), pickled and compressed with zlib, where the arrays of the
+# ClauseStore and the literal blocks are kept as raw machine values.
+# The clause counts of the constraint families recorded while building (see profiling.py) are stored with it.
+# It is keyed by the name of the encoding, its version, a hash of the code building it, the global options
+# of mysat and a hash of the text. The solvers bump `encoding_version` when their formulas change, and the
+# code hash covers the source of the module of the builder and of the shared modules in `formula_modules`,
+# so that a change of a helper is never served stale instances. Storing an instance removes the instances
+# of other versions or code of the encoding. The least recently used instances are evicted when the
+# total size exceeds the limit. Instances are readable according to the umask, so that a cache directory
+# can be shared by users.
+
+import argparse
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import pickle
+import sys
+import tempfile
+import zlib
+from enum import Enum
+from typing import Any, Callable, Dict, List, Tuple
+
+import mysat
+import profiling
+
+# directory of the cache ("" to disable it) and limit of its total size (MB), set by configure
+cache_dir = ""
+max_size = 4096.0
+
+suffix = ".inst"
+# version of the format of the stored instances, hashed in their paths
+format_version = 2
+# modules building parts of the formulas for the builders (cs_solver uses the clauses of rlslp_solver)
+formula_modules = [
+    "mysat",
+    "boolexpr",
+    "clause_store",
+    "interval_index",
+    "stralgo",
+    "lz77",
+    "rlslp_solver",
+]
+# code hash of the builders by their module
+code_hashes: Dict[str, str] = {}
+
+
+class _Pickler(pickle.Pickler):
+    """
+    Classes and enum members of the module of the builder are pickled by name, and resolved in the
+    module of the builder when loaded, since it is __main__ when the solver runs as a program.
+    """
+
+    def __init__(self, file, module: str):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.module = module
+
+    def persistent_id(self, obj):
+        if isinstance(obj, type) and obj.__module__ == self.module:
+            return ("class", obj.__qualname__)
+        if isinstance(obj, Enum) and type(obj).__module__ == self.module:
+            return ("enum", type(obj).__qualname__, obj.name)
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, module: str):
+        super().__init__(file)
+        self.module = sys.modules[module]
+
+    def persistent_load(self, pid):
+        cls = getattr(self.module, pid[1])
+        return cls if pid[0] == "class" else cls[pid[2]]
+
+
+def configure(args: argparse.Namespace):
+    global cache_dir, max_size
+    cache_dir = args.instance_cache
+    max_size = args.instance_cache_size
+
+
+def add_cache_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--instance_cache",
+        type=str,
+        help="directory to cache built formulas in, which are reused for the same text and encoding (none if empty)",
+        default="",
+    )
+    parser.add_argument(
+        "--instance_cache_size",
+        type=float,
+        help="limit of the total size (MB) of the instance cache, over which the least recently used instances are removed",
+        default=4096,
+    )
+
+
+def code_hash(module: str) -> str:
+    """
+    Hash of the source of the module of a builder and of `formula_modules`.
+    """
+    if module not in code_hashes:
+        # the module of the builder is __main__ when the solver runs as a program
+        files = [getattr(sys.modules[module], "__file__", None)]
+        for name in formula_modules:
+            spec = importlib.util.find_spec(name)
+            files.append(spec.origin if spec is not None else None)
+        h = hashlib.sha256()
+        for file in files:
+            if file is not None:
+                with open(file, "rb") as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+        code_hashes[module] = h.hexdigest()[:12]
+    return code_hashes[module]
+
+
+def instance_path(name: str, tag: str, text: bytes, params: dict) -> str:
+    h = hashlib.sha256()
+    h.update(
+        json.dumps(
+            [params, mysat.amo_encoding, format_version], sort_keys=True
+        ).encode()
+    )
+    h.update(text if isinstance(text, bytes) else text.encode())
+    return os.path.join(cache_dir, f"{name}-{tag}-{h.hexdigest()[:32]}{suffix}")
+
+
+def load(path: str, module: str) -> Any:
+    with open(path, "rb") as f:
+        data = zlib.decompress(f.read())
+    # mark it as recently used
+    os.utime(path)
+    return _Unpickler(io.BytesIO(data), module).load()
+
+
+def store(path: str, res: Any, module: str):
+    buf = io.BytesIO()
+    _Pickler(buf, module).dump(res)
+    data = zlib.compress(buf.getbuffer(), 1)
+    # written to a temporary file and renamed, so that concurrent runs never read partial instances
+    (fd, tmp) = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    # mkstemp creates files readable only by the owner
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp, 0o666 & ~umask)
+    os.replace(tmp, path)
+
+
+def invalidate(name: str, tag: str):
+    """
+    Remove the instances of the encoding `name` of versions or code other than `tag`.
+    """
+    prefix = f"{name}-v"
+    for file in os.listdir(cache_dir):
+        if (
+            file.startswith(prefix)
+            and file.endswith(suffix)
+            and not file.startswith(f"{name}-{tag}-")
+        ):
+            remove(os.path.join(cache_dir, file))
+
+
+def evict():
+    """
+    Remove the least recently used instances until the total size is at most max_size.
+    """
+    entries: List[Tuple[float, int, str]] = []
+    for file in os.listdir(cache_dir):
+        if not file.endswith(suffix):
+            continue
+        path = os.path.join(cache_dir, file)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for (_, size, _) in entries)
+    for (_, size, path) in sorted(entries):
+        if total <= max_size * 1024 * 1024:
+            break
+        remove(path)
+        total -= size
+
+
+def remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        # removed by a concurrent run
+        pass
+
+
+def build(
+    name: str, version: int, builder: Callable, text: bytes, **params
+) -> Tuple[Any, str]:
+    """
+    Return `builder(text, **params)` and the status of the cache: "hit", "miss" or "" if disabled.
+    """
+    if cache_dir == "":
+        return (builder(text, **params), "")
+    os.makedirs(cache_dir, exist_ok=True)
+    tag = f"v{version}-{code_hash(builder.__module__)}"
+    path = instance_path(name, tag, text, params)
+    try:
+        with profiling.phase("load instance"):
+            (res, families) = load(path, builder.__module__)
+        profiling.current.families.update(families)
+        return (res, "hit")
+    except FileNotFoundError:
+        pass
+    except (zlib.error, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+        # written by a different code of the same version
+        remove(path)
+    res = builder(text, **params)
+    with profiling.phase("store instance"):
+        invalidate(name, tag)
+        store(path, (res, profiling.current.families), builder.__module__)
+        evict()
+    return (res, "miss")
@@ -0,0 +1,64 @@
+from bisect import insort
+from collections import defaultdict
+from typing import Dict, Iterator, List, Set, Tuple
+
+
+class IntervalIndex:
+    """
+    Set of candidate intervals (i, l), each representing T[i:i+l).
+
+    Membership is answered by a set in O(1), and the intervals can also be
+    iterated by start position (lengths in increasing order) or by length.
+    Iterating the index itself yields the intervals in insertion order.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.intervals: Set[Tuple[int, int]] = set()
+        self.order: List[Tuple[int, int]] = []
+        self.by_start: List[List[int]] = [[] for _ in range(n + 1)]
+        self.by_length: Dict[int, List[int]] = defaultdict(list)
+
+    def add(self, i: int, l: int) -> bool:
+        """
+        Add interval (i, l). Returns False if it is already registered.
+        """
+        if (i, l) in self.intervals:
+            return False
+        assert 0 <= i < i + l <= self.n
+        self.intervals.add((i, l))
+        self.order.append((i, l))
+        insort(self.by_start[i], l)
+        self.by_length[l].append(i)
+        return True
+
+    def update(self, intervals) -> None:
+        for (i, l) in intervals:
+            self.add(i, l)
+
+    def __contains__(self, interval) -> bool:
+        return interval in self.intervals
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return iter(self.order)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def starting_at(self, i: int) -> List[int]:
+        """
+        Lengths of the intervals beginning at `i` in increasing order.
+        """
+        return self.by_start[i]
+
+    def of_length(self, l: int) -> List[int]:
+        """
+        Start positions of the intervals of length `l` in insertion order.
+        """
+        return self.by_length.get(l, [])
+
+    def lengths(self) -> List[int]:
+        """
+        All lengths that occur in the index in increasing order.
+        """
+        return sorted(self.by_length.keys())
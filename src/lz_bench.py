@@ -6,14 +6,16 @@ import argparse
 import datetime
 import os
 import sqlite3
-import subprocess
 import sys
 import time
-from dataclasses import asdict, dataclass
-from typing import List
+from dataclasses import dataclass
 
 from joblib import Parallel, delayed
 
+import accounting
+import results_db
+from results_db import Job, Progress, ResultsWriter
+
 dbname = "out/satcomp.db"
 dbtable = "lz_bench"
 
@@ -30,13 +32,18 @@ class LZExp:
     file_len: int
     time_total: float
     factor_size: int
+    # CPU seconds in user and system mode, peak RSS (MB) and exit code of the job of a benchmark (see accounting.py)
+    cpu_user: float = 0.0
+    cpu_sys: float = 0.0
+    max_rss: float = 0.0
+    exit_code: int = 0
 
     @classmethod
     def create(cls):
         return LZExp("", "", "", "", 0, 0, 0)
 
 
-def benchmark_program(timeout, algo, file) -> List[str]:
+def benchmark_program(timeout, algo, file) -> LZExp:
     """
     Run program with given setting (timeout, algo, file).
     """
@@ -54,17 +61,20 @@ def benchmark_program(timeout, algo, file) -> List[str]:
     print(" ".join(cmd))
     num_factor = 0
     time_start = time.time()
-    try:
-        out = subprocess.check_output(cmd, shell=False, timeout=timeout)
-        res_pre = b"The number of factors : "
-        res_beg = out.find(res_pre) + len(res_pre)
-        res_end = out.find(b"\n", res_beg)
-        num_factor = int(out[res_beg:res_end])
-        status = "complete"
-    except subprocess.TimeoutExpired:
+    (out, usage, timed_out) = accounting.run(cmd, timeout)
+    if timed_out:
         status = f"timeout-{timeout}"
-    except Exception:
-        status = "error"
+    elif usage.exit_code != 0:
+        status = accounting.classify(usage, False)
+    else:
+        try:
+            res_pre = b"The number of factors : "
+            res_beg = out.find(res_pre) + len(res_pre)
+            res_end = out.find(b"\n", res_beg)
+            num_factor = int(out[res_beg:res_end])
+            status = "complete"
+        except ValueError:
+            status = "crash"
 
     exp = LZExp(
         str(datetime.datetime.now()),
@@ -75,50 +85,46 @@ def benchmark_program(timeout, algo, file) -> List[str]:
         time.time() - time_start,
         num_factor,
     )
-
-    expd = exp.__dict__
-    return list(map(str, expd.values()))
+    accounting.fill_usage(exp, usage)
+    return exp
 
 
-def benchmark_mul(timeout, algos, files, out_file, n_jobs):
+def benchmark_mul(timeout, algos, files, out_file, n_jobs, retry_failed=False):
     """
-    Run benchmark program with multiple processes
+    Run benchmark program with multiple threads, each waiting for a program.
+    Jobs run before with the same timeout are skipped, unless they failed and `retry_failed`.
     """
     if os.path.exists(out_file):
         os.remove(out_file)
-    queries = Parallel(n_jobs=n_jobs)(
-        [
-            delayed(benchmark_program)(timeout, algo, file)
-            for file in files
-            for algo in algos
-        ]
-    )
-    con = sqlite3.connect(dbname)
-    cur = con.cursor()
-    expd = LZExp.create().__dict__  # asdict dowsn't work, I don't know the reason
-    n = len(expd.keys())
-    cur.executemany(
-        f"INSERT INTO {dbtable} VALUES ({', '.join('?' for _ in range(n))})",
-        queries,  # type: ignore
+    writer = ResultsWriter(dbtable, LZExp, dbname)
+    todo = [
+        (Job(algo, os.path.basename(file), 0, timeout or 0), file)
+        for file in files
+        for algo in algos
+    ]
+    todo = [(job, file) for (job, file) in todo if not writer.done(job, retry_failed)]
+    print(
+        f"{len(files) * len(algos) - len(todo)} jobs are done in previous runs, {len(todo)} jobs to run"
     )
-    con.commit()
+    progress = Progress([job for (job, _) in todo], writer.past, n_jobs)
+
+    def run(job, file):
+        exp = benchmark_program(timeout, job.algo, file)
+        writer.put(exp, job, exp.time_total)
+        progress.finish(job, exp.status, exp.time_total)
+
+    # threads waiting for the programs put the results to the writer
+    with writer:
+        Parallel(n_jobs=n_jobs, backend="threading")(
+            [delayed(run)(job, file) for (job, file) in todo]
+        )
 
 
 def clear_table(table_name):
     """
     Delete table if exists, and create new table.
     """
-    con = sqlite3.connect(dbname)
-    cur = con.cursor()
-    exp = LZExp.create()
-    expd = asdict(exp)
-
-    try:
-        cur.execute(f"DROP TABLE {table_name}")
-    except sqlite3.OperationalError:
-        pass
-    cur.execute(f"CREATE TABLE {table_name} ({', '.join(key for key in expd.keys())})")
-    con.commit()
+    results_db.clear_table(table_name, LZExp, dbname)
 
 
 def export_csv(table_name, out_file):
@@ -143,6 +149,16 @@ def parse_args():
         default=60,
     )
     parser.add_argument("--output", type=str, help="output file", default="")
+    parser.add_argument(
+        "--retry_failed",
+        action="store_true",
+        help="run again the jobs that failed or timed out in previous runs, which are skipped otherwise",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="delete the results of previous runs and run all jobs",
+    )
     parser.add_argument("--n_jobs", type=int, help="number of jobs", default=2)
     parser.add_argument("--files", nargs="*", help="files", default=[])
 
@@ -156,9 +172,12 @@ def parse_args():
 
 
 def main():
-    clear_table(dbtable)
     args = parse_args()
-    benchmark_mul(args.timeout, algos, args.files, args.output, args.n_jobs)
+    if args.restart:
+        clear_table(dbtable)
+    benchmark_mul(
+        args.timeout, algos, args.files, args.output, args.n_jobs, args.retry_failed
+    )
     export_csv(dbtable, args.output)
 
 
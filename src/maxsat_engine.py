@@ -0,0 +1,457 @@
+# MaxSAT engines used by the solvers to compute an optimal model of a WCNF.
+# An engine is chosen by EngineOptions, which is also recorded in the Exp JSON (engine, engine_options).
+# With a time budget, an engine stops at the deadline and returns the best model found so far
+# together with a lower bound of the optimal cost (anytime solving).
+#
+# As a command, this runs an engine on a WCNF file and prints the result in the standard MaxSAT
+# evaluation format, e.g. python src/maxsat_engine.py --engine lsu formula.wcnf
+
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Type, Union
+
+from dataclasses_json import dataclass_json
+from pysat.examples.fm import FM
+from pysat.examples.lsu import LSU
+from pysat.examples.rc2 import RC2, RC2Stratified
+from pysat.formula import WCNF
+
+from clause_store import ClauseStore
+from profiling import EngineStats
+
+
+@dataclass_json
+@dataclass
+class EngineOptions:
+    # one of `engines`
+    name: str = "rc2"
+    # SAT solver used by rc2, rc2-stratified, lsu and fm (a name of pysat.solvers.SolverNames)
+    sat_solver: str = "g3"
+    # options of rc2 and rc2-stratified
+    adapt: bool = False
+    exhaust: bool = False
+    minz: bool = False
+    # command line of the external MaxSAT solver, the path of the WCNF file is appended
+    command: str = ""
+    # seconds from the start of the search (compute) until it is stopped (0 for no limit)
+    time_budget: float = 0.0
+
+
+class TimeBudgetExceeded(Exception):
+    pass
+
+
+class MaxSATEngine:
+    """
+    Compute an optimal model of a WCNF.
+
+    `load` loads the WCNF into the engine (e.g. the clauses into the SAT oracle of RC2), which the solvers
+    count in their preparation time, and `compute` searches a model of the loaded WCNF.
+    `compute` returns the model as a list of literals, or None if the hard clauses are unsatisfiable,
+    and sets `cost` to the total weight of the falsified soft clauses.
+    `stats` counts the cores, the calls of the SAT oracle and the time in it (not counted by fm and external).
+    If the time budget runs out, `optimal` is set to False, the best model found so far is returned
+    and `lower_bound` is the best lower bound of the optimal cost; otherwise `lower_bound` is `cost`.
+    The first model is searched without limit, except by the external engine, which raises
+    TimeBudgetExceeded if it is stopped before finding a model.
+    """
+
+    def __init__(self, options: EngineOptions):
+        self.options = options
+        self.start = time.time()
+        self.wcnf: Optional[Union[WCNF, ClauseStore]] = None
+        self.cost = 0
+        self.lower_bound = 0
+        self.optimal = True
+        self.stats = EngineStats()
+
+    def load(self, wcnf: Union[WCNF, ClauseStore]):
+        self.wcnf = wcnf
+
+    def compute(
+        self, wcnf: Optional[Union[WCNF, ClauseStore]] = None
+    ) -> Optional[List[int]]:
+        """
+        Compute an optimal model of the loaded WCNF, or of `wcnf` after loading it.
+        The time budget starts here, after loading.
+        """
+        if wcnf is not None:
+            self.load(wcnf)
+        assert self.wcnf is not None, "no WCNF is loaded"
+        self.start = time.time()
+        return self.search(self.wcnf)
+
+    def search(self, wcnf: Union[WCNF, ClauseStore]) -> Optional[List[int]]:
+        raise NotImplementedError
+
+    def remaining(self) -> float:
+        return max(0.0, self.start + self.options.time_budget - time.time())
+
+    def instrument(self, oracle):
+        """
+        Count the calls of `oracle` (pysat.solvers.Solver) and the time spent in them in `stats`.
+        It must be called before `limit`.
+        """
+        stats = self.stats
+
+        def counted(call):
+            def solve(*args, **kwargs):
+                begin = time.time()
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    stats.oracle_calls += 1
+                    stats.oracle_time += time.time() - begin
+
+            return solve
+
+        oracle.solve = counted(oracle.solve)
+        oracle.solve_limited = counted(oracle.solve_limited)
+
+    def limit(self, oracle) -> threading.Timer:
+        """
+        Make the SAT calls of `oracle` (pysat.solvers.Solver) raise TimeBudgetExceeded at the deadline.
+        The first call is not limited, so that there is a model to report.
+        The returned timer must be cancelled after solving.
+        """
+        expired = threading.Event()
+        solve_limited = oracle.solve_limited
+        ncalls = [0]
+
+        def solve(assumptions=[], expect_interrupt=False):
+            ncalls[0] += 1
+            if ncalls[0] == 1:
+                return solve_limited(assumptions=assumptions)
+            if expired.is_set():
+                raise TimeBudgetExceeded
+            res = solve_limited(assumptions=assumptions, expect_interrupt=True)
+            if res is None and expired.is_set():
+                raise TimeBudgetExceeded
+            return res
+
+        def interrupt():
+            expired.set()
+            # the flag of the solver is not cleared by the next call, so the first call is not interrupted
+            if ncalls[0] > 1:
+                oracle.interrupt()
+
+        # both are replaced as the MaxSAT algorithms call either of them depending on the version of pysat
+        oracle.solve = solve
+        oracle.solve_limited = solve
+        timer = threading.Timer(self.remaining(), interrupt)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def set_incumbent(
+        self, wcnf: Union[WCNF, ClauseStore], model: List[int]
+    ) -> List[int]:
+        sol = [x for x in model if abs(x) <= wcnf.nv]
+        solset = set(sol)
+        self.cost = sum(
+            w
+            for (clause, w) in zip(wcnf.soft, wcnf.wght)
+            if not any(x in solset for x in clause)
+        )
+        self.optimal = self.cost <= self.lower_bound
+        return sol
+
+
+class RC2Engine(MaxSATEngine):
+    rc2 = RC2
+
+    def load(self, wcnf: Union[WCNF, ClauseStore]):
+        super().load(wcnf)
+        opts = self.options
+        self.maxsat = self.rc2(
+            wcnf,
+            solver=opts.sat_solver,
+            adapt=opts.adapt,
+            exhaust=opts.exhaust,
+            minz=opts.minz,
+        )
+        self.instrument(self.maxsat.oracle)
+
+    def search(self, wcnf: Union[WCNF, ClauseStore]) -> Optional[List[int]]:
+        opts = self.options
+        with self.maxsat as rc2:
+            process_core = rc2.process_core
+
+            def count_core():
+                self.stats.cores += 1
+                process_core()
+
+            rc2.process_core = count_core
+            if opts.time_budget <= 0:
+                sol = rc2.compute()
+                self.cost = self.lower_bound = rc2.cost
+                return sol
+            timer = self.limit(rc2.oracle)
+            incumbent = None
+            try:
+                # a first model of the hard clauses, preferring to satisfy the soft clauses
+                # (selectors of unit soft clauses are their literals)
+                rc2.oracle.set_phases(literals=rc2.sels)
+                if not rc2.oracle.solve():
+                    return None
+                incumbent = rc2.oracle.get_model()
+                sol = rc2.compute()
+                self.cost = self.lower_bound = rc2.cost
+                return sol
+            except TimeBudgetExceeded:
+                # the first call of the oracle is not limited, so there is a model
+                assert incumbent is not None
+                # the cost of the cores found so far is a lower bound
+                self.lower_bound = rc2.cost
+                return self.set_incumbent(wcnf, incumbent)
+            finally:
+                timer.cancel()
+
+
+class RC2StratifiedEngine(RC2Engine):
+    rc2 = RC2Stratified
+
+
+class LSUEngine(MaxSATEngine):
+    def load(self, wcnf: Union[WCNF, ClauseStore]):
+        super().load(wcnf)
+        # all the soft clauses of the solvers have weight 1
+        assert all(
+            w == 1 for w in wcnf.wght
+        ), "lsu supports only unweighted soft clauses"
+        # LSU appends selectors to the soft clauses, so they are copied
+        formula = WCNF()
+        formula.hard = wcnf.hard
+        formula.soft = [list(clause) for clause in wcnf.soft]
+        formula.wght = list(wcnf.wght)
+        formula.nv = wcnf.nv
+        self.lsu = LSU(formula, solver=self.options.sat_solver)
+        self.instrument(self.lsu.oracle)
+
+    def search(self, wcnf: Union[WCNF, ClauseStore]) -> Optional[List[int]]:
+        lsu = self.lsu
+        if self.options.time_budget <= 0:
+            if not lsu.solve():
+                return None
+            self.cost = self.lower_bound = lsu.cost
+            return lsu.model
+        timer = self.limit(lsu.oracle)
+        try:
+            if not lsu.solve():
+                return None
+            self.cost = self.lower_bound = lsu.cost
+            return lsu.model
+        except TimeBudgetExceeded:
+            # LSU only improves upper bounds, from the model of the first call, which is not limited
+            assert lsu.model is not None
+            return self.set_incumbent(wcnf, lsu.model)
+        finally:
+            timer.cancel()
+
+
+class FMEngine(MaxSATEngine):
+    def load(self, wcnf: Union[WCNF, ClauseStore]):
+        super().load(wcnf)
+        # FM adds clauses to its copy of the hard clauses, so they must be a list
+        formula = WCNF()
+        formula.hard = list(wcnf.hard)
+        formula.soft = wcnf.soft
+        formula.wght = wcnf.wght
+        formula.nv = wcnf.nv
+        # FM creates a new SAT solver at every iteration, which cannot be limited as the others
+        assert self.options.time_budget <= 0, "fm does not support time_budget"
+        self.fm = FM(formula, solver=self.options.sat_solver, verbose=0)
+
+    def search(self, wcnf: Union[WCNF, ClauseStore]) -> Optional[List[int]]:
+        fm = self.fm
+        if not fm.compute():
+            return None
+        self.cost = self.lower_bound = fm.cost
+        return fm.model
+
+
+class ExternalEngine(MaxSATEngine):
+    """
+    Run a MaxSAT solver that reads a DIMACS WCNF file and prints "s", "o" and "v" lines.
+    The "v" line may be either a list of literals or a string of 0/1 values of variables.
+    At the deadline, the solver is terminated by SIGTERM, on which MaxSAT solvers usually
+    print the best model found so far. No lower bound is known in that case.
+    """
+
+    def search(self, wcnf: Union[WCNF, ClauseStore]) -> Optional[List[int]]:
+        assert (
+            self.options.command != ""
+        ), "the command of the external engine is not given"
+        fd, path = tempfile.mkstemp(suffix=".wcnf")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                if isinstance(wcnf, ClauseStore):
+                    wcnf.write_dimacs(fp)
+                else:
+                    wcnf.to_fp(fp)
+            proc = subprocess.Popen(
+                shlex.split(self.options.command) + [path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            try:
+                (out, err) = proc.communicate(
+                    timeout=self.remaining() if self.options.time_budget > 0 else None
+                )
+            except subprocess.TimeoutExpired:
+                proc.terminate()
+                try:
+                    (out, err) = proc.communicate(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    (out, err) = proc.communicate()
+        finally:
+            os.remove(path)
+        return self.parse_output(out, wcnf, err)
+
+    def parse_output(
+        self, out: str, wcnf: Union[WCNF, ClauseStore], err: str = ""
+    ) -> Optional[List[int]]:
+        status = ""
+        cost = None
+        values: List[str] = []
+        for line in out.splitlines():
+            if line.startswith("s "):
+                status = line[2:].strip()
+            elif line.startswith("o "):
+                cost = int(line[2:])
+            elif line.startswith("v "):
+                values.extend(line[2:].split())
+        if status == "UNSATISFIABLE":
+            return None
+        if (
+            len(values) == 0
+            and status != "OPTIMUM FOUND"
+            and self.options.time_budget > 0
+        ):
+            raise TimeBudgetExceeded
+        if (
+            status not in ["OPTIMUM FOUND", "SATISFIABLE", "UNKNOWN", ""]
+            or len(values) == 0
+        ):
+            raise RuntimeError(
+                f"external MaxSAT solver failed: {self.options.command}\n{out}{err}"
+            )
+        if len(values) == 1 and set(values[0]) <= set("01"):
+            # new format of MaxSAT evaluations: value of variable i+1 at position i
+            sol = [i + 1 if b == "1" else -(i + 1) for (i, b) in enumerate(values[0])]
+        else:
+            sol = [int(x) for x in values if x != "0"]
+        if status != "OPTIMUM FOUND":
+            return self.set_incumbent(wcnf, sol)
+        sol = [x for x in sol if abs(x) <= wcnf.nv]
+        if cost is None:
+            solset = set(sol)
+            cost = sum(
+                w
+                for (clause, w) in zip(wcnf.soft, wcnf.wght)
+                if not any(x in solset for x in clause)
+            )
+        self.cost = self.lower_bound = cost
+        return sol
+
+
+engines: Dict[str, Type[MaxSATEngine]] = {
+    "rc2": RC2Engine,
+    "rc2-stratified": RC2StratifiedEngine,
+    "lsu": LSUEngine,
+    "fm": FMEngine,
+    "external": ExternalEngine,
+}
+
+
+def create_engine(options: Optional[EngineOptions] = None) -> MaxSATEngine:
+    if options is None:
+        options = EngineOptions()
+    assert options.name in engines, f"unknown MaxSAT engine: {options.name}"
+    return engines[options.name](options)
+
+
+def add_engine_args(parser: argparse.ArgumentParser):
+    """
+    Add the options of EngineOptions to the command line of a solver.
+    """
+    parser.add_argument(
+        "--engine",
+        type=str,
+        help="MaxSAT engine, " + "/".join(engines.keys()),
+        choices=list(engines.keys()),
+        default="rc2",
+    )
+    parser.add_argument(
+        "--sat_solver",
+        type=str,
+        help="SAT solver used by the MaxSAT engine",
+        default="g3",
+    )
+    parser.add_argument(
+        "--adapt",
+        action="store_true",
+        help="detect and adapt intrinsic AtMost1 constraints (rc2)",
+    )
+    parser.add_argument(
+        "--exhaust", action="store_true", help="exhaust unsatisfiable cores (rc2)"
+    )
+    parser.add_argument(
+        "--minz", action="store_true", help="minimize unsatisfiable cores (rc2)"
+    )
+    parser.add_argument(
+        "--engine_command",
+        type=str,
+        help="command line of the MaxSAT solver run by the external engine",
+        default="",
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        help="stop the search after this many seconds and report the best solution and lower bound (0 for no limit)",
+        default=0.0,
+    )
+
+
+def engine_options_from_args(args: argparse.Namespace) -> EngineOptions:
+    if args.engine == "fm" and args.time_budget > 0:
+        # see FMEngine
+        sys.exit("error: the fm engine does not support --time_budget")
+    return EngineOptions(
+        name=args.engine,
+        sat_solver=args.sat_solver,
+        adapt=args.adapt,
+        exhaust=args.exhaust,
+        minz=args.minz,
+        command=args.engine_command,
+        time_budget=args.time_budget,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Solve a WCNF file with a MaxSAT engine."
+    )
+    parser.add_argument("file", type=str, help="input WCNF file")
+    add_engine_args(parser)
+    args = parser.parse_args()
+
+    wcnf = WCNF(from_file=args.file)
+    engine = create_engine(engine_options_from_args(args))
+    sol = engine.compute(wcnf)
+    if sol is None:
+        print("s UNSATISFIABLE")
+        sys.exit(20)
+    print(f"o {engine.cost}")
+    print("s OPTIMUM FOUND" if engine.optimal else "s SATISFIABLE")
+    print("v " + " ".join(str(x) for x in sol))
+    sys.exit(30 if engine.optimal else 10)
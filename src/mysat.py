@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+from array import array
+from bisect import bisect_left
 from collections import defaultdict
 from enum import Enum
-from typing import Any, Callable, Tuple
+from typing import Any, Callable, Iterator, List, Optional, Tuple
 
-from pysat.card import CardEnc, IDPool
-from sympy import And, Basic, Not, Or, Symbol
-from sympy.logic.boolalg import Boolean, BooleanFalse, BooleanTrue, Equivalent, is_cnf
+from pysat.card import CardEnc, EncType, IDPool
+
+from boolexpr import Equivalent, Expr, Var, expr_cnf_pysat
 
 debug = False
 
+# encoding of at-most-one constraints used by pysat_atmost_one (see amo_encodings)
+amo_encoding = "auto"
+
 # ClauseType = NewType("ClauseType", List[int])
 # CNFType = NewType("ClauseType", List[Clause])
 
@@ -20,58 +25,185 @@ class Literal(Enum):
     auxlit = 3
 
 
+class LiteralBlock:
+    """
+    Slots for the literals of a family whose index ranges are declared up front.
+
+    The id of (lit, x_1, ..., x_k) with 0 <= x_i < dims[i] is stored at the offset
+    sum(x_i * strides[i]) of `ids` (0 if not created), so no tuple is kept per literal.
+    Ids are still taken from the pool in creation order, so formulas do not change.
+    """
+
+    def __init__(self, lit: Enum, dims: Tuple[int, ...]):
+        self.lit = lit
+        self.dims = dims
+        self.strides = [1] * len(dims)
+        for k in reversed(range(len(dims) - 1)):
+            self.strides[k] = self.strides[k + 1] * dims[k + 1]
+        size = self.strides[0] * dims[0] if dims else 1
+        # a list rather than an array, so that clauses share the int objects of ids
+        self.ids: List[int] = [0] * size
+        # ids and offsets in creation order (ids are increasing) for decoding
+        self.created = array("i")
+        self.offsets = array("i")
+
+    def offset(self, idx: Tuple[int, ...]) -> int:
+        # an index out of range would wrap around or hit the slot of another literal,
+        # so it raises KeyError as an unknown literal of the pool does (also under python -O)
+        dims = self.dims
+        # most families are one or two dimensional
+        if len(idx) == 1:
+            if not (len(dims) == 1 and 0 <= idx[0] < dims[0]):
+                raise KeyError((self.lit,) + idx)
+            return idx[0]
+        if len(idx) == 2:
+            (x, y) = idx
+            if not (len(dims) == 2 and 0 <= x < dims[0] and 0 <= y < dims[1]):
+                raise KeyError((self.lit,) + idx)
+            return x * self.strides[0] + y
+        if not self.inside(idx):
+            raise KeyError((self.lit,) + idx)
+        off = 0
+        for (x, stride) in zip(idx, self.strides):
+            off += x * stride
+        return off
+
+    def inside(self, idx: Tuple[int, ...]) -> bool:
+        return len(idx) == len(self.dims) and all(
+            0 <= x < dim for (x, dim) in zip(idx, self.dims)
+        )
+
+    def index(self, off: int) -> Tuple[int, ...]:
+        res = []
+        for stride in self.strides:
+            res.append(off // stride)
+            off %= stride
+        return tuple(res)
+
+
 class LiteralManager:
-    def __init__(self, lits=Literal):
+    def __init__(self, lits=Literal, debug: Optional[bool] = None):
         self.lits = lits
         # self.lits = Literal
+        # verify literals on creation and lookup (see verifyf of subclasses)
+        self.debug = globals()["debug"] if debug is None else debug
         self.vpool = IDPool()
-        self.syms: dict[int, Boolean] = dict()
+        # blocks are keyed by id(lit) since hashing Enum members is slow
+        self.blocks: dict[int, LiteralBlock] = dict()
+        self.syms: dict[int, Var] = dict()
         self.nvar = defaultdict(int)
         self.true = self.newsym(self.lits.true)
         self.false = self.newsym(self.lits.false)
 
+    def declare(self, lit: Enum, *dims: int):
+        """
+        Declare that literals (lit, x_1, ..., x_k) satisfy 0 <= x_i < dims[i],
+        so that their ids are kept in a LiteralBlock instead of the dictionary of the pool.
+        """
+        assert lit in self.lits
+        assert id(lit) not in self.blocks and self.nvar[lit] == 0
+        self.blocks[id(lit)] = LiteralBlock(lit, dims)
+
     def newid(self, *obj) -> int:
         if len(obj) == 0:
             # obj = ("auxlit", self.nvar["auxlit"])
             obj = (self.lits.auxlit, self.nvar[self.lits.auxlit])
-        assert obj[0] in self.lits
-        assert not self.contains(*obj)
+        if self.debug:
+            assert obj[0] in self.lits
+            assert not self.contains(*obj)
         self.nvar[obj[0]] += 1
-        return self.vpool.id(obj)
+        block = self.blocks.get(id(obj[0]))
+        if block is None:
+            return self.vpool.id(obj)
+        off = block.offset(obj[1:])
+        assert block.ids[off] == 0
+        # a new id that is not registered in the pool
+        vid = self.vpool.id()
+        block.ids[off] = vid
+        block.created.append(vid)
+        block.offsets.append(off)
+        return vid
 
     def getid(self, *obj) -> int:
-        assert self.contains(*obj)
-        return self.vpool.obj2id[obj]
+        if self.debug:
+            assert self.contains(*obj)
+        block = self.blocks.get(id(obj[0]))
+        if block is None:
+            vid = self.vpool.obj2id.get(obj)
+        else:
+            vid = block.ids[block.offset(obj[1:])]
+        if not vid:
+            raise KeyError(obj)
+        return vid
 
     def contains(self, *obj) -> bool:
-        return obj in self.vpool.obj2id
+        block = self.blocks.get(id(obj[0]))
+        if block is None:
+            return obj in self.vpool.obj2id
+        return block.inside(obj[1:]) and block.ids[block.offset(obj[1:])] != 0
 
-    def id2sym(self, id: int) -> Boolean:
+    def id2sym(self, id: int) -> Var:
         if id not in self.syms:
-            self.syms[id] = Symbol(str(id))
+            self.syms[id] = Var(id)
         return self.syms[id]
 
-    def sym2id(self, x: Boolean) -> int:
-        return int(str(x))
+    def sym2id(self, x: Var) -> int:
+        return x.id
 
-    def getsym(self, *opt) -> Boolean:
+    def getsym(self, *opt) -> Var:
         return self.id2sym(self.getid(*opt))
 
-    def newsym(self, *obj) -> Boolean:
+    def newsym(self, *obj) -> Var:
         return self.id2sym(self.newid(*obj))
 
     def id2obj(self, id: int):
-        return self.vpool.id2obj[id]
+        if id in self.vpool.id2obj:
+            return self.vpool.id2obj[id]
+        for block in self.blocks.values():
+            pos = bisect_left(block.created, id)
+            if pos < len(block.created) and block.created[pos] == id:
+                return (block.lit,) + block.index(block.offsets[pos])
+        raise KeyError(id)
+
+    def items(self) -> Iterator[Tuple[int, Any]]:
+        """
+        (id, obj) of all registered literals in increasing order of ids.
+        """
+        ids = list(self.vpool.id2obj.keys())
+        for block in self.blocks.values():
+            ids.extend(block.created)
+        for id in sorted(ids):
+            yield id, self.id2obj(id)
 
     def id2str(self, id: int) -> str:
         return str(self.id2obj(id))
 
-    def sym2str(self, x: Boolean) -> str:
+    def sym2str(self, x: Var) -> str:
         return self.id2str(self.sym2id(x))
 
     def top(self) -> int:
         return self.vpool.top
 
+    def __getstate__(self):
+        # blocks are keyed by id(lit), which differs between processes,
+        # and the dictionary of IDPool creates ids with a lambda, which is not picklable
+        state = self.__dict__.copy()
+        state["blocks"] = list(self.blocks.values())
+        vpool = self.vpool
+        state["vpool"] = (vpool.top, dict(vpool.obj2id), vpool.id2obj, vpool._occupied)
+        return state
+
+    def __setstate__(self, state):
+        (top, obj2id, id2obj, occupied) = state["vpool"]
+        vpool = IDPool()
+        vpool.top = top
+        vpool.obj2id.update(obj2id)
+        vpool.id2obj = id2obj
+        vpool._occupied = occupied
+        state["vpool"] = vpool
+        state["blocks"] = {id(block.lit): block for block in state["blocks"]}
+        self.__dict__.update(state)
+
 
 # def pysat_or(new_var: Callable[[], int], xs: list[int]) -> Tuple[int, list[list[int]]]:
 #     nvar = new_var()
@@ -108,12 +240,16 @@ def pysat_and(new_var: Callable[[], int], xs: list[int]) -> Tuple[int, list[list
 
 
 def pysat_atmost(
-    lm: LiteralManager, xs: list[int], bound: int) -> Tuple[int, list[list[int]]]:
+    lm: LiteralManager, xs: list[int], bound: int
+) -> Tuple[int, list[list[int]]]:
     """
     Create a literal and clauses such that the number of true literals in `xs` is at most `bound`.
     """
 
-    atmost_clauses = CardEnc.atmost(xs, bound=bound, vpool=lm.vpool)
+    if bound == 1:
+        atmost_clauses = pysat_atmost_one(lm, xs)
+    else:
+        atmost_clauses = CardEnc.atmost(xs, bound=bound, vpool=lm.vpool).clauses
 
     xs = []
     new_clauses = []
@@ -130,6 +266,80 @@ def pysat_atleast_one(xs: list[int]) -> list[int]:
     return xs
 
 
+# seqcounter: sequential counter of pysat (k-1 new variables, 3k-4 clauses)
+# pairwise:   k(k-1)/2 binary clauses without new variables
+# ladder:     ladder encoding of pysat
+# bitwise:    binary encoding of pysat (log k new variables, k log k clauses)
+# commander:  commander encoding with groups of size 3
+# auto:       pairwise for short lists, and commander for long lists
+amo_encodings = ["seqcounter", "pairwise", "ladder", "bitwise", "commander", "auto"]
+
+# lists of at most this length are encoded pairwise by the auto encoding
+amo_pairwise_max = 6
+
+
+def pysat_atmost_one(
+    lm: LiteralManager, xs: list[int], encoding: Optional[str] = None
+) -> list[list[int]]:
+    """
+    Create clauses s.t. at most one literal in `xs` is true.
+
+    The encoding is given by `encoding`, or the module setting `amo_encoding` if it is None.
+    """
+    if encoding is None:
+        encoding = amo_encoding
+    assert encoding in amo_encodings
+    if encoding == "auto":
+        encoding = "pairwise" if len(xs) <= amo_pairwise_max else "commander"
+    if encoding == "commander":
+        return pysat_commander_atmost_one(lm, xs)
+    if encoding == "pairwise":
+        return [[-xs[i], -xs[j]] for i in range(len(xs)) for j in range(i + 1, len(xs))]
+    enctype = {
+        "seqcounter": EncType.seqcounter,
+        "ladder": EncType.ladder,
+        "bitwise": EncType.bitwise,
+    }[encoding]
+    return CardEnc.atmost(xs, bound=1, vpool=lm.vpool, encoding=enctype).clauses
+
+
+def pysat_exactly_one(
+    lm: LiteralManager, xs: list[int], encoding: Optional[str] = None
+) -> list[list[int]]:
+    """
+    Create clauses s.t. exactly one literal in `xs` is true.
+    """
+    return [pysat_atleast_one(xs)] + pysat_atmost_one(lm, xs, encoding)
+
+
+def pysat_commander_atmost_one(
+    lm: LiteralManager, xs: list[int], group: int = 3
+) -> list[list[int]]:
+    """
+    Commander encoding of at-most-one (Klieber and Kwon, 2007).
+
+    `xs` is split into groups of size `group`. At most one literal of each group is true,
+    every literal implies the commander of its group, and at most one commander is true,
+    which is encoded recursively.
+    """
+    new_clauses = []
+    while len(xs) > group:
+        commanders = []
+        for b in range(0, len(xs), group):
+            ys = xs[b : b + group]
+            if len(ys) == 1:
+                commanders.append(ys[0])
+                continue
+            c = lm.newid()
+            new_clauses.extend(pysat_atmost_one(lm, ys, "pairwise"))
+            for y in ys:
+                new_clauses.append(pysat_if(y, c))
+            commanders.append(c)
+        xs = commanders
+    new_clauses.extend(pysat_atmost_one(lm, xs, "pairwise"))
+    return new_clauses
+
+
 # def pysat_exactlyone(lm: LiteralManager, xs: list[int]) -> Tuple[int, list[list[int]]]:
 #     new_clauses = pysat_atleast_one(xs)
 #     nvar, clauses = pysat_atmost(lm, xs, bound=1)
@@ -138,7 +348,7 @@ def pysat_atleast_one(xs: list[int]) -> list[int]:
 
 
 def pysat_exactlyone(lm: LiteralManager, xs: list[int]) -> Tuple[int, list[list[int]]]:
-    ex1_clauses = CardEnc.atmost(xs, bound=1, vpool=lm.vpool)
+    ex1_clauses = pysat_atmost_one(lm, xs)
     # _, ex1_clauses = pysat_atmost(lm, xs, bound=1)
     # res_clauses = []
     ex1_clauses.append(pysat_atleast_one(xs))
@@ -175,38 +385,42 @@ def pysat_iff(x: int, y: int) -> list[list[int]]:
     return [[-x, y], [x, -y]]
 
 
-def sympy_atleast_one(lits: list[Boolean]) -> Boolean:
-    return Or(*lits)  # type: ignore
-
-
-def sympy_atmost_one(lits: list[Boolean]) -> Boolean:
-    n = len(lits)
-    return And(*[~lits[i] | ~lits[j] for i in range(n) for j in range(i + 1, n)])  # type: ignore
-
-
-def sympy_exactly_one(lits: list[Boolean]):
-    return And(sympy_atleast_one(lits) & sympy_atmost_one(lits))
-
-
-def sympy_if(x, y) -> Boolean:
-    """
-    x -> y
-    """
-    return ~x | y
-
-
-def sympy_iff(x, y) -> Boolean:
+def pysat_less(
+    lm: LiteralManager,
+    xs: list[int],
+    ys: list[int],
+    strict: bool = True,
+    cond: Optional[list[int]] = None,
+) -> list[list[int]]:
     """
-    x <-> y
+    Create clauses s.t. if all literals in `cond` are true, the unsigned integer represented by the bits `xs`
+    is less than (or equal to, if not strict) the one represented by `ys`.
+    Bits are given from the most significant one.
     """
-    return (~x | y) & (x | ~y)
-
-
-def sympy_equal(x, y) -> Boolean:
-    """
-    x <-> y
-    """
-    return (x & y) | (~x & ~y)
+    assert len(xs) == len(ys)
+    new_clauses = []
+    # sel[k]: xs and ys first differ at k with xs[k] = 0 and ys[k] = 1
+    sel = []
+    # eq: literal implying xs[:k] == ys[:k]
+    eq = None
+    for k in range(len(xs)):
+        s = lm.newid()
+        new_clauses.append(pysat_if(s, -xs[k]))
+        new_clauses.append(pysat_if(s, ys[k]))
+        if eq is not None:
+            new_clauses.append(pysat_if(s, eq))
+        sel.append(s)
+        if k + 1 < len(xs) or not strict:
+            e = lm.newid()
+            new_clauses.append([-e, xs[k], -ys[k]])
+            new_clauses.append([-e, -xs[k], ys[k]])
+            if eq is not None:
+                new_clauses.append(pysat_if(e, eq))
+            eq = e
+    if not strict and eq is not None:
+        sel.append(eq)
+    new_clauses.append(pysat_if_and_then_or(cond if cond is not None else [], sel))
+    return new_clauses
 
 
 def sign_enc(x):
@@ -220,88 +434,5 @@ def sign_dec(x):
     return 1 if x == 1 else 0
 
 
-def defcnf(new_var, x: Boolean, y: Boolean) -> list[list[int]]:
-    return sympy_cnf_pysat(new_var, Equivalent(x, y))  # type: ignore
-
-
-def literal_sympy_to_pysat(x: Boolean | Basic):
-    """
-    Convert sympy literal to pysat literal.
-    sympy literal must be represented by integer
-    """
-    assert isinstance(x, Symbol) or isinstance(x, Not)
-    if isinstance(x, Not):
-        return -int(str(x.args[0]))
-    else:
-        return int(str(x))
-
-
-def cnf_sympy_to_pysat(x: Boolean | Any) -> list[list[int]]:
-    """
-    Convert cnf of sympy to cnf of pysat.
-    x is sympy cnf formula whose literal is number
-    """
-
-    def convert_clause(y) -> list[int]:
-        if isinstance(y, Symbol) or isinstance(y, Not):
-            return [literal_sympy_to_pysat(y)]
-        elif isinstance(y, Or):
-            return [literal_sympy_to_pysat(z) for z in y.args]
-        raise Exception("Only Or, Symbol, Not are allowed")
-
-    if isinstance(x, BooleanFalse):
-        return [[1], [-1]]
-    elif isinstance(x, BooleanTrue):
-        return []
-    elif not isinstance(x, And):
-        return [convert_clause(x)]
-
-    return [convert_clause(clause) for clause in x.args]
-
-
-def sympy_cnf_pysat(new_var, x: Boolean | Any) -> list[list[int]]:
-    """
-    Convert any sympy equation to cnf of pysat which is boolean equivalent.
-
-    new_var: get a new variable.
-    """
-    new_formula = []
-
-    def rec(eq: Boolean | Basic) -> int:
-        if isinstance(eq, Symbol) or isinstance(eq, Not):
-            return literal_sympy_to_pysat(eq)
-        elif isinstance(eq, And):
-            nvar = new_var()
-            literals = [rec(clause) for clause in eq.args]
-            new_clauses = []
-            for literal in literals:
-                new_clauses.append([-nvar, literal])
-            new_clause = [nvar] + [-literal for literal in literals]
-            new_clauses.append(new_clause)
-            if debug:
-                print(f"{nvar}={And(*literals)}, cnf={And(*new_clauses)}")
-            new_formula.extend(new_clauses)
-
-            return nvar
-        else:
-            assert isinstance(eq, Or)
-            nvar = new_var()
-            literals = [rec(clause) for clause in eq.args]
-            new_clauses = []
-            for literal in literals:
-                new_clauses.append([nvar, -literal])
-            new_clause = [-nvar] + literals
-            new_clauses.append(new_clause)
-            if debug:
-                print(f"{nvar}={Or(*literals)}, cnf={And(*new_clauses)}")
-            # assert is_nnf(And(*new_clauses))
-            new_formula.extend(new_clauses)
-            return nvar
-
-    x = x.to_nnf()
-    if is_cnf(x):
-        return cnf_sympy_to_pysat(x)
-
-    z = rec(x)
-    new_formula.append([z])
-    return new_formula
+def defcnf(new_var, x: Expr, y: Expr) -> list[list[int]]:
+    return expr_cnf_pysat(new_var, Equivalent(x, y))
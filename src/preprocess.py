@@ -0,0 +1,346 @@
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from pysat.formula import WCNF
+
+from clause_store import ClauseStore
+
+
+class WCNFPreprocessor:
+    """
+    Simplify the hard clauses of a WCNF before solving it.
+
+    The following are applied in order:
+    unit propagation, equivalent literal substitution (strongly connected components
+    of the binary implication graph), subsumption and bounded variable elimination.
+    Variables of soft clauses are frozen: they are never substituted or eliminated,
+    so soft clauses are kept as they are and the cost of models does not change.
+
+    `restore` maps a model of the reduced formula back to the original variables.
+    """
+
+    def __init__(
+        self,
+        wcnf: Union[WCNF, ClauseStore],
+        equivalence: bool = True,
+        subsumption: bool = True,
+        elimination: bool = True,
+        elim_occ_limit: int = 16,
+        elim_clause_limit: int = 16,
+        subsume_occ_limit: int = 100,
+    ):
+        self.wcnf = wcnf
+        self.nv = wcnf.nv
+        self.equivalence = equivalence
+        self.subsumption = subsumption
+        self.elimination = elimination
+        self.elim_occ_limit = elim_occ_limit
+        self.elim_clause_limit = elim_clause_limit
+        self.subsume_occ_limit = subsume_occ_limit
+
+        self.frozen: Set[int] = set(abs(x) for clause in wcnf.soft for x in clause)
+        # value[v] = 1 (true), -1 (false) or 0 (unassigned)
+        self.value = [0] * (self.nv + 1)
+        self.clauses: List[Optional[List[int]]] = []
+        # bit signature of each clause, a clause can subsume another only if its signature is included
+        self.sigs: List[int] = []
+        self.occ: Dict[int, Set[int]] = defaultdict(set)
+        self.units: List[int] = []
+        self.conflict = False
+        # ("unit", lit), ("equiv", v, lit) or ("elim", v, clauses) in the order of simplification
+        self.stack: List[Tuple] = []
+        self.nunits = 0
+        self.nequivs = 0
+        self.nsubsumed = 0
+        self.nelims = 0
+        # the reduced WCNF and the time to compute it, set by run
+        self.reduced: Optional[WCNF] = None
+        self.time = 0.0
+
+    def add_clause(self, clause: List[int]):
+        lits = set(clause)
+        if any(-x in lits for x in lits):
+            return
+        lits = [x for x in lits if self.value[abs(x)] * (1 if x > 0 else -1) != -1]
+        if any(self.value[abs(x)] != 0 for x in lits):
+            return
+        if len(lits) == 0:
+            self.conflict = True
+            return
+        if len(lits) == 1:
+            self.units.append(lits[0])
+            return
+        cid = len(self.clauses)
+        self.clauses.append(lits)
+        sig = 0
+        for x in lits:
+            sig |= 1 << (x & 63)
+        self.sigs.append(sig)
+        for x in lits:
+            self.occ[x].add(cid)
+
+    def remove_clause(self, cid: int):
+        clause = self.clauses[cid]
+        assert clause is not None
+        for x in clause:
+            self.occ[x].discard(cid)
+        self.clauses[cid] = None
+
+    def propagate(self):
+        while self.units and not self.conflict:
+            x = self.units.pop()
+            v = abs(x)
+            if self.value[v] != 0:
+                if self.value[v] != (1 if x > 0 else -1):
+                    self.conflict = True
+                continue
+            self.value[v] = 1 if x > 0 else -1
+            self.stack.append(("unit", x))
+            self.nunits += 1
+            for cid in list(self.occ[x]):
+                self.remove_clause(cid)
+            for cid in list(self.occ[-x]):
+                clause = self.clauses[cid]
+                assert clause is not None
+                self.remove_clause(cid)
+                self.add_clause([y for y in clause if y != -x])
+            self.occ.pop(x, None)
+            self.occ.pop(-x, None)
+
+    def substitute_equivalences(self):
+        """
+        Replace literals that are equivalent by binary clauses with a representative.
+        """
+        # implication graph: -a -> b and -b -> a for each binary clause [a, b]
+        succ: Dict[int, List[int]] = defaultdict(list)
+        for clause in self.clauses:
+            if clause is not None and len(clause) == 2:
+                (a, b) = clause
+                succ[-a].append(b)
+                succ[-b].append(a)
+        rep: Dict[int, int] = dict()
+        for scc in strongly_connected_components(succ):
+            if len(scc) == 1:
+                continue
+            lits = set(scc)
+            if any(-x in lits for x in lits):
+                self.conflict = True
+                return
+            # the complementary component is handled with the same representative
+            if any(abs(x) in rep or -abs(x) in rep for x in scc):
+                continue
+            frozen = [x for x in scc if abs(x) in self.frozen]
+            r = frozen[0] if frozen else min(scc, key=abs)
+            for x in scc:
+                if x != r and abs(x) not in self.frozen:
+                    # x == r, i.e. abs(x) == r if x > 0, and abs(x) == -r otherwise
+                    rep[abs(x)] = r if x > 0 else -r
+        if len(rep) == 0:
+            return
+        touched = set()
+        for v in rep.keys():
+            touched.update(self.occ.get(v, ()))
+            touched.update(self.occ.get(-v, ()))
+        for cid in sorted(touched):
+            clause = self.clauses[cid]
+            assert clause is not None
+            self.remove_clause(cid)
+            self.add_clause(
+                [
+                    rep[x]
+                    if x > 0 and x in rep
+                    else -rep[-x]
+                    if x < 0 and -x in rep
+                    else x
+                    for x in clause
+                ]
+            )
+        for (v, r) in rep.items():
+            self.occ.pop(v, None)
+            self.occ.pop(-v, None)
+            self.stack.append(("equiv", v, r))
+            self.nequivs += 1
+        self.propagate()
+
+    def remove_subsumed(self):
+        """
+        Remove clauses that are supersets of other clauses.
+        """
+        order = sorted((cid for (cid, clause) in enumerate(self.clauses) if clause is not None), key=lambda cid: len(self.clauses[cid]))  # type: ignore
+        for cid in order:
+            clause = self.clauses[cid]
+            if clause is None:
+                continue
+            x = min(clause, key=lambda y: len(self.occ[y]))
+            if len(self.occ[x]) > self.subsume_occ_limit:
+                continue
+            lits = set(clause)
+            sig = self.sigs[cid]
+            for did in list(self.occ[x]):
+                if did == cid or sig & ~self.sigs[did]:
+                    continue
+                other = self.clauses[did]
+                assert other is not None
+                if len(other) >= len(clause) and lits.issubset(other):
+                    self.remove_clause(did)
+                    self.nsubsumed += 1
+
+    def eliminate_variables(self):
+        """
+        Eliminate variables whose resolvents do not increase the number of clauses.
+        """
+        vars = sorted(
+            (
+                v
+                for v in range(1, self.nv + 1)
+                if v not in self.frozen
+                and self.value[v] == 0
+                and (self.occ.get(v) or self.occ.get(-v))
+            ),
+            key=lambda v: len(self.occ.get(v, ())) + len(self.occ.get(-v, ())),
+        )
+        for v in vars:
+            if self.conflict:
+                return
+            pos = list(self.occ.get(v, ()))
+            neg = list(self.occ.get(-v, ()))
+            if len(pos) + len(neg) == 0 or len(pos) + len(neg) > self.elim_occ_limit:
+                continue
+            resolvents = []
+            ok = True
+            for pid in pos:
+                for nid in neg:
+                    lits = set(self.clauses[pid]) | set(self.clauses[nid])  # type: ignore
+                    lits.discard(v)
+                    lits.discard(-v)
+                    if any(-y in lits for y in lits):
+                        continue
+                    if len(lits) > self.elim_clause_limit:
+                        ok = False
+                        break
+                    resolvents.append(list(lits))
+                    if len(resolvents) > len(pos) + len(neg):
+                        ok = False
+                        break
+                if not ok:
+                    break
+            if not ok:
+                continue
+            self.stack.append(("elim", v, [self.clauses[pid] for pid in pos]))
+            self.nelims += 1
+            for cid in pos + neg:
+                self.remove_clause(cid)
+            self.occ.pop(v, None)
+            self.occ.pop(-v, None)
+            for clause in resolvents:
+                self.add_clause(clause)
+            self.propagate()
+
+    def run(self) -> WCNF:
+        """
+        Return the reduced WCNF with the same soft clauses.
+        """
+        start = time.time()
+        for clause in self.wcnf.hard:
+            self.add_clause(clause)
+            if self.conflict:
+                break
+        self.propagate()
+        if self.equivalence and not self.conflict:
+            self.substitute_equivalences()
+        if self.subsumption and not self.conflict:
+            self.remove_subsumed()
+        if self.elimination and not self.conflict:
+            self.eliminate_variables()
+
+        res = WCNF()
+        if self.conflict:
+            res.append([])
+        else:
+            for clause in self.clauses:
+                if clause is not None:
+                    res.append(clause)
+            # soft clauses still refer to fixed frozen variables
+            for v in self.frozen:
+                if self.value[v] != 0:
+                    res.append([v * self.value[v]])
+        for (clause, weight) in zip(self.wcnf.soft, self.wcnf.wght):
+            res.append(clause, weight=weight)
+        res.nv = max(res.nv, self.nv)
+        self.reduced = res
+        self.time = time.time() - start
+        return res
+
+    def restore(self, model: Optional[List[int]]) -> Optional[List[int]]:
+        """
+        Extend a model of the reduced formula to a model of the original one.
+        """
+        if model is None:
+            return None
+        value = [False] * (self.nv + 1)
+        for x in model:
+            if abs(x) <= self.nv:
+                value[abs(x)] = x > 0
+
+        def satisfied(clause: List[int]) -> bool:
+            return any(value[abs(y)] == (y > 0) for y in clause)
+
+        for entry in reversed(self.stack):
+            if entry[0] == "unit":
+                x = entry[1]
+                value[abs(x)] = x > 0
+            elif entry[0] == "equiv":
+                (_, v, r) = entry
+                value[v] = value[abs(r)] == (r > 0)
+            else:
+                (_, v, clauses) = entry
+                value[v] = False
+                if not all(satisfied(clause) for clause in clauses):
+                    value[v] = True
+        return [v if value[v] else -v for v in range(1, self.nv + 1)]
+
+
+def strongly_connected_components(succ: Dict[int, List[int]]) -> List[List[int]]:
+    """
+    Strongly connected components of the graph given by adjacency lists (Tarjan, iterative).
+    """
+    index: Dict[int, int] = dict()
+    low: Dict[int, int] = dict()
+    on_stack: Set[int] = set()
+    stack: List[int] = []
+    res = []
+    for root in list(succ.keys()):
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            (node, i) = work.pop()
+            if i == 0:
+                index[node] = low[node] = len(index)
+                stack.append(node)
+                on_stack.add(node)
+            edges = succ.get(node, [])
+            while i < len(edges):
+                nxt = edges[i]
+                i += 1
+                if nxt not in index:
+                    work.append((node, i))
+                    work.append((nxt, 0))
+                    break
+                if nxt in on_stack:
+                    low[node] = min(low[node], index[nxt])
+            else:
+                if low[node] == index[node]:
+                    scc = []
+                    while True:
+                        x = stack.pop()
+                        on_stack.discard(x)
+                        scc.append(x)
+                        if x == node:
+                            break
+                    res.append(scc)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+    return res
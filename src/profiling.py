@@ -0,0 +1,147 @@
+# Profile of a solver run, recorded in the field `profile` of the Exp records as nested JSON:
+#   phases:   seconds spent in named phases (index build, literal definition, each constraint block, solve, decode, verify)
+#   families: clauses, literal occurrences and new variables added by each constraint family,
+#             e.g. "constraint (7)" of slp_solver or "tree-3" of bidirectional_solver
+#   peak_rss: peak resident set size (MB) of the process
+#   engine:   statistics of the MaxSAT engine (unsatisfiable cores, calls of the SAT oracle and time in it)
+#
+# A solver starts a profile with `start()` and times its phases with `phase`, and the builders of formulas
+# record the steps of building into the current profile with a BuildRecorder. The phases and steps are also
+# recorded as events of the timeline if tracing is enabled (see tracing.py).
+
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional
+
+from dataclasses_json import dataclass_json
+
+import tracing
+from clause_store import ClauseStore
+from mysat import LiteralManager
+
+
+@dataclass_json
+@dataclass
+class FamilyStats:
+    clauses: int = 0
+    # occurrences of literals in the clauses
+    literals: int = 0
+    # variables created for the family (e.g. by pysat_and or the at-most-one encodings)
+    vars: int = 0
+
+
+@dataclass_json
+@dataclass
+class EngineStats:
+    cores: int = 0
+    oracle_calls: int = 0
+    # seconds spent in the SAT oracle
+    oracle_time: float = 0.0
+
+
+@dataclass_json
+@dataclass
+class Profile:
+    phases: Dict[str, float] = field(default_factory=dict)
+    families: Dict[str, FamilyStats] = field(default_factory=dict)
+    peak_rss: float = 0.0
+    engine: EngineStats = field(default_factory=EngineStats)
+
+
+current = Profile()
+
+
+def start() -> Profile:
+    """
+    Start a new profile, into which the phases and families are recorded.
+    """
+    global current
+    current = Profile()
+    return current
+
+
+def finish(engine: Optional[EngineStats] = None) -> Profile:
+    """
+    Record the peak memory and the statistics of the engine in the current profile and return it.
+    """
+    if engine is not None:
+        current.engine = engine
+    current.peak_rss = peak_rss()
+    return current
+
+
+def peak_rss() -> float:
+    """
+    Peak resident set size (MB) of this process.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    begin = time.time()
+    try:
+        yield
+    finally:
+        end = time.time()
+        phases = current.phases
+        phases[name] = phases.get(name, 0.0) + end - begin
+        if tracing.enabled:
+            tracing.record(name, "phase", begin, end)
+
+
+class BuildRecorder:
+    """
+    Record the building of a formula into the current profile, as a sequence of steps ending at the calls of
+    `phase` (time since the previous step) and `block` (time, clauses added to `wcnf` and variables created
+    by `lm` since the previous step). Clauses of families added in the same loop are attributed by `count`,
+    which does not take the time, after each of them.
+    """
+
+    def __init__(self, wcnf: ClauseStore, lm: Optional[LiteralManager] = None):
+        self.wcnf = wcnf
+        self.lm = lm
+        self.begin = time.time()
+        self.mark()
+
+    def top(self) -> int:
+        return self.lm.top() if self.lm is not None else self.wcnf.nv
+
+    def mark(self):
+        wcnf = self.wcnf
+        self.nhard = len(wcnf.ends)
+        self.nlits = len(wcnf.lits)
+        self.nsoft = len(wcnf.soft)
+        self.nvars = self.top()
+
+    def count(self, name: str):
+        wcnf = self.wcnf
+        stats = current.families.get(name)
+        if stats is None:
+            stats = current.families[name] = FamilyStats()
+        stats.clauses += len(wcnf.ends) - self.nhard
+        stats.literals += len(wcnf.lits) - self.nlits
+        if len(wcnf.soft) != self.nsoft:
+            soft = wcnf.soft[self.nsoft :]
+            stats.clauses += len(soft)
+            stats.literals += sum(len(clause) for clause in soft)
+        stats.vars += self.top() - self.nvars
+        self.mark()
+
+    def phase(self, name: str):
+        end = time.time()
+        phases = current.phases
+        phases[name] = phases.get(name, 0.0) + end - self.begin
+        if tracing.enabled:
+            tracing.record(name, "build", self.begin, end)
+        self.begin = end
+        self.mark()
+
+    def block(self, name: str):
+        self.count(name)
+        self.phase(name)
@@ -0,0 +1,215 @@
+# Tables of the benchmarks, comparing the LZ factorizations with the smallest string attractor and bidirectional scheme
+# of each file: out/benchmark_{time,size}.csv and their LaTeX tables out/benchmark_{time,size}.tex (see csv2table.py).
+#
+# Each table of the results database is loaded once into pandas, the cells of all files are computed by columns,
+# and pivoted by file and algorithm in one operation.
+# Regeneration is incremental: the rows of each file are hashed, and the cells are computed again only for the files
+# whose rows changed since the last report (kept in out/report.pkl with the hashes). Nothing is written if none changed.
+# python src/report.py [--db out/satcomp.db] [--out_dir out] [--full]
+
+import argparse
+import csv
+import os
+import pickle
+import sqlite3
+from typing import Dict, List
+
+import pandas as pd
+
+import lz_bench
+from csv2table import latex_table
+
+dbname = "out/satcomp.db"
+cache_name = "report.pkl"
+# output -> (column of the value, type of the values in the LaTeX table)
+targets = {"time": ("time_total", "float"), "size": ("factor_size", "str")}
+# tables compared with the LZ factorizations -> column of the report
+others = {"attractor_bench": "attractor", "bidirectional_bench": "bidirectional"}
+header = ["file", "file_len"] + lz_bench.algos + list(others.values())
+keys = [
+    "file_name",
+    "algo",
+    "status",
+    "file_len",
+    "time_total",
+    "factor_size",
+    "lower_bound",
+]
+
+
+def load(con: sqlite3.Connection, table: str) -> pd.DataFrame:
+    """
+    The columns `keys` of `table`, which are null if the table does not have them, and empty if it does not exist.
+    """
+    names = set(row[1] for row in con.execute(f"PRAGMA table_info({table})"))
+    if len(names) == 0:
+        return pd.DataFrame({key: pd.Series([], dtype=object) for key in keys})
+    cols = [key if key in names else f"NULL AS {key}" for key in keys]
+    return pd.read_sql_query(f"SELECT {', '.join(cols)} FROM {table}", con)
+
+
+def load_all(path: str = dbname) -> Dict[str, pd.DataFrame]:
+    con = sqlite3.connect(path)
+    try:
+        return {table: load(con, table) for table in [lz_bench.dbtable] + list(others)}
+    finally:
+        con.close()
+
+
+def cells(
+    frames: Dict[str, pd.DataFrame], target_key: str, target_none: float = 0
+) -> pd.DataFrame:
+    """
+    Cells (file, column, value) of the report of `target_key` for the files of the LZ benchmark, where the value is
+    the status if it equals `target_none`, and the bounds of the size if the time budget ran out.
+    The first row of a file and algorithm is taken.
+    """
+    lz = frames[lz_bench.dbtable]
+    parts = [
+        pd.DataFrame(
+            {
+                "file": lz.file_name,
+                "column": "file_len",
+                "value": lz.file_len.astype(object),
+            }
+        )
+    ]
+    target = lz[target_key].astype(object)
+    parts.append(
+        pd.DataFrame(
+            {
+                "file": lz.file_name,
+                "column": lz.algo,
+                "value": target.where(target != target_none, lz.status),
+            }
+        )
+    )
+    for (table, column) in others.items():
+        df = frames[table]
+        target = df[target_key].astype(object)
+        value = target.where(target != target_none, df.status)
+        if target_key == "factor_size":
+            bounds = "[" + df.lower_bound.astype(str) + ", " + target.astype(str) + "]"
+            value = value.where(
+                ~((df.status == "anytime") & (target != target_none)), bounds
+            )
+        parts.append(
+            pd.DataFrame({"file": df.file_name, "column": column, "value": value})
+        )
+    res = pd.concat(parts, ignore_index=True).drop_duplicates(["file", "column"])
+    return res[res.file.isin(lz.file_name)]
+
+
+def pivot(long: pd.DataFrame) -> pd.DataFrame:
+    """
+    The report indexed by file with the columns of `header`, where a missing cell is "None".
+    """
+    res = (
+        long.pivot(index="file", columns="column", values="value")
+        .reindex(columns=header[1:])
+        .astype(object)
+    )
+    return res.where(res.notna(), "None")
+
+
+def rows(table: pd.DataFrame) -> List[List[str]]:
+    return [
+        [str(x) for x in row] for row in table.reset_index().itertuples(index=False)
+    ]
+
+
+def write_csv(table: pd.DataFrame, out_file: str):
+    with open(out_file, "w") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        writer.writerows(rows(table))
+
+
+def write_latex(table: pd.DataFrame, out_file: str, vtype: str):
+    with open(out_file, "w") as f:
+        f.write(latex_table(header, rows(table), vtype))
+
+
+def file_hashes(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Hash of the rows of each file (index) in each table (column).
+    """
+    res = {}
+    for (table, df) in frames.items():
+        h = pd.util.hash_pandas_object(df.astype(str), index=False)
+        res[table] = h.groupby(df.file_name.values).agg(lambda x: hash(tuple(x)))
+    return pd.DataFrame(res, columns=list(frames))
+
+
+def update(path: str = dbname, out_dir: str = "out", full: bool = False) -> int:
+    """
+    Write the report of each of `targets` to `out_dir` from the database at `path`, computing the cells only of
+    the files whose rows changed since the last report unless `full`. Returns the number of files computed.
+    """
+    frames = load_all(path)
+    hashes = file_hashes(frames)
+    outputs = [
+        os.path.join(out_dir, f"benchmark_{name}.{ext}")
+        for name in targets
+        for ext in ["csv", "tex"]
+    ]
+    cache_file = os.path.join(out_dir, cache_name)
+    cache = None
+    if (
+        not full
+        and os.path.exists(cache_file)
+        and all(os.path.exists(file) for file in outputs)
+    ):
+        with open(cache_file, "rb") as f:
+            cache = pickle.load(f)
+        if cache["header"] != header:
+            cache = None
+    if cache is None:
+        changed: List[str] = list(hashes.index)
+        tables = {
+            name: pivot(pd.DataFrame({"file": [], "column": [], "value": []}))
+            for name in targets
+        }
+    else:
+        files = hashes.index.union(cache["hashes"].index)
+        (new, old) = (
+            h.reindex(index=files, columns=hashes.columns).fillna(0)
+            for h in [hashes, cache["hashes"]]
+        )
+        changed = list(files[(new != old).any(axis=1)])
+        tables = cache["tables"]
+        if len(changed) == 0:
+            return 0
+
+    part = {table: df[df.file_name.isin(changed)] for (table, df) in frames.items()}
+    files = frames[lz_bench.dbtable].file_name.unique()
+    os.makedirs(out_dir, exist_ok=True)
+    for (name, (target_key, vtype)) in targets.items():
+        table = pd.concat(
+            [
+                tables[name].drop(changed, errors="ignore"),
+                pivot(cells(part, target_key)),
+            ]
+        )
+        tables[name] = table[table.index.isin(files)].sort_index()
+        write_csv(tables[name], os.path.join(out_dir, f"benchmark_{name}.csv"))
+        write_latex(tables[name], os.path.join(out_dir, f"benchmark_{name}.tex"), vtype)
+    with open(cache_file, "wb") as f:
+        pickle.dump({"header": header, "hashes": hashes, "tables": tables}, f)
+    return len(changed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write the tables of the benchmarks in CSV and LaTeX."
+    )
+    parser.add_argument("--db", type=str, help="database", default=dbname)
+    parser.add_argument(
+        "--out_dir", type=str, help="directory of the tables", default="out"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="compute the cells of all files again"
+    )
+    args = parser.parse_args()
+    n = update(args.db, args.out_dir, args.full)
+    print(f"{n} files are updated" if n > 0 else "the report is up to date")
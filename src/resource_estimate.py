@@ -0,0 +1,594 @@
+# Estimate the size of the WCNF and the memory of the solvers before building the formula,
+# and refuse to run or downgrade to a cheaper encoding if a memory cap would be exceeded.
+#
+# The estimates are linear models over statistics of the text (see text_features), with
+# nonnegative coefficients fitted by least squares to measured runs:
+#   python src/resource_estimate.py --calibrate --timeout 120 --time_budget 10 --files \
+#     data/misc/{abcd,banana,hoge0}.txt data/misc/Pipfile data/misc/fib{06,07,08,09,10,11,12,13}.txt \
+#     data/misc/trib0[5679].txt data/misc/pds0[3457].txt data/misc/thuemorse0[357].txt data/artificial/paperfold.0[346]
+# which prints new values for `models`. The inputs held out from it (thuemorse04, thuemorse06, trib08, pds06,
+# hoge and paperfold.05) check the estimates in tests/resource_estimate_check.py and
+# tests/resource_estimate_memory_check.py.
+# Without --calibrate, estimates for the given files are printed.
+
+import argparse
+import json
+import os
+import resource
+import sys
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, NoReturn, Optional, Tuple
+
+from dataclasses_json import dataclass_json
+
+import accounting
+import stralgo
+
+# model -> features, their coefficients for nvars, nhard and ntotalvars, and the peak RSS (MB)
+# = base_memory + memory_per_literal * ntotalvars
+models: Dict[str, Dict] = {
+    "slp": {
+        "features": ["phrases", "phrases2", "refs", "referred", "crossing"],
+        "nvars": [3.638, 0.0081, 1.4308, 1.2594, 0.0],
+        "nhard": [6.6103, 0.7664, 5.9441, 1.3174, 0.9766],
+        "ntotalvars": [11.2104, 2.2447, 13.5328, 5.1789, 1.982],
+        "base_memory": 33.2,
+        "memory_per_literal": 3.383e-05,
+    },
+    "rlslp": {
+        "features": ["phrases", "phrases2", "refs", "referred", "crossing"],
+        "nvars": [2.6348, 0.0, 1.5971, 4.9224, 0.0],
+        "nhard": [5.382, 0.0, 7.6284, 9.1364, 0.9809],
+        "ntotalvars": [10.3071, 0.0, 17.8873, 21.4837, 2.0061],
+        "base_memory": 33.8,
+        "memory_per_literal": 3.74e-05,
+    },
+    "cs-unary": {
+        "features": ["n", "n4", "refs", "csrefs"],
+        "nvars": [20.4805, 0.0799, 79.9357, 0.848],
+        "nhard": [29.6858, 0.5295, 118.2923, 5.9576],
+        "ntotalvars": [54.345, 1.348, 228.7329, 18.1736],
+        "base_memory": 34.0,
+        "memory_per_literal": 0.0001138,
+    },
+    "cs-bounded": {
+        "features": ["n", "n4", "refs", "csrefs"],
+        "nvars": [4.1192, 0.0197, 49.5789, 1.8414],
+        "nhard": [5.3343, 0.0644, 145.7001, 8.363],
+        "ntotalvars": [12.0189, 0.1102, 343.0459, 22.1426],
+        "base_memory": 33.9,
+        "memory_per_literal": 0.0001825,
+    },
+    "cs-binary": {
+        "features": ["n", "n4", "refs", "csrefs"],
+        "nvars": [0.0, 0.0616, 100.5844, 2.1682],
+        "nhard": [0.0, 0.0998, 298.9552, 8.647],
+        "ntotalvars": [0.0, 0.2318, 708.9044, 21.8996],
+        "base_memory": 33.0,
+        "memory_per_literal": 0.0001993,
+    },
+    "cs-transitive": {
+        "features": ["n", "n4", "refs", "csrefs"],
+        "nvars": [1.5316, 0.0178, 43.7825, 1.8459],
+        "nhard": [1.8716, 0.0396, 131.4986, 8.721],
+        "ntotalvars": [4.2019, 0.08, 319.9379, 23.0951],
+        "base_memory": 33.9,
+        "memory_per_literal": 0.000166,
+    },
+    "bidirectional-var0": {
+        "features": ["n", "occ_pairs", "depth_pairs", "occ3"],
+        "nvars": [2.3348, 0.9998, 1.3538, 0.2379],
+        "nhard": [4.5106, 2.9303, 7.1431, 0.0],
+        "ntotalvars": [6.2683, 6.4351, 16.2115, 0.0],
+        "base_memory": 33.3,
+        "memory_per_literal": 7.45e-05,
+    },
+    "bidirectional-var1": {
+        "features": ["n", "occ_pairs", "depth_pairs", "occ3"],
+        "nvars": [1.5034, 0.0187, 0.0552, 0.9609],
+        "nhard": [1.0967, 0.0, 1.7218, 2.0956],
+        "ntotalvars": [0.0, 0.0, 6.0833, 4.2604],
+        "base_memory": 33.0,
+        "memory_per_literal": 7.461e-05,
+    },
+    "bidirectional-var2": {
+        "features": ["n", "occ_pairs", "depth_pairs", "occ3"],
+        "nvars": [1.3464, 2.1888, 0.0, 0.0039],
+        "nhard": [0.3456, 1.223, 0.1876, 0.8652],
+        "ntotalvars": [0.0, 3.5379, 1.7219, 1.2555],
+        "base_memory": 33.5,
+        "memory_per_literal": 3.252e-05,
+    },
+    "attractor": {
+        "features": ["n", "minsubstrs", "cover"],
+        "nvars": [1.0, 0.0, 0.0],
+        "nhard": [0.0, 1.0, 0.0],
+        "ntotalvars": [0.0, 0.0, 1.0],
+        "base_memory": 75.1,
+        "memory_per_literal": 5.896e-05,
+    },
+}
+
+# solver -> models of the encodings it can run, the first one is the default
+solver_models: Dict[str, List[str]] = {
+    "slp_solver": ["slp"],
+    "rlslp_solver": ["rlslp"],
+    "cs_solver": ["cs-unary", "cs-bounded", "cs-binary", "cs-transitive"],
+    "bidirectional_solver_var0": [
+        "bidirectional-var0",
+        "bidirectional-var1",
+        "bidirectional-var2",
+    ],
+    "bidirectional_solver_var1": ["bidirectional-var1", "bidirectional-var2"],
+    "bidirectional_solver_var2": ["bidirectional-var2"],
+    "attractor_solver": ["attractor"],
+}
+
+# head room of RLIMIT_AS over the memory cap for shared libraries and other mappings that are not resident
+address_space_margin = 256
+
+
+# the features of text_features computed from the suffix array, only if refs is set
+repeat_features = [
+    "phrases",
+    "phrases2",
+    "refs",
+    "referred",
+    "crossing",
+    "csrefs",
+    "minsubstrs",
+    "cover",
+]
+
+
+@dataclass_json
+@dataclass
+class ResourceEstimate:
+    model: str
+    nvars: int
+    nhard: int
+    ntotalvars: int
+    # MB
+    memory: float
+
+
+class MemoryCapExceeded(Exception):
+    pass
+
+
+def text_features(text: bytes, refs: bool = True) -> Dict[str, float]:
+    """
+    Statistics of the text that determine the size of the encodings.
+
+    n, sigma: length and alphabet size
+    n3, n4: powers of the length (the depth literals of the unary encoding of cs_solver)
+    occ2, occ3: sum of squares and cubes of the numbers of occurrences of characters
+    occ_pairs: number of (i, j) with i != j and T[i] = T[j]
+    depth_pairs: occ_pairs times the largest number of occurrences of a character minus one
+        (the references at each depth of bidirectional_solver_var0)
+    With `refs`, the statistics of the repeats taken from the suffix array (repeat_features):
+    phrases: sum of max(1, lpf[i]) over positions i (candidate phrases of SLPs)
+    phrases2: sum of max(1, lpf[i])^2 (literals of the definitions of the candidate phrases)
+    refs: number of (j, i, l) with l >= 2, j + l <= i and T[j:j+l] = T[i:i+l] (candidate references)
+    referred: number of (j, l) with such an i (candidate referred intervals)
+    crossing: number of pairs of candidate referred intervals (j1, l1), (j2, l2) with j1 < j2 < j1 + l1 < j2 + l2
+    csrefs: number of candidate references of collage systems, i.e., the intervals enclosing
+        one occurrence of each (j, i, l) of refs and not the other (see cs_solver.compute_csrefs)
+    minsubstrs, cover: number of minimal substrings and sum of the numbers of positions covered by their occurrences
+    """
+    n = len(text)
+    occ = [text.count(c) for c in set(text)]
+    res: Dict[str, float] = {
+        "n": n,
+        "sigma": len(occ),
+        "n3": n**3,
+        "n4": n**4,
+        "occ2": sum(x * x for x in occ),
+        "occ3": sum(x * x * x for x in occ),
+    }
+    res["occ_pairs"] = res["occ2"] - n
+    res["depth_pairs"] = max(0, max(occ, default=0) - 1) * res["occ_pairs"]
+    if not refs:
+        return res
+    # the same ranges of the suffix array as stralgo.nonoverlapping_occ_pairs, but only counted
+    sa = stralgo.make_sa_MM(text)
+    isa = stralgo.make_isa(sa)
+    lcp = stralgo.make_lcpa_kasai(text, sa, isa)
+    lpf = [0] * n
+    nrefs = 0
+    csrefs = 0
+    referred = []
+    l = 2
+    while True:
+        found = False
+        b = 0
+        for e in range(1, n + 1):
+            if e < n and lcp[e] >= l:
+                continue
+            if e - b >= 2:
+                found = True
+                occs = sorted(sa[b:e])
+                # sums of i and i^2 over occs[x:]
+                (sum1, sum2) = ([0] * (len(occs) + 1), [0] * (len(occs) + 1))
+                for x in range(len(occs) - 1, -1, -1):
+                    sum1[x] = sum1[x + 1] + occs[x]
+                    sum2[x] = sum2[x + 1] + occs[x] * occs[x]
+                for (x, j) in enumerate(occs):
+                    y = bisect_left(occs, j + l, x + 1)
+                    c = len(occs) - y
+                    nrefs += c
+                    # (g - l + 1) * (n + 2 - l - g) enclosing intervals for each i = j + g in occs[y:]
+                    g1 = sum1[y] - c * j
+                    g2 = sum2[y] - 2 * j * sum1[y] + c * j * j
+                    csrefs += (n + 1) * g1 - g2 - c * (l - 1) * (n + 2 - l)
+                for i in occs[bisect_left(occs, occs[0] + l) :]:
+                    lpf[i] = l
+                referred.extend(
+                    (j, l) for j in occs[: bisect_right(occs, occs[-1] - l)]
+                )
+            b = e
+        if not found:
+            break
+        l += 1
+    res["phrases"] = sum(max(1, x) for x in lpf)
+    res["phrases2"] = sum(max(1, x) ** 2 for x in lpf)
+    res["refs"] = nrefs
+    res["referred"] = len(referred)
+    res["crossing"] = crossing_pairs(n, referred)
+    res["csrefs"] = csrefs
+    res["minsubstrs"] = 0
+    res["cover"] = 0
+    for (b, l) in stralgo.minimum_substr_sa(text, sa, isa, lcp):
+        (lo, hi) = stralgo.get_lcprange(lcp, isa[b], l)
+        occs = sorted(sa[lo : hi + 1])
+        res["minsubstrs"] += 1
+        res["cover"] += l + sum(min(l, y - x) for (x, y) in zip(occs, occs[1:]))
+    return res
+
+
+def crossing_pairs(n: int, intervals: List[Tuple[int, int]]) -> int:
+    """
+    Number of pairs of intervals (j1, l1), (j2, l2) with j1 < j2 < j1 + l1 < j2 + l2,
+    counted with a Fenwick tree over the ends of the intervals starting before j2.
+    """
+    intervals = sorted(intervals)
+    tree = [0] * (n + 2)
+
+    def ends_before(e: int) -> int:
+        res = 0
+        while e > 0:
+            res += tree[e]
+            e -= e & -e
+        return res
+
+    res = 0
+    k = 0
+    for (j, l) in intervals:
+        while intervals[k][0] < j:
+            e = sum(intervals[k]) + 1
+            while e < len(tree):
+                tree[e] += 1
+                e += e & -e
+            k += 1
+        res += ends_before(j + l) - ends_before(j + 1)
+    return res
+
+
+def estimate(
+    model: str, text: bytes, features: Optional[Dict[str, float]] = None
+) -> ResourceEstimate:
+    if features is None:
+        features = text_features(
+            text,
+            refs=any(f in repeat_features for f in models[model]["features"]),
+        )
+    coef = models[model]
+    xs = [features[f] for f in coef["features"]]
+    (nvars, nhard, ntotalvars) = (
+        max(0, round(sum(c * x for (c, x) in zip(coef[key], xs))))
+        for key in ["nvars", "nhard", "ntotalvars"]
+    )
+    memory = round(coef["base_memory"] + coef["memory_per_literal"] * ntotalvars, 1)
+    return ResourceEstimate(
+        model=model, nvars=nvars, nhard=nhard, ntotalvars=ntotalvars, memory=memory
+    )
+
+
+def choose_model(
+    candidates: List[str], text: bytes, memory_cap: float, downgrade: bool
+) -> ResourceEstimate:
+    """
+    Return the estimate of the first candidate if it fits in `memory_cap` (MB),
+    otherwise the cheapest fitting candidate if `downgrade` is set.
+    MemoryCapExceeded is raised with the estimate of the first candidate if none fits.
+    """
+    features = text_features(
+        text,
+        refs=any(
+            f in repeat_features for m in candidates for f in models[m]["features"]
+        ),
+    )
+    first = estimate(candidates[0], text, features)
+    if memory_cap <= 0 or first.memory <= memory_cap:
+        return first
+    if downgrade:
+        ests = sorted(
+            (estimate(m, text, features) for m in candidates[1:]),
+            key=lambda est: est.memory,
+        )
+        if ests and ests[0].memory <= memory_cap:
+            return ests[0]
+    raise MemoryCapExceeded(first)
+
+
+def set_memory_limit(memory_cap: float):
+    """
+    Limit the address space of the process (RLIMIT_AS) to `memory_cap` MB plus address_space_margin,
+    so that allocations beyond the cap fail quickly with MemoryError.
+    """
+    limit = int((memory_cap + address_space_margin) * 1024 * 1024)
+    (_, hard) = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def add_resource_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--memory_cap",
+        type=float,
+        help="memory cap (MB). The estimated memory is checked before building the formula, and RLIMIT_AS is set (0 for no cap)",
+        default=0,
+    )
+    parser.add_argument(
+        "--on_memory_cap",
+        type=str,
+        help="refuse to run, or downgrade to a cheaper encoding if the estimate exceeds the memory cap",
+        choices=["refuse", "downgrade"],
+        default="refuse",
+    )
+
+
+def apply_memory_cap(
+    args: argparse.Namespace, exp, solver: str, text: bytes, model: Optional[str] = None
+) -> str:
+    """
+    Check the memory estimate of the solver (with the model of the requested encoding, if given)
+    against --memory_cap and set RLIMIT_AS. Nothing is done without a cap. The estimate is recorded in `exp`.
+    Return the model to run; if none fits, `exp` is reported with status "memory-cap" and the process exits.
+    """
+    chosen = check_memory_cap(
+        exp, solver, text, args.memory_cap, args.on_memory_cap == "downgrade", model
+    )
+    if chosen is None:
+        exit_with_status(exp, "memory-cap", args.output)
+    if args.memory_cap > 0:
+        set_memory_limit(args.memory_cap)
+    return chosen
+
+
+def check_memory_cap(
+    exp,
+    solver: str,
+    text: bytes,
+    memory_cap: float,
+    downgrade: bool,
+    model: Optional[str] = None,
+) -> Optional[str]:
+    """
+    The model of the solver to run under `memory_cap` (the requested one if no cap), or None if none fits.
+    The estimate is recorded in `exp`.
+    """
+    candidates = solver_models[solver]
+    if model is not None:
+        candidates = [model] + [m for m in candidates if m != model]
+    if memory_cap <= 0:
+        return candidates[0]
+    try:
+        est = choose_model(candidates, text, memory_cap, downgrade)
+    except MemoryCapExceeded as e:
+        fill_estimate(exp, e.args[0])
+        return None
+    fill_estimate(exp, est)
+    return est.model
+
+
+def fill_estimate(exp, est: ResourceEstimate):
+    exp.est_nvars = est.nvars
+    exp.est_nhard = est.nhard
+    exp.est_ntotalvars = est.ntotalvars
+    exp.est_memory = est.memory
+
+
+def exit_with_status(exp, status: str, output: str = "") -> NoReturn:
+    """
+    Report `exp` with `status` ("memory-cap" or "oom") in the same way as results, and exit with 1.
+    """
+    exp.status = status
+    if output == "":
+        print(exp.to_json(ensure_ascii=False))  # type: ignore
+    else:
+        with open(output, "w") as f:
+            f.write(exp.to_json(ensure_ascii=False))  # type: ignore
+    sys.exit(1)
+
+
+def reported_status(out: bytes, default: str = "error") -> str:
+    """
+    Status in the last line of the output of a solver that exited with an error, e.g., "memory-cap" or "oom".
+    """
+    try:
+        return json.loads(out.strip().splitlines()[-1])["status"]
+    except (IndexError, ValueError, KeyError, TypeError):
+        return default
+
+
+# model -> command line of the solver computing it
+commands = {
+    "slp": ["src/slp_solver.py"],
+    "rlslp": ["src/rlslp_solver.py"],
+    "cs-unary": ["src/cs_solver.py", "--depth_encoding", "unary"],
+    "cs-bounded": ["src/cs_solver.py", "--depth_encoding", "bounded"],
+    "cs-binary": ["src/cs_solver.py", "--depth_encoding", "binary"],
+    "cs-transitive": ["src/cs_solver.py", "--depth_encoding", "transitive"],
+    "bidirectional-var0": ["src/bidirectional_solver_var0.py"],
+    "bidirectional-var1": ["src/bidirectional_solver_var1.py"],
+    "bidirectional-var2": ["src/bidirectional_solver_var2.py"],
+    "attractor": ["src/attractor_solver.py", "--algo", "min"],
+}
+
+
+def measure(
+    model: str, file: str, timeout: float, time_budget: float = 0
+) -> Optional[Dict[str, float]]:
+    """
+    Run the solver of `model` on `file` and return the size of the WCNF, the peak RSS (MB)
+    and whether the search completed (1) or was stopped by `time_budget` (0).
+    """
+    budget = ["--time_budget", str(time_budget)] if time_budget > 0 else []
+    (out, usage, timed_out) = accounting.run(
+        [sys.executable, "-W", "ignore"] + commands[model] + ["--file", file] + budget,
+        timeout,
+    )
+    if timed_out or usage.exit_code != 0:
+        return None
+    exp = json.loads(out.splitlines()[-1])
+    return {
+        "nvars": exp["sol_nvars"],
+        "nhard": exp["sol_nhard"],
+        "ntotalvars": exp["sol_ntotalvars"],
+        "memory": usage.max_rss,
+        "complete": int(exp.get("status") != "anytime"),
+    }
+
+
+def nnls(a, b):
+    """
+    x >= 0 minimizing |ax - b| by the active set method of Lawson and Hanson.
+    """
+    import numpy as np
+
+    (_, k) = a.shape
+    x = np.zeros(k)
+    passive = np.zeros(k, dtype=bool)
+    tol = 1e-10 * max(1.0, float(np.abs(a).max()))
+    for _ in range(3 * k):
+        w = np.where(passive, -np.inf, a.T @ (b - a @ x))
+        if passive.all() or w.max() <= tol:
+            break
+        passive[int(np.argmax(w))] = True
+        while True:
+            z = np.zeros(k)
+            z[passive] = np.linalg.lstsq(a[:, passive], b, rcond=None)[0]
+            if (z[passive] > 0).all():
+                x = z
+                break
+            # move towards z until a coefficient becomes zero, and drop it
+            neg = passive & (z <= 0)
+            x = x + np.min(x[neg] / (x[neg] - z[neg])) * (z - x)
+            passive &= x > tol
+            x[~passive] = 0
+    return x
+
+
+def calibrate(files: List[str], timeout: float, time_budget: float):
+    """
+    Print the models fitted to runs of the solvers on `files`.
+    The coefficients are nonnegative, so that upper bounds of the features give upper bounds of the estimates.
+    Sizes are fitted by least squares of the relative errors, so that small and large inputs count equally.
+    The base memory and the memory per literal of a model are fitted in the same way to the peak RSS
+    of the runs that completed, as the search of some encodings takes more memory than the formula;
+    runs stopped by `time_budget` only count for the sizes.
+    """
+    import numpy as np
+
+    # all runs come first: the peak RSS of a child counts the memory of this process when it starts
+    # (Linux keeps the high-water mark across exec), which computing the features would raise
+    runs = {}
+    for model in commands.keys():
+        for file in files:
+            res = measure(model, file, timeout, time_budget)
+            print(model, os.path.basename(file), res, file=sys.stderr, flush=True)
+            runs[(model, file)] = res
+    features = {file: text_features(open(file, "rb").read()) for file in files}
+    new_models = {}
+    for model in commands.keys():
+        xs = []
+        ys = []
+        mems = []
+        for file in files:
+            res = runs[(model, file)]
+            if res is None:
+                continue
+            xs.append([features[file][f] for f in models[model]["features"]])
+            ys.append([res["nvars"], res["nhard"], res["ntotalvars"]])
+            if res["complete"]:
+                mems.append([1, res["ntotalvars"], res["memory"]])
+        if len(xs) == 0:
+            continue
+        x = np.array(xs, dtype=float)
+        y = np.array(ys, dtype=float)
+        new_models[model] = {"features": models[model]["features"]}
+        for (k, key) in enumerate(["nvars", "nhard", "ntotalvars"]):
+            coef = nnls(x / y[:, k : k + 1], np.ones(len(y)))
+            new_models[model][key] = [round(float(c), 4) for c in coef]
+        if len(mems) > 0:
+            m = np.array(mems, dtype=float)
+            coef = nnls(m[:, :2] / m[:, 2:], np.ones(len(m)))
+            new_models[model]["base_memory"] = round(float(coef[0]), 1)
+            new_models[model]["memory_per_literal"] = float(f"{coef[1]:.4g}")
+        else:
+            for key in ["base_memory", "memory_per_literal"]:
+                new_models[model][key] = models[model][key]
+    print(f"models = {json.dumps(new_models, indent=4)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Estimate the size of the WCNF and the memory of the solvers."
+    )
+    parser.add_argument("--files", nargs="+", help="input files", required=True)
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="fit the models to runs of the solvers on the files",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="timeout (sec) of each run of --calibrate",
+        default=600,
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        help="time budget (sec) of the search of each run of --calibrate (0 for no limit)",
+        default=0,
+    )
+    args = parser.parse_args()
+
+    if args.calibrate:
+        calibrate(args.files, args.timeout, args.time_budget)
+    else:
+        print("\t".join(["file", "model", "nvars", "nhard", "ntotalvars", "memory"]))
+        for file in args.files:
+            text = open(file, "rb").read()
+            features = text_features(text)
+            for model in models.keys():
+                est = estimate(model, text, features)
+                print(
+                    "\t".join(
+                        map(
+                            str,
+                            [
+                                os.path.basename(file),
+                                model,
+                                est.nvars,
+                                est.nhard,
+                                est.ntotalvars,
+                                round(est.memory, 1),
+                            ],
+                        )
+                    )
+                )
@@ -0,0 +1,103 @@
+# Cache of verified results of the solvers in SQLite, so that benchmarks and tests/size_check.py do not
+# recompute solutions that never change for the same input, algorithm and options.
+#
+# A result is the Exp record of a run (as JSON, with the factors and metrics), keyed by the algorithm
+# (the encoding names of instance_cache.py, e.g. "bidirectional-var0"), the encoding version of its solver,
+# the options given to it (those with non-default values) and the SHA-256 of the input.
+# Workers of joblib write concurrently: the database is in WAL mode and writers wait for the lock.
+
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+from typing import Optional
+
+dbname = "out/result_cache.db"
+dbtable = "result_cache"
+
+
+def connect(path: str = dbname) -> sqlite3.Connection:
+    if os.path.dirname(path) != "":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    con = sqlite3.connect(path, timeout=60)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(
+        f"CREATE TABLE IF NOT EXISTS {dbtable} (key TEXT PRIMARY KEY, algo TEXT, encoding_version INTEGER, "
+        "options TEXT, input_hash TEXT, file_name TEXT, factor_size INTEGER, exp TEXT, date TEXT)"
+    )
+    return con
+
+
+def encoding_version(module: str) -> int:
+    """
+    `encoding_version` of the solver module (e.g. "attractor_solver").
+    """
+    return importlib.import_module(module).encoding_version
+
+
+def given_options(options: dict) -> dict:
+    """
+    The options with non-default (non-zero, non-empty) values, so that runs with and without default options share results.
+    """
+    return {k: v for (k, v) in options.items() if v}
+
+
+def result_key(algo: str, version: int, options: dict, input_hash: str) -> str:
+    return json.dumps(
+        [algo, version, given_options(options), input_hash], sort_keys=True
+    )
+
+
+def input_hash(file: str) -> str:
+    with open(file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def lookup(
+    algo: str, version: int, options: dict, file: str, path: str = dbname
+) -> Optional[str]:
+    """
+    The cached Exp record (JSON) of `algo` on `file`, or None.
+    """
+    key = result_key(algo, version, options, input_hash(file))
+    con = connect(path)
+    try:
+        row = con.execute(f"SELECT exp FROM {dbtable} WHERE key = ?", (key,)).fetchone()
+    finally:
+        con.close()
+    return None if row is None else row[0]
+
+
+def store(
+    algo: str,
+    version: int,
+    options: dict,
+    file: str,
+    exp: str,
+    factor_size: int,
+    path: str = dbname,
+):
+    """
+    Store the Exp record (JSON) of a verified run of `algo` on `file`.
+    """
+    h = input_hash(file)
+    key = result_key(algo, version, options, h)
+    con = connect(path)
+    try:
+        with con:
+            con.execute(
+                f"INSERT OR REPLACE INTO {dbtable} VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+                (
+                    key,
+                    algo,
+                    version,
+                    json.dumps(given_options(options), sort_keys=True),
+                    h,
+                    os.path.basename(file),
+                    factor_size,
+                    exp,
+                ),
+            )
+    finally:
+        con.close()
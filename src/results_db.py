@@ -0,0 +1,383 @@
+# Results of the benchmarks in SQLite (out/satcomp.db), a table per benchmark with a column per field of its Exp
+# record, typed as INTEGER, REAL or TEXT (lists and nested records such as factors and profile are JSON), and an
+# index on (file_name, algo).
+#
+# The process running a benchmark is the only writer: rows are put into a queue as the jobs finish, and a thread
+# holding the only connection inserts them in batches with executemany, so that workers never wait for the lock.
+# The database is in WAL mode, so that reports can read it during a run.
+# Tables created by older versions have untyped columns with every value stored as str. They are converted when
+# opened for writing, or by `python src/results_db.py` for all tables of the database.
+#
+# Runs of the benchmarks are resumable: the table bench_jobs records each job of a benchmark, keyed by the algorithm
+# and file, with the encoding version of the solver, the timeout, the status and the time it took. A job with the same
+# version and timeout is skipped unless it failed and failed jobs are retried, and the result of a job run again
+# replaces the previous one. The times predict the remaining time of a run (see `Progress`).
+
+import argparse
+import ast
+import dataclasses
+import importlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, get_type_hints
+
+dbname = "out/satcomp.db"
+jobs_table = "bench_jobs"
+# statuses of jobs that do not fail again when run again
+succeeded = ["correct", "complete", "anytime"]
+
+# table -> (module, class) of the Exp records
+tables = {
+    "attractor_bench": ("attractor_bench_format", "AttractorExp"),
+    "bidirectional_bench": ("bidirectional", "BiDirExp"),
+    "lz_bench": ("lz_bench", "LZExp"),
+    "scaling_bench": ("scaling_bench", "ScalingExp"),
+}
+
+
+def connect(path: str = dbname) -> sqlite3.Connection:
+    if os.path.dirname(path) != "":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    con = sqlite3.connect(path, timeout=60)
+    con.execute("PRAGMA journal_mode=WAL")
+    return con
+
+
+@dataclass
+class Job:
+    algo: str
+    file_name: str
+    encoding_version: int = 0
+    # seconds, 0 for no timeout
+    timeout: float = 0
+
+
+@dataclass
+class PastJob:
+    encoding_version: int
+    timeout: float
+    status: str
+    time: float
+
+
+def columns(exp_type: type) -> List[Tuple[str, str]]:
+    """
+    Columns of the fields of `exp_type` with their types, where "JSON" is a TEXT column of JSON values.
+    """
+    hints = get_type_hints(exp_type)
+    res = []
+    for f in dataclasses.fields(exp_type):
+        t = hints[f.name]
+        if t is bool or t is int:
+            res.append((f.name, "INTEGER"))
+        elif t is float:
+            res.append((f.name, "REAL"))
+        elif t is str:
+            res.append((f.name, "TEXT"))
+        else:
+            res.append((f.name, "JSON"))
+    return res
+
+
+def sql_type(t: str) -> str:
+    return "TEXT" if t == "JSON" else t
+
+
+def to_row(exp, cols: List[Tuple[str, str]]) -> tuple:
+    d = dataclasses.asdict(exp)
+    return tuple(
+        json.dumps(d[name], ensure_ascii=False) if t == "JSON" else d[name]
+        for (name, t) in cols
+    )
+
+
+def from_str(value: Optional[str], t: str) -> Any:
+    """
+    Value of the type of a column from a value of an untyped table, which is kept if it cannot be converted.
+    """
+    if value is None or t == "TEXT":
+        return value
+    try:
+        if t == "INTEGER":
+            return (
+                int(float(value))
+                if value not in ["True", "False"]
+                else int(value == "True")
+            )
+        if t == "REAL":
+            return float(value)
+        return json.dumps(ast.literal_eval(value), ensure_ascii=False)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def create_table(con: sqlite3.Connection, table: str, exp_type: type):
+    """
+    Create `table` for `exp_type` if not exists. An untyped table is converted, and the columns of new fields are added.
+    """
+    cols = columns(exp_type)
+    existing = con.execute(f"PRAGMA table_info({table})").fetchall()
+    with con:
+        # DDL is not in a transaction unless begun
+        con.execute("BEGIN")
+        if len(existing) == 0:
+            con.execute(
+                f"CREATE TABLE {table} ({', '.join(f'{name} {sql_type(t)}' for (name, t) in cols)})"
+            )
+        elif any(col[2] == "" for col in existing):
+            migrate_table(con, table, cols, [col[1] for col in existing])
+        else:
+            names = set(col[1] for col in existing)
+            for (name, t) in cols:
+                if name not in names:
+                    con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type(t)}")
+        con.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_file_algo ON {table} (file_name, algo)"
+        )
+        # the result of a job is the row of the file with the date
+        con.execute(
+            f"CREATE TABLE IF NOT EXISTS {jobs_table} (bench TEXT, algo TEXT, file_name TEXT, encoding_version INTEGER, timeout REAL, "
+            "status TEXT, time REAL, result_date TEXT, date TEXT, PRIMARY KEY (bench, algo, file_name))"
+        )
+
+
+def migrate_table(
+    con: sqlite3.Connection,
+    table: str,
+    cols: List[Tuple[str, str]],
+    old_names: List[str],
+):
+    con.execute(f"ALTER TABLE {table} RENAME TO {table}_untyped")
+    con.execute(
+        f"CREATE TABLE {table} ({', '.join(f'{name} {sql_type(t)}' for (name, t) in cols)})"
+    )
+    rows = []
+    for old in con.execute(f"SELECT * FROM {table}_untyped"):
+        d = dict(zip(old_names, old))
+        rows.append(tuple(from_str(d.get(name), t) for (name, t) in cols))
+    con.executemany(
+        f"INSERT INTO {table} VALUES ({', '.join('?' for _ in cols)})", rows
+    )
+    con.execute(f"DROP TABLE {table}_untyped")
+
+
+def clear_table(table: str, exp_type: type, path: str = dbname):
+    """
+    Delete table if exists, and create new table.
+    """
+    con = connect(path)
+    try:
+        with con:
+            con.execute(f"DROP TABLE IF EXISTS {table}")
+        create_table(con, table, exp_type)
+        with con:
+            con.execute(f"DELETE FROM {jobs_table} WHERE bench = ?", (table,))
+    finally:
+        con.close()
+
+
+def exp_type_of(table: str) -> type:
+    (module, name) = tables[table]
+    return getattr(importlib.import_module(module), name)
+
+
+def migrate(path: str = dbname):
+    """
+    Convert the untyped tables of the benchmarks in the database.
+    """
+    con = connect(path)
+    try:
+        names = [
+            row[0]
+            for row in con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        ]
+        for table in names:
+            if table in tables:
+                create_table(con, table, exp_type_of(table))
+    finally:
+        con.close()
+
+
+class ResultsWriter:
+    """
+    The writer of Exp records of `exp_type` into `table`. Records given to `put` are inserted by a thread in batches
+    of at most `batch_size` rows, and all of them are written when closed.
+    `past` has the jobs of the benchmark run before by (algo, file_name).
+    """
+
+    def __init__(
+        self, table: str, exp_type: type, path: str = dbname, batch_size: int = 64
+    ):
+        self.table = table
+        self.path = path
+        self.batch_size = batch_size
+        self.columns = columns(exp_type)
+        self.insert = (
+            f"INSERT INTO {table} VALUES ({', '.join('?' for _ in self.columns)})"
+        )
+        con = connect(path)
+        try:
+            create_table(con, table, exp_type)
+            rows = con.execute(
+                f"SELECT algo, file_name, encoding_version, timeout, status, time FROM {jobs_table} WHERE bench = ?",
+                (table,),
+            ).fetchall()
+        finally:
+            con.close()
+        self.past: Dict[Tuple[str, str], PastJob] = {
+            (row[0], row[1]): PastJob(*row[2:]) for row in rows
+        }
+        self.queue: "queue.Queue[Optional[Tuple[tuple, Optional[Job], float]]]" = (
+            queue.Queue()
+        )
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def done(self, job: Job, retry_failed: bool = False) -> bool:
+        """
+        Whether `job` was run before with the same encoding version and timeout, and is not retried.
+        """
+        past = self.past.get((job.algo, job.file_name))
+        if (
+            past is None
+            or past.encoding_version != job.encoding_version
+            or past.timeout != job.timeout
+        ):
+            return False
+        return past.status in succeeded or not retry_failed
+
+    def put(self, exp, job: Optional[Job] = None, elapsed: float = 0.0):
+        """
+        Write `exp`, as the result of `job` which took `elapsed` seconds if given.
+        """
+        self.queue.put((to_row(exp, self.columns), job, elapsed))
+
+    def run(self):
+        con = connect(self.path)
+        done = False
+        while not done:
+            items = []
+            item = self.queue.get()
+            while True:
+                if item is None:
+                    done = True
+                    break
+                items.append(item)
+                if len(items) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if items:
+                with con:
+                    self.write(con, items)
+        con.close()
+
+    def write(
+        self, con: sqlite3.Connection, items: List[Tuple[tuple, Optional[Job], float]]
+    ):
+        jobs = [(job, row, t) for (row, job, t) in items if job is not None]
+        # the previous results of the jobs
+        olds = []
+        for (job, _, _) in jobs:
+            old = con.execute(
+                f"SELECT file_name, result_date FROM {jobs_table} WHERE bench = ? AND algo = ? AND file_name = ?",
+                (self.table, job.algo, job.file_name),
+            ).fetchone()
+            if old is not None:
+                olds.append(old)
+        con.executemany(
+            f"DELETE FROM {self.table} WHERE file_name = ? AND date = ?", olds
+        )
+        con.executemany(self.insert, [row for (row, _, _) in items])
+        d = dict(self.columns)
+        (i_status, i_date) = (list(d).index("status"), list(d).index("date"))
+        con.executemany(
+            f"INSERT OR REPLACE INTO {jobs_table} VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+            [
+                (
+                    self.table,
+                    job.algo,
+                    job.file_name,
+                    job.encoding_version,
+                    job.timeout,
+                    row[i_status],
+                    t,
+                    row[i_date],
+                )
+                for (job, row, t) in jobs
+            ],
+        )
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class Progress:
+    """
+    Print the jobs finished and remaining with the estimated remaining time of `jobs` run by `n_workers`,
+    where the time of a job is predicted by its past time, or by the mean time of the jobs finished in this run
+    (of the past jobs before any finishes).
+    """
+
+    def __init__(
+        self, jobs: List[Job], past: Dict[Tuple[str, str], PastJob], n_workers: int
+    ):
+        self.remaining = {
+            (job.algo, job.file_name): past[job.algo, job.file_name].time
+            if (job.algo, job.file_name) in past
+            else None
+            for job in jobs
+        }
+        self.n_workers = max(1, n_workers)
+        self.times = [p.time for p in past.values()]
+        self.n_finished = 0
+        self.begin = time.time()
+        # jobs finish in threads of lz_bench
+        self.lock = threading.Lock()
+
+    def eta(self) -> float:
+        if len(self.times) == 0:
+            return 0.0
+        mean = sum(self.times) / len(self.times)
+        return (
+            sum(mean if t is None else t for t in self.remaining.values())
+            / self.n_workers
+        )
+
+    def finish(self, job: Job, status: str, t: float):
+        with self.lock:
+            if self.n_finished == 0:
+                self.times = []
+            self.n_finished += 1
+            self.times.append(t)
+            self.remaining.pop((job.algo, job.file_name), None)
+            print(
+                f"[{self.n_finished}/{self.n_finished + len(self.remaining)}] {job.algo} {job.file_name}: {status} ({t:.1f}s), "
+                f"{len(self.remaining)} remaining, ETA {self.eta():.0f}s, elapsed {time.time() - self.begin:.0f}s",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the untyped tables of the benchmarks to typed ones."
+    )
+    parser.add_argument("--db", type=str, help="database", default=dbname)
+    args = parser.parse_args()
+    migrate(args.db)
@@ -6,23 +6,35 @@ import sys
 import time
 from enum import auto
 from logging import CRITICAL, DEBUG, INFO, Formatter, StreamHandler, getLogger
-from typing import Optional
-
-from pysat.card import CardEnc
-from pysat.examples.rc2 import RC2
-from pysat.formula import WCNF
-
+from typing import List, Optional
+
+import instance_cache
+import mysat
+import profiling
+import stralgo
+import tracing
+from clause_store import ClauseStore
+from interval_index import IntervalIndex
+from maxsat_engine import (
+    EngineOptions,
+    add_engine_args,
+    create_engine,
+    engine_options_from_args,
+)
 from mysat import (
     Enum,
     Literal,
     LiteralManager,
-    pysat_and,
     pysat_atleast_one,
+    pysat_atmost_one,
     pysat_if,
+    pysat_if_and_then_or,
     pysat_iff,
     pysat_name_cnf,
     pysat_or,
 )
+from preprocess import WCNFPreprocessor
+from resource_estimate import add_resource_args, apply_memory_cap, exit_with_status
 from slp import SLPExp, SLPType
 
 logger = getLogger(__name__)
@@ -33,20 +45,25 @@ formatter = Formatter(FORMAT)
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-#SLPLiteralという列挙型のクラスの定義
+# 符号化のバージョン (式を変えたら上げる. 古いバージョンのキャッシュされたインスタンスは使われない)
+encoding_version = 1
+
+# SLPLiteralという列挙型のクラスの定義
 class RLSLPLiteral(Enum):
-    true = Literal.true             #true = 1
-    false = Literal.false           #false = 2
-    auxlit = Literal.auxlit         #auxlit = 3
+    true = Literal.true  # true = 1
+    false = Literal.false  # false = 2
+    auxlit = Literal.auxlit  # auxlit = 3
     phrase = auto()  # (i,l) (representing T[i:i+l)) is phrase of grammar parsing
     pstart = auto()  # i is a starting position of a phrase of grammar parsing
     ref = auto()  # (j,i,l): phrase (j,j+l) references T[i,i+l)  (T[i,i+l] <- T[j,j+l])
-    rlref = auto() # (j,i,l): phrase (j,j+l) references (T[i,i+l))*(t-1)  ((T[i,i+l])*(t-1) <- T[j,j+l])
+    rlref = (
+        auto()
+    )  # (j,i,l): phrase (j,j+l) references (T[i,i+l))*(t-1)  ((T[i,i+l])*(t-1) <- T[j,j+l])
     referred = auto()  # (i,l): T[i,i+l) is referenced by some phrase
     rlreferred = auto()  # (i,l):  One of the three condition is implied,
-                         # "T[i,i+l) is referenced by some phrase" or
-                         # "T[i,i+l) is labeled by a run-length non-terminal" or
-                         # "[i,i+l) is the left child of a run-length rule"
+    # "T[i,i+l) is referenced by some phrase" or
+    # "T[i,i+l) is labeled by a run-length non-terminal" or
+    # "[i,i+l) is the left child of a run-length rule"
 
 
 class RLSLPLiteralManager(LiteralManager):
@@ -71,7 +88,7 @@ class RLSLPLiteralManager(LiteralManager):
     # 新しくIDを割り当てるメソッド
     def newid(self, *obj) -> int:
         res = super().newid(*obj)
-        if len(obj) > 0 and obj[0] in self.verifyf:
+        if self.debug and len(obj) > 0 and obj[0] in self.verifyf:
             self.verifyf[obj[0]](*obj)
         return res
 
@@ -92,7 +109,7 @@ class RLSLPLiteralManager(LiteralManager):
         assert len(obj) == 2
         name, i = obj
         assert name == self.lits.pstart
-        assert 0 <= i <= self.n #i \in [1,n+1]
+        assert 0 <= i <= self.n  # i \in [1,n+1]
 
     # 変数がref_{i<-j,l}の型であるか確認するメソッド
     def verify_ref(self, *obj):
@@ -101,7 +118,7 @@ class RLSLPLiteralManager(LiteralManager):
         assert len(obj) == 4
         name, j, i, l = obj
         assert name == self.lits.ref
-        assert 0 <= i < self.n-1 #i \in [1,n-1]
+        assert 0 <= i < self.n - 1  # i \in [1,n-1]
         assert i < i + l <= j < j + l <= self.n
         assert 1 < l <= self.n
 
@@ -139,12 +156,13 @@ class RLSLPLiteralManager(LiteralManager):
         assert 0 < l <= self.n
         assert i + l <= self.n
 
+
 # SLPルールにおける参照先の候補を格納する関数
 def compute_lpf(text: bytes):  # non-self-referencing lpf
     """
     lpf[i] = length of longest prefix of text[i:] that occurs in text[0:i]
     """
-    #ここをtext[i:]のtext[0:i+t]中の最長接頭辞の長さに置き換えたい
+    # ここをtext[i:]のtext[0:i+t]中の最長接頭辞の長さに置き換えたい
     n = len(text)
     lpf = []
     for i in range(0, n):
@@ -177,32 +195,116 @@ def compute_rllpf(text: bytes):
     # print(f"rllpf = {rllpf}")
     return rllpf
 
+
+# 連長圧縮ルールの参照の候補を全探索で列挙する関数
+def compute_rlrefs_naive(text: bytes):
+    """
+    Enumerate (i, j, l) s.t. phrase T[j:j+l) can be a run-length reference to T[i:j),
+    i.e., i < j < i+l, T[i:i+l) = T[j:j+l) and l is a multiple of j-i.
+    """
+    n = len(text)
+    rllpf = compute_rllpf(text)
+    res = []
+    for i in range(n):
+        for j in range(i + 1, n):
+            for l in range(2, rllpf[j] + 1):
+                if (
+                    j < i + l
+                    and text[i : i + l] == text[j : j + l]
+                    and (l % (j - i)) == 0
+                ):
+                    res.append((i, j, l))
+    return res
+
+
+# 連長圧縮ルールの参照の候補を連から列挙する関数
+def compute_rlrefs(text: bytes):
+    """
+    Enumerate the same triplets as `compute_rlrefs_naive` from the runs of text.
+    (i, j, l) corresponds to the cube or higher integer power T[i:j+l) = T[i:j)^k with k = l/(j-i)+1 >= 3.
+    """
+    res = [(b, b + p, (k - 1) * p) for (b, p, k) in stralgo.integer_powers(text, 3)]
+    res.sort()
+    return res
+
+
+# フレーズの候補に対してのみphrase変数を定義する関数
+def phrase_clauses(
+    lm: LiteralManager,
+    pstart_lit: Enum,
+    phrase_lit: Enum,
+    n: int,
+    phrases: IntervalIndex,
+) -> List[List[int]]:
+    """
+    Define phrase(i,l) only for the candidates (i,l) in `phrases` and return the clauses s.t.
+    phrase(i,l) <=> pstart[i] and pstart[i+l] and no pstart in (i, i+l), and
+    every pstart[i] (i < n) is the beginning of some candidate phrase.
+    phrase(i,l) and pstart[i] are the literals (phrase_lit, i, l) and (pstart_lit, i) of `lm`.
+
+    "no pstart in (i, i+l)" is shared among the candidates beginning at i
+    by a chain of auxiliary literals over l, instead of one conjunction per interval.
+    """
+    clauses = []
+    for i in range(n):
+        pstart = lm.getid(pstart_lit, i)
+        # nopstart: literal for "no pstart in (i, i+covered)", None if it is trivially true
+        nopstart = None
+        covered = 1
+        phrase_lits = []
+        for l in phrases.starting_at(i):
+            while covered < l:
+                p = lm.getid(pstart_lit, i + covered)
+                if nopstart is None:
+                    nopstart = -p
+                else:
+                    x = lm.newid()
+                    clauses.extend([[-x, nopstart], [-x, -p], [x, -nopstart, p]])
+                    nopstart = x
+                covered += 1
+            body = [pstart, lm.getid(pstart_lit, i + l)]
+            if nopstart is not None:
+                body.append(nopstart)
+            phrase = lm.newid(phrase_lit, i, l)
+            clauses.extend(pysat_if(phrase, x) for x in body)
+            clauses.append(pysat_if_and_then_or(body, [phrase]))
+            phrase_lits.append(phrase)
+        # 候補でない区間はフレーズにならない
+        clauses.append(pysat_if_and_then_or([pstart], phrase_lits))
+    return clauses
+
+
 # 条件式を基に重み付きCNFの作成
 def smallest_RLSLP_WCNF(text: bytes):
     """
     Compute the max sat formula for computing the smallest SLP
     """
     n = len(text)
-    logger.info(f"text length = {len(text)}") # テキストの長さをログ出力
-    wcnf = WCNF() #空の重み付きCNFを生成
+    logger.info(f"text length = {len(text)}")  # テキストの長さをログ出力
+    wcnf = ClauseStore()  # 空の重み付きCNFを生成
 
-    lm = RLSLPLiteralManager(text) # textに対して生成されるすべての変数からなる集合を表す.
+    lm = RLSLPLiteralManager(text)  # textに対して生成されるすべての変数からなる集合を表す.
+    rec = profiling.BuildRecorder(wcnf, lm)
     # print("sloooow algorithm for lpf... (should use linear time algorithm)")
     lpf = compute_lpf(text)
-    rllpf = compute_rllpf(text)
+    rec.phase("index build")
+    # 密な族だけ配列で管理し, ref などの疎な族は辞書で管理する
+    maxl = max([1] + lpf) + 1
+    lm.declare(lm.lits.pstart, n + 1)
+    lm.declare(lm.lits.referred, n, maxl)
 
     # defining the literals  ########################################
     # ref(i,j,l): defined for all i,j,l>1 s.t. T[i:i+l) = T[j:j+l)
     # pstart(i)
     # phrase(i,l) defined for all i, l > 1 with l <= lpf[i]
-    phrases = []
+    phrases = IntervalIndex(n)
     for i in range(n + 1):
         lm.newid(lm.lits.pstart, i)  # definition of p_i
 
-    #タイプA or タイプBのフレーズになり得る変数の作成
+    # タイプA or タイプBのフレーズになり得る変数の作成
     for i in range(n):
         for l in range(1, max(2, lpf[i] + 1)):
-            phrases.append((i, l))
+            phrases.add(i, l)
             # lm.newid(lm.lits.phrase, i, l)  # definition of f_{i,l}(type-A)
 
             """"
@@ -211,7 +313,7 @@ def smallest_RLSLP_WCNF(text: bytes):
             lm.newid(lm.lits.phrase, i, rll)  # definition of f_{i,l}(type-b)
         """
 
-    refs_by_referred = {} #辞書型
+    refs_by_referred = {}  # 辞書型
     refs_by_referrer = {}
     for i in range(n):
         for j in range(i + 1, n):
@@ -220,39 +322,33 @@ def smallest_RLSLP_WCNF(text: bytes):
                     lm.newid(lm.lits.ref, j, i, l)  # definition of ref_{i<-j,l}
                     if not (i, l) in refs_by_referred:
                         refs_by_referred[i, l] = []
-                    refs_by_referred[i, l].append(j) #キー[i,l]にjを格納する
+                    refs_by_referred[i, l].append(j)  # キー[i,l]にjを格納する
                     if not (j, l) in refs_by_referrer:
                         refs_by_referrer[j, l] = []
-                    refs_by_referrer[j, l].append(i) #キー[j,l]にiを格納する
+                    refs_by_referrer[j, l].append(i)  # キー[j,l]にiを格納する
 
-    for (i, l) in refs_by_referred.keys(): #キーの個数分,for文をまわす
-        lm.newid(lm.lits.referred, i, l) #definition of q_{i,l}
+    for (i, l) in refs_by_referred.keys():  # キーの個数分,for文をまわす
+        lm.newid(lm.lits.referred, i, l)  # definition of q_{i,l}
 
     ###### 新しく追加部分 #######################################
-    refs_by_rliterated = {} # 連長圧縮ルールの左のノードが表す区間（キー），右のノードが表す区間の長さ（値）
-    refs_by_rlreferrer = {} # 連長圧縮ルールの右のノードが表す区間（キー），左のノードの開始位置（値）
-    refs_by_allrule = {} # 連長圧縮ルール全体が表す区間（キー），右のノードの開始位置（値）
-
-    #ref^rの定義
-    for i in range(n):
-        for j in range(i + 1, n):
-            for l in range(2, rllpf[j] + 1):
-                # j-i \in PDvi(l)の条件を追加
-                if j < i + l  and text[i : i + l] == text[j : j + l] and (l % (j - i)) == 0:
-                    lm.newid(lm.lits.rlref, j, i, l)  # definition of {ref^r}_{i<-j,l}
-                    if not (i, j + l - i) in refs_by_allrule:
-                        refs_by_allrule[i, j + l - i] = []
-                    refs_by_allrule[i, j + l - i].append(j)
-                    if not (i, j - i) in refs_by_rliterated:
-                        refs_by_rliterated[i, j - i] = []
-                    refs_by_rliterated[i, j - i].append(l)
-                    if not (j, l) in refs_by_rlreferrer:
-                        refs_by_rlreferrer[j, l] = []
-                    refs_by_rlreferrer[j, l].append(i) # 参照先の位置を格納
-                    if not (j,l) in phrases:
-                        phrases.append((j, l))
-                        # lm.newid(lm.lits.phrase, j, l)  # definition of f_{i,l}（type-B）
-                        # print(phrases)
+    refs_by_rliterated = {}  # 連長圧縮ルールの左のノードが表す区間（キー），右のノードが表す区間の長さ（値）
+    refs_by_rlreferrer = {}  # 連長圧縮ルールの右のノードが表す区間（キー），左のノードの開始位置（値）
+    refs_by_allrule = {}  # 連長圧縮ルール全体が表す区間（キー），右のノードの開始位置（値）
+
+    # ref^rの定義: 連から候補を列挙する (j-i \in PDvi(l))
+    for (i, j, l) in compute_rlrefs(text):
+        lm.newid(lm.lits.rlref, j, i, l)  # definition of {ref^r}_{i<-j,l}
+        if not (i, j + l - i) in refs_by_allrule:
+            refs_by_allrule[i, j + l - i] = []
+        refs_by_allrule[i, j + l - i].append(j)
+        if not (i, j - i) in refs_by_rliterated:
+            refs_by_rliterated[i, j - i] = []
+        refs_by_rliterated[i, j - i].append(l)
+        if not (j, l) in refs_by_rlreferrer:
+            refs_by_rlreferrer[j, l] = []
+        refs_by_rlreferrer[j, l].append(i)  # 参照先の位置を格納
+        phrases.add(j, l)
+        # lm.newid(lm.lits.phrase, j, l)  # definition of f_{i,l}（type-B）
 
     # print(f"連長圧縮ルール全体 = {refs_by_allrule}")
     # print("連長圧縮左のノード", refs_by_rliterated)
@@ -263,41 +359,27 @@ def smallest_RLSLP_WCNF(text: bytes):
     referred_set1 = set(refs_by_rliterated.keys())
     referred_set2 = set(refs_by_allrule.keys())
     referred_set3 = set(refs_by_referred.keys())
-    referred_set = (referred_set1|referred_set2|referred_set3)
-    refs_by_rlreferred = list(referred_set)
+    referred_set = referred_set1 | referred_set2 | referred_set3
+    refs_by_rlreferred = IntervalIndex(n)
+    refs_by_rlreferred.update(referred_set)
     # print(f"phraseの候補={phrases}")
     # print(f"refの候補={refs_by_referrer}")
     # print(f"ref^rの候補={refs_by_rlreferrer}")
     # print(f"q'の候補={refs_by_rlreferred}")
     for (i, l) in refs_by_rlreferred:
-        lm.newid(lm.lits.rlreferred, i, l) # definition of q'_{i<-j,l}
+        lm.newid(lm.lits.rlreferred, i, l)  # definition of q'_{i<-j,l}
 
     # refの添え字のリストとref^rの添え字のリストを結合させ重複を除いたリスト
-    refs_by_allreferrers = list(set(refs_by_rlreferrer.keys())|set(refs_by_referrer.keys()))
+    refs_by_allreferrers = list(
+        set(refs_by_rlreferrer.keys()) | set(refs_by_referrer.keys())
+    )
+    rec.phase("literal definition")
 
     # // start constraint (2)(3) ###############################
     # (2):phrase(i,l) <=> pstart[i] and pstart[i+l] and \neg{pstart[i+1]} and .. and \neg{pstart[i+l-1]}
-    for i in range(n):
-        for l in range(1,n - i +1):
-            plst = [-lm.getid(lm.lits.pstart, (i + j)) for j in range(1, l)] + [
-                lm.getid(lm.lits.pstart, i), #p_iの取得
-                lm.getid(lm.lits.pstart, (i + l)), #p_(i+l)の取得
-            ]
-            lm.newid(lm.lits.phrase, i, l)
-
-        # range_iff_startp:plst全体を表すliteral
-        # clauses:条件式(2)の右辺を表す
-            range_iff_startp, clauses = pysat_and(lm.newid, plst)
-            wcnf.extend(clauses)
-            wcnf.extend(pysat_iff(lm.getid(lm.lits.phrase, i, l), range_iff_startp))
-        # pysat_iff(x,y)->リスト[[-x,y], [x, -y]]を返す．(x<=>yを表現する関数)
-
     # (3):there must be at least one new phrase beginning from [i+1,...,i+max(1,lpf[i] or rllpf[i])]
-    for i in range(n):
-        for l in range(1,n - i + 1):
-            if not (i,l) in phrases:
-                # print(f"phrasesにないペア={i,l}")
-                wcnf.append([-lm.getid(lm.lits.phrase, i, l)])
+    # phrase(i,l)は候補(i,l) in phrasesに対してのみ定義し，pstart[i]ならば候補のいずれかがフレーズとなる
+    wcnf.extend(phrase_clauses(lm, lm.lits.pstart, lm.lits.phrase, n, phrases))
     """
     print(f"phrase = {phrases}")
     for (j,l) in phrases:
@@ -342,6 +424,7 @@ def smallest_RLSLP_WCNF(text: bytes):
             print(f"rllst = {rllst}")
             wcnf.append([lm.getid(lm.lits.pstart, i) for i in rllst])
     """
+    rec.block("constraint (2)(3)")
     # // end constraint (2)(3) ###############################
 
     # // start constraint (4),(5) ###############################
@@ -349,20 +432,18 @@ def smallest_RLSLP_WCNF(text: bytes):
     for (j, l) in refs_by_allreferrers:
         reflst1 = []
         reflst2 = []
-        if (j,l) in refs_by_referrer.keys():
+        if (j, l) in refs_by_referrer.keys():
             reflst1 = [lm.getid(lm.lits.ref, j, i, l) for i in refs_by_referrer[j, l]]
-        if (j,l) in refs_by_rlreferrer.keys():
+        if (j, l) in refs_by_rlreferrer.keys():
             # print(f"reflst(4,5) = {refs_by_rlreferrer[j, l], j, l}")
-            reflst2 = [lm.getid(lm.lits.rlref, j, i, l) for i in refs_by_rlreferrer[j, l]]
+            reflst2 = [
+                lm.getid(lm.lits.rlref, j, i, l) for i in refs_by_rlreferrer[j, l]
+            ]
 
         reflst = reflst1 + reflst2
 
-        # CardEnc.atmost(literalのリスト,閾値 k) -> "literalのリストの論理和 <= k"を表すリスト
-        clauses = CardEnc.atmost(
-            reflst,
-            bound=1,
-            vpool=lm.vpool,
-        )
+        # pysat_atmost_one(lm, literalのリスト) -> "literalのリストの論理和 <= 1"を表すリスト
+        clauses = pysat_atmost_one(lm, reflst)
         wcnf.extend(clauses)
 
         # (4):ref_{・<-j,l}+ref^r{・<-j,l}に対して,iが少なくとも一つが存在する.
@@ -370,11 +451,12 @@ def smallest_RLSLP_WCNF(text: bytes):
 
         # var_atleast:条件式(4)の右辺を表すliteral
         # clause_atleast:条件式(4)の右辺を節を表す
-        var_atleast, clause_atleast = pysat_name_cnf(lm, [clause]) # この関数じゃなくていいかも？
+        var_atleast, clause_atleast = pysat_name_cnf(lm, [clause])  # この関数じゃなくていいかも？
         wcnf.extend(clause_atleast)
         phrase = lm.getid(lm.lits.phrase, j, l)
         wcnf.extend(pysat_iff(phrase, var_atleast))
 
+    rec.block("constraint (4),(5)")
     # // end constraint (4),(5) ###############################
 
     # // start constraint (6) ###############################
@@ -387,9 +469,8 @@ def smallest_RLSLP_WCNF(text: bytes):
         )
         wcnf.extend(clauses)
         referredid = lm.getid(lm.lits.referred, i, l)
-        wcnf.extend(
-            pysat_iff(ref_sources, referredid)
-        )
+        wcnf.extend(pysat_iff(ref_sources, referredid))
+    rec.block("constraint (6)")
     # // end constraint (6) ###############################
 
     # // start constraint (7) ###############################
@@ -403,6 +484,7 @@ def smallest_RLSLP_WCNF(text: bytes):
             wcnf.append(lst)
             wcnf.append(pysat_if(qid, lm.getid(lm.lits.pstart, occ)))
             wcnf.append(pysat_if(qid, lm.getid(lm.lits.pstart, occ + l)))
+    rec.block("constraint (7)")
     # // end constraint (7) ###############################
 
     # // start constraint (8) ###############################
@@ -411,37 +493,31 @@ def smallest_RLSLP_WCNF(text: bytes):
         for i in refs_by_rlreferrer[j, l]:
             # print(f"rlref(8) = {refs_by_rlreferrer}")
             wcnf.append(
-                pysat_if(
-                    lm.getid(lm.lits.rlref, j, i, l),
-                    lm.getid(lm.lits.pstart, i)
-                )
+                pysat_if(lm.getid(lm.lits.rlref, j, i, l), lm.getid(lm.lits.pstart, i))
             )
+    rec.block("constraint (8)")
     # // start constraint (8) ###############################
 
     # // start constraint (9) ###############################
     # (9):q'の定義
     for (i, l) in refs_by_rlreferred:
-        referredlst=[] #q_{i,l}
-        rlreflst1=[] # 連長圧縮ルール全体からなるノードのリスト
-        rlreflst2=[] # 連長圧縮ルールの左のノードのリスト
-        rlreferredlst=[]
+        referredlst = []  # q_{i,l}
+        rlreflst1 = []  # 連長圧縮ルール全体からなるノードのリスト
+        rlreflst2 = []  # 連長圧縮ルールの左のノードのリスト
+        rlreferredlst = []
 
         if (i, l) in refs_by_referred:
             referredlst.append(lm.getid(lm.lits.referred, i, l))
 
-        for j in range(n):
-            # 連長圧縮ルール全体
-            # print(f"i,l,j = {i,l,j}")
-            # print(f"allrule = {refs_by_allrule}")
-            if (i,l) in refs_by_allrule.keys() and j in refs_by_allrule[i,l]:
-                # print(f"rlref_all(9) = {i,j,i + l - j}")
-                rlreflst1.append(lm.getid(lm.lits.rlref, j, i, i + l - j))
+        # 連長圧縮ルール全体
+        for j in refs_by_allrule.get((i, l), []):
+            # print(f"rlref_all(9) = {i,j,i + l - j}")
+            rlreflst1.append(lm.getid(lm.lits.rlref, j, i, i + l - j))
 
-            # 連長圧縮ルールの左のノード
-            if (i, l) in refs_by_rliterated.keys() and j == i + l:
-                for rll in refs_by_rliterated[i, l]:
-                    # print(f"rlref_left(9) = {i,j,rll}")
-                    rlreflst2.append(lm.getid(lm.lits.rlref, j, i, rll))
+        # 連長圧縮ルールの左のノード
+        for rll in refs_by_rliterated.get((i, l), []):
+            # print(f"rlref_left(9) = {i,i + l,rll}")
+            rlreflst2.append(lm.getid(lm.lits.rlref, i + l, i, rll))
 
         rlreferredlst.extend(referredlst + rlreflst1 + rlreflst2)
 
@@ -450,20 +526,14 @@ def smallest_RLSLP_WCNF(text: bytes):
         wcnf.extend(clause_refatleast)
         rlreferredid = lm.getid(lm.lits.rlreferred, i, l)
         wcnf.extend(pysat_iff(rlreferredid, var_refatleast))
+    rec.block("constraint (9)")
     # // end constraint (9) #################################
 
     # // start constraint (10) ###############################
     # (10):crossing intervals cannot be referred to at the same time.
-    #rlreferred = list(refs_by_rlreferred)
-    rlreferred_by_bp = [[] for _ in range(n)] # nサイズのリストを作成
-    for (occ, l) in refs_by_rlreferred:
-        rlreferred_by_bp[occ].append(l)
-    for lst in rlreferred_by_bp:
-        lst.sort(reverse=True)
-
     for (occ1, l1) in refs_by_rlreferred:
         for occ2 in range(occ1 + 1, occ1 + l1):
-            for l2 in rlreferred_by_bp[occ2]:
+            for l2 in reversed(refs_by_rlreferred.starting_at(occ2)):
                 if l2 == 1:
                     pass
                 else:
@@ -475,6 +545,7 @@ def smallest_RLSLP_WCNF(text: bytes):
                     id1 = lm.getid(lm.lits.rlreferred, occ1, l1)
                     id2 = lm.getid(lm.lits.rlreferred, occ2, l2)
                     wcnf.append([-id1, -id2])
+    rec.block("constraint (10)")
     # // end constraint (10) ###############################
 
     # // start constraint (11) ##############################
@@ -487,14 +558,17 @@ def smallest_RLSLP_WCNF(text: bytes):
     # 初期設定:p_1,p_(n+1) = true
     wcnf.append([lm.getid(lm.lits.pstart, 0)])
     wcnf.append([lm.getid(lm.lits.pstart, n)])
+    rec.block("constraint (11)")
     # // end constraint (11) ###############################
 
     # soft clauses: minimize # of phrases
     # soft clauseの作成
     for i in range(0, n):
         wcnf.append([-lm.getid(lm.lits.pstart, i)], weight=1)
+    rec.block("soft")
     return lm, wcnf, phrases, refs_by_referrer, refs_by_rlreferrer
 
+
 # リストxとリストyの比較関数
 # 1を返す → そのまま，0を返す → 順番を変える
 def postorder_cmp(x, y):
@@ -505,13 +579,13 @@ def postorder_cmp(x, y):
     # print(f"compare: {x} vs {y}")
     if i1 == i2 and i2 == j2:
         return 0
-    if j1 <= i2: # x < y
+    if j1 <= i2:  # x < y
         return -1
-    elif j2 <= i1: # y < x
+    elif j2 <= i1:  # y < x
         return 1
-    elif i1 <= i2 and j2 <= j1: # y \subset x(yはbの部分区間)
+    elif i1 <= i2 and j2 <= j1:  # y \subset x(yはbの部分区間)
         return 1
-    elif i2 <= i1 and j1 <= j2: # x \subset y
+    elif i2 <= i1 and j1 <= j2:  # x \subset y
         return -1
     else:
         assert False
@@ -532,12 +606,13 @@ def build_rlslp_aux(nodes, rlslp):
         # print(f"nodes[-1] = {nodes[-1]}")
         c = build_rlslp_aux(nodes, rlslp)
         children.append(c)
-    children.reverse() # 逆順に並び替える
+    children.reverse()  # 逆順に並び替える
     rlslp[root] = children
     # print(f"rlslp[root] = {rlslp[root]}")
     ##########################################################
     return root
 
+
 # turn multi-ary tree into binary tree
 # 与えられた生成規則を基に復元する順番を決定する関数
 def binarize_rlslp(root, rlslp):
@@ -549,13 +624,23 @@ def binarize_rlslp(root, rlslp):
     # print(f"numc = {numc}")
     # print(f"numc_children = {children}")
     # print(f"root_numc = {root}")
-    assert numc == 0 or numc >= 2 or (numc == 1 and children[0][2] == "RLrule" or children[0][2] == "RLrule")
+    assert (
+        numc == 0
+        or numc >= 2
+        or (numc == 1 and children[0][2] == "RLrule" or children[0][2] == "RLrule")
+    )
     if numc == 2:
         if children[1][2] == "RLrule":
             # children[1][2] = "RLrule" + str((children[1][1] - children[1][0]) / (children[0][1] - children[0][0])) + "times"
-            rlslp[root] = (binarize_rlslp(children[0], rlslp), binarize_rlslp(children[1], rlslp))
+            rlslp[root] = (
+                binarize_rlslp(children[0], rlslp),
+                binarize_rlslp(children[1], rlslp),
+            )
         else:
-            rlslp[root] = (binarize_rlslp(children[0], rlslp), binarize_rlslp(children[1], rlslp))
+            rlslp[root] = (
+                binarize_rlslp(children[0], rlslp),
+                binarize_rlslp(children[1], rlslp),
+            )
 
     elif numc > 0:
         leftc = children[0]
@@ -573,6 +658,7 @@ def binarize_rlslp(root, rlslp):
         rlslp[root] = None
     return root
 
+
 # RLSLPの生成規則から文字列を復元する関数
 def rlslp2str(root, rlslp):
     # print(f"root={root}")
@@ -585,20 +671,27 @@ def rlslp2str(root, rlslp):
         children = rlslp[root]
         # print(f"root = {root}")
         # print(f"children = {children}")
-        if ref is None: # SLPの生成規則を表す内部ノードの場合
-            assert len(children) == 2 or (len(children) == 1 and children[0][2] == "RLrule")
-            if children[0][2]  == "RLrule" and len(children) == 1:
+        if ref is None:  # SLPの生成規則を表す内部ノードの場合
+            assert len(children) == 2 or (
+                len(children) == 1 and children[0][2] == "RLrule"
+            )
+            if children[0][2] == "RLrule" and len(children) == 1:
                 res += rlslp2str(children[0], rlslp)
             else:
                 res += rlslp2str(children[0], rlslp)
                 res += rlslp2str(children[1], rlslp)
-        elif str(ref).startswith("RLrule") == True: # 連帳圧縮ルールの繰り返しを表した葉ノードの場合
+        elif str(ref).startswith("RLrule") == True:  # 連帳圧縮ルールの繰り返しを表した葉ノードの場合
             assert len(children) == 2
             # print(f"children_RLrule = {children}")
-            for j in range(int((children[1][1] - children[0][0]) / (children[0][1] - children[0][0]))):
+            for j in range(
+                int(
+                    (children[1][1] - children[0][0])
+                    / (children[0][1] - children[0][0])
+                )
+            ):
                 res += rlslp2str(children[0], rlslp)
 
-        else: # 葉ノードの場合
+        else:  # 葉ノードの場合
             # print(f"root = {root}")
             # print(f"children_leaves = {children}")
             assert children is None
@@ -611,29 +704,40 @@ def rlslp2str(root, rlslp):
             res += rlslp2str(n, rlslp)
     return res
 
+
 # SLPの解析木の情報を保存
 def recover_rlslp(text: bytes, pstartl, refs_by_referrer, refs_by_rlreferrer):
     n = len(text)
     # 各区間に対応するノードの種類を分類
-    referred = set((refs_by_referrer[j, l], l) for (j, l) in refs_by_referrer.keys()) # 参照元の位置と長さを保持するタプルを生成
+    referred = set(
+        (refs_by_referrer[j, l], l) for (j, l) in refs_by_referrer.keys()
+    )  # 参照元の位置と長さを保持するタプルを生成
 
     if len(refs_by_rlreferrer) > 0:
-        rlreferred = set((refs_by_rlreferrer[j, l], j, l) for (j, l) in refs_by_rlreferrer.keys())
+        rlreferred = set(
+            (refs_by_rlreferrer[j, l], j, l) for (j, l) in refs_by_rlreferrer.keys()
+        )
     else:
         rlreferred = set()
 
     # ノードが内部ノードかつ蓮長圧縮ルール全体のノードとみなされていた場合，連長圧縮ルール全体のノードとして扱う
     # 繰り返しを表す区間が左に出現していた時発生する
 
-    leaves = [(j, j + l, refs_by_referrer[j, l]) for (j, l) in refs_by_referrer.keys()] + [(j, j + l, refs_by_rlreferrer[j, l]) for (j, l) in refs_by_rlreferrer.keys()] # 葉ノードが表す区間
+    leaves = [
+        (j, j + l, refs_by_referrer[j, l]) for (j, l) in refs_by_referrer.keys()
+    ] + [
+        (j, j + l, refs_by_rlreferrer[j, l]) for (j, l) in refs_by_rlreferrer.keys()
+    ]  # 葉ノードが表す区間
     for i in range(len(pstartl) - 1):
-        if pstartl[i + 1] - pstartl[i] == 1: # pstartl[i]が長さ1のファクタの開始位置の場合
+        if pstartl[i + 1] - pstartl[i] == 1:  # pstartl[i]が長さ1のファクタの開始位置の場合
             leaves.append((pstartl[i], pstartl[i + 1], text[pstartl[i]]))
 
-    internal = [(occ, occ + l, None) for (occ, l) in referred] # 内部ノードが表す区間(SLP)
-    rlinternal = [(occ, j + l , "RLrule") for (occ, j, l) in rlreferred] # 連長圧縮全体を表す内部ノードの区間(RLSLP)
-            # leaves = [(occ, j + l - i, None)]
-            # print(f"occ, j, l = {occ, j, l}")
+    internal = [(occ, occ + l, None) for (occ, l) in referred]  # 内部ノードが表す区間(SLP)
+    rlinternal = [
+        (occ, j + l, "RLrule") for (occ, j, l) in rlreferred
+    ]  # 連長圧縮全体を表す内部ノードの区間(RLSLP)
+    # leaves = [(occ, j + l - i, None)]
+    # print(f"occ, j, l = {occ, j, l}")
     for (i, l) in referred:
         for (j, rl) in refs_by_rlreferrer.keys():
             if i == refs_by_rlreferrer[j, rl] and i + l == j + rl:
@@ -645,72 +749,104 @@ def recover_rlslp(text: bytes, pstartl, refs_by_referrer, refs_by_rlreferrer):
     # rint(f"internal = {internal}")
     # print(f"rlinternal = {rlinternal}")
     # print(f"leaves = {leaves}")
-    nodes = leaves + internal + rlinternal # 全てのノード情報が格納
+    nodes = leaves + internal + rlinternal  # 全てのノード情報が格納
     if len(nodes) > 1:
-        nodes.append((0, n, None)) # 根ノードを表す区間を追加
+        nodes.append((0, n, None))  # 根ノードを表す区間を追加
     # print(f"nodes={nodes}")
-    nodes.sort(key=functools.cmp_to_key(postorder_cmp)) # postorder_cmpの規則に従い，ソートする
+    nodes.sort(key=functools.cmp_to_key(postorder_cmp))  # postorder_cmpの規則に従い，ソートする
     rlslp = {}
     root = build_rlslp_aux(nodes, rlslp)
     binarize_rlslp(root, rlslp)
     return (root, rlslp)
 
+
 # 最小のSLPを計算,SLP分解したときの解析木を返す関数
-def smallest_RLSLP(text: bytes, exp: Optional[SLPExp] = None) -> SLPType:
+def smallest_RLSLP(
+    text: bytes,
+    exp: Optional[SLPExp] = None,
+    preprocess: bool = False,
+    engine_options: Optional[EngineOptions] = None,
+) -> SLPType:
     """
     Compute the smallest SLP.
     """
     total_start = time.time()
-    lm, wcnf, phrases, refs_by_referrer, refs_by_rlreferrer = smallest_RLSLP_WCNF(text) # 条件式を生成
-    rc2 = RC2(wcnf) # MAX-SATを計算
+    profiling.start()
+    engine = create_engine(engine_options)  # MAX-SATのソルバ
+    (
+        lm,
+        wcnf,
+        phrases,
+        refs_by_referrer,
+        refs_by_rlreferrer,
+    ), cache_status = instance_cache.build(
+        "rlslp", encoding_version, smallest_RLSLP_WCNF, text
+    )  # 条件式を生成 (キャッシュにあれば読み込む)
+    pre = WCNFPreprocessor(wcnf) if preprocess else None  # 条件式の簡約
+    engine.load(pre.run() if pre else wcnf)  # MAX-SATを計算
     time_prep = time.time() - total_start  # 前処理時間
-    sol_ = rc2.compute()    # MAX-SATの解を保持したint型のリストを返す．
+    with profiling.phase("solve"):
+        sol_ = engine.compute()  # MAX-SATの解を保持したint型のリストを返す．
+        if pre:
+            sol_ = pre.restore(sol_)  # 簡約前の変数の値に戻す
     assert sol_ is not None
     sol = set(sol_)
 
     n = len(text)
 
-    posl = []
-    for i in range(0, n + 1):
-        x = lm.getid(lm.lits.pstart, i)
-        if x in sol:
-            posl.append(i)
-    # print(f"posl={posl}")
-    phrasel = []
-    for (occ, l) in phrases:
-        x = lm.getid(lm.lits.phrase, occ, l)
-        if x in sol:
-            phrasel.append((occ, occ + l))
-    # print(f"phrasel={phrasel}")
-    refs = {}
-    for (j, l) in refs_by_referrer.keys():
-        for i in refs_by_referrer[j, l]:
-            if lm.getid(lm.lits.ref, j, i, l) in sol:
-                refs[j, l] = i
-    # print(f"refs={refs}")
-    # 連長圧縮ルールの参照先と参照元のデータを保存
-    rlrefs = {}
-    for (j, l) in refs_by_rlreferrer.keys():
-        for i in refs_by_rlreferrer[j, l]:
-            if lm.getid(lm.lits.rlref, j, i, l) in sol:
-                rlrefs[j, l] = i
-    # print(f"rlrefs={rlrefs}")
-    # MAX-SATの解からRLSLPを生成
-    root, rlslp = recover_rlslp(text, posl, refs, rlrefs)
+    with profiling.phase("decode"):
+        posl = []
+        for i in range(0, n + 1):
+            x = lm.getid(lm.lits.pstart, i)
+            if x in sol:
+                posl.append(i)
+        # print(f"posl={posl}")
+        phrasel = []
+        for (occ, l) in phrases:
+            x = lm.getid(lm.lits.phrase, occ, l)
+            if x in sol:
+                phrasel.append((occ, occ + l))
+        # print(f"phrasel={phrasel}")
+        refs = {}
+        for (j, l) in refs_by_referrer.keys():
+            for i in refs_by_referrer[j, l]:
+                if lm.getid(lm.lits.ref, j, i, l) in sol:
+                    refs[j, l] = i
+        # print(f"refs={refs}")
+        # 連長圧縮ルールの参照先と参照元のデータを保存
+        rlrefs = {}
+        for (j, l) in refs_by_rlreferrer.keys():
+            for i in refs_by_rlreferrer[j, l]:
+                if lm.getid(lm.lits.rlref, j, i, l) in sol:
+                    rlrefs[j, l] = i
+        # print(f"rlrefs={rlrefs}")
+        # MAX-SATの解からRLSLPを生成
+        root, rlslp = recover_rlslp(text, posl, refs, rlrefs)
     # print(f"root={root}, rlslp = {rlslp}, rlslpkeys={rlslp.keys()}")
 
     rlslpsize = len(posl) - 2 + len(set(text))
 
+    with profiling.phase("verify"):
+        check = bytes(rlslp2str(root, rlslp))
+
+        assert check == text
+
     if exp:
         exp.time_total = time.time() - total_start
         exp.time_prep = time_prep
         exp.factors = f"{(root, rlslp)}"
         exp.factor_size = rlslpsize  # len(internal_nodes) + len(set(text))
         exp.fill(wcnf)
-
-    check = bytes(rlslp2str(root, rlslp))
-
-    assert check == text
+        if pre is not None:
+            assert pre.reduced is not None
+            exp.fill_pre(pre.reduced, pre.time)
+        exp.instance_cache = cache_status
+        exp.engine = engine.options.name
+        exp.engine_options = engine.options.to_json()  # type: ignore
+        exp.lower_bound = engine.lower_bound + len(set(text)) - 1
+        if not engine.optimal:
+            exp.status = "anytime"
+        exp.profile = profiling.finish(engine.stats)
 
     return SLPType((root, rlslp))
 
@@ -726,6 +862,22 @@ def parse_args():
         help="exact size or upper bound of attractor size to search",
         default=0,
     )
+    parser.add_argument(
+        "--amo_encoding",
+        type=str,
+        help="encoding of at-most-one constraints, " + "/".join(mysat.amo_encodings),
+        choices=mysat.amo_encodings,
+        default="auto",
+    )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="simplify the hard clauses before solving (see preprocess.py)",
+    )
+    add_engine_args(parser)
+    add_resource_args(parser)
+    instance_cache.add_cache_args(parser)
+    tracing.add_trace_args(parser)
     parser.add_argument(
         "--log_level",
         type=str,
@@ -742,7 +894,7 @@ def parse_args():
 
 if __name__ == "__main__":
     # print("start!")
-    args = parse_args() # 解析するデータの指定
+    args = parse_args()  # 解析するデータの指定
 
     if args.str != "":
         text = bytes(args.str, "utf-8")
@@ -755,15 +907,32 @@ if __name__ == "__main__":
     elif args.log_level == "CRITICAL":
         logger.setLevel(CRITICAL)
 
-    exp = SLPExp.create() # 出力したいフォーマットの作成
+    exp = SLPExp.create()  # 出力したいフォーマットの作成
     exp.algo = "rlslp-sat"
+    mysat.amo_encoding = args.amo_encoding
+    instance_cache.configure(args)
+    tracing.configure(args)
+    if args.amo_encoding != "auto":
+        exp.algo += f"-amo-{args.amo_encoding}"
+    if args.engine != "rc2":
+        exp.algo += f"-{args.engine}"
     exp.file_name = os.path.basename(args.file)
     exp.file_len = len(text)
-
-    rlslp = smallest_RLSLP(text, exp) # SLPの最小サイズを計算
+    apply_memory_cap(args, exp, "rlslp_solver", text)  # 推定メモリが上限を超えるなら終了
+
+    try:
+        rlslp = smallest_RLSLP(
+            text,
+            exp,
+            preprocess=args.preprocess,
+            engine_options=engine_options_from_args(args),
+        )  # SLPの最小サイズを計算
+    except MemoryError:
+        exit_with_status(exp, "oom", args.output)
 
     if args.output == "":
         print(exp.to_json(ensure_ascii=False))  # type: ignore
     else:
         with open(args.output, "w") as f:
             json.dump(exp, f, ensure_ascii=False)
+    tracing.save(args.trace, exp.algo, file=exp.file_name, status=exp.status)
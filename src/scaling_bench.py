@@ -0,0 +1,464 @@
+# Scaling benchmark of all solvers over the prefixes of the files of corpora, replacing the prefixes written by
+# shell/splitter.sh with dd and the loops of the benchmarks of each solver.
+#
+# A suite is a set of corpora (patterns of files), a ladder of prefix lengths, the solvers, and the budgets of a job:
+# the timeout, the memory cap (the limit of the worker, and the estimate of the solver, see resource_estimate.py) and
+# the time budget of the MaxSAT engine. The named suites are in `profiles`, and their settings can be overridden.
+# The prefixes are cut from the files in memory by the workers of worker_pool.py. The ladder is run one length after
+# another, and a solver that ran out of its budget on a prefix of a file (timeout, oom or memory-cap) is not run on the
+# longer prefixes of the file.
+# The results of all solvers are written to the table scaling_bench of the results database (see results_db.py) as
+# ScalingExp records, where the file name of a prefix is <corpus>/<file>.<length> (as shell/splitter.sh names them).
+# The instance cache and result cache are not used, as they would hide the times measured.
+# python src/scaling_bench.py --suite smoke [--solvers slp cs] [--ladder 8 16 32] [--timeout 60] [--output out.csv]
+
+import argparse
+import dataclasses
+import datetime
+import glob
+import importlib
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from dataclasses_json import dataclass_json
+
+import accounting
+import bidirectional
+import instance_cache
+import result_cache
+import results_db
+from attractor import verify_attractor
+from attractor_bench_format import AttractorExp
+from bidirectional import BiDirExp
+from maxsat_engine import EngineOptions
+from profiling import Profile
+from resource_estimate import check_memory_cap
+from results_db import Job, Progress, ResultsWriter
+from slp import SLPExp
+from worker_pool import JobResult, WorkerPool
+
+dbname = "out/satcomp.db"
+dbtable = "scaling_bench"
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# solver -> (module, function computing the smallest structure of a text, type of its Exp record)
+solvers: Dict[str, Tuple[str, str, type]] = {
+    "attractor": ("attractor_solver", "min_attractor", AttractorExp),
+    "bidirectional-var0": ("bidirectional_solver_var0", "min_bidirectional", BiDirExp),
+    "bidirectional-var1": ("bidirectional_solver_var1", "min_bidirectional", BiDirExp),
+    "bidirectional-var2": ("bidirectional_solver_var2", "min_bidirectional", BiDirExp),
+    "slp": ("slp_solver", "smallest_SLP", SLPExp),
+    "rlslp": ("rlslp_solver", "smallest_RLSLP", SLPExp),
+    "cs": ("cs_solver", "smallest_CollageSystem", SLPExp),
+}
+# statuses of a job that ran out of its budget, after which the longer prefixes of the file are not run
+out_of_budget = ["timeout", "oom", "memory-cap"]
+
+
+@dataclass
+class Suite:
+    # corpus -> patterns of its files, relative to the root of the repository
+    corpora: Dict[str, List[str]]
+    # lengths of the prefixes of each file, a file shorter than a length has no prefix of it
+    ladder: List[int]
+    solvers: List[str]
+    # seconds (0 for no timeout) and MB (0 for no cap) of a job
+    timeout: float
+    memory_cap: float
+    # seconds of the MaxSAT engine, after which it reports the best solution and lower bound (0 for no budget)
+    time_budget: float = 0
+
+
+profiles: Dict[str, Suite] = {
+    # a few seconds, for checking changes
+    "smoke": Suite(
+        {
+            "misc": ["data/misc/trib09.txt"],
+            "artificial": ["data/artificial/paperfold.06"],
+        },
+        [8, 12, 16],
+        list(solvers),
+        60,
+        2000,
+    ),
+    "nightly": Suite(
+        {"misc": ["data/misc/large/*"], "artificial": ["data/artificial/*.10"]},
+        [16, 32, 64, 128, 256, 512],
+        list(solvers),
+        600,
+        8000,
+    ),
+    # the corpora of shell/example_run.sh with the prefix lengths of shell/splitter.sh
+    "paper": Suite(
+        {
+            "calgary": ["data/calgary/*"],
+            "cantrbry": ["data/cantrbry/*"],
+            "artificial": ["data/artificial/*"],
+        },
+        sorted(
+            set(range(10, 200, 10))
+            | set(range(200, 800, 50))
+            | set(range(800, 3001, 200))
+        ),
+        list(solvers),
+        3600,
+        16000,
+    ),
+}
+
+
+@dataclass_json
+@dataclass
+class ScalingExp:
+    date: str
+    status: str
+    # solver
+    algo: str
+    # <corpus>/<file>.<length>
+    file_name: str
+    file_len: int
+    suite: str
+    corpus: str
+    # the file the prefix is cut from
+    dataset: str
+    time_prep: float = 0.0
+    time_total: float = 0.0
+    sol_nvars: int = 0
+    sol_nhard: int = 0
+    sol_nsoft: int = 0
+    sol_navgclause: float = 0.0
+    sol_ntotalvars: int = 0
+    sol_nmaxclause: int = 0
+    factor_size: int = 0
+    # the factors of the solver as str, or as JSON if they are a list
+    factors: str = ""
+    lower_bound: int = 0
+    engine: str = ""
+    engine_options: str = ""
+    # size of the WCNF and peak memory (MB) estimated before building (see resource_estimate.py)
+    est_nvars: int = 0
+    est_nhard: int = 0
+    est_ntotalvars: int = 0
+    est_memory: float = 0.0
+    # phase timings, clause counts of constraint families, peak memory and engine statistics (see profiling.py)
+    profile: Profile = field(default_factory=Profile)
+    # budgets of the job (see Suite)
+    timeout: float = 0.0
+    memory_cap: float = 0.0
+    time_budget: float = 0.0
+    # CPU seconds in user and system mode, peak RSS (MB) and exit code of the job (see accounting.py)
+    cpu_user: float = 0.0
+    cpu_sys: float = 0.0
+    max_rss: float = 0.0
+    exit_code: int = 0
+
+
+@dataclass
+class ScalingJob:
+    solver: str
+    corpus: str
+    path: str
+    length: int
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.corpus}/{os.path.basename(self.path)}.{self.length:04}"
+
+
+def corpus_files(patterns: List[str]) -> List[str]:
+    return sorted(
+        set(
+            file
+            for pattern in patterns
+            for file in glob.glob(os.path.join(root, pattern))
+            if os.path.isfile(file)
+        )
+    )
+
+
+def record(
+    job: ScalingJob, suite_name: str, suite: Suite, status: str, exp=None
+) -> ScalingExp:
+    """
+    The record of `job` with the fields of the Exp record of its solver if given.
+    """
+    res = ScalingExp(
+        str(datetime.datetime.now()),
+        status,
+        job.solver,
+        job.file_name,
+        job.length,
+        suite_name,
+        job.corpus,
+        os.path.basename(job.path),
+    )
+    if exp is not None:
+        names = set(f.name for f in dataclasses.fields(ScalingExp)) - {
+            "date",
+            "status",
+            "algo",
+            "file_name",
+            "file_len",
+            "factors",
+        }
+        for f in dataclasses.fields(exp):
+            if f.name in names:
+                setattr(res, f.name, getattr(exp, f.name))
+        res.factors = (
+            exp.factors if isinstance(exp.factors, str) else json.dumps(exp.factors)
+        )
+    (res.timeout, res.memory_cap, res.time_budget) = (
+        suite.timeout,
+        suite.memory_cap,
+        suite.time_budget,
+    )
+    return res
+
+
+def run_job(job: ScalingJob, suite_name: str, suite: Suite) -> ScalingExp:
+    """
+    Run the solver of `job` on the prefix in this process (a worker of worker_pool, which limits the memory), and
+    verify the result.
+    """
+    text = open(job.path, "rb").read()[: job.length]
+    (module, func, exp_type) = solvers[job.solver]
+    exp = exp_type.create()
+    instance_cache.cache_dir = ""
+    if check_memory_cap(exp, module, text, suite.memory_cap, False) is None:
+        return record(job, suite_name, suite, "memory-cap", exp)
+    solver = getattr(importlib.import_module(module), func)
+    factors = solver(
+        text, exp, engine_options=EngineOptions(time_budget=suite.time_budget)
+    )
+    # the grammars are verified by their solvers
+    if job.solver == "attractor":
+        valid = verify_attractor(text, factors)
+    elif module.startswith("bidirectional"):
+        valid = bidirectional.decode(factors) == text
+    else:
+        valid = True
+    # the solution of an anytime run is not minimum but must be valid
+    status = (
+        "wrong" if not valid else exp.status if exp.status == "anytime" else "correct"
+    )
+    return record(job, suite_name, suite, status, exp)
+
+
+def benchmark(
+    suite_name: str,
+    suite: Suite,
+    n_jobs: int,
+    retry_failed: bool = False,
+    path: str = dbname,
+):
+    """
+    Run `suite` with `n_jobs` workers, one length of the ladder after another.
+    Jobs run before with the same encoding version and timeout are skipped, unless they failed and `retry_failed`.
+    """
+    files = {
+        corpus: corpus_files(patterns) for (corpus, patterns) in suite.corpora.items()
+    }
+    for (corpus, paths) in files.items():
+        if len(paths) == 0:
+            print(f"no files of the corpus {corpus}: {suite.corpora[corpus]}")
+    sizes = {p: os.path.getsize(p) for paths in files.values() for p in paths}
+    versions = {
+        solver: result_cache.encoding_version(solvers[solver][0])
+        for solver in suite.solvers
+    }
+    ladder = sorted(set(suite.ladder))
+    timeout = suite.timeout if suite.timeout > 0 else None
+    writer = ResultsWriter(dbtable, ScalingExp, path)
+    all_jobs = [
+        (job, Job(job.solver, job.file_name, versions[job.solver], suite.timeout))
+        for job in (
+            ScalingJob(solver, corpus, p, n)
+            for n in ladder
+            for (corpus, paths) in files.items()
+            for p in paths
+            for solver in suite.solvers
+        )
+        if job.length <= sizes[job.path]
+    ]
+    done = [writer.done(key, retry_failed) for (_, key) in all_jobs]
+    # (solver, corpus, file) that ran out of the budget, in previous runs or this one
+    stopped = set()
+    for ((job, key), d) in zip(all_jobs, done):
+        if d and any(
+            writer.past[key.algo, key.file_name].status.startswith(s)
+            for s in out_of_budget
+        ):
+            stopped.add((job.solver, job.corpus, job.path))
+    todo = [
+        (job, key)
+        for ((job, key), d) in zip(all_jobs, done)
+        if not d and (job.solver, job.corpus, job.path) not in stopped
+    ]
+    print(
+        f"{len(all_jobs) - len(todo)} jobs are done or skipped in previous runs, {len(todo)} jobs to run"
+    )
+    progress = Progress([key for (_, key) in todo], writer.past, n_jobs)
+
+    n_run = 0
+    with writer, WorkerPool(n_jobs, suite.memory_cap) as pool:
+        for n in ladder:
+            jobs = [
+                (job, key)
+                for (job, key) in todo
+                if job.length == n and (job.solver, job.corpus, job.path) not in stopped
+            ]
+            if len(jobs) == 0:
+                continue
+            print(f"length {n}: {len(jobs)} jobs")
+            n_run += len(jobs)
+
+            def finish(i: int, res: JobResult):
+                (job, key) = jobs[i]
+                if res.status == "ok":
+                    exp = res.value
+                else:
+                    status = (
+                        f"timeout-{suite.timeout}"
+                        if res.status == "timeout"
+                        else res.status
+                    )
+                    if res.status == "crash":
+                        print(res.value)
+                    exp = record(job, suite_name, suite, status)
+                accounting.fill_usage(exp, res.usage)
+                if any(exp.status.startswith(s) for s in out_of_budget):
+                    stopped.add((job.solver, job.corpus, job.path))
+                writer.put(exp, key, res.end - res.begin)
+                progress.finish(key, exp.status, res.end - res.begin)
+
+            pool.map(
+                run_job,
+                [(job, suite_name, suite) for (job, _) in jobs],
+                timeout,
+                finish,
+            )
+    if n_run < len(todo):
+        print(
+            f"{len(todo) - n_run} jobs are skipped, as their solvers ran out of the budget on shorter prefixes"
+        )
+
+
+def clear_table(path: str = dbname):
+    """
+    Delete table if exists, and create new table.
+    """
+    results_db.clear_table(dbtable, ScalingExp, path)
+
+
+def export_csv(out_file: str, path: str = dbname):
+    """
+    Store table as csv format in `out_file`.
+    """
+    con = sqlite3.connect(path)
+    import pandas as pd
+
+    df = pd.read_sql_query(f"SELECT * FROM {dbtable}", con)
+    df.to_csv(out_file, index=False)
+
+
+def make_suite(args: argparse.Namespace) -> Suite:
+    """
+    The suite of the profile of `args` with the settings given in `args` instead.
+    """
+    suite = dataclasses.replace(profiles[args.suite])
+    if args.corpora:
+        suite.corpora = {}
+        for corpus in args.corpora:
+            (name, pattern) = corpus.split("=", 1)
+            suite.corpora.setdefault(name, []).append(pattern)
+    for name in ["ladder", "solvers", "timeout", "memory_cap", "time_budget"]:
+        if getattr(args, name) is not None:
+            setattr(suite, name, getattr(args, name))
+    return suite
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the solvers on prefixes of the files of corpora of increasing length."
+    )
+    parser.add_argument(
+        "--suite",
+        type=str,
+        help="profile of the suite",
+        choices=list(profiles),
+        default="smoke",
+    )
+    parser.add_argument(
+        "--corpora",
+        nargs="*",
+        help="corpora as <name>=<pattern of files relative to the root of the repository> instead of those of the suite",
+        default=None,
+    )
+    parser.add_argument(
+        "--ladder",
+        nargs="*",
+        type=int,
+        help="lengths of the prefixes instead of those of the suite",
+        default=None,
+    )
+    parser.add_argument(
+        "--solvers",
+        nargs="*",
+        help="solvers instead of those of the suite",
+        choices=list(solvers),
+        default=None,
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="timeout (sec) of a job instead of that of the suite, 0 for no timeout",
+        default=None,
+    )
+    parser.add_argument(
+        "--memory_cap",
+        type=float,
+        help="memory cap (MB) of a job instead of that of the suite, 0 for no cap",
+        default=None,
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        help="time budget (sec) of the solver instead of that of the suite, 0 for no budget",
+        default=None,
+    )
+    parser.add_argument(
+        "--retry_failed",
+        action="store_true",
+        help="run again the jobs that failed or timed out in previous runs, which are skipped otherwise",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="delete the results of previous runs and run all jobs",
+    )
+    parser.add_argument("--n_jobs", type=int, help="number of jobs", default=2)
+    parser.add_argument("--db", type=str, help="results database", default=dbname)
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="CSV file to export the results to (none if empty)",
+        default="",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    suite = make_suite(args)
+    if args.restart:
+        clear_table(args.db)
+    benchmark(args.suite, suite, args.n_jobs, args.retry_failed, args.db)
+    if args.output != "":
+        export_csv(args.output, args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# Local scheduler of the solver runs of shell/example_run.sh and shell/measure_datasets.sh (without sbatch),
+# running the jobs of each solver on each file in parallel on a machine instead of one after another.
+#
+# The time of a job is predicted by its time in previous results (the JSON written by this scheduler), or by
+# a power law of the length of the file fitted to the previous results of the solver, or by the length alone; and
+# so is its memory, by the estimates of the solvers in the results (see resource_estimate.py), or without them by
+# an estimate from the length and the counts of characters of the file, at most the share of the memory budget of a
+# core (the memory cap of the job is still enforced by the solver).
+# Jobs are started longest first (LPT) on `n_jobs` cores, and only while the memory of the running jobs fits in
+# the memory budget; a job that does not fit is passed over for the next one that does.
+# Results are written as they finish to a JSON list of the records of the solvers, with the algorithm renamed to
+# the solver of the job and the dataset added, in the format of shell/concat_json.sh, and the CPU time, peak memory
+# and exit code of the job by wait4. A job without a record has the status "timeout", "oom" or "crash" by how it
+# ended (see accounting.py). The stdout and stderr of the jobs are kept in the log directory as
+# <solver>_<file>.{log,err}, and the results of other jobs in the JSON.
+# python src/scheduler.py --files shell/example_run/splitted/* --log_dir shell/example_run/log --output shell/example_run/benchmark.json
+
+import argparse
+import dataclasses
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import accounting
+import resource_estimate
+from accounting import Usage
+from results_db import Job, PastJob, Progress
+
+# solver -> command line (see generate_slurmscripts.sh)
+solvers: Dict[str, List[str]] = {
+    "bidir": ["src/bidirectional_solver.py", "--on_memory_cap", "downgrade"],
+    "attr": ["src/attractor_solver.py", "--algo", "min"],
+    "slp": ["src/slp_solver.py"],
+}
+# solver -> module of the solver, whose encodings are estimated by resource_estimate.py
+solver_modules: Dict[str, str] = {
+    "bidir": "bidirectional_solver_var0",
+    "attr": "attractor_solver",
+    "slp": "slp_solver",
+}
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+@dataclass
+class SchedJob:
+    solver: str
+    file: str
+    # seconds
+    predicted: float
+    # whether predicted by previous results
+    known: bool
+    # MB
+    memory: float
+
+
+def dataset(file_name: str) -> str:
+    """
+    The dataset of a file, which is the name without the length for prefixes named <dataset>.NNNN by shell/splitter.sh.
+    """
+    return re.sub(r"\.[0-9]{4}$", "", file_name)
+
+
+def load_results(path: str) -> List[dict]:
+    if path == "" or not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def fit_power_law(points: List[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    """
+    (a, b) of time = a * n^b by least squares in log-log scale, or None without two distinct lengths.
+    """
+    points = [(math.log(n), math.log(t)) for (n, t) in points if n > 0 and t > 0]
+    if len(set(x for (x, _) in points)) < 2:
+        return None
+    mx = sum(x for (x, _) in points) / len(points)
+    my = sum(y for (_, y) in points) / len(points)
+    b = sum((x - mx) * (y - my) for (x, y) in points) / sum(
+        (x - mx) ** 2 for (x, _) in points
+    )
+    return (math.exp(my - b * mx), b)
+
+
+def predictor(
+    points: List[Tuple[str, str, int, float]], default: Callable[[int], float]
+) -> Callable[[str, str, int], Tuple[float, bool]]:
+    """
+    Function predicting a value of (solver, file_name, length) from the values of previous results
+    (solver, file_name, length, value), and whether it is predicted from them (otherwise `default` of the length).
+    """
+    past = {(solver, file_name): value for (solver, file_name, _, value) in points}
+    fits = {}
+    for solver in set(p[0] for p in points):
+        fits[solver] = fit_power_law(
+            [(n, value) for (s, _, n, value) in points if s == solver]
+        )
+
+    def predict(solver: str, file_name: str, n: int) -> Tuple[float, bool]:
+        if (solver, file_name) in past:
+            return (past[solver, file_name], True)
+        fit = fits.get(solver)
+        if fit is None:
+            return (default(n), False)
+        return (fit[0] * n ** fit[1], True)
+
+    return predict
+
+
+def estimate_memory(solver: str, text: bytes) -> float:
+    """
+    Upper bound of the memory (MB) of the solver on `text` by the model of its default encoding in resource_estimate.py
+    (inf for other solvers). The statistics of the repeats (repeat_features), which take a pass over the suffix array
+    for each length, are replaced by their upper bounds by the length, as the coefficients of the models are nonnegative.
+    """
+    if solver not in solver_modules:
+        return math.inf
+    model = resource_estimate.solver_models[solver_modules[solver]][0]
+    features = resource_estimate.text_features(text, refs=False)
+    n = len(text)
+    # lpf[i] <= n - i, less than n^2 / 2 intervals (j, l) and n^3 / 6 triplets (j, i, l),
+    # and less than n^2 / 4 intervals enclosing one occurrence of a triplet and not the other
+    intervals = n * (n + 1) / 2
+    features["phrases"] = intervals
+    features["phrases2"] = n * (n + 1) * (2 * n + 1) / 6
+    features["refs"] = n**3 / 6
+    features["referred"] = intervals
+    features["crossing"] = intervals**2 / 2
+    features["csrefs"] = features["refs"] * (n + 1) ** 2 / 4
+    features["minsubstrs"] = intervals
+    features["cover"] = n * intervals
+    return resource_estimate.estimate(model, text, features).memory
+
+
+def make_jobs(
+    files: List[str],
+    names: List[str],
+    memory_cap: float,
+    results: List[dict],
+    timeout: float,
+    share: float = 0,
+) -> List[SchedJob]:
+    """
+    The jobs of `names` of solvers on `files` with their predictions, longest first.
+    A job that ran out of time took `timeout`, and the memory of a job is the estimate of the solver in the results,
+    or without results of the solver `estimate_memory` up to `share` (MB, 0 for no limit), at most `memory_cap`.
+    """
+    (times, memories) = ([], [])
+    for r in results:
+        n = r.get("file_len")
+        if not isinstance(n, int):
+            continue
+        t = r.get("time_wall", r.get("time_total"))
+        # "no time" in the results of slurm (see shell/concat_json.sh)
+        if r.get("status") in ["timeout", "no time"]:
+            times.append((r["algo"], r["file_name"], n, timeout))
+        elif isinstance(t, (int, float)):
+            times.append((r["algo"], r["file_name"], n, t))
+        if isinstance(r.get("est_memory"), (int, float)) and r["est_memory"] > 0:
+            memories.append((r["algo"], r["file_name"], n, r["est_memory"]))
+    # without previous results, the jobs are ordered by length (in seconds per byte of the previous results if any)
+    rates = sorted(t / n for (_, _, n, t) in times if n > 0)
+    rate = rates[len(rates) // 2] if rates else 1.0
+    predict_time = predictor(times, lambda n: rate * n)
+    predict_memory = predictor(memories, lambda n: math.inf)
+    jobs = []
+    for file in files:
+        n = os.path.getsize(file)
+        text = None
+        for name in names:
+            (t, known) = predict_time(name, os.path.basename(file), n)
+            t = min(t, timeout) if timeout > 0 and known else t
+            (memory, known_memory) = predict_memory(name, os.path.basename(file), n)
+            if not known_memory:
+                # a job exceeding its reservation is still stopped by the memory cap, which is enforced by the solver
+                if text is None:
+                    text = open(file, "rb").read()
+                memory = estimate_memory(name, text)
+                memory = min(memory, share) if share > 0 else memory
+            memory = min(memory, memory_cap) if memory_cap > 0 else memory
+            jobs.append(SchedJob(name, file, t, known, memory))
+    jobs.sort(key=lambda job: -job.predicted)
+    return jobs
+
+
+def job_name(job: SchedJob) -> str:
+    return f"{job.solver}_{os.path.basename(job.file)}"
+
+
+def result(
+    job: SchedJob,
+    log_dir: str,
+    usage: Usage,
+    timed_out: bool,
+    memory_cap: float,
+    elapsed: float,
+) -> dict:
+    """
+    The record of the finished job in the format of shell/concat_json.sh, with the time of the job `time_wall` (seconds)
+    and its `usage`.
+    """
+    file_name = os.path.basename(job.file)
+    with open(os.path.join(log_dir, f"{job_name(job)}.log")) as f:
+        lines = [line for line in f if line.startswith("{")]
+    if timed_out or len(lines) == 0:
+        res = {
+            "status": accounting.classify(usage, timed_out, memory_cap),
+            "file_name": file_name,
+            "file_len": os.path.getsize(job.file),
+        }
+    else:
+        res = json.loads(lines[-1])
+    res["algo"] = job.solver
+    res["dataset"] = dataset(file_name)
+    res["time_wall"] = elapsed
+    res.update(dataclasses.asdict(usage))
+    return res
+
+
+def write_results(path: str, results: List[dict]):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(results, f, indent=1)
+    os.replace(tmp, path)
+
+
+def run(
+    jobs: List[SchedJob],
+    n_jobs: int,
+    memory_budget: float,
+    memory_cap: float,
+    timeout: float,
+    log_dir: str,
+    output: str,
+    results: List[dict],
+):
+    """
+    Run `jobs` in the order given, at most `n_jobs` at once within `memory_budget` (MB), writing their results
+    following `results` to `output`.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    pending = list(jobs)
+    running: List[Tuple[SchedJob, subprocess.Popen, float]] = []
+    results = list(results)
+    write_results(output, results)
+    progress = Progress(
+        [Job(job.solver, os.path.basename(job.file)) for job in jobs],
+        {
+            (job.solver, os.path.basename(job.file)): PastJob(
+                0, timeout, "", job.predicted
+            )
+            for job in jobs
+            if job.known
+        },
+        n_jobs,
+    )
+    while pending or running:
+        used = sum(job.memory for (job, _, _) in running)
+        while pending and len(running) < n_jobs:
+            # the longest job fitting in the memory left, or the longest one if none is running
+            job = next(
+                (job for job in pending if used + job.memory <= memory_budget),
+                pending[0] if not running else None,
+            )
+            if job is None:
+                break
+            pending.remove(job)
+            command = (
+                [sys.executable]
+                + solvers[job.solver]
+                + ["--file", os.path.abspath(job.file)]
+            )
+            if memory_cap > 0:
+                command += ["--memory_cap", str(memory_cap)]
+            with open(os.path.join(log_dir, f"{job_name(job)}.log"), "w") as out, open(
+                os.path.join(log_dir, f"{job_name(job)}.err"), "w"
+            ) as err:
+                running.append(
+                    (
+                        job,
+                        subprocess.Popen(command, stdout=out, stderr=err, cwd=root),
+                        time.time(),
+                    )
+                )
+            used += job.memory
+        time.sleep(0.1)
+        for (job, proc, begin) in list(running):
+            # the resource usage of the job is given by wait4
+            (pid, status, ru) = os.wait4(proc.pid, os.WNOHANG)
+            timed_out = pid == 0 and timeout > 0 and time.time() - begin > timeout
+            if timed_out:
+                proc.kill()
+                (_, status, ru) = os.wait4(proc.pid, 0)
+            elif pid == 0:
+                continue
+            # already waited, Popen must not wait again
+            proc.returncode = accounting.exit_code(status)
+            usage = accounting.from_rusage(ru)
+            usage.exit_code = proc.returncode
+            running.remove((job, proc, begin))
+            elapsed = time.time() - begin
+            res = result(job, log_dir, usage, timed_out, memory_cap, elapsed)
+            results.append(res)
+            write_results(output, results)
+            progress.finish(
+                Job(job.solver, os.path.basename(job.file)),
+                res.get("status", "unknown"),
+                elapsed,
+            )
+
+
+def physical_memory() -> float:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 / 1024
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the solvers on files in parallel, longest jobs first."
+    )
+    parser.add_argument(
+        "--files", nargs="*", help="files to run the solvers on", default=[]
+    )
+    parser.add_argument(
+        "--solvers",
+        nargs="*",
+        help="solvers to run",
+        choices=list(solvers),
+        default=list(solvers),
+    )
+    parser.add_argument(
+        "--log_dir", type=str, help="directory of the logs of the jobs", required=True
+    )
+    parser.add_argument("--output", type=str, help="JSON of the results", required=True)
+    parser.add_argument(
+        "--history",
+        nargs="*",
+        help="JSON of previous results to predict the times (default: --output)",
+        default=None,
+    )
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        help="number of jobs run at once",
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--memory",
+        type=float,
+        help="memory budget of the jobs (MB)",
+        default=physical_memory(),
+    )
+    parser.add_argument(
+        "--memory_cap",
+        type=float,
+        help="memory cap of a job (MB, 0 for no cap)",
+        default=16000,
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="timeout of a job (seconds, 0 for no timeout)",
+        default=3600,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    history = args.history if args.history is not None else [args.output]
+    results = [r for path in history for r in load_results(path)]
+    files = [file for file in args.files if os.path.isfile(file)]
+    jobs = make_jobs(
+        files,
+        args.solvers,
+        args.memory_cap,
+        results,
+        args.timeout,
+        args.memory / args.n_jobs,
+    )
+    print(
+        f"{len(jobs)} jobs on {args.n_jobs} cores, {len([job for job in jobs if job.known])} of them predicted by previous results",
+        flush=True,
+    )
+    # the results of other jobs in the output are kept
+    names = set((job.solver, os.path.basename(job.file)) for job in jobs)
+    kept = [
+        r
+        for r in load_results(args.output)
+        if (r.get("algo"), r.get("file_name")) not in names
+    ]
+    run(
+        jobs,
+        args.n_jobs,
+        args.memory,
+        args.memory_cap,
+        args.timeout,
+        args.log_dir,
+        args.output,
+        kept,
+    )
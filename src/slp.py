@@ -1,10 +1,13 @@
 import datetime
-from dataclasses import dataclass
-from typing import Dict, List, NewType, Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, NewType, Optional, Tuple, Union
 
 from dataclasses_json import dataclass_json
 from pysat.formula import WCNF
 
+from clause_store import ClauseStore
+from profiling import Profile
+
 # type for SLP: represent a partial parse tree via ([i,j,x]) where:
 # if x == None -> references Node [i,j,None]
 # if x == Int -> If j-i==1, x is a leaf with symbol x, otherwise is an internal node
@@ -45,21 +48,50 @@ class SLPExp:
     sol_nmaxclause: int
     factor_size: int
     factors: str
-
-    def fill(self, wcnf: WCNF):
+    # size of the WCNF after preprocessing (0 if not preprocessed)
+    time_pre: float = 0.0
+    pre_nvars: int = 0
+    pre_nhard: int = 0
+    pre_ntotalvars: int = 0
+    # MaxSAT engine and its options (maxsat_engine.EngineOptions as JSON)
+    engine: str = "rc2"
+    engine_options: str = ""
+    # lower bound of factor_size, less than factor_size if the time budget ran out (status "anytime")
+    lower_bound: int = 0
+    # size of the WCNF and peak memory (MB) estimated before building (see resource_estimate.py)
+    est_nvars: int = 0
+    est_nhard: int = 0
+    est_ntotalvars: int = 0
+    est_memory: float = 0.0
+    # "hit" if the formula was loaded from the instance cache, "miss" if built and stored (see instance_cache.py)
+    instance_cache: str = ""
+    # phase timings, clause counts of constraint families, peak memory and engine statistics (see profiling.py)
+    profile: Profile = field(default_factory=Profile)
+
+    def fill(self, wcnf: Union[WCNF, ClauseStore]):
         self.sol_nvars = wcnf.nv
         self.sol_nhard = len(wcnf.hard)
         self.sol_nsoft = len(wcnf.soft)
-        max_clause = max(wcnf.hard, key=lambda item: len(item))
-        self.sol_nmaxclause = len(max_clause)
+        # a single pass, as the clauses of a ClauseStore are built on access
+        clause_lens = [len(clause) for clause in wcnf.hard]
+        self.sol_nmaxclause = max(clause_lens)
 
-        var_in_clause_sum = 0
-        for i in range(0, len(wcnf.hard)):
-            var_in_clause_sum += len(wcnf.hard[i])
+        var_in_clause_sum = sum(clause_lens)
         avg_var_in_clause = var_in_clause_sum / len(wcnf.hard)
         self.sol_ntotalvars = var_in_clause_sum
         self.sol_navgclause = avg_var_in_clause
 
+    def fill_pre(self, wcnf: WCNF, time_pre: float):
+        """
+        Record the size of the WCNF given by preprocess.WCNFPreprocessor.
+        """
+        self.time_pre = time_pre
+        self.pre_nvars = len(
+            set(abs(x) for clause in wcnf.hard + wcnf.soft for x in clause)
+        )
+        self.pre_nhard = len(wcnf.hard)
+        self.pre_ntotalvars = sum(len(clause) for clause in wcnf.hard)
+
     @classmethod
     def create(cls):
         return SLPExp(
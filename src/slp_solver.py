@@ -8,21 +8,31 @@ from enum import auto
 from logging import CRITICAL, DEBUG, INFO, Formatter, StreamHandler, getLogger
 from typing import Optional
 
-from pysat.card import CardEnc
-from pysat.examples.rc2 import RC2
-from pysat.formula import WCNF
-
+import instance_cache
+import mysat
+import profiling
+import tracing
+from clause_store import ClauseStore
+from maxsat_engine import (
+    EngineOptions,
+    add_engine_args,
+    create_engine,
+    engine_options_from_args,
+)
 from mysat import (
     Enum,
     Literal,
     LiteralManager,
     pysat_and,
     pysat_atleast_one,
+    pysat_atmost_one,
     pysat_if,
     pysat_iff,
     pysat_name_cnf,
     pysat_or,
 )
+from preprocess import WCNFPreprocessor
+from resource_estimate import add_resource_args, apply_memory_cap, exit_with_status
 from slp import SLPExp, SLPType
 
 logger = getLogger(__name__)
@@ -33,6 +43,9 @@ formatter = Formatter(FORMAT)
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# version of the encoding, increased when the formula changes so that cached instances are not reused
+encoding_version = 1
+
 
 class SLPLiteral(Enum):
     true = Literal.true
@@ -63,7 +76,7 @@ class SLPLiteralManager(LiteralManager):
 
     def newid(self, *obj) -> int:
         res = super().newid(*obj)
-        if len(obj) > 0 and obj[0] in self.verifyf:
+        if self.debug and len(obj) > 0 and obj[0] in self.verifyf:
             self.verifyf[obj[0]](*obj)
         return res
 
@@ -129,11 +142,18 @@ def smallest_SLP_WCNF(text: bytes):
     """
     n = len(text)
     logger.info(f"text length = {len(text)}")
-    wcnf = WCNF()
+    wcnf = ClauseStore()
 
     lm = SLPLiteralManager(text)
+    rec = profiling.BuildRecorder(wcnf, lm)
     # print("sloooow algorithm for lpf... (should use linear time algorithm)")
     lpf = compute_lpf(text)
+    rec.phase("index build")
+    # 密な族だけ配列で管理し, ref などの疎な族は辞書で管理する
+    maxl = max([1] + lpf) + 1
+    lm.declare(lm.lits.pstart, n + 1)
+    lm.declare(lm.lits.phrase, n, maxl)
+    lm.declare(lm.lits.referred, n, maxl)
 
     # defining the literals  ########################################
     # ref(i,j,l): defined for all i,j,l>1 s.t. T[i:i+l) = T[j:j+l)
@@ -162,6 +182,7 @@ def smallest_SLP_WCNF(text: bytes):
                     refs_by_referrer[j, l].append(i)
     for (i, l) in refs_by_referred.keys():
         lm.newid(lm.lits.referred, i, l)
+    rec.phase("literal definition")
 
     # // start constraint (1) ###############################
     # phrase(i,l) = true <=> pstart[i] = pstart[i+l] = true, pstart[i+1..i+l) = false
@@ -180,15 +201,14 @@ def smallest_SLP_WCNF(text: bytes):
             lst = list(range(i + 1, i + max(1, lpf[i]) + 1))
             wcnf.append([lm.getid(lm.lits.pstart, i) for i in lst])
 
+    rec.block("constraint (1)")
     # // end constraint (1) ###############################
 
     # // start constraint (2),(3) ###############################
     # if phrase(j,l) = true there must be exactly one i < j such that ref(j,i,l) is true
     for (j, l) in refs_by_referrer.keys():
-        clauses = CardEnc.atmost(
-            [lm.getid(lm.lits.ref, j, i, l) for i in refs_by_referrer[j, l]],
-            bound=1,
-            vpool=lm.vpool,
+        clauses = pysat_atmost_one(
+            lm, [lm.getid(lm.lits.ref, j, i, l) for i in refs_by_referrer[j, l]]
         )
         wcnf.extend(clauses)
         clause = pysat_atleast_one(
@@ -198,6 +218,7 @@ def smallest_SLP_WCNF(text: bytes):
         wcnf.extend(clause_atleast)
         phrase = lm.getid(lm.lits.phrase, j, l)
         wcnf.append(pysat_if(phrase, var_atleast))
+    rec.block("constraint (2),(3)")
     # // end constraint (2),(3) ###############################
     # // start constraint (4) ###############################
     for (j, l) in refs_by_referrer.keys():
@@ -208,6 +229,7 @@ def smallest_SLP_WCNF(text: bytes):
                     lm.getid(lm.lits.phrase, j, l),  # f_{j,l}
                 )
             )
+    rec.block("constraint (4)")
     # // end constraint (4) ###############################
 
     # // start constraint (5) ###############################
@@ -223,6 +245,7 @@ def smallest_SLP_WCNF(text: bytes):
         wcnf.extend(
             pysat_iff(ref_sources, referredid)
         )  # q_{i,l} <=> \exists ref_{i<-j,l}
+    rec.block("constraint (5)")
     # // end constraint (5) ###############################
 
     # // start constraint (6) ###############################
@@ -236,6 +259,7 @@ def smallest_SLP_WCNF(text: bytes):
             wcnf.append(lst)
             wcnf.append(pysat_if(qid, lm.getid(lm.lits.pstart, occ)))
             wcnf.append(pysat_if(qid, lm.getid(lm.lits.pstart, occ + l)))
+    rec.block("constraint (6)")
     # // end constraint (6) ###############################
 
     # // start constraint (7) ###############################
@@ -256,6 +280,7 @@ def smallest_SLP_WCNF(text: bytes):
                 id1 = lm.getid(lm.lits.referred, occ1, l1)
                 id2 = lm.getid(lm.lits.referred, occ2, l2)
                 wcnf.append([-id1, -id2])
+    rec.block("constraint (7)")
     # // end constraint (7) ###############################
 
     # // start constraint (9) ###############################
@@ -266,11 +291,13 @@ def smallest_SLP_WCNF(text: bytes):
 
     wcnf.append([lm.getid(lm.lits.pstart, 0)])
     wcnf.append([lm.getid(lm.lits.pstart, n)])
+    rec.block("constraint (9)")
     # // end constraint (9) ###############################
 
     # soft clauses: minimize # of phrases
     for i in range(0, n):
         wcnf.append([-lm.getid(lm.lits.pstart, i)], weight=1)
+    rec.block("soft")
 
     return lm, wcnf, phrases, refs_by_referrer
 
@@ -372,51 +399,76 @@ def recover_slp(text: bytes, pstartl, refs_by_referrer):
     return (root, slp)
 
 
-def smallest_SLP(text: bytes, exp: Optional[SLPExp] = None) -> SLPType:
+def smallest_SLP(
+    text: bytes,
+    exp: Optional[SLPExp] = None,
+    preprocess: bool = False,
+    engine_options: Optional[EngineOptions] = None,
+) -> SLPType:
     """
     Compute the smallest SLP.
     """
     total_start = time.time()
-    lm, wcnf, phrases, refs_by_referrer = smallest_SLP_WCNF(text)
-    rc2 = RC2(wcnf)
+    profiling.start()
+    engine = create_engine(engine_options)
+    (lm, wcnf, phrases, refs_by_referrer), cache_status = instance_cache.build(
+        "slp", encoding_version, smallest_SLP_WCNF, text
+    )
+    pre = WCNFPreprocessor(wcnf) if preprocess else None
+    engine.load(pre.run() if pre else wcnf)
     time_prep = time.time() - total_start
-    sol_ = rc2.compute()
+    with profiling.phase("solve"):
+        sol_ = engine.compute()
+        if pre:
+            sol_ = pre.restore(sol_)
     assert sol_ is not None
     sol = set(sol_)
 
     n = len(text)
 
-    posl = []
-    for i in range(0, n + 1):
-        x = lm.getid(lm.lits.pstart, i)
-        if x in sol:
-            posl.append(i)
-    # print(f"posl={posl}")
-    phrasel = []
-    for (occ, l) in phrases:
-        x = lm.getid(lm.lits.phrase, occ, l)
-        if x in sol:
-            phrasel.append((occ, occ + l))
-    # print(f"phrasel={phrasel}")
-    refs = {}
-    for (j, l) in refs_by_referrer.keys():
-        for i in refs_by_referrer[j, l]:
-            if lm.getid(lm.lits.ref, j, i, l) in sol:
-                refs[j, l] = i
-    root, slp = recover_slp(text, posl, refs)
+    with profiling.phase("decode"):
+        posl = []
+        for i in range(0, n + 1):
+            x = lm.getid(lm.lits.pstart, i)
+            if x in sol:
+                posl.append(i)
+        # print(f"posl={posl}")
+        phrasel = []
+        for (occ, l) in phrases:
+            x = lm.getid(lm.lits.phrase, occ, l)
+            if x in sol:
+                phrasel.append((occ, occ + l))
+        # print(f"phrasel={phrasel}")
+        refs = {}
+        for (j, l) in refs_by_referrer.keys():
+            for i in refs_by_referrer[j, l]:
+                if lm.getid(lm.lits.ref, j, i, l) in sol:
+                    refs[j, l] = i
+        root, slp = recover_slp(text, posl, refs)
     # print(f"root={root}, slp = {slp}, slpkeys={slp.keys()}")
 
     slpsize = len(posl) - 2 + len(set(text))
 
+    with profiling.phase("verify"):
+        check = bytes(slp2str(root, slp))
+        assert check == text
+
     if exp:
         exp.time_total = time.time() - total_start
         exp.time_prep = time_prep
         exp.factors = f"{(root, slp)}"
         exp.factor_size = slpsize  # len(internal_nodes) + len(set(text))
         exp.fill(wcnf)
-
-    check = bytes(slp2str(root, slp))
-    assert check == text
+        if pre is not None:
+            assert pre.reduced is not None
+            exp.fill_pre(pre.reduced, pre.time)
+        exp.instance_cache = cache_status
+        exp.engine = engine.options.name
+        exp.engine_options = engine.options.to_json()  # type: ignore
+        exp.lower_bound = engine.lower_bound + len(set(text)) - 1
+        if not engine.optimal:
+            exp.status = "anytime"
+        exp.profile = profiling.finish(engine.stats)
 
     return SLPType((root, slp))
 
@@ -432,6 +484,22 @@ def parse_args():
         help="exact size or upper bound of attractor size to search",
         default=0,
     )
+    parser.add_argument(
+        "--amo_encoding",
+        type=str,
+        help="encoding of at-most-one constraints, " + "/".join(mysat.amo_encodings),
+        choices=mysat.amo_encodings,
+        default="auto",
+    )
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="simplify the hard clauses before solving (see preprocess.py)",
+    )
+    add_engine_args(parser)
+    add_resource_args(parser)
+    instance_cache.add_cache_args(parser)
+    tracing.add_trace_args(parser)
     parser.add_argument(
         "--log_level",
         type=str,
@@ -462,13 +530,30 @@ if __name__ == "__main__":
 
     exp = SLPExp.create()
     exp.algo = "slp-sat"
+    mysat.amo_encoding = args.amo_encoding
+    instance_cache.configure(args)
+    tracing.configure(args)
+    if args.amo_encoding != "auto":
+        exp.algo += f"-amo-{args.amo_encoding}"
+    if args.engine != "rc2":
+        exp.algo += f"-{args.engine}"
     exp.file_name = os.path.basename(args.file)
     exp.file_len = len(text)
-
-    slp = smallest_SLP(text, exp)
+    apply_memory_cap(args, exp, "slp_solver", text)
+
+    try:
+        slp = smallest_SLP(
+            text,
+            exp,
+            preprocess=args.preprocess,
+            engine_options=engine_options_from_args(args),
+        )
+    except MemoryError:
+        exit_with_status(exp, "oom", args.output)
 
     if args.output == "":
         print(exp.to_json(ensure_ascii=False))  # type: ignore
     else:
         with open(args.output, "w") as f:
             json.dump(exp, f, ensure_ascii=False)
+    tracing.save(args.trace, exp.algo, file=exp.file_name, status=exp.status)
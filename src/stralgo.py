@@ -1,3 +1,4 @@
+from bisect import bisect_left
 from typing import AnyStr, Iterable, List, Optional, Tuple
 
 from tqdm import tqdm
@@ -411,6 +412,156 @@ def verify_sa(text, sa):
         assert text[sa[i - 1] :] < text[sa[i] :]
 
 
+def lyndon_array(text, inverse: bool = False) -> List[int]:
+    """
+    Compute lyn[i] = length of the longest Lyndon word starting at i.
+    If `inverse` is True, the Lyndon words are defined w.r.t. the inverse order of characters.
+    The end of text is regarded as smaller than any character for both orders.
+    """
+    n = len(text)
+    codes = [ord(c) if isinstance(c, str) else c for c in text]
+    if inverse and n > 0:
+        # keep codes non-negative so that the end of text remains the smallest
+        m = max(codes)
+        codes = [m - c for c in codes]
+    isa = make_isa(make_sa_MM(codes))
+    # the longest Lyndon word starting at i ends at the next smaller suffix
+    lyn = [0 for _ in range(n)]
+    stack = []
+    for i in range(n - 1, -1, -1):
+        while stack and isa[stack[-1]] > isa[i]:
+            stack.pop()
+        lyn[i] = (stack[-1] if stack else n) - i
+        stack.append(i)
+    return lyn
+
+
+def compute_runs(text) -> List[Tuple[int, int, int]]:
+    """
+    Compute all runs (maximal repetitions) of text by the Lyndon array approach.
+    Returns the sorted list of (b, e, p) s.t. text[b:e] is a run with the smallest period p.
+    """
+    n = len(text)
+    runs = set()
+    for inverse in [False, True]:
+        lyn = lyndon_array(text, inverse)
+        for i in range(n):
+            # candidate of Lyndon root text[i:i+p]
+            p = lyn[i]
+            r = get_lcp(text, i, i + p)
+            l = 0
+            while i - l - 1 >= 0 and text[i - l - 1] == text[i + p - l - 1]:
+                l += 1
+            if l + r >= p:
+                runs.add((i - l, i + p + r, p))
+    return sorted(runs)
+
+
+def compute_runs_naive(text) -> List[Tuple[int, int, int]]:
+    """
+    Compute all runs of text by checking all intervals.
+    """
+    n = len(text)
+
+    def smallest_period(b: int, e: int) -> int:
+        for p in range(1, e - b + 1):
+            if all(text[k] == text[k + p] for k in range(b, e - p)):
+                return p
+        return e - b
+
+    res = []
+    for b in range(n):
+        for e in range(b + 2, n + 1):
+            p = smallest_period(b, e)
+            if 2 * p > e - b:
+                continue
+            left = b == 0 or text[b - 1] != text[b - 1 + p]
+            right = e == n or text[e] != text[e - p]
+            if left and right:
+                res.append((b, e, p))
+    return sorted(res)
+
+
+def integer_powers(
+    text, min_exp: int = 2, runs: Optional[List[Tuple[int, int, int]]] = None
+) -> List[Tuple[int, int, int]]:
+    """
+    Enumerate (b, p, k) s.t. text[b:b+k*p] = text[b:b+p]^k and k >= min_exp.
+    Every such substring lies in exactly one run whose smallest period divides p,
+    so the output is computed from the runs without duplicates.
+    """
+    if runs is None:
+        runs = compute_runs(text)
+    res = []
+    for (s, e, p0) in runs:
+        p = p0
+        while min_exp * p <= e - s:
+            for b in range(s, e - min_exp * p + 1):
+                for k in range(min_exp, (e - b) // p + 1):
+                    res.append((b, p, k))
+            p += p0
+    return res
+
+
+def integer_powers_naive(text, min_exp: int = 2) -> List[Tuple[int, int, int]]:
+    """
+    Enumerate (b, p, k) s.t. text[b:b+k*p] = text[b:b+p]^k and k >= min_exp by brute force.
+    """
+    n = len(text)
+    res = []
+    for b in range(n):
+        for p in range(1, n - b + 1):
+            for k in range(min_exp, (n - b) // p + 1):
+                if text[b : b + (k - 1) * p] == text[b + p : b + k * p]:
+                    res.append((b, p, k))
+    return res
+
+
+def nonoverlapping_occ_pairs(text, min_len: int = 2) -> List[Tuple[int, int, int]]:
+    """
+    Enumerate (j, i, l) s.t. l >= min_len, j + l <= i and text[j:j+l] = text[i:i+l],
+    sorted in increasing order.
+    The occurrences of a substring of length l form a range of the suffix array with lcp >= l,
+    so only the pairs of such ranges are visited.
+    """
+    n = len(text)
+    sa = make_sa_MM(text)
+    lcp = make_lcpa_kasai(text, sa)
+    res = []
+    l = min_len
+    while True:
+        found = False
+        b = 0
+        for e in range(1, n + 1):
+            if e < n and lcp[e] >= l:
+                continue
+            if e - b >= 2:
+                found = True
+                occs = sorted(sa[b:e])
+                for x, j in enumerate(occs):
+                    for i in occs[bisect_left(occs, j + l, x + 1) :]:
+                        res.append((j, i, l))
+            b = e
+        if not found:
+            break
+        l += 1
+    res.sort()
+    return res
+
+
+def nonoverlapping_occ_pairs_naive(
+    text, min_len: int = 2
+) -> List[Tuple[int, int, int]]:
+    n = len(text)
+    res = []
+    for j in range(n):
+        for i in range(j + 1, n):
+            for l in range(min_len, n - i + 1):
+                if j + l <= i and text[j : j + l] == text[i : i + l]:
+                    res.append((j, i, l))
+    return res
+
+
 def gen_binary(n: int) -> Iterable[str]:
     """
     Generates all binary strings of length `n`.
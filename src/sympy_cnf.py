@@ -0,0 +1,136 @@
+"""
+Conversion of sympy formulas to pysat clauses.
+
+This is the former CNF path of mysat, kept as a reference for the native
+conversion of boolexpr (see tests/boolexpr_check.py). Solvers should not
+import this module, as importing sympy is slow.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+from sympy import And, Basic, Not, Or, Symbol
+from sympy.logic.boolalg import Boolean, BooleanFalse, BooleanTrue, Equivalent, is_cnf
+
+debug = False
+
+
+def sympy_atleast_one(lits: list[Boolean]) -> Boolean:
+    return Or(*lits)  # type: ignore
+
+
+def sympy_atmost_one(lits: list[Boolean]) -> Boolean:
+    n = len(lits)
+    return And(*[~lits[i] | ~lits[j] for i in range(n) for j in range(i + 1, n)])  # type: ignore
+
+
+def sympy_exactly_one(lits: list[Boolean]):
+    return And(sympy_atleast_one(lits) & sympy_atmost_one(lits))
+
+
+def sympy_if(x, y) -> Boolean:
+    """
+    x -> y
+    """
+    return ~x | y
+
+
+def sympy_iff(x, y) -> Boolean:
+    """
+    x <-> y
+    """
+    return (~x | y) & (x | ~y)
+
+
+def sympy_equal(x, y) -> Boolean:
+    """
+    x <-> y
+    """
+    return (x & y) | (~x & ~y)
+
+
+def literal_sympy_to_pysat(x: Boolean | Basic):
+    """
+    Convert sympy literal to pysat literal.
+    sympy literal must be represented by integer
+    """
+    assert isinstance(x, Symbol) or isinstance(x, Not)
+    if isinstance(x, Not):
+        return -int(str(x.args[0]))
+    else:
+        return int(str(x))
+
+
+def cnf_sympy_to_pysat(x: Boolean | Any) -> list[list[int]]:
+    """
+    Convert cnf of sympy to cnf of pysat.
+    x is sympy cnf formula whose literal is number
+    """
+
+    def convert_clause(y) -> list[int]:
+        if isinstance(y, Symbol) or isinstance(y, Not):
+            return [literal_sympy_to_pysat(y)]
+        elif isinstance(y, Or):
+            return [literal_sympy_to_pysat(z) for z in y.args]
+        raise Exception("Only Or, Symbol, Not are allowed")
+
+    if isinstance(x, BooleanFalse):
+        return [[1], [-1]]
+    elif isinstance(x, BooleanTrue):
+        return []
+    elif not isinstance(x, And):
+        return [convert_clause(x)]
+
+    return [convert_clause(clause) for clause in x.args]
+
+
+def sympy_cnf_pysat(new_var, x: Boolean | Any) -> list[list[int]]:
+    """
+    Convert any sympy equation to cnf of pysat which is boolean equivalent.
+
+    new_var: get a new variable.
+    """
+    new_formula = []
+
+    def rec(eq: Boolean | Basic) -> int:
+        if isinstance(eq, Symbol) or isinstance(eq, Not):
+            return literal_sympy_to_pysat(eq)
+        elif isinstance(eq, And):
+            nvar = new_var()
+            literals = [rec(clause) for clause in eq.args]
+            new_clauses = []
+            for literal in literals:
+                new_clauses.append([-nvar, literal])
+            new_clause = [nvar] + [-literal for literal in literals]
+            new_clauses.append(new_clause)
+            if debug:
+                print(f"{nvar}={And(*literals)}, cnf={And(*new_clauses)}")
+            new_formula.extend(new_clauses)
+
+            return nvar
+        else:
+            assert isinstance(eq, Or)
+            nvar = new_var()
+            literals = [rec(clause) for clause in eq.args]
+            new_clauses = []
+            for literal in literals:
+                new_clauses.append([nvar, -literal])
+            new_clause = [-nvar] + literals
+            new_clauses.append(new_clause)
+            if debug:
+                print(f"{nvar}={Or(*literals)}, cnf={And(*new_clauses)}")
+            # assert is_nnf(And(*new_clauses))
+            new_formula.extend(new_clauses)
+            return nvar
+
+    x = x.to_nnf()
+    if is_cnf(x):
+        return cnf_sympy_to_pysat(x)
+
+    z = rec(x)
+    new_formula.append([z])
+    return new_formula
+
+
+def defcnf(new_var, x: Boolean, y: Boolean) -> list[list[int]]:
+    return sympy_cnf_pysat(new_var, Equivalent(x, y))  # type: ignore
@@ -0,0 +1,127 @@
+# Timeline of solver runs and benchmark jobs in the Chrome trace event format, which can be opened in
+# https://ui.perfetto.dev or chrome://tracing.
+#
+# Tracing is disabled unless `start` is called (by the option --trace of the solvers and benchmarks), and
+# `profiling` checks `enabled` before recording the phases as events, so that it costs nothing when disabled.
+# Each process records its own events, with timestamps in microseconds since the epoch:
+#   solver:    the whole run and its phases (see profiling.py), written to the file given by --trace
+#   benchmark: each job in the worker running it (with the file, algorithm and status) together with the phases
+#              of the solver called by it, written to a file in a directory shared by the workers (see worker_pool.py),
+#              which are merged into one timeline at the end of the run
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from typing import List
+
+enabled = False
+events: List[dict] = []
+# start of the run of this process
+begin = 0.0
+
+
+def start():
+    """
+    Enable tracing and start recording the events of this process.
+    """
+    global enabled, events, begin
+    enabled = True
+    events = []
+    begin = time.time()
+
+
+def add_trace_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--trace",
+        type=str,
+        help="file to write the timeline of the run to, in the Chrome trace event format (none if empty)",
+        default="",
+    )
+
+
+def configure(args: argparse.Namespace):
+    if args.trace != "":
+        start()
+
+
+def event(name: str, cat: str, begin: float, end: float, **args) -> dict:
+    """
+    Complete event `name` from `begin` to `end` (seconds since the epoch) in the current thread.
+    """
+    return {
+        "name": name,
+        "cat": cat,
+        "ph": "X",
+        "ts": begin * 1e6,
+        "dur": (end - begin) * 1e6,
+        "pid": os.getpid(),
+        "tid": threading.get_native_id(),
+        "args": args,
+    }
+
+
+def process_name(name: str) -> dict:
+    return {
+        "name": "process_name",
+        "ph": "M",
+        "pid": os.getpid(),
+        "args": {"name": name},
+    }
+
+
+def record(name: str, cat: str, begin: float, end: float, **args):
+    """
+    Record an event of this process, which must be called only if `enabled`.
+    """
+    events.append(event(name, cat, begin, end, **args))
+
+
+def write(path: str, events: List[dict]):
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def load(path: str) -> List[dict]:
+    with open(path) as f:
+        return json.load(f)["traceEvents"]
+
+
+def save(path: str, name: str, **args):
+    """
+    Record the run of this process since `start` as `name`, and write the events to `path` if not empty.
+    """
+    if path == "":
+        return
+    record(name, "run", begin, time.time(), **args)
+    write(path, [process_name(name)] + events)
+
+
+def save_job(trace_dir: str, begin: float, **args):
+    """
+    Write the events of a benchmark job since `begin` in this worker to `trace_dir`, if not empty,
+    together with those recorded since `start` was called at `begin`.
+    """
+    if trace_dir == "":
+        return
+    job = [
+        process_name("benchmark worker"),
+        event("job", "benchmark", begin, time.time(), **args),
+    ] + events
+    write(os.path.join(trace_dir, f"job-{uuid.uuid4().hex}.json"), job)
+
+
+def merge(path: str, trace_dir: str, name: str, **args):
+    """
+    Write the events of the benchmark run of this process since `start` as `name`, and those of its jobs
+    in `trace_dir`, to `path` in the order of time.
+    """
+    record(name, "run", begin, time.time(), **args)
+    merged = [process_name(name)] + events
+    for file in sorted(glob.glob(os.path.join(trace_dir, "job-*.json"))):
+        merged += load(file)
+    merged.sort(key=lambda e: e.get("ts", 0))
+    write(path, merged)
@@ -0,0 +1,213 @@
+# Pool of persistent worker processes for the benchmarks, which import the solvers once and run the jobs
+# by calling functions, instead of starting `pipenv run python src/...` and importing them for every job.
+#
+# Results come back as the objects returned by the function (e.g. Exp records), with a status:
+#   "ok":      the value is the result
+#   "timeout": the job did not finish in the timeout, and the worker was killed and respawned
+#   "oom":     MemoryError was raised under the memory limit (RLIMIT_AS, see resource_estimate.set_memory_limit),
+#              and the worker exited to be respawned with a fresh heap, or the worker was killed by SIGKILL
+#   "crash":   the job raised an exception (the value is the traceback), or the worker died otherwise
+# and the CPU time and peak memory of the job (see accounting.py).
+# python src/worker_pool.py --files data/misc/fib08.txt --repeat 10 compares the overhead per job with programs.
+
+import argparse
+import multiprocessing
+import signal
+import sys
+import time
+import traceback
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import accounting
+from accounting import Usage
+from resource_estimate import set_memory_limit
+
+
+@dataclass
+class JobResult:
+    status: str
+    value: Any = None
+    # worker process running the job, and the time (seconds since the epoch) it was sent and finished
+    pid: int = 0
+    begin: float = 0.0
+    end: float = 0.0
+    usage: Usage = field(default_factory=Usage)
+
+
+def worker_main(conn: Connection, memory_limit: float):
+    if memory_limit > 0:
+        set_memory_limit(memory_limit)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        (func, args) = job
+        meter = accounting.Meter()
+        try:
+            (status, value) = ("ok", func(*args))
+        except MemoryError:
+            (status, value) = ("oom", None)
+        except Exception:
+            (status, value) = ("crash", traceback.format_exc())
+        conn.send((status, value, meter.stop()))
+        if status == "oom":
+            return
+
+
+class Worker:
+    def __init__(self, memory_limit: float):
+        (self.conn, child) = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=worker_main, args=(child, memory_limit), daemon=True
+        )
+        self.process.start()
+        child.close()
+        # index of the running job, the time it was sent and the CPU time of the worker then
+        self.job = -1
+        self.begin = 0.0
+        self.cpu_begin = (0.0, 0.0)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    `n_workers` processes running jobs, each limited to `memory_limit` MB (0 for no limit).
+    """
+
+    def __init__(self, n_workers: int, memory_limit: float = 0):
+        self.memory_limit = memory_limit
+        self.workers = [Worker(memory_limit) for _ in range(max(1, n_workers))]
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def respawn(self, worker: Worker):
+        self.workers[self.workers.index(worker)] = Worker(self.memory_limit)
+
+    def map(
+        self,
+        func: Callable,
+        argss: Sequence[Tuple],
+        timeout: Optional[float] = None,
+        callback: Optional[Callable[[int, JobResult], None]] = None,
+    ) -> List[JobResult]:
+        """
+        Call `func(*args)` for each of `argss` in the workers, each in `timeout` seconds (no limit if None),
+        and return the results in the same order. `callback` is called with the index and result of each job
+        as soon as it finishes.
+        """
+        results: List[Optional[JobResult]] = [None] * len(argss)
+        next_job = 0
+        while True:
+            for worker in self.workers:
+                if worker.job < 0 and next_job < len(argss):
+                    worker.job = next_job
+                    worker.begin = time.time()
+                    worker.cpu_begin = accounting.process_cpu(worker.process.pid or 0)
+                    worker.conn.send((func, argss[next_job]))
+                    next_job += 1
+            busy = [worker for worker in self.workers if worker.job >= 0]
+            if not busy:
+                break
+            wait_time = None
+            if timeout is not None:
+                wait_time = max(
+                    0.0, min(worker.begin for worker in busy) + timeout - time.time()
+                )
+            ready = wait([worker.conn for worker in busy], wait_time)
+            now = time.time()
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        (status, value, usage) = worker.conn.recv()
+                    except (EOFError, OSError):
+                        # the CPU time of the zombie before it is joined
+                        usage = accounting.process_usage(
+                            worker.process.pid or 0, worker.cpu_begin
+                        )
+                        worker.process.join()
+                        usage.exit_code = worker.process.exitcode or 0
+                        status = accounting.classify(usage, False, self.memory_limit)
+                        value = f"worker exited with {worker.process.exitcode}"
+                elif timeout is not None and now - worker.begin >= timeout:
+                    (status, value) = ("timeout", None)
+                    usage = accounting.process_usage(
+                        worker.process.pid or 0, worker.cpu_begin
+                    )
+                    usage.exit_code = -signal.SIGKILL
+                else:
+                    continue
+                res = results[worker.job] = JobResult(
+                    status, value, worker.process.pid or 0, worker.begin, now, usage
+                )
+                if callback is not None:
+                    callback(worker.job, res)
+                worker.job = -1
+                if status in ["timeout", "oom"] or not worker.process.is_alive():
+                    worker.kill()
+                    self.respawn(worker)
+        return [res for res in results if res is not None]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare the overhead per job of the worker pool with running programs."
+    )
+    parser.add_argument("--files", nargs="+", help="input files", required=True)
+    parser.add_argument(
+        "--repeat", type=int, help="number of jobs per file", default=10
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import attractor_bench
+
+    args = parse_args()
+    jobs = [(file,) for file in args.files for _ in range(args.repeat)]
+    start = time.time()
+    for (file,) in jobs:
+        attractor_bench.run_solver(file)
+    time_program = (time.time() - start) / len(jobs)
+    start = time.time()
+    with WorkerPool(1) as pool:
+        results = pool.map(attractor_bench.solve, jobs)
+    time_pool = (time.time() - start) / len(jobs)
+    if any(res.status != "ok" for res in results):
+        print(
+            f"jobs failed: {[res.value for res in results if res.status != 'ok']}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    # the time of solving is the same, the difference is the overhead
+    print(
+        f"program: {time_program * 1000:.1f} ms/job, worker pool: {time_pool * 1000:.1f} ms/job"
+    )
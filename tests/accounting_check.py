@@ -0,0 +1,54 @@
+# verify that the CPU time and peak memory of programs are measured, and that their failures are classified
+# by how they ended
+# python accounting_check.py
+
+import os
+import signal
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import accounting  # noqa: E402
+
+# 200 MB and 0.5 seconds of CPU
+spin = """
+import time
+data = bytearray(200 << 20)
+end = time.process_time() + 0.5
+while time.process_time() < end:
+    pass
+print(len(data))
+"""
+
+
+def python(code: str):
+    return [sys.executable, "-c", code]
+
+
+if __name__ == "__main__":
+    (out, usage, timed_out) = accounting.run(python(spin), 30)
+    if out.strip() != str(200 << 20).encode() or timed_out or usage.exit_code != 0:
+        print(f"wrong result: {out} {usage}")
+        sys.exit(1)
+    if usage.cpu_user + usage.cpu_sys < 0.4 or usage.max_rss < 200:
+        print(f"wrong usage: {usage}")
+        sys.exit(1)
+
+    cases = [
+        (python("import time; time.sleep(60)"), 1, 0, "timeout"),
+        (python("import os, signal; os.kill(os.getpid(), signal.SIGKILL)"), None, 0, "oom"),
+        (python(spin), None, 100, "oom"),
+        (python("import os; os.abort()"), None, 0, "crash"),
+        (python("raise ValueError()"), None, 0, "crash"),
+        (["./no-such-program"], None, 0, "crash"),
+    ]
+    for (cmd, timeout, memory_limit, expected) in cases:
+        (_, usage, timed_out) = accounting.run(cmd, timeout, stderr=open(os.devnull, "w"))
+        status = accounting.classify(usage, timed_out, memory_limit)
+        if status != expected:
+            print(f"{cmd[-1]}: {status} ({usage}) instead of {expected}")
+            sys.exit(1)
+    if accounting.run(python("import os; os.abort()"), stderr=open(os.devnull, "w"))[1].exit_code != -signal.SIGABRT:
+        print("the signal is not reported")
+        sys.exit(1)
+    print("ok")
@@ -0,0 +1,27 @@
+# verify that every encoding of at-most-one constraints has exactly the intended models
+# python amo_check.py [max_len]
+
+import itertools
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pysat.solvers import Solver  # noqa: E402
+
+import mysat  # noqa: E402
+
+if __name__ == "__main__":
+    max_len = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for encoding in mysat.amo_encodings:
+        for k in range(max_len + 1):
+            lm = mysat.LiteralManager()
+            xs = [lm.newid() for _ in range(k)]
+            clauses = mysat.pysat_atmost_one(lm, xs, encoding)
+            with Solver(name="g3", bootstrap_with=clauses) as solver:
+                for values in itertools.product([False, True], repeat=k):
+                    assumptions = [x if v else -x for (x, v) in zip(xs, values)]
+                    if solver.solve(assumptions=assumptions) != (sum(values) <= 1):
+                        print(f"{encoding} is wrong for {values}")
+                        sys.exit(1)
+    print("ok")
@@ -0,0 +1,80 @@
+# verify the native CNF conversion of boolexpr against the sympy one on random formulas
+# python boolexpr_check.py [num_formulas]
+
+import itertools
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import sympy  # noqa: E402
+from pysat.solvers import Solver  # noqa: E402
+
+import boolexpr  # noqa: E402
+import sympy_cnf  # noqa: E402
+
+NVARS = 4
+
+
+def random_formula(depth: int):
+    """
+    Build the same random formula as a boolexpr expression and a sympy expression.
+    """
+    if depth == 0 or random.random() < 0.2:
+        x = random.randint(1, NVARS)
+        return boolexpr.Var(x), sympy.Symbol(str(x))
+    op = random.choice(["not", "and", "or", "implies", "equiv"])
+    if op == "not":
+        (x, sx) = random_formula(depth - 1)
+        return ~x, ~sx
+    if op in ["and", "or"]:
+        args = [random_formula(depth - 1) for _ in range(random.randint(1, 3))]
+        if op == "and":
+            return boolexpr.And(*[x for (x, _) in args]), sympy.And(*[sx for (_, sx) in args])
+        return boolexpr.Or(*[x for (x, _) in args]), sympy.Or(*[sx for (_, sx) in args])
+    (x, sx) = random_formula(depth - 1)
+    (y, sy) = random_formula(depth - 1)
+    if op == "implies":
+        return x >> y, sympy.Implies(sx, sy)
+    return boolexpr.Equivalent(x, y), sympy.Equivalent(sx, sy)
+
+
+def models(clauses) -> set:
+    """
+    Assignments of the variables 1..NVARS that extend to a model of the clauses.
+    """
+    res = set()
+    with Solver(name="g3", bootstrap_with=clauses) as solver:
+        for values in itertools.product([False, True], repeat=NVARS):
+            assumptions = [x + 1 if v else -(x + 1) for (x, v) in enumerate(values)]
+            if solver.solve(assumptions=assumptions):
+                res.add(values)
+    return res
+
+
+def counter(start: int):
+    top = [start]
+
+    def new_var() -> int:
+        top[0] += 1
+        return top[0]
+
+    return new_var
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    for _ in range(num):
+        (x, sx) = random_formula(4)
+        expected = set()
+        for values in itertools.product([False, True], repeat=NVARS):
+            if boolexpr.evaluate(x, {i + 1: v for (i, v) in enumerate(values)}):
+                expected.add(values)
+        native = models(boolexpr.expr_cnf_pysat(counter(NVARS), x))
+        reference = models(sympy_cnf.sympy_cnf_pysat(counter(NVARS), sx))
+        if native != expected or reference != expected:
+            print(f"models differ for {x!r}")
+            sys.exit(1)
+    print("ok")
@@ -0,0 +1,40 @@
+# verify that ClauseStore holds the same formula as pysat.formula.WCNF and writes the same DIMACS WCNF
+# python clause_store_check.py [num_formulas]
+
+import io
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pysat.formula import WCNF  # noqa: E402
+
+from clause_store import ClauseStore  # noqa: E402
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    for _ in range(num):
+        nv = random.randint(1, 50)
+        wcnf = WCNF()
+        store = ClauseStore()
+        store.hard.batch = random.randint(1, 8)
+        for _ in range(random.randint(0, 200)):
+            clause = [random.choice([-1, 1]) * random.randint(1, nv) for _ in range(random.randint(1, 5))]
+            weight = random.randint(1, 3) if random.random() < 0.2 else None
+            wcnf.append(clause, weight=weight)
+            store.append(iter(clause), weight=weight)
+        if (list(store.hard), store.soft, store.wght, store.nv) != (wcnf.hard, wcnf.soft, wcnf.wght, wcnf.nv):
+            print(f"formula differs: {wcnf.hard} {wcnf.soft}")
+            sys.exit(1)
+        if [store.hard[i] for i in range(-len(store.hard), len(store.hard))] != wcnf.hard * 2:
+            print(f"indexing differs: {wcnf.hard}")
+            sys.exit(1)
+        fp = io.StringIO()
+        store.write_dimacs(fp)
+        parsed = WCNF(from_string=fp.getvalue())
+        if (parsed.hard, parsed.soft, parsed.wght, parsed.nv) != (wcnf.hard, wcnf.soft, wcnf.wght, wcnf.nv):
+            print(f"DIMACS differs: {fp.getvalue()}")
+            sys.exit(1)
+    print("ok")
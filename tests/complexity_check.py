@@ -0,0 +1,96 @@
+# verify that the complexity of the solvers is fitted from the results of the scaling benchmark, and that a larger
+# exponent or a slowdown against the baseline is detected as a regression, but not noise
+# python complexity_check.py
+
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import complexity  # noqa: E402
+import results_db  # noqa: E402
+import scaling_bench  # noqa: E402
+
+src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+ladder = [16, 32, 64, 128, 256]
+
+
+def records(slope: float, factor: float, noise: float, seed: int):
+    """
+    Results of a solver on 3 files where the solving time is factor * 1e-6 * n^slope up to the relative noise.
+    """
+    rnd = random.Random(seed)
+    res = []
+    for file in ["a", "b", "c"]:
+        for n in ladder:
+            exp = scaling_bench.ScalingExp("", "correct", "slp", f"misc/{file}.{n:04}", n, "check", "misc", file)
+            exp.time_prep = 1e-5 * n ** 1.5 * (1 + rnd.uniform(-noise, noise))
+            exp.time_total = exp.time_prep + factor * 1e-6 * n ** slope * (1 + rnd.uniform(-noise, noise))
+            exp.sol_nhard = n * n
+            exp.max_rss = 50 + n / 10
+            res.append(exp)
+    return res
+
+
+def write_db(path: str, exps):
+    results_db.clear_table(scaling_bench.dbtable, scaling_bench.ScalingExp, path)
+    with results_db.ResultsWriter(scaling_bench.dbtable, scaling_bench.ScalingExp, path) as writer:
+        for exp in exps:
+            writer.put(exp)
+
+
+def solve_fit(fits):
+    return [fit for fit in fits if fit.metric == "solve"][0]
+
+
+if __name__ == "__main__":
+    # quantiles of Student's t-distribution
+    for (t, df, p) in [(2.015, 5, 0.05), (2.764, 10, 0.01), (-1.476, 5, 0.9), (1.96, 10**6, 0.025)]:
+        if abs(complexity.t_sf(t, df) - p) > 5e-4:
+            print(f"wrong P(T > {t}) with {df} degrees of freedom: {complexity.t_sf(t, df)}")
+            sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "satcomp.db")
+        write_db(db, records(2, 1, 0.1, 0))
+        baseline = complexity.fit_all(complexity.load(db))
+        fit = solve_fit(baseline)
+        if sorted(f.metric for f in baseline) != sorted(complexity.metrics) or abs(fit.slope - 2) > 0.1 or len(fit.values) != 15:
+            print(f"wrong fits: {baseline}")
+            sys.exit(1)
+
+        # (slope, factor, noise) -> metrics regressed
+        cases = [((2, 1, 0.1), []), ((2, 1.1, 0.3), []), ((3, 1, 0.1), ["solve"]), ((2, 3, 0.1), ["solve"])]
+        for (i, ((slope, factor, noise), expected)) in enumerate(cases):
+            run_db = os.path.join(tmp, f"run{i}.db")
+            write_db(run_db, records(slope, factor, noise, i + 1))
+            verdict = complexity.compare(baseline, complexity.fit_all(complexity.load(run_db)))
+            if [c["metric"] for c in verdict["regressions"]] != expected or verdict["status"] != ("fail" if expected else "pass"):
+                print(f"wrong verdict of n^{slope} x{factor}: {verdict}")
+                sys.exit(1)
+
+        # the verdict for CI, with the exit status
+        base_file = os.path.join(tmp, "baseline.json")
+        verdict_file = os.path.join(tmp, "verdict.json")
+        subprocess.check_call([sys.executable, os.path.join(src, "complexity.py"), "--db", db, "--save_baseline", base_file], stdout=subprocess.DEVNULL)
+        write_db(db, records(2, 3, 0.1, 5))
+        cmd = [sys.executable, os.path.join(src, "complexity.py"), "--db", db, "--baseline", base_file, "--verdict", verdict_file]
+        code = subprocess.call(cmd, stdout=subprocess.DEVNULL)
+        with open(verdict_file) as f:
+            verdict = json.load(f)
+        if code != 1 or verdict["status"] != "fail" or [(c["algo"], c["corpus"], c["metric"]) for c in verdict["regressions"]] != [("slp", "misc", "solve")]:
+            print(f"wrong verdict for CI ({code}): {verdict}")
+            sys.exit(1)
+        con = sqlite3.connect(db)
+        with con:
+            con.execute(f"UPDATE {scaling_bench.dbtable} SET time_total = time_prep + (time_total - time_prep) / 3")
+        con.close()
+        if subprocess.call(cmd, stdout=subprocess.DEVNULL) != 0:
+            print("a run as fast as the baseline fails")
+            sys.exit(1)
+    print("ok")
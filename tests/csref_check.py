@@ -0,0 +1,30 @@
+# verify the occurrence-based enumeration of truncation reference candidates against the naive one
+# python csref_check.py [num_strings]
+
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import stralgo  # noqa: E402
+from cs_solver import compute_csrefs, compute_csrefs_naive  # noqa: E402
+
+
+def random_text(n: int, alphabet: bytes) -> bytes:
+    return bytes(random.choice(alphabet) for _ in range(n))
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    for alphabet in [b"ab", b"abc", b"aab"]:
+        for _ in range(num):
+            text = random_text(random.randint(1, 16), alphabet)
+            if stralgo.nonoverlapping_occ_pairs(text) != stralgo.nonoverlapping_occ_pairs_naive(text):
+                print(f"occurrence pairs differ for {text!r}")
+                sys.exit(1)
+            if compute_csrefs(text) != compute_csrefs_naive(text):
+                print(f"csrefs differ for {text!r}")
+                sys.exit(1)
+    print("ok")
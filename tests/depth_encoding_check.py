@@ -0,0 +1,60 @@
+# verify that the depth encodings of the collage system solver give the same smallest collage system on random strings,
+# and that the comparator of the binary encoding (mysat.pysat_less) agrees with the comparison of integers
+# python depth_encoding_check.py [num_texts]
+
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pysat.solvers import Solver  # noqa: E402
+
+from cs_solver import depth_encodings, smallest_CollageSystem  # noqa: E402
+from mysat import LiteralManager, pysat_less  # noqa: E402
+from slp import SLPExp  # noqa: E402
+
+
+def check_less(nbits: int):
+    """
+    pysat_less is satisfiable with the bits of x and y fixed iff x < y (x <= y if not strict), or the condition is false.
+    """
+    for strict in [True, False]:
+        for with_cond in [False, True]:
+            lm = LiteralManager()
+            xs = [lm.newid() for _ in range(nbits)]
+            ys = [lm.newid() for _ in range(nbits)]
+            cond = [lm.newid()] if with_cond else []
+            clauses = pysat_less(lm, xs, ys, strict, cond) if with_cond else pysat_less(lm, xs, ys, strict)
+            with Solver(bootstrap_with=clauses) as solver:
+                for x in range(2**nbits):
+                    for y in range(2**nbits):
+                        # bits from the most significant one
+                        bits = [(v >> (nbits - 1 - b)) & 1 for v in [x, y] for b in range(nbits)]
+                        assumptions = [lit if bit else -lit for (lit, bit) in zip(xs + ys, bits)]
+                        for c in [True, False] if with_cond else [True]:
+                            expected = (x < y if strict else x <= y) or not c
+                            if with_cond:
+                                assumptions[2 * nbits :] = [cond[0] if c else -cond[0]]
+                            if solver.solve(assumptions=assumptions) != expected:
+                                print(f"wrong comparison of {x} and {y} with {nbits} bits (strict={strict}, cond={c})")
+                                sys.exit(1)
+
+
+if __name__ == "__main__":
+    for nbits in range(1, 5):
+        check_less(nbits)
+
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    for _ in range(num):
+        text = "".join(random.choices(random.choice(["ab", "abc"]), k=random.randint(1, 11))).encode()
+        sizes = []
+        for depth_encoding in depth_encodings:
+            exp = SLPExp.create()
+            smallest_CollageSystem(text, exp, depth_encoding)
+            sizes.append(exp.factor_size)
+        if len(set(sizes)) != 1:
+            print(f"sizes of {depth_encodings} differ for {text!r}: {sizes}")
+            sys.exit(1)
+    print("ok")
@@ -0,0 +1,125 @@
+# verify that formulas loaded from the instance cache are the same as built ones and give the same solutions,
+# and that instances are invalidated by the encoding version and the code, readable by the umask and evicted by the
+# total size
+# python instance_cache_check.py [num_strings]
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+srcdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.append(srcdir)
+
+import instance_cache  # noqa: E402
+from attractor_solver import min_attractor, min_attractor_WCNF  # noqa: E402
+from bidirectional_solver_var2 import bidirectional_WCNF, min_bidirectional  # noqa: E402
+from cs_solver import smallest_CollageSystem, smallest_CollageSystem_WCNF  # noqa: E402
+from slp import SLPExp  # noqa: E402
+from slp_solver import smallest_SLP, smallest_SLP_WCNF  # noqa: E402
+
+
+def formula(res):
+    wcnf = res[1] if isinstance(res, tuple) else res
+    return (list(wcnf.hard), wcnf.soft, wcnf.wght, wcnf.nv)
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    builders = [
+        ("slp", smallest_SLP_WCNF, {}),
+        ("cs-bounded", smallest_CollageSystem_WCNF, {"depth_encoding": "bounded"}),
+        ("attractor", min_attractor_WCNF, {}),
+        ("bidirectional-var2", bidirectional_WCNF, {}),
+    ]
+    # distinct texts, so that the first build of each is a miss
+    texts = set()
+    while len(texts) < num:
+        texts.add(bytes(random.choice(b"ab") for _ in range(random.randint(2, 9))))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for text in sorted(texts):
+            for (name, builder, params) in builders:
+                instance_cache.cache_dir = ""
+                built = builder(text, **params)
+                instance_cache.cache_dir = cache_dir
+                statuses = []
+                for _ in range(2):
+                    (res, status) = instance_cache.build(name, 1, builder, text, **params)
+                    statuses.append(status)
+                    if formula(res) != formula(built):
+                        print(f"{name}: cached formula differs for {text}")
+                        sys.exit(1)
+                if statuses != ["miss", "hit"]:
+                    print(f"{name}: wrong statuses {statuses} for {text}")
+                    sys.exit(1)
+            # solutions from loaded instances
+            solvers = [
+                lambda text: smallest_SLP(text, SLPExp.create()),
+                lambda text: smallest_CollageSystem(text, SLPExp.create(), "bounded"),
+                min_attractor,
+                min_bidirectional,
+            ]
+            for solver in solvers:
+                sizes = []
+                for d in ["", cache_dir]:
+                    instance_cache.cache_dir = d
+                    res = solver(text)
+                    sizes.append(len(res[1]) if isinstance(res, tuple) else len(res))
+                if sizes[0] != sizes[1]:
+                    print(f"sizes differ with the cache: {sizes} for {text}")
+                    sys.exit(1)
+
+        # another version of the encoding removes the old instances
+        text = b"abaababaab"
+        instance_cache.build("slp", 2, smallest_SLP_WCNF, text)
+        if any(file.startswith("slp-v1-") for file in os.listdir(cache_dir)):
+            print("instances of the old version are not removed")
+            sys.exit(1)
+        # a change of the code of a helper removes the old instances, without a new version
+        helper = os.path.join(cache_dir, "instance_cache_helper.py")
+        with open(helper, "w") as f:
+            f.write("x = 1\n")
+        sys.path.append(cache_dir)
+        instance_cache.formula_modules.append("instance_cache_helper")
+        statuses = []
+        for code in ["x = 1\n", "x = 2\n", "x = 2\n"]:
+            with open(helper, "w") as f:
+                f.write(code)
+            # the code is hashed once per process
+            instance_cache.code_hashes.clear()
+            statuses.append(instance_cache.build("slp", 2, smallest_SLP_WCNF, text)[1])
+        if statuses != ["miss", "miss", "hit"] or len([file for file in os.listdir(cache_dir) if file.startswith("slp-")]) != 1:
+            print(f"instances are not invalidated by the code: {statuses} {os.listdir(cache_dir)}")
+            sys.exit(1)
+        instance_cache.formula_modules.pop()
+        os.remove(helper)
+
+        # instances follow the umask instead of the mode of temporary files
+        umask = os.umask(0o022)
+        instance_cache.build("slp", 2, smallest_SLP_WCNF, text + b"b")
+        os.umask(umask)
+        modes = set(os.stat(os.path.join(cache_dir, file)).st_mode & 0o777 for file in os.listdir(cache_dir) if file.endswith(".inst"))
+        if modes != {0o644}:
+            print(f"wrong modes of the instances: {[oct(mode) for mode in modes]}")
+            sys.exit(1)
+
+        # with no room, every instance is evicted
+        instance_cache.max_size = 0
+        instance_cache.build("slp", 2, smallest_SLP_WCNF, text + b"a")
+        if len(os.listdir(cache_dir)) != 0:
+            print(f"instances are not evicted: {os.listdir(cache_dir)}")
+            sys.exit(1)
+
+    # the classes of a solver running as a program are resolved when loaded
+    with tempfile.TemporaryDirectory() as cache_dir:
+        outs = []
+        for _ in range(2):
+            cmd = [sys.executable, "-W", "ignore", os.path.join(srcdir, "slp_solver.py"), "--str", "abaababaab", "--instance_cache", cache_dir]
+            outs.append(json.loads(subprocess.check_output(cmd).splitlines()[-1]))
+        if [exp["instance_cache"] for exp in outs] != ["miss", "hit"] or outs[0]["factors"] != outs[1]["factors"]:
+            print(f"slp_solver differs with the cache: {outs}")
+            sys.exit(1)
+    print("ok")
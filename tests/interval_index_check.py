@@ -0,0 +1,57 @@
+# verify the membership and the iterations of IntervalIndex (see interval_index.py) against a set of random intervals
+# python interval_index_check.py [num_rounds]
+
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from interval_index import IntervalIndex  # noqa: E402
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for _ in range(num):
+        n = random.randint(1, 20)
+        index = IntervalIndex(n)
+        expected = set()
+        order = []
+        for _ in range(random.randint(0, 3 * n)):
+            i = random.randrange(n)
+            l = random.randint(1, n - i)
+            if index.add(i, l) != ((i, l) not in expected):
+                print(f"wrong result of add({i}, {l}) with {sorted(expected)}")
+                sys.exit(1)
+            if (i, l) not in expected:
+                expected.add((i, l))
+                order.append((i, l))
+        if random.random() < 0.5:
+            index.update(order[: len(order) // 2])
+
+        if len(index) != len(expected) or list(index) != order:
+            print(f"wrong intervals: {list(index)} instead of {order}")
+            sys.exit(1)
+        for i in range(n + 1):
+            for l in range(n + 2):
+                if ((i, l) in index) != ((i, l) in expected):
+                    print(f"wrong membership of {(i, l)} in {sorted(expected)}")
+                    sys.exit(1)
+        for i in range(n + 1):
+            lengths = sorted(l for (j, l) in expected if j == i)
+            if index.starting_at(i) != lengths:
+                print(f"wrong lengths starting at {i}: {index.starting_at(i)} instead of {lengths}")
+                sys.exit(1)
+        if index.lengths() != sorted(set(l for (_, l) in expected)):
+            print(f"wrong lengths: {index.lengths()} in {sorted(expected)}")
+            sys.exit(1)
+        for l in range(n + 2):
+            starts = [i for (i, m) in order if m == l]
+            if index.of_length(l) != starts:
+                print(f"wrong starts of length {l}: {index.of_length(l)} instead of {starts}")
+                sys.exit(1)
+        # looking up a missing length does not register it
+        if index.lengths() != sorted(set(l for (_, l) in expected)):
+            print(f"of_length changed the lengths: {index.lengths()}")
+            sys.exit(1)
+    print("ok")
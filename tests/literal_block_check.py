@@ -0,0 +1,115 @@
+# verify that the literals of declared families (see mysat.LiteralBlock) get the same ids and objects as in a plain
+# IDPool, also after pickling the manager, and that unknown literals and indices out of the declared ranges are
+# rejected with KeyError (also under python -O)
+# python literal_block_check.py [num_rounds]
+
+import os
+import pickle
+import random
+import sys
+from enum import auto
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pysat.formula import IDPool  # noqa: E402
+
+from mysat import Enum, Literal, LiteralManager  # noqa: E402
+
+
+class CheckLiteral(Enum):
+    true = Literal.true
+    false = Literal.false
+    auxlit = Literal.auxlit
+    one = auto()
+    two = auto()
+    three = auto()
+    sparse = auto()
+
+
+dims = {CheckLiteral.one: (7,), CheckLiteral.two: (5, 6), CheckLiteral.three: (3, 4, 2), CheckLiteral.sparse: (9, 9)}
+
+
+def check_same(lm: LiteralManager, pool: IDPool, objs):
+    for obj in objs:
+        if lm.getid(*obj) != pool.obj2id[obj] or lm.id2obj(pool.obj2id[obj]) != obj or not lm.contains(*obj):
+            print(f"wrong id or object of {obj}")
+            sys.exit(1)
+    if list(lm.items()) != sorted(pool.id2obj.items()):
+        print(f"wrong items: {list(lm.items())}")
+        sys.exit(1)
+    if lm.top() != pool.top:
+        print(f"wrong top: {lm.top()} {pool.top}")
+        sys.exit(1)
+
+
+def create(lm: LiteralManager, pool: IDPool, objs, num: int):
+    """
+    Create `num` random literals in both `lm` and `pool`, and add them to `objs`.
+    """
+    for _ in range(num):
+        lit = random.choice(list(dims) + [CheckLiteral.auxlit])
+        if lit == CheckLiteral.auxlit:
+            obj = (lit, lm.nvar[lit])
+            vid = lm.newid()
+        else:
+            obj = (lit,) + tuple(random.randrange(dim) for dim in dims[lit])
+            if obj in pool.obj2id:
+                continue
+            vid = lm.newid(*obj)
+        if vid != pool.id(obj):
+            print(f"wrong id of {obj}: {vid} {pool.obj2id[obj]}")
+            sys.exit(1)
+        objs.append(obj)
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    for _ in range(num):
+        lm = LiteralManager(CheckLiteral)
+        pool = IDPool()
+        objs = [(CheckLiteral.true,), (CheckLiteral.false,)]
+        for obj in objs:
+            pool.id(obj)
+        # the sparse family stays in the dictionary of the pool
+        for lit in [CheckLiteral.one, CheckLiteral.two, CheckLiteral.three]:
+            lm.declare(lit, *dims[lit])
+        create(lm, pool, objs, random.randint(0, 60))
+        check_same(lm, pool, objs)
+
+        lm = pickle.loads(pickle.dumps(lm))
+        check_same(lm, pool, objs)
+        create(lm, pool, objs, random.randint(0, 20))
+        check_same(lm, pool, objs)
+
+    # out of the declared ranges, or the wrong number of indices
+    for obj in [(CheckLiteral.one, 7), (CheckLiteral.one, -1), (CheckLiteral.two, 0, 6), (CheckLiteral.two, -1, 0), (CheckLiteral.two, 5, 0)]:
+        for func in [lm.getid, lm.newid]:
+            try:
+                func(*obj)
+            except KeyError:
+                continue
+            print(f"{obj} out of range is accepted by {func.__name__}")
+            sys.exit(1)
+        if lm.contains(*obj):
+            print(f"{obj} out of range is contained")
+            sys.exit(1)
+    for obj in [(CheckLiteral.two, 1), (CheckLiteral.three, 0, 0), (CheckLiteral.three, 0, 4, 0)]:
+        try:
+            lm.getid(*obj)
+        except KeyError:
+            continue
+        print(f"{obj} is accepted by getid")
+        sys.exit(1)
+
+    # literals that are not created, in a block and in the pool, are unknown as in a plain IDPool
+    lm = LiteralManager(CheckLiteral)
+    lm.declare(CheckLiteral.two, *dims[CheckLiteral.two])
+    for obj in [(CheckLiteral.two, 1, 1), (CheckLiteral.sparse, 1, 1)]:
+        try:
+            lm.getid(*obj)
+        except KeyError:
+            continue
+        print(f"{obj} is not created but has an id")
+        sys.exit(1)
+    print("ok")
@@ -0,0 +1,91 @@
+# verify that every MaxSAT engine finds models of the same cost on random WCNFs with unit weights (as lsu requires),
+# and that engines stopped by the time budget report valid bounds, where the budget starts with the search
+# the external engine runs src/maxsat_engine.py as a MaxSAT solver
+# python maxsat_engine_check.py [num_formulas]
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+srcdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.append(srcdir)
+
+from clause_store import ClauseStore  # noqa: E402
+from maxsat_engine import EngineOptions, ExternalEngine, create_engine, engines  # noqa: E402
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    command = f"{sys.executable} -W ignore {os.path.join(srcdir, 'maxsat_engine.py')}"
+    for _ in range(num):
+        nv = random.randint(3, 12)
+        wcnf = ClauseStore()
+        for _ in range(random.randint(1, 3 * nv)):
+            wcnf.append([random.choice([-1, 1]) * random.randint(1, nv) for _ in range(random.choice([1, 2, 2, 3]))])
+        for v in random.sample(range(1, nv + 1), nv // 2):
+            wcnf.append([random.choice([-1, 1]) * v], weight=1)
+        wcnf.nv = nv
+        costs = dict()
+        for name in engines.keys():
+            engine = create_engine(EngineOptions(name=name, command=command))
+            sol = engine.compute(wcnf)
+            if sol is not None:
+                solset = set(sol)
+                assert all(any(x in solset for x in clause) for clause in wcnf.hard), f"{name} returned a non-model"
+            costs[name] = None if sol is None else engine.cost
+        if len(set(costs.values())) != 1:
+            print(f"costs differ: {costs} for {list(wcnf.hard)} {wcnf.soft}")
+            sys.exit(1)
+        # with (almost) no time budget, a model and a lower bound are returned
+        for name in ["rc2", "rc2-stratified", "lsu"]:
+            engine = create_engine(EngineOptions(name=name, time_budget=1e-6))
+            sol = engine.compute(wcnf)
+            if (sol is None) != (costs["rc2"] is None):
+                print(f"{name} with time budget differs in satisfiability")
+                sys.exit(1)
+            if sol is not None and not engine.lower_bound <= costs["rc2"] <= engine.cost:
+                print(f"{name} with time budget: wrong bounds {engine.lower_bound} {engine.cost} of {costs['rc2']}")
+                sys.exit(1)
+
+    # both formats of "v" lines of external solvers
+    wcnf = ClauseStore()
+    wcnf.append([1, 2])
+    wcnf.append([-1], weight=1)
+    wcnf.nv = 2
+    engine = ExternalEngine(EngineOptions(name="external"))
+    for out in ["s OPTIMUM FOUND\nv -1 2\n", "o 0\ns OPTIMUM FOUND\nv 01\n"]:
+        if engine.parse_output(out, wcnf) != [-1, 2] or engine.cost != 0:
+            print(f"wrong parse of {out}")
+            sys.exit(1)
+    if engine.parse_output("s UNSATISFIABLE\n", wcnf) is not None:
+        print("wrong parse of UNSATISFIABLE")
+        sys.exit(1)
+
+    # the time budget starts with the search, not with the creation of the engine or the loading of the formula
+    wcnf = ClauseStore()
+    wcnf.append([1, 2])
+    wcnf.append([-1], weight=1)
+    wcnf.append([-2], weight=1)
+    wcnf.nv = 2
+    for name in ["rc2", "rc2-stratified", "lsu"]:
+        engine = create_engine(EngineOptions(name=name, time_budget=1))
+        engine.load(wcnf)
+        time.sleep(1.2)
+        if engine.compute() is None or not engine.optimal or engine.cost != 1:
+            print(f"{name} is stopped before searching: {engine.cost} {engine.lower_bound}")
+            sys.exit(1)
+
+    # fm cannot be stopped by the time budget, which is rejected with the arguments
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "formula.wcnf")
+        with open(path, "w") as fp:
+            wcnf.write_dimacs(fp)
+        cmd = command.split() + ["--engine", "fm", "--time_budget", "1", path]
+        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if res.returncode != 1 or "fm engine does not support --time_budget" not in res.stderr or "Traceback" in res.stderr:
+            print(f"fm with time budget is not rejected: {res.returncode} {res.stderr}")
+            sys.exit(1)
+    print("ok")
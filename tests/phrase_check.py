@@ -0,0 +1,58 @@
+# verify that the phrase literals defined only for the candidate intervals (see rlslp_solver.phrase_clauses) give the
+# same smallest RLSLP and collage system as the phrase literals defined for all intervals
+# python phrase_check.py [num_texts]
+
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import cs_solver  # noqa: E402
+import rlslp_solver  # noqa: E402
+from mysat import pysat_and, pysat_iff  # noqa: E402
+from slp import SLPExp  # noqa: E402
+
+
+def dense_phrase_clauses(lm, pstart_lit, phrase_lit, n, phrases):
+    """
+    phrase(i,l) <=> pstart[i] and pstart[i+l] and no pstart in (i, i+l) for all intervals (i,l),
+    and the intervals that are not candidates are not phrases.
+    """
+    clauses = []
+    for i in range(n):
+        for l in range(1, n - i + 1):
+            plst = [-lm.getid(pstart_lit, i + j) for j in range(1, l)]
+            plst += [lm.getid(pstart_lit, i), lm.getid(pstart_lit, i + l)]
+            phrase = lm.newid(phrase_lit, i, l)
+            (conj, conj_clauses) = pysat_and(lm.newid, plst)
+            clauses.extend(conj_clauses)
+            clauses.extend(pysat_iff(phrase, conj))
+            if (i, l) not in phrases:
+                clauses.append([-phrase])
+    return clauses
+
+
+def factor_sizes(text: bytes):
+    res = []
+    for solver in [rlslp_solver.smallest_RLSLP, cs_solver.smallest_CollageSystem]:
+        exp = SLPExp.create()
+        solver(text, exp)
+        res.append(exp.factor_size)
+    return res
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    sparse = rlslp_solver.phrase_clauses
+    for _ in range(num):
+        text = "".join(random.choices(random.choice(["ab", "abc"]), k=random.randint(1, 11))).encode()
+        expected = factor_sizes(text)
+        (rlslp_solver.phrase_clauses, cs_solver.phrase_clauses) = (dense_phrase_clauses, dense_phrase_clauses)
+        dense = factor_sizes(text)
+        (rlslp_solver.phrase_clauses, cs_solver.phrase_clauses) = (sparse, sparse)
+        if dense != expected:
+            print(f"sizes of (rlslp, cs) differ for {text!r}: {expected} (candidates), {dense} (all intervals)")
+            sys.exit(1)
+    print("ok")
@@ -0,0 +1,53 @@
+# verify that preprocessing keeps the optimum of random WCNFs and that restored models are models of the original formula
+# python preprocess_check.py [num_formulas]
+
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pysat.examples.rc2 import RC2  # noqa: E402
+from pysat.formula import WCNF  # noqa: E402
+
+from preprocess import WCNFPreprocessor  # noqa: E402
+
+
+def random_wcnf(nv: int, nclauses: int) -> WCNF:
+    wcnf = WCNF()
+    for _ in range(nclauses):
+        k = random.choice([1, 2, 2, 2, 3, 3, 4])
+        wcnf.append([random.choice([-1, 1]) * random.randint(1, nv) for _ in range(k)])
+    for v in random.sample(range(1, nv + 1), nv // 3):
+        wcnf.append([random.choice([-1, 1]) * v], weight=random.randint(1, 3))
+    wcnf.nv = nv
+    return wcnf
+
+
+def cost(wcnf: WCNF, model) -> int:
+    sol = set(model)
+    return sum(w for (clause, w) in zip(wcnf.soft, wcnf.wght) if not any(x in sol for x in clause))
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    for _ in range(num):
+        nv = random.randint(3, 14)
+        wcnf = random_wcnf(nv, random.randint(1, 3 * nv))
+        expected = RC2(wcnf).compute()
+        pre = WCNFPreprocessor(wcnf)
+        model = pre.restore(RC2(pre.run()).compute())
+        if (expected is None) != (model is None):
+            print(f"satisfiability differs for {wcnf.hard}")
+            sys.exit(1)
+        if model is None:
+            continue
+        sol = set(model)
+        if not all(any(x in sol for x in clause) for clause in wcnf.hard):
+            print(f"restored model is not a model of {wcnf.hard}")
+            sys.exit(1)
+        if cost(wcnf, model) != cost(wcnf, expected):
+            print(f"cost differs for {wcnf.hard} {wcnf.soft}")
+            sys.exit(1)
+    print("ok")
@@ -0,0 +1,80 @@
+# verify that the clauses counted for the constraint families of each solver add up to the formula,
+# with and without the instance cache, and that the phases and engine statistics are recorded
+# python profiling_check.py [num_strings]
+
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import bidirectional_solver_var0  # noqa: E402
+import bidirectional_solver_var1  # noqa: E402
+import bidirectional_solver_var2  # noqa: E402
+import instance_cache  # noqa: E402
+from attractor_bench_format import AttractorExp  # noqa: E402
+from attractor_solver import min_attractor  # noqa: E402
+from bidirectional import BiDirExp  # noqa: E402
+from cs_solver import smallest_CollageSystem  # noqa: E402
+from rlslp_solver import smallest_RLSLP  # noqa: E402
+from slp import SLPExp  # noqa: E402
+from slp_solver import smallest_SLP  # noqa: E402
+
+solvers = [
+    ("slp", lambda text, exp: smallest_SLP(text, exp), SLPExp),
+    ("rlslp", lambda text, exp: smallest_RLSLP(text, exp), SLPExp),
+    ("cs-bounded", lambda text, exp: smallest_CollageSystem(text, exp, "bounded"), SLPExp),
+    ("attractor", lambda text, exp: min_attractor(text, exp), AttractorExp),
+    ("bidirectional-var0", lambda text, exp: bidirectional_solver_var0.min_bidirectional(text, exp), BiDirExp),
+    ("bidirectional-var1", lambda text, exp: bidirectional_solver_var1.min_bidirectional(text, exp), BiDirExp),
+    ("bidirectional-var2", lambda text, exp: bidirectional_solver_var2.min_bidirectional(text, exp), BiDirExp),
+]
+
+
+def check(exp) -> str:
+    profile = exp.profile
+    families = profile.families.values()
+    # all soft clauses are units
+    if sum(f.clauses for f in families) != exp.sol_nhard + exp.sol_nsoft:
+        return "clauses of families do not add up"
+    if sum(f.literals for f in families) != exp.sol_ntotalvars + exp.sol_nsoft:
+        return "literals of families do not add up"
+    for phase in ["solve", "decode"]:
+        if phase not in profile.phases:
+            return f"phase {phase} is not recorded"
+    if profile.engine.oracle_calls == 0 or profile.peak_rss <= 0:
+        return "engine statistics or peak memory are not recorded"
+    # exp is written and read as JSON by the benchmarks
+    if type(exp).from_json(exp.to_json()).profile != profile:  # type: ignore
+        return "profile changes through JSON"
+    return ""
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    texts = set()
+    while len(texts) < num:
+        texts.add(bytes(random.choice(b"abc") for _ in range(random.randint(3, 12))))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for text in sorted(texts):
+            for (name, solver, exp_type) in solvers:
+                profiles = []
+                for d in ["", cache_dir, cache_dir]:
+                    instance_cache.cache_dir = d
+                    exp = exp_type.create()
+                    solver(text, exp)
+                    err = check(exp)
+                    if err != "":
+                        print(f"{name}: {err} for {text} (cache: {exp.instance_cache}): {exp.profile}")
+                        sys.exit(1)
+                    profiles.append(exp.profile)
+                # the counts of the families are loaded with cached instances
+                if not (profiles[0].families == profiles[1].families == profiles[2].families):
+                    print(f"{name}: families differ with the cache for {text}")
+                    sys.exit(1)
+                if "load instance" not in profiles[2].phases:
+                    print(f"{name}: loading the instance is not recorded for {text}")
+                    sys.exit(1)
+    print("ok")
@@ -0,0 +1,110 @@
+# verify that the report pivoted from the tables of the benchmarks has the cells of each file and algorithm,
+# and that an incremental update computes only the files whose rows changed, giving the same tables as a full one
+# python report_check.py [num_files]
+
+import csv
+import filecmp
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import lz_bench  # noqa: E402
+import report  # noqa: E402
+import results_db  # noqa: E402
+from attractor_bench_format import AttractorExp  # noqa: E402
+from bidirectional import BiDirExp  # noqa: E402
+from lz_bench import LZExp  # noqa: E402
+
+
+def exp(exp_type, file_name: str, algo: str, i: int):
+    res = exp_type.create()
+    (res.file_name, res.algo, res.file_len) = (file_name, algo, 10 * len(file_name))
+    (res.status, res.factor_size, res.time_total) = ("correct", i + 1, 0.5 * i + 0.25)
+    if i % 3 == 1:
+        (res.status, res.factor_size, res.time_total) = ("timeout-6", 0, 0)
+    if hasattr(res, "lower_bound") and i % 3 == 2:
+        (res.status, res.lower_bound) = ("anytime", i)
+    return res
+
+
+def expected(path: str, target_key: str):
+    """
+    Cells queried file by file.
+    """
+    con = sqlite3.connect(path)
+    files = sorted(set(row[0] for row in con.execute("SELECT file_name FROM lz_bench")))
+    res = [report.header]
+    for file in files:
+        line = [file, con.execute("SELECT file_len FROM lz_bench WHERE file_name = ?", (file,)).fetchone()[0]]
+        for algo in lz_bench.algos:
+            (status, target) = con.execute(f"SELECT status, {target_key} FROM lz_bench WHERE file_name = ? AND algo = ?", (file, algo)).fetchone()
+            line.append(status if target == 0 else target)
+        for table in report.others:
+            row = con.execute(f"SELECT status, {target_key}, lower_bound FROM {table} WHERE file_name = ?", (file,)).fetchone()
+            if row is None:
+                line.append("None")
+            elif row[1] == 0:
+                line.append(row[0])
+            else:
+                line.append(f"[{row[2]}, {row[1]}]" if row[0] == "anytime" and target_key == "factor_size" else row[1])
+        res.append([str(x) for x in line])
+    con.close()
+    return res
+
+
+def read(path: str):
+    with open(path) as f:
+        return list(csv.reader(f))
+
+
+if __name__ == "__main__":
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "satcomp.db")
+        (out, full) = (os.path.join(tmp, "out"), os.path.join(tmp, "full"))
+        files = [f"file{i:02}.txt" for i in range(num)]
+        with results_db.ResultsWriter("lz_bench", LZExp, path) as writer:
+            for (i, file) in enumerate(files):
+                for (j, algo) in enumerate(lz_bench.algos):
+                    writer.put(exp(LZExp, file, algo, i + j))
+        with results_db.ResultsWriter("attractor_bench", AttractorExp, path) as writer:
+            for (i, file) in enumerate(files[: num // 2]):
+                writer.put(exp(AttractorExp, file, "attractor", i))
+        with results_db.ResultsWriter("bidirectional_bench", BiDirExp, path) as writer:
+            for (i, file) in enumerate(files):
+                writer.put(exp(BiDirExp, file, "bidirectional", i + 1))
+
+        if report.update(path, out) != num:
+            print("not all files are computed in the first report")
+            sys.exit(1)
+        for (name, (target_key, _)) in report.targets.items():
+            if read(os.path.join(out, f"benchmark_{name}.csv")) != expected(path, target_key):
+                print(f"wrong report of {name}: {read(os.path.join(out, f'benchmark_{name}.csv'))}")
+                sys.exit(1)
+        if report.update(path, out) != 0:
+            print("files are computed again without changes")
+            sys.exit(1)
+
+        # a result replaced, and a new one
+        con = sqlite3.connect(path)
+        con.execute("UPDATE bidirectional_bench SET factor_size = 100 WHERE file_name = ?", (files[0],))
+        con.commit()
+        con.close()
+        with results_db.ResultsWriter("attractor_bench", AttractorExp, path) as writer:
+            writer.put(exp(AttractorExp, files[-1], "attractor", 0))
+        if report.update(path, out) != 2:
+            print("changed files are not the only ones computed")
+            sys.exit(1)
+        report.update(path, full, full=True)
+        for name in report.targets:
+            for ext in ["csv", "tex"]:
+                if not filecmp.cmp(os.path.join(out, f"benchmark_{name}.{ext}"), os.path.join(full, f"benchmark_{name}.{ext}"), shallow=False):
+                    print(f"the incremental benchmark_{name}.{ext} differs from the full one")
+                    sys.exit(1)
+        if read(os.path.join(out, "benchmark_size.csv")) != expected(path, "factor_size"):
+            print("the incremental report is not updated")
+            sys.exit(1)
+    print("ok")
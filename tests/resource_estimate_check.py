@@ -0,0 +1,126 @@
+# verify the statistics of texts used by the resource estimates against naive computations,
+# that the estimated sizes are within a stated factor of the formulas on held-out inputs
+# (the memory is checked by resource_estimate_memory_check.py), and that the solvers refuse to run
+# or downgrade the encoding under a memory cap
+# python resource_estimate_check.py [num_strings]
+
+import importlib
+import json
+import os
+import random
+import subprocess
+import sys
+
+srcdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.append(srcdir)
+
+import attractor_solver  # noqa: E402
+import cs_solver  # noqa: E402
+import rlslp_solver  # noqa: E402
+import slp_solver  # noqa: E402
+import stralgo  # noqa: E402
+from resource_estimate import MemoryCapExceeded, choose_model, estimate, text_features  # noqa: E402
+
+datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+# inputs that the models are not calibrated on (see the header of resource_estimate.py)
+heldout = ["misc/thuemorse06.txt", "misc/trib08.txt", "misc/pds06.txt", "misc/hoge.txt", "artificial/paperfold.05"]
+# the collage systems are only built on a short one
+heldout_cs = ["misc/thuemorse04.txt"]
+# the estimated sizes are within size_factor of the formulas
+size_factor = 2.0
+
+builders = {
+    "slp": lambda text: slp_solver.smallest_SLP_WCNF(text)[1],
+    "rlslp": lambda text: rlslp_solver.smallest_RLSLP_WCNF(text)[1],
+    "bidirectional-var0": lambda text: importlib.import_module("bidirectional_solver_var0").bidirectional_WCNF(text)[1],
+    "bidirectional-var1": lambda text: importlib.import_module("bidirectional_solver_var1").bidirectional_WCNF(text)[1],
+    "bidirectional-var2": lambda text: importlib.import_module("bidirectional_solver_var2").bidirectional_WCNF(text)[1],
+    "attractor": attractor_solver.min_attractor_WCNF,
+}
+for depth_encoding in cs_solver.depth_encodings:
+    builders[f"cs-{depth_encoding}"] = lambda text, e=depth_encoding: cs_solver.smallest_CollageSystem_WCNF(text, e)[1]
+
+
+def phrases_naive(text: bytes) -> int:
+    n = len(text)
+    res = 0
+    for i in range(n):
+        lpf = max([l for j in range(i) for l in range(2, i - j + 1) if text[j : j + l] == text[i : i + l]], default=1)
+        res += lpf
+    return res
+
+
+def crossing_naive(intervals) -> int:
+    return sum(1 for (j1, l1) in intervals for (j2, l2) in intervals if j1 < j2 < j1 + l1 < j2 + l2)
+
+
+def within(estimated: float, actual: float, factor: float) -> bool:
+    return actual / factor <= estimated <= actual * factor
+
+
+def run(cmd):
+    proc = subprocess.run([sys.executable, "-W", "ignore"] + cmd, stdout=subprocess.PIPE)
+    return (proc.returncode, json.loads(proc.stdout.splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    for _ in range(num):
+        text = bytes(random.choice(b"ab") for _ in range(random.randint(1, 30)))
+        features = text_features(text)
+        if features["refs"] != len(stralgo.nonoverlapping_occ_pairs(text)):
+            print(f"refs differ: {text}")
+            sys.exit(1)
+        if features["phrases"] != phrases_naive(text):
+            print(f"phrases differ: {text}")
+            sys.exit(1)
+        referred = set((j, l) for (j, _, l) in stralgo.nonoverlapping_occ_pairs(text))
+        if features["referred"] != len(referred) or features["crossing"] != crossing_naive(referred):
+            print(f"referred intervals differ: {text}")
+            sys.exit(1)
+        if features["csrefs"] != len(cs_solver.compute_csrefs(text)):
+            print(f"csrefs differ: {text}")
+            sys.exit(1)
+        wcnf = attractor_solver.min_attractor_WCNF(text)
+        if features["minsubstrs"] != len(wcnf.hard) or features["cover"] != sum(len(clause) for clause in wcnf.hard):
+            print(f"minimal substrings differ: {text}")
+            sys.exit(1)
+
+    for (model, build) in builders.items():
+        for file in heldout_cs if model.startswith("cs-") else heldout:
+            text = open(os.path.join(datadir, file), "rb").read()
+            wcnf = build(text)
+            actual = [wcnf.nv, len(wcnf.hard), sum(len(clause) for clause in wcnf.hard)]
+            est = estimate(model, text)
+            if not all(within(x, y, size_factor) for (x, y) in zip([est.nvars, est.nhard, est.ntotalvars], actual)):
+                print(f"estimate of {model} on {file} is not within {size_factor} of {actual}: {est}")
+                sys.exit(1)
+    text = b"abaababaabaababaababa"
+    ests = {model: estimate(model, text) for model in ["bidirectional-var0", "bidirectional-var2"]}
+    if not ests["bidirectional-var2"].memory < ests["bidirectional-var0"].memory:
+        print(f"var2 is not estimated to be smaller than var0: {ests}")
+        sys.exit(1)
+    # a cap between the two estimates
+    cap = (ests["bidirectional-var0"].memory + ests["bidirectional-var2"].memory) / 2
+    models = ["bidirectional-var0", "bidirectional-var1", "bidirectional-var2"]
+    if choose_model(models, text, cap, downgrade=True).memory > cap:
+        print("downgraded model exceeds the cap")
+        sys.exit(1)
+    try:
+        choose_model(models, text, cap, downgrade=False)
+        print("memory cap is not checked")
+        sys.exit(1)
+    except MemoryCapExceeded:
+        pass
+
+    (code, exp) = run([os.path.join(srcdir, "slp_solver.py"), "--str", text.decode(), "--memory_cap", "1"])
+    if code == 0 or exp["status"] != "memory-cap":
+        print(f"slp_solver ran over the memory cap: {exp}")
+        sys.exit(1)
+    solver = os.path.join(srcdir, "bidirectional_solver_var0.py")
+    (code, exp) = run([solver, "--str", text.decode(), "--memory_cap", str(cap), "--on_memory_cap", "downgrade"])
+    if code != 0 or not exp["algo"].endswith(("-var1", "-var2")) or exp["factor_size"] == 0:
+        print(f"bidirectional_solver_var0 is not downgraded: {exp}")
+        sys.exit(1)
+    print("ok")
@@ -0,0 +1,52 @@
+# verify that the estimated memory of the solvers is within a stated factor of the peak RSS of their runs
+# on inputs held out from the calibration (see the header of resource_estimate.py), and that a run fitting
+# in a memory cap is not refused
+# python resource_estimate_memory_check.py
+#
+# The solvers are not imported here: the peak RSS of a child counts the memory of this process when it starts
+# (Linux keeps the high-water mark across exec).
+
+import os
+import subprocess
+import sys
+
+srcdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.append(srcdir)
+
+from resource_estimate import estimate, measure  # noqa: E402
+
+datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+# the estimated memory is within memory_factor of the peak RSS of the runs
+memory_factor = 1.5
+
+
+def within(estimated: float, actual: float, factor: float) -> bool:
+    return actual / factor <= estimated <= actual * factor
+
+
+if __name__ == "__main__":
+    for (model, file) in [
+        ("slp", "misc/trib08.txt"),
+        ("rlslp", "misc/pds06.txt"),
+        ("bidirectional-var0", "misc/thuemorse06.txt"),
+    ]:
+        path = os.path.join(datadir, file)
+        res = measure(model, path, 600)
+        if res is None:
+            print(f"{model} failed on {file}")
+            sys.exit(1)
+        est = estimate(model, open(path, "rb").read())
+        if not within(est.memory, res["memory"], memory_factor):
+            print(f"estimated memory of {model} on {file} is not within {memory_factor} of {res['memory']}: {est}")
+            sys.exit(1)
+
+    # about 210 MB
+    path = os.path.join(datadir, "misc/fib12.txt")
+    proc = subprocess.run(
+        [sys.executable, "-W", "ignore", os.path.join(srcdir, "slp_solver.py"), "--file", path, "--memory_cap", "400"],
+        stdout=subprocess.DEVNULL,
+    )
+    if proc.returncode != 0:
+        print(f"slp_solver refused fib12 under a memory cap of 400 MB: {estimate('slp', open(path, 'rb').read())}")
+        sys.exit(1)
+    print("ok")
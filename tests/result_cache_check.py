@@ -0,0 +1,49 @@
+# verify that results stored concurrently by joblib workers are found in the result cache,
+# and that the key depends on the encoding version, the given options and the input
+# python result_cache_check.py [num_files]
+
+import json
+import os
+import sys
+import tempfile
+
+from joblib import Parallel, delayed
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import result_cache  # noqa: E402
+
+
+def store(path: str, file: str, i: int):
+    exp = json.dumps({"file": os.path.basename(file), "factor_size": i})
+    result_cache.store("slp", 1, {"time_budget": 0, "memory_cap": 100}, file, exp, i, path=path)
+
+
+if __name__ == "__main__":
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "result_cache.db")
+        files = []
+        for i in range(num):
+            file = os.path.join(tmp, f"{i}.txt")
+            with open(file, "w") as f:
+                f.write("ab" * i)
+            files.append(file)
+        Parallel(n_jobs=4)(delayed(store)(path, file, i) for (i, file) in enumerate(files))
+        for (i, file) in enumerate(files):
+            # options with default values are ignored
+            cached = result_cache.lookup("slp", 1, {"memory_cap": 100}, file, path=path)
+            if cached is None or json.loads(cached)["factor_size"] != i:
+                print(f"result of {file} is not found: {cached}")
+                sys.exit(1)
+            for (algo, version, options) in [("slp", 2, {"memory_cap": 100}), ("slp", 1, {}), ("rlslp", 1, {"memory_cap": 100})]:
+                if result_cache.lookup(algo, version, options, file, path=path) is not None:
+                    print(f"result of {file} is found for {algo} {version} {options}")
+                    sys.exit(1)
+        # the same input in another file
+        with open(files[3], "rb") as f, open(os.path.join(tmp, "copy.txt"), "wb") as g:
+            g.write(f.read())
+        if result_cache.lookup("slp", 1, {"memory_cap": 100}, os.path.join(tmp, "copy.txt"), path=path) is None:
+            print("results are not keyed by the input")
+            sys.exit(1)
+    print("ok")
@@ -0,0 +1,104 @@
+# verify that the rows put concurrently into the results database are all written with typed columns and indexed,
+# that a table of an older version, with every value stored as str, is converted to the same values,
+# and that the jobs of previous runs are skipped unless they failed and are retried
+# python results_db_check.py [num_rows]
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import results_db  # noqa: E402
+from bidirectional import BiDirExp  # noqa: E402
+from bidirectional_solver_var2 import min_bidirectional  # noqa: E402
+
+
+def exps(num: int):
+    res = []
+    for i in range(num):
+        exp = BiDirExp.create()
+        exp.file_name = f"{i}.txt"
+        exp.algo = "solver"
+        exp.factors = min_bidirectional(b"ab" * (i % 5) + b"aab", exp)
+        exp.factor_size = len(exp.factors)
+        res.append(exp)
+    return res
+
+
+if __name__ == "__main__":
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    rows = exps(num)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "satcomp.db")
+        with results_db.ResultsWriter("bidirectional_bench", BiDirExp, path, batch_size=8) as writer:
+            threads = [threading.Thread(target=lambda k: [writer.put(exp) for exp in rows[k::4]], args=(k,)) for k in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        con = sqlite3.connect(path)
+        cols = results_db.columns(BiDirExp)
+        expected = sorted(results_db.to_row(exp, cols) for exp in rows)
+        if sorted(con.execute("SELECT * FROM bidirectional_bench").fetchall()) != expected:
+            print("rows differ")
+            sys.exit(1)
+        types = con.execute("SELECT typeof(file_len), typeof(time_total), typeof(factors) FROM bidirectional_bench").fetchone()
+        if types != ("integer", "real", "text"):
+            print(f"wrong types: {types}")
+            sys.exit(1)
+        plan = con.execute("EXPLAIN QUERY PLAN SELECT * FROM bidirectional_bench WHERE file_name = '1.txt' AND algo = 'solver'").fetchall()
+        if "bidirectional_bench_file_algo" not in str(plan) or con.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            print(f"not indexed or not in WAL mode: {plan}")
+            sys.exit(1)
+
+        # a table of an older version, without the column profile
+        exp = rows[0]
+        old_cols = [name for (name, _) in cols if name != "profile"]
+        con.execute("DROP TABLE bidirectional_bench")
+        con.execute(f"CREATE TABLE bidirectional_bench ({', '.join(old_cols)})")
+        d = exp.to_dict()  # type: ignore
+        con.execute(f"INSERT INTO bidirectional_bench VALUES ({', '.join('?' for _ in old_cols)})", tuple(str(d[name]) for name in old_cols))
+        con.commit()
+        con.close()
+        results_db.migrate(path)
+        con = sqlite3.connect(path)
+        row = con.execute("SELECT * FROM bidirectional_bench").fetchone()
+        new = results_db.to_row(exp, cols)
+        k = [name for (name, _) in cols].index("profile")
+        if row[:k] + row[k + 1 :] != new[:k] + new[k + 1 :] or row[k] is not None:
+            print(f"migrated row differs: {row} {new}")
+            sys.exit(1)
+        con.close()
+
+        # jobs of previous runs are skipped, and failed ones are retried on request, replacing their results
+        results_db.clear_table("bidirectional_bench", BiDirExp, path)
+        jobs = [results_db.Job("solver", exp.file_name, 1, 60) for exp in rows]
+        with results_db.ResultsWriter("bidirectional_bench", BiDirExp, path) as writer:
+            for (i, (exp, job)) in enumerate(zip(rows, jobs)):
+                exp.status = "correct" if i % 2 == 0 else "timeout-60"
+                writer.put(exp, job, i)
+        for retry_failed in [False, True]:
+            with results_db.ResultsWriter("bidirectional_bench", BiDirExp, path) as writer:
+                done = [writer.done(job, retry_failed) for job in jobs]
+                if done != [True if retry_failed is False else i % 2 == 0 for i in range(num)]:
+                    print(f"wrong jobs to skip with retry_failed={retry_failed}: {done}")
+                    sys.exit(1)
+                if writer.done(results_db.Job("solver", rows[0].file_name, 2, 60)) or writer.done(results_db.Job("solver", rows[0].file_name, 1, 30)):
+                    print("jobs of another encoding version or timeout are skipped")
+                    sys.exit(1)
+                if writer.past[jobs[3].algo, jobs[3].file_name].time != 3:
+                    print("the time of a job is not recorded")
+                    sys.exit(1)
+        with results_db.ResultsWriter("bidirectional_bench", BiDirExp, path) as writer:
+            rows[1].status = "correct"
+            writer.put(rows[1], jobs[1], 1)
+        con = sqlite3.connect(path)
+        statuses = con.execute("SELECT status FROM bidirectional_bench WHERE file_name = ?", (rows[1].file_name,)).fetchall()
+        if statuses != [("correct",)] or con.execute("SELECT count(*) FROM bidirectional_bench").fetchone()[0] != num:
+            print(f"results of jobs run again are not replaced: {statuses}")
+            sys.exit(1)
+        con.close()
+    print("ok")
@@ -0,0 +1,30 @@
+# verify the runs-based enumeration of run-length rule candidates against the naive one
+# python runs_check.py [num_strings]
+
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import stralgo  # noqa: E402
+from rlslp_solver import compute_rlrefs, compute_rlrefs_naive  # noqa: E402
+
+
+def random_text(n: int, alphabet: bytes) -> bytes:
+    return bytes(random.choice(alphabet) for _ in range(n))
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    for alphabet in [b"ab", b"abc", b"aab"]:
+        for _ in range(num):
+            text = random_text(random.randint(1, 30), alphabet)
+            if stralgo.compute_runs(text) != stralgo.compute_runs_naive(text):
+                print(f"runs differ for {text!r}")
+                sys.exit(1)
+            if compute_rlrefs(text) != compute_rlrefs_naive(text):
+                print(f"rlrefs differ for {text!r}")
+                sys.exit(1)
+    print("ok")
@@ -0,0 +1,59 @@
+# verify that the scaling benchmark runs the solvers on the prefixes of the ladder, stops a solver on the longer
+# prefixes of a file after it ran out of time, and skips the jobs of previous runs
+# python scaling_bench_check.py
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import scaling_bench  # noqa: E402
+from slp import SLPExp  # noqa: E402
+from slp_solver import smallest_SLP  # noqa: E402
+
+data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "misc", "trib09.txt")
+
+
+def rows(path: str):
+    con = sqlite3.connect(path)
+    try:
+        return {(r[0], r[1]): r[2:] for r in con.execute(f"SELECT algo, file_name, file_len, status, factor_size FROM {scaling_bench.dbtable}")}
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "corpus"))
+        shutil.copy(data, os.path.join(tmp, "corpus", "trib"))
+        db = os.path.join(tmp, "satcomp.db")
+        # the collage system takes about 30 seconds on 24 characters, and the file is shorter than 1000
+        suite = scaling_bench.Suite({"tmp": [os.path.join(tmp, "corpus", "*")]}, [8, 24, 28, 1000], ["slp", "cs", "bidirectional-var2"], 3, 2000)
+        scaling_bench.benchmark("check", suite, 2, path=db)
+        first = rows(db)
+        expected = {}
+        for n in [8, 24, 28]:
+            expected["slp", f"tmp/trib.{n:04}"] = "correct"
+            expected["bidirectional-var2", f"tmp/trib.{n:04}"] = "correct"
+        expected["cs", "tmp/trib.0008"] = "correct"
+        expected["cs", "tmp/trib.0024"] = "timeout-3"
+        if {key: row[1] for (key, row) in first.items()} != expected:
+            print(f"wrong jobs: {first}")
+            sys.exit(1)
+        text = open(data, "rb").read()
+        for n in [8, 24, 28]:
+            exp = SLPExp.create()
+            smallest_SLP(text[:n], exp)
+            if first["slp", f"tmp/trib.{n:04}"] != (n, "correct", exp.factor_size):
+                print(f"wrong result of the prefix of length {n}: {first['slp', f'tmp/trib.{n:04}']}")
+                sys.exit(1)
+
+        # nothing runs again, even the prefix after the timeout
+        scaling_bench.benchmark("check", suite, 2, path=db)
+        if rows(db) != first:
+            print(f"jobs of the previous run are run again: {rows(db)}")
+            sys.exit(1)
+    print("ok")
@@ -0,0 +1,96 @@
+# verify that the scheduler starts the jobs longest first as predicted by previous results, never runs more jobs
+# or more memory than given at once, reports the jobs over the timeout, and reserves for the jobs without previous
+# results their estimates up to the share of the memory budget of a core
+# python scheduler_check.py
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import resource_estimate  # noqa: E402
+import scheduler  # noqa: E402
+
+# a job sleeping for the seconds in the file, reporting when it began and ended
+job = """
+import json, os, sys, time
+begin = time.time()
+print(json.dumps({"begin": begin}), flush=True)
+file = sys.argv[sys.argv.index("--file") + 1]
+time.sleep(float(open(file).read()))
+print(json.dumps({"algo": "sleep", "file_name": os.path.basename(file), "status": "", "begin": begin, "end": time.time()}))
+"""
+
+
+if __name__ == "__main__":
+    # without previous results, the estimate of a solver or the share of the memory budget
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for (i, n) in enumerate([10, 40, 2000]):
+            files.append(os.path.join(tmp, f"text{i}"))
+            with open(files[-1], "wb") as f:
+                f.write(b"ab" * (n // 2))
+        jobs = scheduler.make_jobs(files, ["bidir", "attr", "slp", "sleep"], 16000, [], 60, 3000)
+        memories = {(job.solver, os.path.basename(job.file)): job.memory for job in jobs}
+        text = open(files[0], "rb").read()
+        expected = {
+            ("bidir", "text0"): resource_estimate.estimate("bidirectional-var0", text).memory,
+            ("attr", "text0"): resource_estimate.estimate("attractor", text, {"n": 10, "minsubstrs": 55, "cover": 550}).memory,
+            ("sleep", "text0"): 3000,
+            ("bidir", "text2"): 3000,
+            ("slp", "text2"): 3000,
+        }
+        if any(memories[key] != value for (key, value) in expected.items()) or max(memories.values()) > 3000:
+            print(f"wrong memory of jobs without previous results: {memories}")
+            sys.exit(1)
+
+    scheduler.solvers = {"small": ["-c", job], "large": ["-c", job]}
+    seconds = [0.5, 1.5, 0.2, 1.0, 0.7, 20]
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for (i, t) in enumerate(seconds):
+            files.append(os.path.join(tmp, f"file{i}.{i:04}"))
+            with open(files[-1], "w") as f:
+                f.write(str(t))
+        # the times of the previous run, where the large jobs took 1000 MB
+        history = []
+        for solver in scheduler.solvers:
+            for (file, t) in zip(files, seconds):
+                history.append({"algo": solver, "file_name": os.path.basename(file), "file_len": 3, "time_wall": t, "est_memory": 100})
+                history[-1]["est_memory"] = 1000 if solver == "large" else 100
+        jobs = scheduler.make_jobs(files, list(scheduler.solvers), 2000, history, 5)
+        if [job.predicted for job in jobs] != sorted([min(t, 5) for t in seconds] * 2, reverse=True):
+            print(f"jobs are not ordered longest first: {jobs}")
+            sys.exit(1)
+        output = os.path.join(tmp, "benchmark.json")
+        scheduler.run(jobs, 3, 2100, 2000, 5, os.path.join(tmp, "log"), output, [{"algo": "kept"}])
+        with open(output) as f:
+            results = json.load(f)
+        # (solver, file, begin, end) of the jobs, which are killed on the timeout
+        runs = []
+        for r in results[1:]:
+            with open(os.path.join(tmp, "log", f"{r['algo']}_{r['file_name']}.log")) as f:
+                begin = json.loads(f.readline())["begin"]
+            runs.append((r["algo"], r["file_name"], begin, r["end"] if "end" in r else begin + 5))
+
+    if len(results) != 2 * len(files) + 1 or results[0] != {"algo": "kept"}:
+        print(f"results are missing: {results}")
+        sys.exit(1)
+    timeouts = [r for r in results[1:] if r["status"] == "timeout"]
+    if sorted((r["algo"], r["file_name"], r["dataset"]) for r in timeouts) != [("large", "file5.0005", "file5"), ("small", "file5.0005", "file5")]:
+        print(f"wrong jobs over the timeout: {timeouts}")
+        sys.exit(1)
+    runs.sort(key=lambda run: run[2])
+    # the first 3 jobs start at once, in an order given by the startup of the processes
+    if [run[1] for run in runs[:3]].count("file5.0005") != 2:
+        print(f"the longest jobs do not start first: {runs}")
+        sys.exit(1)
+    for (_, _, begin, _) in runs:
+        # with a margin for the interval of polling
+        running = [run for run in runs if run[2] <= begin < run[3] - 0.2]
+        if len(running) > 3 or sum(1000 if run[0] == "large" else 100 for run in running) > 2100:
+            print(f"too many jobs at once: {running}")
+            sys.exit(1)
+    print("ok")
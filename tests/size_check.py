@@ -1,10 +1,19 @@
 # verify the output of algorithm
 # python size_check.py "filename, algo, size"
+# python size_check.py make_tsv [--bypass_result_cache] files...
+# make_tsv takes the sizes from the result cache (see src/result_cache.py) if computed before, unless
+# --bypass_result_cache is given, and verify always runs the solvers
 
+import csv
+import json
+import os
 import subprocess
 import sys
 from typing import List
-import csv
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import result_cache  # noqa: E402
 
 
 algos = [
@@ -14,35 +23,56 @@ algos = [
     "bidirectional_var2",
     "slp",
 ]
+cache_names = {
+    "attractor": ("attractor", "attractor_solver"),
+    "bidirectional_var0": ("bidirectional-var0", "bidirectional_solver_var0"),
+    "bidirectional_var1": ("bidirectional-var1", "bidirectional_solver_var1"),
+    "bidirectional_var2": ("bidirectional-var2", "bidirectional_solver_var2"),
+    "slp": ("slp", "slp_solver"),
+}
 
 
-def compute_size(filename, algo) -> int:
+def compute_size(filename, algo, use_result_cache: bool = False, bypass_result_cache: bool = False) -> int:
+    """
+    Run the solver of `algo` on `filename` and return the size of the output.
+    If `use_result_cache`, the size cached by a previous run (see src/result_cache.py) is returned instead
+    unless `bypass_result_cache`, and new results are stored.
+    """
     assert algo in algos
     if algo == "attractor":
-        cmd = f"pipenv run python src/attractor_solver.py --file {filename} --algo min | jq '.factor_size'"
+        cmd = f"pipenv run python src/attractor_solver.py --file {filename} --algo min"
     elif algo == "bidirectional_var0":
-        cmd = f"pipenv run python src/bidirectional_solver_var0.py --file {filename} | jq '.factor_size'"
+        cmd = f"pipenv run python src/bidirectional_solver_var0.py --file {filename}"
     elif algo == "bidirectional_var1":
-        cmd = f"pipenv run python src/bidirectional_solver_var1.py --file {filename} | jq '.factor_size'"
+        cmd = f"pipenv run python src/bidirectional_solver_var1.py --file {filename}"
     elif algo == "bidirectional_var2":
-        cmd = f"pipenv run python src/bidirectional_solver_var2.py --file {filename} | jq '.factor_size'"
+        cmd = f"pipenv run python src/bidirectional_solver_var2.py --file {filename}"
     elif algo == "slp":
-        cmd = (
-            f"pipenv run python src/slp_solver.py --file {filename} | jq '.factor_size'"
-        )
+        cmd = f"pipenv run python src/slp_solver.py --file {filename}"
     else:
         assert False
 
-    res = int(subprocess.check_output(cmd, shell=True).strip().decode("utf8"))
+    if not use_result_cache:
+        return int(json.loads(subprocess.check_output(cmd, shell=True).splitlines()[-1])["factor_size"])
+    # the names of the encodings in the cache, shared with the benchmarks
+    (name, module) = cache_names[algo]
+    version = result_cache.encoding_version(module)
+    cached = None if bypass_result_cache else result_cache.lookup(name, version, {}, filename)
+    if cached is not None:
+        return json.loads(cached)["factor_size"]
+    exp = subprocess.check_output(cmd, shell=True).decode("utf8").strip().splitlines()[-1]
+    res = int(json.loads(exp)["factor_size"])
+    # the solvers verify their outputs
+    result_cache.store(name, version, {}, filename, exp, res)
     return res
 
 
-def make_tsv(files: List[str]):
+def make_tsv(files: List[str], bypass_result_cache: bool = False):
     writer = csv.writer(sys.stdout, delimiter="\t")
     writer.writerow(["filename", "algo", "size"])
     for file in files:
         for algo in algos:
-            size = compute_size(file, algo)
+            size = compute_size(file, algo, use_result_cache=True, bypass_result_cache=bypass_result_cache)
             writer.writerow([file, algo, size])
             sys.stdout.flush()
 
@@ -50,8 +80,8 @@ def make_tsv(files: List[str]):
 if __name__ == "__main__":
     prog = sys.argv[1]
     if prog == "make_tsv":
-        filenames = sys.argv[2:]
-        make_tsv(filenames)
+        filenames = [arg for arg in sys.argv[2:] if arg != "--bypass_result_cache"]
+        make_tsv(filenames, "--bypass_result_cache" in sys.argv[2:])
     elif prog == "verify":
         filename, algo, true_size = sys.argv[2:]
         if algo in algos:
@@ -0,0 +1,59 @@
+# verify that nothing is recorded unless tracing is enabled, and that the timeline of jobs running solvers
+# in a worker pool is merged into one, where the events of each solver lie in its job in the same process
+# python tracing_check.py [num_jobs]
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import tracing  # noqa: E402
+from slp import SLPExp  # noqa: E402
+from slp_solver import smallest_SLP  # noqa: E402
+from worker_pool import WorkerPool  # noqa: E402
+
+
+def job(trace_dir: str, text: str):
+    begin = time.time()
+    tracing.start()
+    smallest_SLP(text.encode(), SLPExp.create())
+    tracing.save_job(trace_dir, begin, file=text, algo="slp")
+
+
+if __name__ == "__main__":
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    smallest_SLP(b"abaababaab", SLPExp.create())
+    if tracing.enabled or len(tracing.events) != 0:
+        print("events are recorded while tracing is disabled")
+        sys.exit(1)
+
+    texts = ["ab" * i + "a" for i in range(1, num + 1)]
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_dir = os.path.join(tmp, "jobs")
+        os.mkdir(trace_dir)
+        tracing.start()
+        with WorkerPool(2) as pool:
+            pool.map(job, [(trace_dir, text) for text in texts])
+        path = os.path.join(tmp, "trace.json")
+        tracing.merge(path, trace_dir, "tracing_check")
+        events = tracing.load(path)
+
+    if [e["ts"] for e in events if "ts" in e] != sorted(e["ts"] for e in events if "ts" in e):
+        print("events are not in the order of time")
+        sys.exit(1)
+    jobs = [e for e in events if e["name"] == "job"]
+    if sorted(e["args"]["file"] for e in jobs) != sorted(texts):
+        print(f"jobs are missing: {jobs}")
+        sys.exit(1)
+    phases = [e for e in events if e.get("cat") in ["phase", "build"]]
+    if len([e for e in phases if e["name"] == "solve"]) != num:
+        print(f"events of the solvers are missing: {phases}")
+        sys.exit(1)
+    for e in phases:
+        # in the job of the same worker running the solver
+        if not any(j["pid"] == e["pid"] and j["ts"] <= e["ts"] and e["ts"] + e["dur"] <= j["ts"] + j["dur"] for j in jobs):
+            print(f"event {e} is not in a job")
+            sys.exit(1)
+    print("ok")
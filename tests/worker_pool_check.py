@@ -0,0 +1,79 @@
+# verify that the worker pool returns the results of jobs in order, that jobs over the timeout or the memory limit
+# and crashed ones are reported and their workers respawned, so that the following jobs still run,
+# and that the CPU time and peak memory of each job are measured
+# python worker_pool_check.py [num_jobs]
+
+import os
+import signal
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from attractor_bench_format import AttractorExp  # noqa: E402
+from attractor_solver import min_attractor  # noqa: E402
+from worker_pool import WorkerPool  # noqa: E402
+
+
+def job(kind: str, i: int):
+    if kind == "sleep":
+        time.sleep(60)
+    elif kind == "alloc":
+        # far over the memory limit
+        return len(bytearray(1 << 34))
+    elif kind == "raise":
+        raise ValueError(i)
+    elif kind == "kill":
+        # as the OOM killer
+        os.kill(os.getpid(), signal.SIGKILL)
+    elif kind == "abort":
+        os.abort()
+    elif kind == "spin":
+        # 200 MB and 0.5 seconds of CPU
+        data = bytearray(200 << 20)
+        end = time.process_time() + 0.5
+        while time.process_time() < end:
+            pass
+        return len(data)
+    exp = AttractorExp.create()
+    exp.factors = min_attractor(b"ab" * i + b"a", exp)
+    return exp
+
+
+if __name__ == "__main__":
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    kinds = ["sleep", "alloc", "raise", "kill", "abort", "spin"] + ["solve"] * num
+    with WorkerPool(2, memory_limit=512) as pool:
+        start = time.time()
+        results = pool.map(job, [(kind, i) for (i, kind) in enumerate(kinds)], timeout=3)
+        if time.time() - start > 30:
+            print("the timeout is not enforced")
+            sys.exit(1)
+        pids = set(w.process.pid for w in pool.workers)
+    statuses = [res.status for res in results]
+    if statuses != ["timeout", "oom", "crash", "oom", "crash", "ok"] + ["ok"] * num:
+        print(f"wrong statuses: {statuses}")
+        sys.exit(1)
+    if "ValueError" not in results[2].value:
+        print(f"the traceback is not reported: {results[2].value}")
+        sys.exit(1)
+    spin = results[5].usage
+    if spin.cpu_user + spin.cpu_sys < 0.4 or spin.max_rss < 200 or results[0].usage.cpu_user > 0.5:
+        print(f"wrong usage: {spin} {results[0].usage}")
+        sys.exit(1)
+    if results[3].usage.exit_code != -signal.SIGKILL or results[4].usage.exit_code != -signal.SIGABRT:
+        print(f"wrong exit codes: {results[3].usage} {results[4].usage}")
+        sys.exit(1)
+    # the peak is of each job, not of the worker
+    if os.path.exists("/proc/self/clear_refs") and any(res.usage.max_rss >= 200 for res in results[6:]):
+        print(f"the peak memory is not reset: {[res.usage for res in results[6:]]}")
+        sys.exit(1)
+    for (i, res) in enumerate(results[6:], 6):
+        if not isinstance(res.value, AttractorExp) or res.value.factor_size != len(res.value.factors) or res.value.sol_nsoft == 0:
+            print(f"wrong result of job {i}: {res.value}")
+            sys.exit(1)
+    # the workers of the timeout and MemoryError were replaced
+    if results[0].pid in pids or results[1].pid in pids:
+        print("workers are not respawned")
+        sys.exit(1)
+    print("ok")